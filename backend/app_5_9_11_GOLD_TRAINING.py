@@ -1,7 +1,308 @@
 """
-SAMM Agent Application - Version 5.9.11
+SAMM Agent Application - Version 5.9.36
 =======================================
 
+CHANGELOG v5.9.36:
+- FIXED: The in-process ITAR engine called Ollama (200s timeout, 3 retries) before most
+  answers, only for ai_insights. Its LLM analysis now defaults to never (ITAR_LLM_ANALYSIS
+  turns it on); when on it makes one call with ITAR_LLM_TIMEOUT (default 15s)
+- FIXED: path_finder_cache served a 2-hop context built for another intent; the key now
+  includes the intent and entries depend on the query's training versions too
+- FIXED: Cached answers, retrieval and 2-hop results were stamped with the data versions
+  at save time, so a HITL correction or KG update during generation marked the old result
+  current. Versions are captured at request start (DATA_VERSIONS.capture(), kept in
+  PipelineContext.data_versions) and passed as VersionedCache.set(snapshot=...)
+- FIXED: /api/query cached answers grounded in attachments under the bare question, so a
+  later plain query got them; with attachments the answer cache is now skipped both ways
+- FIXED: Embedded financial records of a case that got a new workbook before its first
+  summary read were never copied to FINANCIAL_STORE; copying is tracked by a per-case
+  migrated flag (ensure_case) and a partial copy is retried
+- FIXED: /api/debug/traces and /api/debug/traces/<request_id> were open to anyone; they
+  now need a login and are off unless DEBUG_TRACES_ENABLED=true
+- FIXED: The PDF page pool was forked lazily by whichever request thread first met a long
+  PDF; reset_after_fork() (and the dev server before app.run()) now forks it while the
+  process has no request threads, and extraction stays in-process until it has
+
+CHANGELOG v5.9.35:
+- ADDED: benchmark_hot_paths.py - pytest-benchmark suite for the pure-Python functions on
+  every query: normalize_query_for_cache, calculate_keyword_score / calculate_boost_score,
+  rerank_results, deduplicate_vector_results, EntityMetrics.normalize_entities /
+  evaluate_extraction, IntentAgent.analyze_intent (rule path), _extract_entities_enhanced,
+  find_nhop_paths, _enhance_answer_quality. Fixtures from the SAMM chunk files and the KG;
+  no network
+  * Each function is compared with benchmark_baselines/hot_paths.json (BENCH_STAT, default
+    min); slower than BENCH_REGRESSION_THRESHOLD (default 0.5) fails the test
+  * BENCH_SAVE_BASELINE=true records a new baseline
+- ADDED: pytest-benchmark to requirements.txt
+
+CHANGELOG v5.9.34:
+- ADDED: benchmark_retrieval.py - retrieval-only benchmark over the Gold question set
+  (one question per GOLD_TRAINING_DATA pattern, labelled by its must_retrieve targets):
+  recall@k, MRR and per-query latency for semantic / hybrid / hybrid_embedding_only
+  (_safe_query_vector) / two_hop (get_context_for_query), and EntityMetrics precision /
+  recall / F1 of the extracted entities. Compared with benchmark_baselines/retrieval.json
+  (--save records a new one; a quality drop beyond --tolerance fails the run)
+- ADDED: SMART_SEARCH_ENABLED=false skips the think_first_v2() LLM call before vector search
+
+CHANGELOG v5.9.33:
+- ADDED: benchmark_load.py - end-to-end load test of the app under gunicorn (ASGI or WSGI,
+  --workers) with a seeded mix of /api/query and /api/query/stream requests, some with an
+  attached document. Reports rps, errors, p50/p95/p99 per endpoint, stream time to first
+  token, and p50/p95/p99 per stage from each request's trace
+- ADDED: local_backends.py - stand-ins installed as the cosmos / blob / gremlin subsystems:
+  * InMemoryContainer answers the Cosmos SQL the app sends, with etags and patch operations
+  * InMemoryGremlin answers query_cosmos_graph() traversals from the knowledge graph file
+  * FakeOllama answers /api/chat after a time to first token plus tokens / rate
+- CHANGED: VECTOR_DB_PATH sets the ChromaDB directory (default unchanged)
+- FIXED: The async stream Cosmos client was built when the reviews container existed
+  but COSMOS_ENDPOINT was unset
+- ADDED: test_local_backends.py
+
+CHANGELOG v5.9.32:
+- ADDED: Per-request span trees (tracing.py). Query endpoints start a trace (TRACE_SAMPLE_RATE);
+  spans cover process_query and its steps, every agent / orchestrator method (@trace_methods),
+  the stream pipeline, each Ollama attempt, each Gremlin round trip, vector searches,
+  think_first_v2, trained lookups, rerank, 2-hop, compliance and review writes. Spans on
+  stage threads and the single-flight producer nest under their request
+  * GET /api/debug/traces/<request_id>: nested timing tree (?format=otlp: OTLP/JSON);
+    GET /api/debug/traces: recent traces. A ring keeps TRACE_BUFFER_SIZE finished traces
+  * TRACE_EXPORT_DIR: each finished trace also written as <request_id>.json (OTLP/JSON)
+  * About 6 us per span; 0.5 ms on a 36 ms /api/query (58 spans)
+- FIXED: A streamed response (Flask /api/query/stream) was counted out of
+  samm_requests_in_flight when its view returned; it now stays in flight, and traced,
+  until the server closes the stream
+- ADDED: test_tracing.py
+
+CHANGELOG v5.9.31:
+- ADDED: GET /metrics - Prometheus text from an in-process registry (metrics.py):
+  * Latency histograms: pipeline stages (StageScheduler observe hook), trained lookups,
+    think_first, Gremlin, 2-hop, rerank, compliance, Cosmos review writes, semantic and
+    entity vector searches, LLM time to first token and total, @time_function methods
+  * Counters: cache lookups by result, LLM calls by outcome, requests by endpoint/status
+  * Gauge: requests in flight per endpoint (SSE streams until their last frame)
+  * About 1 us per observation; label children are bound once at import
+  * Under gunicorn each worker flushes to METRICS_DIR and a scrape sums every worker
+- ADDED: test_metrics.py
+
+CHANGELOG v5.9.30:
+- CHANGED: Query-path print() calls (agents, orchestrator, Ollama calls, caches, retrieval,
+  2-hop RAG, training lookups) log through per-subsystem loggers (structured_logging.py):
+  samm.intent / samm.entity / samm.answer / samm.llm / ... with lazy %-formatting
+  * LOG_LEVEL / LOG_LEVELS set levels per subsystem; LOG_FORMAT=text|json
+  * LOG_DEBUG_SAMPLE_RATE keeps full DEBUG traces for a fraction of requests
+  * A bounded queue and listener thread write the records (LOG_QUEUE / LOG_QUEUE_SIZE);
+    a full queue drops and counts instead of blocking the request
+  * Every request has an id (X-Request-ID, echoed in the response) that follows its
+    stages onto worker threads (StageScheduler, SingleFlight, drive_effects_async)
+  * Startup and admin messages still print
+- ADDED: benchmark_logging.py - /api/query latency with the old prints vs production
+  logging (p50 96 -> 77 ms, log output 8.6 -> 0.1 KB per query)
+- ADDED: test_structured_logging.py
+
+CHANGELOG v5.9.29:
+- ADDED: Knowledge snapshot (knowledge_snapshot.py) - the JSON KG indices, 2-hop graphs and
+  TTL graph are written to KNOWLEDGE_SNAPSHOT_PATH keyed by the SHA-256 of
+  samm_knowledge_graph.json and this file; later starts load them from the memory-mapped
+  snapshot (34 ms) instead of building them (94 ms), and rebuild + rewrite it when a source
+  changes. Load vs build time in --profile-startup and /api/cache/stats
+- ADDED: test_knowledge_snapshot.py
+
+CHANGELOG v5.9.28:
+- CHANGED: Lazy startup - importing the app builds nothing; each subsystem (knowledge graph,
+  orchestrator, Cosmos and Blob clients, review stats/queue, financial store, Gremlin, vector
+  DB, embedding model, 2-hop RAG, matchers) is built on first use, or all at once by warmup()
+  (lazy_init.Subsystems; module globals are LazyObject proxies)
+  * gremlin_python, chromadb and sentence_transformers are imported by the subsystem that
+    uses them; openpyxl, PyMuPDF and authlib on first use; unused openpyxl / PyPDF2 imports removed
+  * preload_for_serving() is warmup(exclude=("gremlin",))
+- FIXED: One CosmosClient for the reviews and cases containers (two were created)
+- FIXED: meets_lor_gold_standard() was only defined when sentence_transformers was missing
+- ADDED: python app_5_9_11_GOLD_TRAINING.py --profile-startup - import time and RSS per package
+  and build time and RSS per subsystem, then exits
+- ADDED: test_startup_budget.py - cold import time / RSS budget, no heavy modules or
+  subsystems at import (1.29s -> 0.70s import, 109 -> 73 MB RSS on the reference host)
+
+CHANGELOG v5.9.27:
+- ADDED: Async SSE serving - WEB_SERVER=asgi runs uvicorn workers on create_asgi_app():
+  WEB_SERVER=asgi gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_asgi_app()"
+  * POST /api/query/stream is served from the event loop (sse_asgi.SSEASGIApp): an open
+    stream awaits Ollama (httpx) and the review write (azure.cosmos.aio when aiohttp is
+    installed) instead of holding a thread; other routes run in the Flask app behind the
+    WSGI bridge (WEB_THREADS threads)
+  * The pipeline's CPU-bound steps share STREAM_STEP_WORKERS threads
+  * Identical concurrent async streams coalesce too (SingleFlight.stream_async)
+  * Session cookie auth as in Flask (user_from_session_data)
+- CHANGED: The stream pipeline is stream_query_pipeline(), shared by both routes; it yields
+  GenerateAnswer / CreateReviewItem effects that each route's driver performs, so both
+  send the same SSE events
+- ADDED: test_async_streaming.py - 1,000 concurrent streams parked on a fake Ollama in one
+  process (bounded threads, RSS per stream, same event sequence as the Flask route)
+
+CHANGELOG v5.9.26:
+- ADDED: Production serving - gunicorn.conf.py (gthread workers, preload_app) with
+  create_app() as the entry point: gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_app()"
+  * preload_for_serving(): 2-hop KG, compiled entity / intent patterns and vector index
+    segments loaded once in the master (embedding model + KG already load on import),
+    then gc.freeze() so workers share the pages copy-on-write
+  * reset_after_fork(): each worker drops pooled HTTP connections inherited from the
+    master (Ollama, compliance, Cosmos, Blob) and opens its own Gremlin websocket
+  * WEB_WORKERS / WEB_THREADS / WEB_PRELOAD / WEB_TIMEOUT / WEB_MAX_REQUESTS
+- CHANGED: warm_up_ollama() no longer runs on import (dev server start / first gunicorn worker)
+- CHANGED: Werkzeug reloader is opt-in (DEV_RELOAD=true) - it imported the app twice
+- FIXED: SQLite cache tiers and the financial store open a new connection in a forked process
+- ADDED: benchmark_serving.py - requests/sec and per-worker RSS / PSS / USS under gunicorn
+  with a fake Ollama
+
+CHANGELOG v5.9.25:
+- ADDED: ReviewQueue (review_queue.py) - review queue pages over Cosmos continuation tokens
+  * /api/reviews/pending?pageSize=&continuationToken= returns one query page + the next token
+  * List view projects the queue fields (question, status, priority, timestamp, confidences,
+    intent); view=full returns whole items
+  * Server-side filters: status, intent, confidence band (low / medium / high) or
+    min/maxConfidence, since / until
+  * Without paging parameters the endpoint returns every pending review as before
+- ADDED: GET /api/reviews/<review_id> - full review for the detail view
+- UPDATED: static/hitl_review_dashboard_production_UPDATED.html loads 25-review list pages and
+  fetches each review's detail (point read by item id) when it is shown
+- ADDED: benchmark_review_queue.py - page latency from 100 to 100k pending reviews
+
+CHANGELOG v5.9.24:
+- ADDED: ReviewStatsService (review_stats.py) - review statistics without reading every review
+  * Counters item in the reviews container: status counts, confidence sums/counts,
+    intent correctness, entity metric sums/counts
+  * Incremented (Cosmos patch "incr") by the after-minus-before contribution on review
+    create, submit, accept, reject, needs-revision and regenerate
+  * Missing counters (or ?refresh=true) rebuilt with ONE aggregate query (COUNT / SUM
+    computed by Cosmos); short TTL cache in front (REVIEW_STATS_CACHE_TTL)
+- UPDATED: /api/reviews/stats and /api/reviews/detailed-stats read the counters
+- FIXED: /api/reviews/stats average_confidence summed review documents instead of confidenceOverall
+- UPDATED: /api/cache/stats reports review_stats
+- ADDED: test_review_stats.py
+
+CHANGELOG v5.9.23:
+- ADDED: FinancialRecordsStore (financial_records_store.py) - workbook financial records as
+  their own rows, partitioned by case
+  * Cosmos container FINANCIAL_RECORDS_CONTAINER (partition key /caseId): one item per record
+    plus a per-case aggregate item; otherwise a local SQLite file (FINANCIAL_STORE_PATH)
+  * Case / per-RSN totals updated incrementally when a document is added or deleted
+- UPDATED: Ingest jobs write records to the store; case items keep only recordCount
+- UPDATED: /api/cases/<id>/financial-summary serves the materialised aggregates
+- UPDATED: /api/cases/<id>/financial-data returns one page of rows (pageSize, continuationToken)
+  filtered by rsn / pdli / documentId / search; totals from the aggregates
+- UPDATED: Both endpoints resolve the case with one projected in-partition query; records
+  embedded in older case items are copied to the store on first read
+- UPDATED: /api/cache/stats reports financial_records
+- ADDED: test_financial_records_store.py
+
+CHANGELOG v5.9.22:
+- ADDED: Upload-time extraction jobs (document_ingest.py)
+  * /api/cases/<case_id>/documents/upload and /api/chat/stage_attachment store the blob,
+    queue an ingest job and return 202 with jobId + statusUrl (INGEST_ASYNC=false: inline, 200)
+  * A job stores text, entity/relationship hits, financial tables (workbooks) and a
+    per-document embedding index (overlapping chunks, one vector each)
+  * Artefacts and job status kept in memory + local SQLite (visible to every worker)
+- ADDED: GET /api/documents/jobs/<job_id> - queued / running / done / failed (+ summary / error)
+- UPDATED: Queries read the artefacts (load_attachment_documents): passages closest to the
+  question instead of the first 5,000 chars, precomputed entity hits; other files fetched as before
+- UPDATED: Workbook financial records are written to the case by the job (etag-checked update)
+- UPDATED: /api/cache/stats reports document_ingest
+- ADDED: test_document_ingest.py
+
+CHANGELOG v5.9.21:
+- ADDED: BlobTextCache (blob_text_cache.py) - extracted attachment text keyed on (container, blob, etag)
+  * Blob properties checked first; unchanged blobs are served without a download
+  * Memory LRU + local SQLite disk tier (BLOB_TEXT_CACHE_PATH), shared by workers on the host
+  * Plain text read with a ranged download of the prefix the budget needs
+  * Known binary types (xlsx, docx, images, ...) answered from properties alone
+  * LocalBlobContainer: filesystem stand-in for ContainerClient (tests / local runs)
+- UPDATED: /api/query and /api/query/stream fetch all attachments concurrently (fetch_blob_contents)
+- UPDATED: /api/cache/stats reports blob_text
+- ADDED: test_blob_text_cache.py (filesystem stand-in or Azurite)
+
+CHANGELOG v5.9.20:
+- REPLACED: PyPDF2 `text +=` extraction with PDFTextExtractor (pdf_text_extractor.py)
+  * PyMuPDF page ranges extracted in a process pool (PDF_EXTRACT_WORKERS), in-process for small PDFs
+  * iter_pages() streams page text and stops at the caller's character budget
+  * Pages cached by SHA-256 of the content; a larger budget continues from the cached pages
+- UPDATED: fetch_blob_content(max_chars=...) extracts PDF attachments instead of returning
+  "[Binary file]"; /api/query and /api/query/stream pass ATTACHMENT_CONTENT_CHARS (5000)
+- UPDATED: extract_text_from_pdf() / extract_case_document_data() PDF branch use the extractor
+- UPDATED: /api/cache/stats reports pdf_text (pages extracted, early stops, cache hits)
+- ADDED: benchmark_pdf_extraction.py
+
+CHANGELOG v5.9.19:
+- REPLACED: Full openpyxl load in extract_case_document_data() with a streaming parser
+  (excel_financial_parser.py)
+  * Workbook opened read_only, rows streamed as value tuples - one pass per sheet
+  * RSN/PDLI header rows detected on the fly; only mapped columns read per row
+  * CTY/CASE filter checked before a row is extracted
+  * find_header_row() reads the first rows once (works on read-only sheets)
+- ADDED: benchmark_excel_parser.py - parse time and peak RSS on a generated workbook
+
+CHANGELOG v5.9.18:
+- ADDED: In-process ITAR compliance engine (itar_compliance_engine.py)
+  * Same knowledge base, rules and result schema as itar_compliance_microservice.py
+  * All detector terms compiled into one regex - one scan per query
+  * Decision cache (LRU + TTL) keyed on normalized query + intent + entity set + auth level
+  * LLM analysis (advisory ai_insights only) skipped when the rules are decisive
+- UPDATED: check_compliance() runs the engine in-process (COMPLIANCE_MODE=inprocess, default);
+  COMPLIANCE_MODE=http keeps the microservice call, now over a pooled session
+- UPDATED: /api/cache/stats reports compliance_decisions (cache hits, LLM calls/skips)
+
+CHANGELOG v5.9.17:
+- ADDED: StageScheduler (stage_scheduler.py) - declared stage dependencies
+  * compliance requires (intent, entities) - starts as soon as entities are extracted,
+    overlapping vector/graph retrieval, 2-hop lookup and context building
+  * answer waits only on retrieval/context + compliance
+  * IntegratedEntityAgent.extract_and_retrieve(on_entities=...) fires before retrieval
+  * EnhancedAnswerAgent.generate_answer(compliance_check=...) uses the started check
+  * /api/query/stream builds the answer context on a worker while compliance finishes
+- ADDED: Per-stage start/end offsets in timings (metadata.timings.stages, SSE complete.timings.stages)
+- ADDED: PIPELINE_STAGE_WORKERS env setting (shared stage worker pool)
+
+CHANGELOG v5.9.16:
+- ADDED: PipelineContext - explicit per-request retrieval state
+  * Created by SimpleStateOrchestrator.process_query() (state['pipeline_context'])
+  * Passed to IntegratedEntityAgent.extract_and_retrieve() and its helpers
+  * Holds query/intent, retrieval results, text-section metadata and 2-hop context
+- REMOVED: _current_query / _current_intent / last_retrieval_results /
+  last_text_sections_meta / _two_hop_context from the shared entity agent
+  * Agents keep only shared knowledge (patterns, HIL/trigger updates) - safe for threaded servers
+- ADDED: test_concurrent_queries.py - N parallel queries, asserts no cross-request leakage
+
+CHANGELOG v5.9.15:
+- ADDED: Single-flight coalescing of identical in-flight queries (single_flight.py)
+  * Key: normalized query + case context (case id, chat history, auth level) + attachment set
+  * /api/query: concurrent duplicates wait for the leader's result ("coalesced": true)
+  * /api/query/stream: one background producer, SSE frames fanned out to every subscriber
+  * Attachments are fetched once per flight; SINGLE_FLIGHT_ENABLED env toggle
+- UPDATED: /api/cache/stats reports single_flight leaders/coalesced/llm_calls_saved
+
+CHANGELOG v5.9.14:
+- ADDED: /api/query/stream uses the shared answer cache
+  * Cache checked after the HITL check, before intent/entity/compliance/LLM
+  * Hit: cached answer + metadata replayed with the normal SSE event schema
+  * Miss: answer saved to the cache on completion (skipped when files are attached)
+  * timings.cache_ttft reported on hits, timings.ttft on live generations
+- ADDED: cache_entry_allowed_for() - cached answers are only served to users
+  cleared at least as high as the user they were approved for
+
+CHANGELOG v5.9.13:
+- ADDED: Version-stamped cache invalidation (DataVersionRegistry + VersionedCache)
+  * Answers, retrieval results and 2-hop path results record the data versions they used
+  * HITL corrections bump only training:q:<hash> + training:kw:<keyword> versions
+  * Trigger updates bump only kg:term:<term> versions for the new entities/relationships
+  * KG file / vector store fingerprints invalidate everything built from an older copy
+  * Stale entries are dropped lazily on lookup - no full cache flush on a correction
+- ADDED: retrieval_cache for _safe_query_vector(), path_finder_cache for 2-hop context
+
+CHANGELOG v5.9.12:
+- REPLACED: Plain-dict query_cache with TieredCache (tiered_cache.py)
+  * Memory tier: thread-safe OrderedDict LRU with TTL, O(1) eviction (was min() scan)
+  * Shared tier: SQLite file (WAL) read by every worker, atomic single-transaction writes
+  * CACHE_SHARED_ENABLED / CACHE_SHARED_PATH / CACHE_SHARED_MAX_SIZE env settings
+- UPDATED: /api/cache/stats reports hits/misses/evictions per tier
+
 CHANGELOG v5.9.11 (18-Dec-2025):
 - ADDED: GOLD STANDARD TRAINING SYSTEM!
   * 13 Gold Q&A patterns from verified test questions
@@ -114,47 +415,128 @@ LOR_BLUEPRINT = {
 }
 
 
+# v5.9.28: --profile-startup times every import below and each subsystem's first build
+import sys
+import time
+from lazy_init import ImportProfiler, Subsystems, format_startup_report
+STARTUP_PROFILER = ImportProfiler().install() if "--profile-startup" in sys.argv else None
+_import_started = time.perf_counter()
+
 import os
 import json
+import logging
 import uuid 
-import time
 import re
 import hashlib
 import asyncio
-import sys
+import importlib.util
 from datetime import datetime, timezone 
-from typing import Dict, List, Any, Optional, TypedDict, Set
+from typing import Dict, List, Any, Optional, TypedDict, Set, Callable, Tuple, NamedTuple
 from urllib.parse import quote_plus, urlencode
 from enum import Enum
 from pathlib import Path
 from flask import send_from_directory
 import functools
 from collections import defaultdict  # For metrics calculations
-import openpyxl  # Excel processing for MISIL RSN sheets
-import PyPDF2    # PDF text extraction
+from excel_financial_parser import parse_financial_workbook, find_header_row as find_financial_header_row  # v5.9.19
 import tempfile  # Temporary file handling for uploads
+import threading
+import copy
+from tiered_cache import TieredCache, DataVersionRegistry, VersionedCache  # v5.9.12/13: tiered + versioned caches
+from single_flight import SingleFlight, single_flight_key  # v5.9.15: coalesce identical in-flight queries
+from stage_scheduler import StageScheduler  # v5.9.17: overlap independent pipeline stages
+from itar_compliance_engine import ITARComplianceEngine  # v5.9.18: in-process compliance checks
+from pdf_text_extractor import PDFTextExtractor  # v5.9.20: page-parallel PDF text with early stop
+from blob_text_cache import BlobTextCache  # v5.9.21: attachment text cached by (container, blob, etag)
+from document_ingest import DocumentIngestService, DocumentExtractors, select_passages, entities_in  # v5.9.22: upload-time extraction
+from financial_records_store import financial_store_from_env  # v5.9.23: financial records partitioned by case
+from review_stats import ReviewStatsService, review_stats_summary, detailed_review_stats  # v5.9.24: review counters
+from review_queue import ReviewQueue  # v5.9.25: paged, projected review queue
+from sse_asgi import SSEASGIApp, SSEResponse, drive_effects, drive_effects_async  # v5.9.27: async SSE serving
+from knowledge_snapshot import KnowledgeSnapshot  # v5.9.29: snapshot of the KG / 2-hop structures
+from structured_logging import configure_logging, get_logger, begin_request, end_request  # v5.9.30: levelled, sampled logging
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE  # v5.9.31: Prometheus /metrics
+from tracing import Tracer, span, traced, trace_methods, set_attribute, current_span, tree_from_otlp  # v5.9.32: per-request span trees
+from concurrent.futures import ThreadPoolExecutor
 # Fix for Windows asyncio issues
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 # Flask & Extensions
-from flask import Flask, request, jsonify, session, send_from_directory, redirect, url_for
+from flask import Flask, request, jsonify, session, send_from_directory, redirect, url_for, g
 from flask_cors import CORS
-from authlib.integrations.flask_client import OAuth
 from werkzeug.utils import secure_filename 
 
 # Environment
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv()) 
+# v5.9.30: Query-path subsystems log through levelled loggers instead of print():
+# LOG_LEVEL / LOG_LEVELS set the levels, records below them are never formatted,
+# and LOG_DEBUG_SAMPLE_RATE keeps full DEBUG traces for a fraction of requests.
+# Startup and admin messages still print.
+LOGGING = configure_logging()
+timing_log = get_logger("samm.timing")
+kg_log = get_logger("samm.kg")
+training_log = get_logger("samm.training")
+cache_log = get_logger("samm.cache")
+retrieval_log = get_logger("samm.retrieval")
+llm_log = get_logger("samm.llm")
+db_log = get_logger("samm.db")
+intent_log = get_logger("samm.intent")
+metrics_log = get_logger("samm.metrics")
+entity_log = get_logger("samm.entity")
+answer_log = get_logger("samm.answer")
+compliance_log = get_logger("samm.compliance")
+orchestrator_log = get_logger("samm.orchestrator")
+query_log = get_logger("samm.query")
+
+# v5.9.31: Metrics served in Prometheus text format on GET /metrics (summed over
+# gunicorn workers through METRICS_DIR). Hot paths bind their label children once,
+# so an observation costs a bisect and an add.
+METRICS = MetricsRegistry.from_env()
+PIPELINE_STAGE_SECONDS = METRICS.histogram(
+    "samm_pipeline_stage_seconds", "Query pipeline stage latency (StageScheduler stages)", ("stage",))
+STEP_SECONDS = METRICS.histogram(
+    "samm_step_seconds", "Latency of retrieval, knowledge graph, compliance and storage steps", ("step",))
+VECTOR_SEARCH_SECONDS = METRICS.histogram("samm_vector_search_seconds", "Vector DB query latency", ("search",))
+LLM_TTFT_SECONDS = METRICS.histogram("samm_llm_ttft_seconds", "Time to the first answer token", ("call",))
+LLM_SECONDS = METRICS.histogram("samm_llm_seconds", "LLM call latency, first request to last token", ("call",))
+FUNCTION_SECONDS = METRICS.histogram("samm_function_seconds", "Latency of @time_function methods", ("function",))
+CACHE_LOOKUPS = METRICS.counter("samm_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+LLM_CALLS = METRICS.counter("samm_llm_calls_total", "LLM calls by call site and outcome", ("call", "outcome"))
+HTTP_REQUESTS = METRICS.counter("samm_http_requests_total", "Requests served by endpoint and status", ("endpoint", "status"))
+REQUESTS_IN_FLIGHT = METRICS.gauge("samm_requests_in_flight", "Requests (and open SSE streams) being served", ("endpoint",))
+
+
+# v5.9.32: Span trees of query requests (TRACE_SAMPLE_RATE of them), kept in a ring of
+# TRACE_BUFFER_SIZE and served on /api/debug/traces/<request_id>. Only these endpoints
+# start a trace; outside one, a span is a context-variable read.
+TRACER = Tracer.from_env()
+# v5.9.36: The trace routes show every user's requests (span attributes include Gremlin
+# query text), so they are off unless DEBUG_TRACES_ENABLED=true, and need a login
+DEBUG_TRACES_ENABLED = os.getenv("DEBUG_TRACES_ENABLED", "false").lower() == "true"
+TRACED_ENDPOINTS = {"query_ai_assistant", "query_ai_assistant_stream", "test_query_endpoint",
+                    "rerun_intent", "rerun_entities", "hitl_regenerate_answer", "regenerate_answer"}
+
+
+def observe_pipeline_stage(stage: str, seconds: float) -> None:
+    """StageScheduler observe hook"""
+    PIPELINE_STAGE_SECONDS.labels(stage).observe(seconds)
+
+
 def time_function(func):
     """Simple timing decorator for performance monitoring"""
+    seconds = FUNCTION_SECONDS.labels(func.__qualname__)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.time()
-        result = func(*args, **kwargs)
-        elapsed = time.time() - start
-        print(f"[TIMING] {func.__name__}: {elapsed:.2f}s")
-        return result
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            seconds.observe(elapsed)
+            timing_log.debug("[TIMING] %s: %.2fs", func.__name__, elapsed)
     return wrapper
 
 # HTTP Requests Library
@@ -163,52 +545,51 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 # Azure SDK
 from azure.cosmos import CosmosClient, PartitionKey, exceptions as CosmosExceptions 
+from azure.core import MatchConditions
 from azure.storage.blob import BlobServiceClient, ContentSettings 
 from azure.core.exceptions import ResourceExistsError as BlobResourceExistsError, ResourceNotFoundError as BlobResourceNotFoundError
 
 # Database imports for integrated agents
-try:
-    from gremlin_python.driver import client, serializer
-    from gremlin_python.driver.protocol import GremlinServerError
-    print("Gremlin client imported successfully")
-except ImportError:
-    print("Gremlin client not available - some features may be limited")
-    client = None
-
-try:
-    import chromadb
-    print("ChromaDB imported successfully")
-except ImportError:
-    print("ChromaDB not available - some features may be limited")
-    chromadb = None
-
-try:
-    from sentence_transformers import SentenceTransformer
-    print("SentenceTransformers imported successfully")
-except ImportError:
-    print("SentenceTransformers not available - some features may be limited")
-    SentenceTransformer = None
-    
-    def meets_lor_gold_standard(answer_text: str) -> bool:
-        text = answer_text.lower()
-
-        # Check required phrases
-        for phrase in LOR_BLUEPRINT["must_include_phrases"]:
-            if phrase.lower() not in text:
-                return False
-
-        # Count bullet points
-        bullet_count = answer_text.count("\n")  # rough but OK for now
-        if bullet_count < LOR_BLUEPRINT["min_bullets"]:
+# v5.9.28: gremlin_python, chromadb and sentence_transformers (torch) are imported by the
+# DatabaseManager subsystem that uses them, on first use; here we only check they are installed
+GREMLIN_AVAILABLE = importlib.util.find_spec("gremlin_python") is not None
+CHROMADB_AVAILABLE = importlib.util.find_spec("chromadb") is not None
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+print(f"Optional backends: Gremlin={'yes' if GREMLIN_AVAILABLE else 'no'}, ChromaDB={'yes' if CHROMADB_AVAILABLE else 'no'}, "
+      f"SentenceTransformers={'yes' if SENTENCE_TRANSFORMERS_AVAILABLE else 'no'} (loaded on first use)")
+
+# v5.9.28: lazily built subsystems (knowledge graph, database clients, agents); warmup() builds them all
+SUBSYSTEMS = Subsystems()
+
+
+def meets_lor_gold_standard(answer_text: str) -> bool:
+    text = answer_text.lower()
+
+    # Check required phrases
+    for phrase in LOR_BLUEPRINT["must_include_phrases"]:
+        if phrase.lower() not in text:
             return False
 
-        return True
+    # Count bullet points
+    bullet_count = answer_text.count("\n")  # rough but OK for now
+    if bullet_count < LOR_BLUEPRINT["min_bullets"]:
+        return False
+
+    return True
 
 # =============================================================================
 # v5.9.3: 2-HOP PATH RAG CLASSES
 # =============================================================================
 from collections import deque
 
+def find_data_file(name: str) -> Optional[Path]:
+    """First of name, next to this file, or under the working directory that exists"""
+    for p in (Path(name), Path(__file__).parent / name, Path.cwd() / name):
+        if p.exists():
+            return p
+    return None
+
+
 class SAMMKnowledgeGraphJSON:
     """
     JSON-based Knowledge Graph for SAMM - v5.9.3
@@ -238,19 +619,13 @@ class SAMMKnowledgeGraphJSON:
     
     def _load_from_file(self, json_path: str):
         """Load from JSON file."""
-        possible_paths = [
-            Path(json_path),
-            Path(__file__).parent / json_path,
-            Path.cwd() / json_path,
-        ]
-        
-        for p in possible_paths:
-            if p.exists():
-                with open(p, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self._load_from_dict(data)
-                print(f"[SAMMKnowledgeGraphJSON] Loaded from: {p}")
-                return
+        p = find_data_file(json_path)
+        if p is not None:
+            with open(p, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._load_from_dict(data)
+            print(f"[SAMMKnowledgeGraphJSON] Loaded from: {p}")
+            return
         
         print(f"[SAMMKnowledgeGraphJSON] ⚠️ File not found: {json_path}")
     
@@ -368,7 +743,7 @@ class TwoHopPathFinder:
         self.relationship_graph = {}
         self.reverse_graph = {}
         self._build_graphs()
-        print(f"[TwoHopPathFinder] ✅ Initialized with {len(self.relationship_graph)} entities in graph")
+        kg_log.info("[TwoHopPathFinder] ✅ Initialized with %s entities in graph", len(self.relationship_graph))
     
     def _build_graphs(self):
         """Build forward and reverse relationship graphs."""
@@ -530,6 +905,8 @@ class TwoHopPathFinder:
         
         return chain
     
+    @traced()
+    @STEP_SECONDS.labels("two_hop").time()
     def get_context_for_query(self, entities: List[str], query: str, intent: str = None) -> Dict:
         """Get 2-hop context for a query."""
         result = {
@@ -605,17 +982,54 @@ class TwoHopPathFinder:
 SAMM_JSON_KG = None
 TWO_HOP_PATH_FINDER = None
 
-def initialize_2hop_rag(json_kg_path: str = "samm_knowledge_graph.json"):
+# v5.9.29: The JSON KG indices, the 2-hop graphs and the TTL graph are built from the same
+# files on every boot; a snapshot keyed by those files' hashes loads them instead
+SAMM_KG_JSON_FILE = "samm_knowledge_graph.json"
+KNOWLEDGE_SNAPSHOT_VERSION = 1  # bump when the state of a snapshotted class changes shape
+
+
+def build_knowledge_states() -> Dict[str, Dict[str, Any]]:
+    """Instance state of each snapshotted structure, built from the source files"""
+    json_kg = SAMMKnowledgeGraphJSON(json_path=SAMM_KG_JSON_FILE)
+    path_finder = TwoHopPathFinder(json_kg=json_kg, entity_relationships=json_kg.get_entity_relationships_dict())
+    return {
+        "json_kg": vars(json_kg),
+        "two_hop": {k: v for k, v in vars(path_finder).items() if k not in ("json_kg", "knowledge_graph")},
+        "ttl_kg": vars(SimpleKnowledgeGraph(SAMM_KNOWLEDGE_GRAPH)),
+    }
+
+
+def restore_state(cls, state: Dict[str, Any]):
+    """An instance of cls with state, without running its __init__"""
+    instance = cls.__new__(cls)
+    instance.__dict__.update(state)
+    return instance
+
+
+# Sources: the KG JSON, and this file (the TTL graph and the code that builds every structure)
+KNOWLEDGE_SNAPSHOT = KnowledgeSnapshot.from_env(
+    sources=[find_data_file(SAMM_KG_JSON_FILE) or SAMM_KG_JSON_FILE, os.path.abspath(__file__)],
+    version=KNOWLEDGE_SNAPSHOT_VERSION)
+SUBSYSTEMS.register("knowledge_snapshot", lambda: KNOWLEDGE_SNAPSHOT.load_or_build(build_knowledge_states))
+
+
+def initialize_2hop_rag(json_kg_path: str = SAMM_KG_JSON_FILE):
     """Initialize 2-Hop Path RAG system."""
     global SAMM_JSON_KG, TWO_HOP_PATH_FINDER
     
     try:
-        SAMM_JSON_KG = SAMMKnowledgeGraphJSON(json_path=json_kg_path)
-        entity_rels = SAMM_JSON_KG.get_entity_relationships_dict()
-        TWO_HOP_PATH_FINDER = TwoHopPathFinder(
-            json_kg=SAMM_JSON_KG,
-            entity_relationships=entity_rels
-        )
+        states = SUBSYSTEMS.get("knowledge_snapshot") if json_kg_path == SAMM_KG_JSON_FILE else None
+        if states:
+            SAMM_JSON_KG = restore_state(SAMMKnowledgeGraphJSON, states["json_kg"])
+            TWO_HOP_PATH_FINDER = restore_state(TwoHopPathFinder, {**states["two_hop"], "json_kg": SAMM_JSON_KG,
+                                                                   "knowledge_graph": None})
+        else:
+            SAMM_JSON_KG = SAMMKnowledgeGraphJSON(json_path=json_kg_path)
+            entity_rels = SAMM_JSON_KG.get_entity_relationships_dict()
+            TWO_HOP_PATH_FINDER = TwoHopPathFinder(
+                json_kg=SAMM_JSON_KG,
+                entity_relationships=entity_rels
+            )
         print(f"[v5.9.3] ✅ 2-Hop Path RAG initialized successfully")
         return True
     except Exception as e:
@@ -660,7 +1074,8 @@ COSMOS_GREMLIN_CONFIG = {
 }
 
 # Vector Database Configuration
-VECTOR_DB_PATH = "C:\\Users\\ShaziaKashif\\ASIST Project\\ASIST2.1\\ASIST_V2.1\\backend\\Chromadb\\samm_all_chapters_db"
+# v5.9.33: VECTOR_DB_PATH overrides it (benchmark_load.py points it at backend/Chromadb)
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "C:\\Users\\ShaziaKashif\\ASIST Project\\ASIST2.1\\ASIST_V2.1\\backend\\Chromadb\\samm_all_chapters_db")
 #VECTOR_DB_PATH = "C:\\Users\\TomLorenc\\Downloads\\ASIST_DEV\\ASIST_DEV\backend\\vector_db"
 #VECTOR_DB_PATH = "C:\\Projects\\5_1\\ASIST_V5.0-main\backend\\vector_db"
 #VECTOR_DB_PATH = "O:\\Assist Versions\backend\\vector_db"
@@ -884,7 +1299,7 @@ class SAMMGoldTrainer:
     def __init__(self):
         self.patterns = GOLD_TRAINING_DATA.get("patterns", [])
         self.keyword_map = GOLD_TRAINING_DATA.get("keyword_to_retrieval", {})
-        print(f"[GoldTrainer] ✅ Loaded {len(self.patterns)} training patterns")
+        training_log.info("[GoldTrainer] ✅ Loaded %s training patterns", len(self.patterns))
     
     def match_query_to_pattern(self, query: str) -> Optional[Dict]:
         """Query ko Gold patterns ke saath match karo."""
@@ -902,7 +1317,7 @@ class SAMMGoldTrainer:
                 best_match = pattern
         
         if best_match and best_score >= 1:
-            print(f"[GoldTrainer] 🎯 Matched pattern: {best_match['id']} (score: {best_score})")
+            training_log.debug("[GoldTrainer] 🎯 Matched pattern: %s (score: %s)", best_match['id'], best_score)
             return best_match
         
         return None
@@ -1064,25 +1479,123 @@ print(f"[v5.9.11] Gold Training: {len(GOLD_TRAINING_DATA['patterns'])} patterns
 # Cache settings
 CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))  # 1 hour default
-CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1000"))  # Maximum cached items
-
-# In-memory cache structures
-query_cache = {}  # Structure: {normalized_query: {answer, metadata, timestamp}}
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1000"))  # Maximum cached items (per process)
+# v5.9.12: Shared tier - one SQLite file read by every worker on this host
+CACHE_SHARED_ENABLED = os.getenv("CACHE_SHARED_ENABLED", "true").lower() == "true"
+CACHE_SHARED_PATH = os.getenv("CACHE_SHARED_PATH", os.path.join("cache_data", "answer_cache.sqlite3"))
+CACHE_SHARED_MAX_SIZE = int(os.getenv("CACHE_SHARED_MAX_SIZE", str(CACHE_MAX_SIZE * 10)))
+
+# v5.9.13: Data versions that cached artefacts depend on (shared across workers)
+#   training:q:<question_hash>   - exact HITL corrections for one question
+#   training:kw:<keyword>        - trained keyword patterns (similar questions)
+#   kg:term:<term>               - entities/relationships added by trigger updates
+#   kg:file                      - fingerprint of samm_knowledge_graph.json
+#   vector:<collection>          - fingerprint of the Chroma vector store
+DATA_VERSIONS = DataVersionRegistry(
+    path=CACHE_SHARED_PATH if CACHE_SHARED_ENABLED else None,
+    refresh_seconds=float(os.getenv("CACHE_VERSION_REFRESH_SECONDS", "1.0"))
+)
+
+# v5.9.12: Thread-safe tiered cache (memory LRU + shared SQLite)
+# v5.9.13: Entries are version-stamped and invalidated lazily on version bump
+# Entry structure: {original_query, answer, metadata, timestamp}
+query_cache = VersionedCache(TieredCache(
+    max_size=CACHE_MAX_SIZE,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    shared_path=CACHE_SHARED_PATH if CACHE_SHARED_ENABLED else None,
+    shared_max_size=CACHE_SHARED_MAX_SIZE,
+    namespace="answers"
+), DATA_VERSIONS)
+
+# v5.9.13: Per-process caches for retrieval and 2-hop path results
+retrieval_cache = VersionedCache(TieredCache(max_size=CACHE_MAX_SIZE, ttl_seconds=CACHE_TTL_SECONDS), DATA_VERSIONS)
+path_finder_cache = VersionedCache(TieredCache(max_size=CACHE_MAX_SIZE, ttl_seconds=CACHE_TTL_SECONDS), DATA_VERSIONS)
 cache_stats = {
     "hits": 0,
     "misses": 0,
     "total_queries": 0,
     "cache_size": 0
 }
+cache_stats_lock = threading.Lock()
+
+# v5.9.15: Single-flight coalescing of identical concurrent queries
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+QUERY_FLIGHTS = SingleFlight("query")
+STREAM_FLIGHTS = SingleFlight("stream")
 
-print(f"Cache Configuration: Enabled={CACHE_ENABLED}, TTL={CACHE_TTL_SECONDS}s, Max Size={CACHE_MAX_SIZE}")
+print(f"Cache Configuration: Enabled={CACHE_ENABLED}, TTL={CACHE_TTL_SECONDS}s, Max Size={CACHE_MAX_SIZE}, "
+      f"Shared Tier={'Enabled (' + CACHE_SHARED_PATH + ')' if query_cache.shared else 'Disabled'}")
 
 # ITAR Compliance Integration
 COMPLIANCE_SERVICE_URL = os.getenv("COMPLIANCE_SERVICE_URL", "http://localhost:3002")
 COMPLIANCE_ENABLED = os.getenv("COMPLIANCE_ENABLED", "true").lower() == "true"
 DEFAULT_DEV_AUTH_LEVEL = os.getenv("DEFAULT_DEV_AUTH_LEVEL", "top_secret")
 
-print(f"ITAR Compliance: {'Enabled' if COMPLIANCE_ENABLED else 'Disabled'} (Default Level: {DEFAULT_DEV_AUTH_LEVEL})")
+# v5.9.18: "inprocess" evaluates rules in this process (no HTTP hop, cached decisions);
+# "http" calls the standalone itar_compliance_microservice at COMPLIANCE_SERVICE_URL
+COMPLIANCE_MODE = os.getenv("COMPLIANCE_MODE", "inprocess").lower()
+# v5.9.36: check_compliance() runs before the answer, so the engine's LLM analysis (ai_insights,
+# unused by the app) is off unless ITAR_LLM_ANALYSIS asks for it; then one attempt, hard timeout
+ITAR_LLM_TIMEOUT = float(os.getenv("ITAR_LLM_TIMEOUT", "15"))
+
+
+def _itar_llm(prompt, system_msg):
+    """Single Ollama call for ITAR analysis; errors fall back to the rule-based result"""
+    response = requests.post(f"{OLLAMA_URL}/api/chat", json={
+        "model": OLLAMA_MODEL,
+        "messages": [{"role": "system", "content": system_msg}, {"role": "user", "content": prompt}],
+        "stream": False,
+        "options": {"temperature": 0.1, "num_predict": 500},
+    }, timeout=ITAR_LLM_TIMEOUT)
+    response.raise_for_status()
+    return response.json()["message"]["content"]
+
+
+ITAR_ENGINE = ITARComplianceEngine.from_env(llm=_itar_llm, default_llm_mode="never")
+compliance_http_session = requests.Session()
+
+print(f"ITAR Compliance: {'Enabled' if COMPLIANCE_ENABLED else 'Disabled'} (Default Level: {DEFAULT_DEV_AUTH_LEVEL}, "
+      f"Mode: {COMPLIANCE_MODE}, LLM analysis: {ITAR_ENGINE.llm_mode})")
+
+# v5.9.20: PDF text extraction (PyMuPDF process pool, content-hash page cache).
+# Attachments only need a prefix of the text, so extraction stops at the budget.
+ATTACHMENT_CONTENT_CHARS = int(os.getenv("ATTACHMENT_CONTENT_CHARS", "5000"))
+PDF_EXTRACTOR = PDFTextExtractor.from_env()
+print(f"PDF Extraction: {PDF_EXTRACTOR.get_stats()['backend']}, workers={PDF_EXTRACTOR.workers}, "
+      f"attachment budget={ATTACHMENT_CONTENT_CHARS} chars")
+
+# v5.9.21: Extracted attachment text keyed on (container, blob, etag), memory + local disk tier
+BLOB_TEXT_CACHE = BlobTextCache.from_env(pdf_extractor=PDF_EXTRACTOR)
+print(f"Blob Text Cache: disk tier={'Enabled' if BLOB_TEXT_CACHE.cache.shared else 'Disabled'}, "
+      f"fetch workers={BLOB_TEXT_CACHE.fetch_workers}")
+
+# v5.9.22: Attachments are extracted once by a background job at upload time (text, entity hits,
+# financial tables, chunk embeddings); queries read the stored artefacts.
+# INGEST_ASYNC=false runs the job inside the upload request (200 instead of 202).
+INGEST_ASYNC = os.getenv("INGEST_ASYNC", "true").lower() == "true"
+DOCUMENT_INGEST = DocumentIngestService.from_env(extractors=DocumentExtractors(
+    pdf_text=lambda data, max_chars: PDF_EXTRACTOR.extract_text(data, max_chars=max_chars),
+    entities=lambda text, file_name: orchestrator.entity_agent._extract_entities_from_text(text, file_name),
+    relationships=lambda text, file_name: orchestrator.entity_agent._extract_relationships_from_text(text, file_name),
+    financial=lambda data, file_name: extract_financial_tables(data, file_name),
+    embed=lambda texts: embed_texts(texts),
+))
+print(f"Document Ingest: {'background jobs' if INGEST_ASYNC else 'inline'}, workers={DOCUMENT_INGEST.workers}")
+
+# v5.9.17: Worker pool for background pipeline stages (compliance, context building)
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "8"))
+PIPELINE_STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=PIPELINE_STAGE_WORKERS, thread_name_prefix="pipeline-stage")
+
+
+def compliance_stage(query: str, user_profile: Dict = None) -> Callable[[Dict, List[str]], Dict[str, Any]]:
+    """
+    Compliance stage for StageScheduler: needs only the intent and the extracted
+    entity names (the service reads nothing else from entity_info), so it can
+    start before retrieval and context building have finished.
+    """
+    def _run(intent_info: Dict, entities: List[str]) -> Dict[str, Any]:
+        return check_compliance(query, intent_info, {"entities": list(entities or [])}, user_profile)
+    return _run
 # =============================================================================
 # CACHE HELPER FUNCTIONS
 # =============================================================================
@@ -1104,94 +1617,281 @@ def normalize_query_for_cache(query: str) -> str:
     # Return sorted words as key
     return ' '.join(sorted(significant_words))
 
+def _file_fingerprint(path) -> str:
+    """Cheap content fingerprint (size + mtime) for version stamping"""
+    try:
+        st = os.stat(path)
+        return f"{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return "missing"
+
+def version_terms(text: str) -> Set[str]:
+    """Lowercase terms used to scope KG versions (keeps 2-letter acronyms like SA/SC)"""
+    stop_words = {'what', 'is', 'are', 'the', 'an', 'does', 'do', 'can', 'how', 'of', 'in',
+                  'on', 'to', 'for', 'and', 'or', 'who', 'which', 'with', 'be', 'by'}
+    return {t for t in re.findall(r'[a-z0-9]+', (text or '').lower()) if len(t) >= 2 and t not in stop_words}
+
+def training_version_components(question: str) -> List[str]:
+    """Versions bumped by a HITL correction / read by answers for this question"""
+    components = [f"training:q:{create_question_hash(question)}"]
+    components.extend(f"training:kw:{kw}" for kw in extract_keywords(question))
+    return components
+
+def kg_version_components(texts) -> List[str]:
+    """KG versions for a set of entity names / query text"""
+    terms = set()
+    for text in texts:
+        terms |= version_terms(text)
+    return ["kg:file"] + [f"kg:term:{t}" for t in sorted(terms)]
+
+def answer_version_components(query: str, metadata: Dict[str, Any] = None) -> List[str]:
+    """Everything a cached answer depends on"""
+    entities = (metadata or {}).get('entities', []) or []
+    entity_names = [e if isinstance(e, str) else str(e.get('name', e)) for e in entities]
+    return (training_version_components(query)
+            + kg_version_components([query] + entity_names)
+            + [f"vector:{VECTOR_DB_COLLECTION}"])
+
+def bump_training_version(question: str) -> None:
+    """Invalidate cached artefacts for this question and similar (keyword-sharing) ones"""
+    DATA_VERSIONS.bump(*training_version_components(question))
+    print(f"[Cache Versions] Training version bumped for: '{question[:50]}...'")
+
+def bump_kg_version(new_entities: List[str], new_relationships: List[Dict]) -> None:
+    """Invalidate cached artefacts that mention any new entity/relationship term"""
+    texts = list(new_entities or [])
+    for rel in new_relationships or []:
+        texts.extend(str(rel.get(k, '')) for k in ('source', 'target'))
+    components = [c for c in kg_version_components(texts) if c != "kg:file"]
+    DATA_VERSIONS.bump(*components)
+    print(f"[Cache Versions] KG version bumped for {len(components)} terms")
+
+# v5.9.13: Source-file fingerprints - a rebuilt KG / vector store invalidates dependents
+DATA_VERSIONS.set_fingerprint("kg:file", _file_fingerprint("samm_knowledge_graph.json"))
+DATA_VERSIONS.set_fingerprint(f"vector:{VECTOR_DB_COLLECTION}",
+                              _file_fingerprint(os.path.join(VECTOR_DB_PATH, "chroma.sqlite3")))
+
+@traced()
 def get_from_cache(query: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve cached answer for a query
+    Checks the in-process LRU first, then the shared tier
     Returns None if not found or expired
     """
     if not CACHE_ENABLED:
         return None
     
     cache_key = normalize_query_for_cache(query)
+    cached_entry = query_cache.get(cache_key)  # None if expired OR built from outdated data versions
     
-    if cache_key in query_cache:
-        cached_entry = query_cache[cache_key]
-        
-        # Check if cache entry is still valid (TTL check)
-        age_seconds = time.time() - cached_entry['timestamp']
-        if age_seconds < CACHE_TTL_SECONDS:
+    with cache_stats_lock:
+        cache_stats['total_queries'] += 1
+        if cached_entry:
             cache_stats['hits'] += 1
-            cache_stats['total_queries'] += 1
-            print(f"[Cache HIT] Query: '{query[:50]}...' (age: {age_seconds:.1f}s)")
-            return cached_entry
         else:
-            # Expired - remove it
-            del query_cache[cache_key]
-            print(f"[Cache EXPIRED] Query: '{query[:50]}...' (age: {age_seconds:.1f}s)")
+            cache_stats['misses'] += 1
+    CACHE_LOOKUPS.labels("answer", "hit" if cached_entry else "miss").inc()
     
-    cache_stats['misses'] += 1
-    cache_stats['total_queries'] += 1
-    print(f"[Cache MISS] Query: '{query[:50]}...'")
-    return None
-def fetch_blob_content(blob_name: str, container_client) -> Optional[str]:
-    """Fetch text content from a blob for AI processing"""
-    if not container_client:
-        return None
+    if cached_entry:
+        age_seconds = time.time() - cached_entry['timestamp']
+        cache_log.debug("[Cache HIT] Query: '%s...' (age: %.1fs)", query[:50], age_seconds)
+        return cached_entry
     
-    try:
-        blob_client = container_client.get_blob_client(blob_name)
-        download_stream = blob_client.download_blob()
-        content = download_stream.readall()
-        
-        try:
-            return content.decode('utf-8')
-        except UnicodeDecodeError:
-            return f"[Binary file: {blob_name}]"
-    except Exception as e:
-        print(f"[Blob Fetch] Error reading {blob_name}: {e}")
-        return None
-def save_to_cache(query: str, answer: str, metadata: Dict[str, Any]) -> bool:
+    cache_log.debug("[Cache MISS] Query: '%s...'", query[:50])
+    return None
+def fetch_blob_content(blob_name: str, container_client, max_chars: Optional[int] = None) -> Optional[str]:
+    """
+    Fetch text content from a blob for AI processing
+    v5.9.20: PDFs are extracted (up to max_chars) instead of returned as binary
+    v5.9.21: Served from BLOB_TEXT_CACHE while the blob's etag is unchanged;
+             misses read only the prefix max_chars needs
+    """
+    return BLOB_TEXT_CACHE.get_text(container_client, blob_name, max_chars=max_chars)
+
+
+def fetch_blob_contents(items: List[Tuple[str, Any]], max_chars: Optional[int] = None) -> List[Optional[str]]:
+    """v5.9.21: fetch_blob_content() for several (blob_name, container_client) pairs concurrently"""
+    return BLOB_TEXT_CACHE.fetch_many([(container_client, blob_name) for blob_name, container_client in items],
+                                      max_chars=max_chars)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """v5.9.22: Normalised sentence embeddings ([] when the embedding model is not loaded)"""
+    model = db_manager.embedding_model
+    if model is None or not texts:
+        return []
+    return model.encode(list(texts), normalize_embeddings=True).tolist()
+
+
+def extract_financial_tables(data: bytes, file_name: str) -> Dict[str, Any]:
+    """v5.9.22: RSN/PDLI records of an uploaded workbook (filtered by the case id in the file name)"""
+    from io import BytesIO
+    extraction_result = extract_case_document_data(BytesIO(data), "FINANCIAL_DATA", file_name)
+    key_info = extraction_result.get("key_info", {})
+    return {"financial_records": key_info.get("financial_records") or [], "summary": key_info.get("summary") or {}}
+
+
+def load_attachment_documents(question: str, items: List[Tuple[Dict[str, Any], Any]],
+                              max_chars: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    v5.9.22: Attachment documents for a query, one per (doc_meta, container_client) item
+    (None when no content could be loaded).
+    Documents ingested at upload are built from their artefacts: the passages closest to
+    the question, precomputed entities/relationships and financial tables. The rest are
+    fetched from blob storage (concurrently, cached by etag).
+    """
+    max_chars = max_chars or ATTACHMENT_CONTENT_CHARS
+    documents: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    not_ingested = []
+    query_vector = None
+    query_embedded = False
+
+    for idx, (doc_meta, container_client) in enumerate(items):
+        blob_name = doc_meta.get("blobName")
+        container_name = getattr(container_client, "container_name", "") or ""
+        artefacts = DOCUMENT_INGEST.get_artefacts(container_name, blob_name) if blob_name else None
+        if artefacts is None:
+            not_ingested.append(idx)
+            continue
+
+        if artefacts.get("index") and not query_embedded:
+            query_embedded = True
+            try:
+                vectors = embed_texts([question])
+                query_vector = vectors[0] if vectors else None
+            except Exception as e:
+                retrieval_log.warning("[Attachments] Query embedding failed, using document start: %s", e)
+        content = select_passages(artefacts, query_vector, max_chars)
+        if not content:
+            continue
+
+        document = {
+            **doc_meta,
+            "content": content,
+            "entities": entities_in(artefacts, content),
+            "relationships": artefacts.get("relationships"),
+            "ingestJobId": artefacts.get("jobId")
+        }
+        financial = artefacts.get("financial") or {}
+        if financial.get("records") and not doc_meta.get("metadata", {}).get("hasFinancialData"):
+            document["metadata"] = {
+                **doc_meta.get("metadata", {}),
+                "hasFinancialData": True,
+                "financialRecords": financial["records"],
+                "financialSummary": financial.get("summary", {})
+            }
+        documents[idx] = document
+
+    if not_ingested:
+        contents = fetch_blob_contents([(items[idx][0]["blobName"], items[idx][1]) for idx in not_ingested],
+                                       max_chars=max_chars)
+        for idx, content in zip(not_ingested, contents):
+            if content:
+                documents[idx] = {**items[idx][0], "content": content[:max_chars]}
+
+    retrieval_log.debug("[Attachments] %s/%s from ingest artefacts, %s fetched", len(items) - len(not_ingested), len(items), len(not_ingested))
+    return documents
+def save_to_cache(query: str, answer: str, metadata: Dict[str, Any],
+                  data_versions: Optional[Dict[str, str]] = None) -> bool:
     """
     Save query-answer pair to cache
-    Implements LRU eviction if cache is full
+    LRU eviction is O(1) in memory; the shared tier evicts oldest-written rows
+    v5.9.36: data_versions - DATA_VERSIONS.capture() from before the answer's data was read,
+    so a HITL correction or KG update during generation leaves the entry stale
     """
     if not CACHE_ENABLED:
         return False
     
     cache_key = normalize_query_for_cache(query)
-    
-    # Check cache size limit
-    if len(query_cache) >= CACHE_MAX_SIZE and cache_key not in query_cache:
-        # Evict oldest entry (simple LRU)
-        oldest_key = min(query_cache.keys(), key=lambda k: query_cache[k]['timestamp'])
-        del query_cache[oldest_key]
-        print(f"[Cache EVICT] Removed oldest entry to make room")
-    
-    # Save to cache
-    query_cache[cache_key] = {
+    query_cache.set(cache_key, {
         'original_query': query,
         'answer': answer,
         'metadata': metadata,
         'timestamp': time.time()
-    }
+    }, depends_on=answer_version_components(query, metadata), snapshot=data_versions)
     
-    cache_stats['cache_size'] = len(query_cache)
-    print(f"[Cache SAVE] Query: '{query[:50]}...' (cache size: {len(query_cache)})")
+    with cache_stats_lock:
+        cache_stats['cache_size'] = len(query_cache)
+    cache_log.debug("[Cache SAVE] Query: '%s...' (cache size: %s)", query[:50], len(query_cache))
     return True
 
+AUTH_LEVEL_RANK = {"unclassified": 0, "confidential": 1, "secret": 2, "top_secret": 3, "sci": 4}
+
+def cache_entry_allowed_for(cached_entry: Dict[str, Any], user_profile: Dict[str, Any] = None) -> bool:
+    """
+    v5.9.14: A cached answer is only served to users cleared at least as high as
+    the user it was compliance-approved for (entries without a level are treated
+    as approved at DEFAULT_DEV_AUTH_LEVEL)
+    """
+    approved_level = cached_entry.get('metadata', {}).get('approved_authorization_level', DEFAULT_DEV_AUTH_LEVEL)
+    user_level = (user_profile or {}).get('authorization_level', DEFAULT_DEV_AUTH_LEVEL)
+    return AUTH_LEVEL_RANK.get(user_level, 0) >= AUTH_LEVEL_RANK.get(approved_level, 0)
+
 def get_cache_stats() -> Dict[str, Any]:
-    """Get cache statistics"""
-    hit_rate = (cache_stats['hits'] / cache_stats['total_queries'] * 100) if cache_stats['total_queries'] > 0 else 0
+    """Get cache statistics (overall + per tier)"""
+    with cache_stats_lock:
+        totals = dict(cache_stats)
+    hit_rate = (totals['hits'] / totals['total_queries'] * 100) if totals['total_queries'] > 0 else 0
     
     return {
         'enabled': CACHE_ENABLED,
-        'total_queries': cache_stats['total_queries'],
-        'cache_hits': cache_stats['hits'],
-        'cache_misses': cache_stats['misses'],
+        'total_queries': totals['total_queries'],
+        'cache_hits': totals['hits'],
+        'cache_misses': totals['misses'],
         'hit_rate_percent': round(hit_rate, 2),
         'current_size': len(query_cache),
         'max_size': CACHE_MAX_SIZE,
-        'ttl_seconds': CACHE_TTL_SECONDS
+        'ttl_seconds': CACHE_TTL_SECONDS,
+        'tiers': query_cache.get_stats(),
+        'versions': DATA_VERSIONS.get_stats(),
+        'retrieval_cache': retrieval_cache.get_stats(),
+        'path_finder_cache': path_finder_cache.get_stats(),
+        'single_flight': get_single_flight_stats(),
+        'compliance_decisions': ITAR_ENGINE.get_stats(),
+        'pdf_text': PDF_EXTRACTOR.get_stats(),
+        'blob_text': BLOB_TEXT_CACHE.get_stats(),
+        'document_ingest': DOCUMENT_INGEST.get_stats(),
+        'financial_records': FINANCIAL_STORE.get_stats(),
+        'review_stats': REVIEW_STATS.get_stats(),
+        'knowledge_snapshot': KNOWLEDGE_SNAPSHOT.get_stats(),
+        'logging': LOGGING.get_stats(),
+        'metrics': METRICS.get_stats(),
+        'tracing': TRACER.get_stats()
+    }
+
+
+def query_flight_key(query: str, data: Dict[str, Any], user_profile: Dict[str, Any], stream: bool = False) -> str:
+    """
+    Key for coalescing concurrent requests: normalized query + case context
+    (case id, chat history, authorization level) + attachment set.
+    Returns a unique key when coalescing is disabled.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return f"{uuid.uuid4()}"
+    attachments = sorted(
+        str(doc.get("blobName") or doc.get("fileName") or "")
+        for doc in (data.get("staged_chat_documents") or [])
+    )
+    return single_flight_key(
+        "stream" if stream else "query",
+        normalize_query_for_cache(query),
+        data.get("case_id") or data.get("caseId"),
+        data.get("chat_history") or [],
+        user_profile.get("authorization_level"),
+        attachments,
+        bool(data.get("debug", False) or data.get("include_workflow", False))
+    )
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    """Coalescing counters for /api/query and /api/query/stream"""
+    query_stats = QUERY_FLIGHTS.get_stats()
+    stream_stats = STREAM_FLIGHTS.get_stats()
+    return {
+        'enabled': SINGLE_FLIGHT_ENABLED,
+        'query': query_stats,
+        'stream': stream_stats,
+        'llm_calls_saved': query_stats['llm_calls_saved'] + stream_stats['llm_calls_saved']
     }
 
 # =============================================================================
@@ -1276,6 +1976,8 @@ def calculate_boost_score(chunk_content: str, chunk_metadata: Dict) -> float:
     return boost
 
 
+@traced()
+@STEP_SECONDS.labels("rerank").time()
 def rerank_results(query: str, results: List[Dict]) -> List[Dict]:
     """
     Re-rank search results using hybrid scoring.
@@ -1287,7 +1989,7 @@ def rerank_results(query: str, results: List[Dict]) -> List[Dict]:
     if not results:
         return results
     
-    print(f"[RERANK v5.9.10] Re-ranking {len(results)} results...")
+    retrieval_log.debug("[RERANK v5.9.10] Re-ranking %s results...", len(results))
     
     scored_results = []
     
@@ -1326,11 +2028,11 @@ def rerank_results(query: str, results: List[Dict]) -> List[Dict]:
     scored_results.sort(key=lambda x: x[0], reverse=True)
     
     # Debug output
-    print(f"[RERANK v5.9.10] Top 5 after re-ranking:")
+    retrieval_log.debug("[RERANK v5.9.10] Top 5 after re-ranking:")
     for i, (score, r) in enumerate(scored_results[:5]):
         section = r.get('metadata', {}).get('section_number', 'Unknown')
         scores = r.get('_rerank_scores', {})
-        print(f"  #{i+1} {section}: E={scores.get('embedding')}, K={scores.get('keyword')}, B={scores.get('boost')} → {scores.get('final')}")
+        retrieval_log.debug("  #%s %s: E=%s, K=%s, B=%s → %s", i+1, section, scores.get('embedding'), scores.get('keyword'), scores.get('boost'), scores.get('final'))
     
     return [r for _, r in scored_results]
 
@@ -1349,6 +2051,44 @@ CORS(app, resources={
     }
 })
 
+# v5.9.30: Everything logged while serving a request carries its id (X-Request-ID
+# if the client sent one) and follows its DEBUG-sampling decision, drawn once here
+@app.before_request
+def _begin_request_logging():
+    g.request_id = begin_request(request.headers.get("X-Request-ID"))
+    # v5.9.31: in flight until teardown - for an SSE route, until its stream closes (after_request)
+    g.in_flight = REQUESTS_IN_FLIGHT.labels(request.endpoint or "unmatched")
+    g.in_flight.inc()
+    if request.endpoint in TRACED_ENDPOINTS:  # v5.9.32: root span until teardown (stream end)
+        g.trace = TRACER.begin(g.request_id, f"{request.method} {request.path}", endpoint=request.endpoint)
+
+
+@app.after_request
+def _add_request_id_header(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    HTTP_REQUESTS.labels(request.endpoint or "unmatched", response.status_code).inc()
+    if g.get("trace") is not None:
+        g.trace.root.set_attribute("http.status_code", response.status_code)
+    if response.is_streamed:
+        # v5.9.32: teardown runs when the view returns; a stream is served until the server closes it
+        in_flight, trace = g.pop("in_flight", None), g.pop("trace", None)
+        response.call_on_close(lambda: _close_request(in_flight, trace))
+    return response
+
+
+def _close_request(in_flight, trace, exc=None) -> None:
+    if in_flight is not None:
+        in_flight.dec()
+    TRACER.end(trace, exc)
+
+
+@app.teardown_request
+def _end_request_logging(exc):
+    _close_request(g.pop("in_flight", None), g.pop("trace", None), exc)
+    end_request()
+
+
 ollama_session = requests.Session()
 adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
 ollama_session.mount("http://", adapter)
@@ -1364,49 +2104,71 @@ print(f"Ollama URL: {OLLAMA_URL}")
 print(f"Ollama Model: {OLLAMA_MODEL}")
 
 # --- Initialize Cosmos DB Client ---
-cosmos_client = None
-database_client = None
-cases_container_client = None
-reviews_test_container_client = None
-
-# Initialize reviews container if Cosmos DB configured
-if COSMOS_ENDPOINT and COSMOS_KEY and DATABASE_NAME:
+# v5.9.28: connected on first use (or warmup()); one CosmosClient for the reviews and cases containers
+def _connect_cosmos() -> Dict[str, Any]:
+    clients: Dict[str, Any] = {}
+    if not (COSMOS_ENDPOINT and COSMOS_KEY and DATABASE_NAME):
+        print("Warning: Cosmos DB credentials not configured. Using in-memory storage.")
+        return clients
+
+    # Initialize reviews container if Cosmos DB configured
     try:
-        if not cosmos_client:
-            cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-        if not database_client:
-            database_client = cosmos_client.get_database_client(DATABASE_NAME)
+        clients["client"] = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+        clients["database"] = clients["client"].get_database_client(DATABASE_NAME)
         
         # Create or get reviews container
         try:
-            reviews_test_container_client = database_client.create_container(
+            clients["reviews"] = clients["database"].create_container(
                 id="reviews",
                 partition_key=PartitionKey(path="/type"),
                 offer_throughput=400
             )
             print("✅ Reviews container created")
         except:
-            reviews_test_container_client = database_client.get_container_client("reviews")
+            clients["reviews"] = clients["database"].get_container_client("reviews")
             print("✅ Reviews test container connected")
             
     except Exception as e:
         print(f"⚠️ Reviews container not initialized: {e}")
 
-if COSMOS_ENDPOINT and COSMOS_KEY and DATABASE_NAME and CASES_CONTAINER_NAME:
-    try:
-        cosmos_client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
-        database_client = cosmos_client.get_database_client(DATABASE_NAME)
-        cases_container_client = database_client.get_container_client(CASES_CONTAINER_NAME)
-        print(f"Successfully connected to Cosmos DB Cases container: {DATABASE_NAME}/{CASES_CONTAINER_NAME}")
-    except Exception as e:
-        print(f"Warning: Error initializing Cosmos DB client: {e}. Using in-memory storage.")
-else:
-    print("Warning: Cosmos DB credentials not configured. Using in-memory storage.")
+    if CASES_CONTAINER_NAME and clients.get("database") is not None:
+        try:
+            clients["cases"] = clients["database"].get_container_client(CASES_CONTAINER_NAME)
+            print(f"Successfully connected to Cosmos DB Cases container: {DATABASE_NAME}/{CASES_CONTAINER_NAME}")
+        except Exception as e:
+            print(f"Warning: Error initializing Cosmos DB client: {e}. Using in-memory storage.")
+    else:
+        print("Warning: Cosmos DB credentials not configured. Using in-memory storage.")
+    return clients
 
-# --- Initialize Azure Blob Service Client ---
-blob_service_client = None
-case_docs_blob_container_client = None
-chat_docs_blob_container_client = None
+
+SUBSYSTEMS.register("cosmos", _connect_cosmos)
+cosmos_client = SUBSYSTEMS.lazy("cosmos", "client")
+database_client = SUBSYSTEMS.lazy("cosmos", "database")
+cases_container_client = SUBSYSTEMS.lazy("cosmos", "cases")
+reviews_test_container_client = SUBSYSTEMS.lazy("cosmos", "reviews")
+
+# v5.9.24: Review statistics from a counters item (incremented on every review transition),
+# rebuilt by one Cosmos aggregate query when missing; short TTL cache in front
+SUBSYSTEMS.register("review_stats", lambda: ReviewStatsService.from_env(SUBSYSTEMS.get("cosmos").get("reviews")),
+                    requires=("cosmos",))
+REVIEW_STATS = SUBSYSTEMS.lazy("review_stats")
+# v5.9.25: Review queue pages (Cosmos continuation tokens, list-view projection)
+SUBSYSTEMS.register("review_queue", lambda: ReviewQueue.from_env(SUBSYSTEMS.get("cosmos").get("reviews")),
+                    requires=("cosmos",))
+REVIEW_QUEUE = SUBSYSTEMS.lazy("review_queue")
+
+
+# v5.9.23: Workbook financial records live in their own store (Cosmos container partitioned by
+# /caseId, or local SQLite) with totals maintained on upload; case documents keep only counts
+def _open_financial_store():
+    store = financial_store_from_env(SUBSYSTEMS.get("cosmos").get("database"))
+    print(f"Financial Records Store: {store.backend}")
+    return store
+
+
+SUBSYSTEMS.register("financial_store", _open_financial_store, requires=("cosmos",))
+FINANCIAL_STORE = SUBSYSTEMS.lazy("financial_store")
 
 def _extract_case_identifier_from_text(text: str) -> Optional[str]:
     """
@@ -1495,6 +2257,7 @@ def find_header_row(ws) -> Optional[int]:
     """
     Find the header row in an Excel sheet
     Looks for common header keywords in MISIL RSN sheets
+    v5.9.19: Single pass over the first rows (works on read-only worksheets)
     
     Args:
         ws: openpyxl worksheet object
@@ -1502,42 +2265,22 @@ def find_header_row(ws) -> Optional[int]:
     Returns:
         Row index (1-based) or None
     """
-    header_keywords = ['rsn', 'pdli', 'oa rec amt', 'net commit', 'obligation']
-    
-    for row_idx in range(1, min(20, ws.max_row + 1)):  # Search first 20 rows
-        row = ws[row_idx]
-        row_text = ' '.join([str(cell.value or '').lower() for cell in row])
-        
-        # Check if this row contains multiple header keywords
-        matches = sum(1 for keyword in header_keywords if keyword in row_text)
-        
-        if matches >= 3:  # At least 3 header keywords
-            return row_idx
-    
-    return None
+    return find_financial_header_row(ws)
 
 
-def extract_text_from_pdf(file_path: str) -> str:
+def extract_text_from_pdf(file_path, max_chars: Optional[int] = None) -> str:
     """
-    Extract text from PDF file using PyPDF2
+    Extract text from a PDF (v5.9.20: PyMuPDF pages via PDF_EXTRACTOR, cached by content hash)
     
     Args:
-        file_path: Path to PDF file
+        file_path: Path to PDF file (or the PDF bytes)
+        max_chars: Stop extracting once this many characters are available
         
     Returns:
         Extracted text content
     """
     try:
-        import PyPDF2
-        
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ''
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + '\n'
-            
-            return text
+        return PDF_EXTRACTOR.extract_text(file_path, max_chars=max_chars)
     
     except Exception as e:
         print(f"[PDF Extraction] Error: {e}")
@@ -1595,9 +2338,6 @@ Dict[str, Any]:
     Extract structured data from case documents.
     FILTERS by CTY and CASE columns to get only matching records.
     """
-    import PyPDF2
-    from openpyxl import load_workbook
-    from io import BytesIO
     import re
 
     doc_data = {
@@ -1622,14 +2362,9 @@ Dict[str, Any]:
         # PDF PROCESSING
         # =====================================================================
         if str(file_path).lower().endswith('.pdf'):
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                full_text = ""
-                for page in pdf_reader.pages:
-                    full_text += page.extract_text() or ""
-
-                doc_data["extracted_text"] = full_text
-                doc_data["case_identifier"] = _extract_case_identifier_from_text(full_text)
+            full_text = PDF_EXTRACTOR.extract_text(file_path)
+            doc_data["extracted_text"] = full_text
+            doc_data["case_identifier"] = _extract_case_identifier_from_text(full_text)
 
         # =====================================================================
         # EXCEL PROCESSING
@@ -1637,27 +2372,7 @@ Dict[str, Any]:
         elif str(file_path).lower().endswith(('.xlsx', '.xls')) or (
                 original_filename and original_filename.lower().endswith(('.xlsx', '.xls'))):
             doc_data["document_type"] = "FINANCIAL_DATA"
-            doc_data["extraction_metadata"]["extraction_method"] = "excel_openpyxl"
-
-            # Handle different input types
-            wb = None
-            try:
-                if isinstance(file_path, bytes):
-                    wb = load_workbook(BytesIO(file_path), data_only=True)
-                elif hasattr(file_path, 'read'):
-                    content = file_path.read()
-                    file_path.seek(0)
-                    wb = load_workbook(BytesIO(content), data_only=True)
-                elif isinstance(file_path, str) and os.path.exists(file_path):
-                    wb = load_workbook(file_path, data_only=True)
-                else:
-                    wb = load_workbook(file_path, data_only=True)
-            except Exception as load_err:
-                print(f"[Extract] ❌ Failed to load workbook: {load_err}")
-                doc_data["extraction_metadata"]["error"] = str(load_err)
-                return doc_data
-
-            print(f"[Extract] 📊 Excel with {len(wb.sheetnames)} sheets: {wb.sheetnames}")
+            doc_data["extraction_metadata"]["extraction_method"] = "excel_openpyxl_readonly"
 
             # =================================================================
             # EXTRACT CTY and CASE from filename
@@ -1682,239 +2397,33 @@ Dict[str, Any]:
                     print(f"[Extract] ⚠️ Could not parse case ID from filename: {original_filename}")
 
             # =================================================================
-            # STEP 1: Find and process RSN sheet for NET COMMIT AMT
-            # =================================================================
-            rsn_net_commit = {}
-
-            rsn_sheet = None
-            rsn_sheet_name = None
-            for sheet_name in wb.sheetnames:
-                sheet_lower = sheet_name.lower()
-                if 'rsn' in sheet_lower and 'pdli' not in sheet_lower:
-                    rsn_sheet = wb[sheet_name]
-                    rsn_sheet_name = sheet_name
-                    break
-
-            if rsn_sheet:
-                print(f"[Extract] Processing RSN sheet: {rsn_sheet_name}")
-
-                # Find header row and column indices
-                rsn_header_row = None
-                rsn_col_idx = None
-                net_commit_col_idx = None
-                cty_col_idx = None
-                case_col_idx = None
-
-                for row_idx in range(1, min(20, rsn_sheet.max_row + 1)):
-                    row = list(rsn_sheet.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-
-                    for col_idx, cell in enumerate(row):
-                        if not cell:
-                            continue
-                        cell_str = str(cell).strip().lower()
-
-                        if cell_str == 'rsn':
-                            rsn_col_idx = col_idx
-                        if cell_str == 'cty':
-                            cty_col_idx = col_idx
-                        if cell_str == 'case':
-                            case_col_idx = col_idx
-                        if ('net' in cell_str and 'commit' in cell_str) or cell_str == 'net_commit_amt':
-                            net_commit_col_idx = col_idx
-
-                    if rsn_col_idx is not None and net_commit_col_idx is not None:
-                        rsn_header_row = row_idx
-                        print(
-                            f"[Extract] ✅ RSN header row: {row_idx}, RSN col: {rsn_col_idx}, NET COMMIT col: {net_commit_col_idx}")
-                        if cty_col_idx is not None:
-                            print(f"[Extract]   CTY col: {cty_col_idx}, CASE col: {case_col_idx}")
-                        break
-
-                # Extract RSN -> NET_COMMIT_AMT (filtered by CTY/CASE)
-                if rsn_header_row and rsn_col_idx is not None and net_commit_col_idx is not None:
-                    for row in rsn_sheet.iter_rows(min_row=rsn_header_row + 1, values_only=True):
-                        # Check CTY/CASE filter
-                        if filter_cty and cty_col_idx is not None and case_col_idx is not None:
-                            row_cty = str(row[cty_col_idx]).strip().upper() if row[cty_col_idx] else ''
-                            row_case = str(row[case_col_idx]).strip().upper() if row[case_col_idx] else ''
-                            if row_cty != filter_cty or row_case != filter_case:
-                                continue  # Skip rows that don't match
-
-                        if len(row) <= max(rsn_col_idx, net_commit_col_idx):
-                            continue
-
-                        rsn_val = row[rsn_col_idx]
-                        net_commit_val = row[net_commit_col_idx]
-
-                        if not rsn_val:
-                            continue
-
-                        rsn_str = str(rsn_val).strip()
-
-                        try:
-                            net_commit_amt = float(net_commit_val) if net_commit_val else 0.0
-                        except (ValueError, TypeError):
-                            net_commit_amt = 0.0
-
-                        if net_commit_amt != 0:
-                            rsn_net_commit[rsn_str] = net_commit_amt
-                            rsn_net_commit[rsn_str.lstrip('0') or '0'] = net_commit_amt
-                            rsn_net_commit[rsn_str.zfill(3)] = net_commit_amt
-
-                    print(
-                        f"[Extract] ✅ Extracted {len(set(rsn_net_commit.values()))} RSN NET_COMMIT values for {filter_cty}-{filter_case}")
-
-            # =================================================================
-            # STEP 2: Find PDLI sheet
+            # v5.9.19: Single streaming pass per sheet (read-only workbook,
+            # header detected on the fly, CTY/CASE filter applied while scanning)
             # =================================================================
-            pdli_sheet = None
-            pdli_sheet_name = None
-            for sheet_name in wb.sheetnames:
-                if 'pdli' in sheet_name.lower():
-                    pdli_sheet = wb[sheet_name]
-                    pdli_sheet_name = sheet_name
-                    break
-
-            if not pdli_sheet:
-                for sheet_name in wb.sheetnames:
-                    if 'misil' in sheet_name.lower():
-                        pdli_sheet = wb[sheet_name]
-                        pdli_sheet_name = sheet_name
-                        break
-                if not pdli_sheet:
-                    pdli_sheet = wb.active
-                    pdli_sheet_name = pdli_sheet.title
-
-            print(f"[Extract] Processing PDLI sheet: {pdli_sheet_name}")
-
-            # =================================================================
-            # STEP 3: Find header row and map columns
-            # =================================================================
-            header_row_idx = None
-            column_map = {}
-
-            for row_idx in range(1, min(20, pdli_sheet.max_row + 1)):
-                row = list(pdli_sheet.iter_rows(min_row=row_idx, max_row=row_idx, values_only=True))[0]
-                row_str = ' '.join([str(c).lower() if c else '' for c in row])
-
-                if 'rsn' in row_str and ('pdli' in row_str or 'dir' in row_str):
-                    header_row_idx = row_idx
-                    print(f"[Extract] ✅ PDLI header row: {row_idx}")
-
-                    for col_idx, cell in enumerate(row):
-                        if not cell:
-                            continue
-                        cell_str = str(cell).strip().lower()
-
-                        if cell_str == 'cty':
-                            column_map['cty'] = col_idx
-                        elif cell_str == 'case':
-                            column_map['case'] = col_idx
-                        elif cell_str == 'rsn':
-                            column_map['rsn'] = col_idx
-                        elif cell_str in ['pdli', 'pdli nbr']:
-                            column_map['pdli'] = col_idx
-                        elif 'pdli' in cell_str and 'desc' in cell_str:
-                            column_map['pdli_desc'] = col_idx
-                        elif 'dir' in cell_str and 'rsrv' in cell_str:
-                            column_map['dir_rsrv_amt'] = col_idx
-                        elif 'net' in cell_str and 'obl' in cell_str:
-                            column_map['net_obl_amt'] = col_idx
-                        elif 'net' in cell_str and 'exp' in cell_str:
-                            column_map['net_exp_amt'] = col_idx
-                        elif 'avail' in cell_str and 'bal' in cell_str:
-                            column_map['avail_bal'] = col_idx
-                        elif 'line' in cell_str:
-                            column_map['line_nbr'] = col_idx
-
-                    print(f"[Extract] Column map: {column_map}")
-                    break
+            try:
+                parsed = parse_financial_workbook(file_path, filter_cty, filter_case)
+            except Exception as load_err:
+                print(f"[Extract] ❌ Failed to load workbook: {load_err}")
+                doc_data["extraction_metadata"]["error"] = str(load_err)
+                return doc_data
 
-            if not header_row_idx:
+            financial_records = parsed["financial_records"]
+            if financial_records is None:
                 print(f"[Extract] ⚠️ No header row found!")
-                wb.close()
                 return doc_data
 
-            # =================================================================
-            # STEP 4: Extract PDLI records (FILTERED by CTY/CASE)
-            # =================================================================
-            financial_records = []
-
-            def safe_float(col_name, row):
-                col_idx = column_map.get(col_name)
-                if col_idx is not None and col_idx < len(row):
-                    val = row[col_idx]
-                    try:
-                        return float(val) if val else 0.0
-                    except (ValueError, TypeError):
-                        return 0.0
-                return 0.0
-
-            def safe_str(col_name, row):
-                col_idx = column_map.get(col_name)
-                if col_idx is not None and col_idx < len(row):
-                    val = row[col_idx]
-                    return str(val).strip() if val else ''
-                return ''
-
-            for row in pdli_sheet.iter_rows(min_row=header_row_idx + 1, values_only=True):
-                # FILTER: Check CTY and CASE match
-                if filter_cty and 'cty' in column_map and 'case' in column_map:
-                    row_cty = safe_str('cty', row).upper()
-                    row_case = safe_str('case', row).upper()
-                    if row_cty != filter_cty or row_case != filter_case:
-                        continue  # Skip rows that don't match this case
-
-                rsn = safe_str('rsn', row)
-                if not rsn:
-                    continue
-
-                # Get NET_COMMIT_AMT for this RSN
-                net_commit_amt = 0.0
-                rsn_normalized = rsn.lstrip('0') or '0'
-                rsn_padded = rsn.zfill(3)
-
-                if rsn in rsn_net_commit:
-                    net_commit_amt = rsn_net_commit[rsn]
-                elif rsn_normalized in rsn_net_commit:
-                    net_commit_amt = rsn_net_commit[rsn_normalized]
-                elif rsn_padded in rsn_net_commit:
-                    net_commit_amt = rsn_net_commit[rsn_padded]
-
-                record = {
-                    "line_nbr": safe_str('line_nbr', row),
-                    "rsn": rsn,
-                    "pdli": safe_str('pdli', row),
-                    "pdli_desc": safe_str('pdli_desc', row),
-                    "dir_rsrv_amt": safe_float('dir_rsrv_amt', row),
-                    "net_obl_amt": safe_float('net_obl_amt', row),
-                    "net_exp_amt": safe_float('net_exp_amt', row),
-                    "avail_bal": safe_float('avail_bal', row),
-                    "net_commit_amt": net_commit_amt
-                }
-
-                financial_records.append(record)
-
             # Log first record to verify
             if financial_records:
                 print(f"[Extract] 📋 First record: {financial_records[0]}")
 
-            unique_rsns = set(r['rsn'] for r in financial_records)
-            total_directed = sum(r['dir_rsrv_amt'] for r in financial_records)
-
+            summary = parsed["summary"]
             print(
-                f"[Extract] ✅ {len(financial_records)} PDLIs, {len(unique_rsns)} RSNs (filtered for {filter_cty}-{filter_case})")
-            print(f"[Extract] 💰 Total: ${total_directed:,.2f}")
+                f"[Extract] ✅ {summary['total_pdlis']} PDLIs, {summary['unique_rsns']} RSNs (filtered for {filter_cty}-{filter_case})")
+            print(f"[Extract] 💰 Total: ${summary['total_directed']:,.2f}")
 
             doc_data["key_info"]["financial_records"] = financial_records
-            doc_data["key_info"]["rsn_data"] = rsn_net_commit
-            doc_data["key_info"]["summary"] = {
-                "total_pdlis": len(financial_records),
-                "unique_rsns": len(unique_rsns),
-                "total_directed": total_directed
-            }
-
-            wb.close()
+            doc_data["key_info"]["rsn_data"] = parsed["rsn_data"]
+            doc_data["key_info"]["summary"] = summary
 
     except Exception as e:
         print(f"[Extract] ❌ Error: {str(e)}")
@@ -1944,15 +2453,26 @@ def initialize_blob_container(bs_client, container_name_env_var, container_descr
         print(f"Could not create/verify blob container '{container_name}' for {container_description}: {e_create_container}")
         return None
 
-if AZURE_CONNECTION_STRING:
+# --- Initialize Azure Blob Service Client ---
+# v5.9.28: connected on first use (or warmup())
+def _connect_blob() -> Dict[str, Any]:
+    clients: Dict[str, Any] = {}
+    if not AZURE_CONNECTION_STRING:
+        print("Warning: AZURE_CONNECTION_STRING is not set. Blob storage functionality will be disabled.")
+        return clients
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-        case_docs_blob_container_client = initialize_blob_container(blob_service_client, "AZURE_CASE_DOCS_CONTAINER_NAME", "case documents")
-        chat_docs_blob_container_client = initialize_blob_container(blob_service_client, "AZURE_CHAT_DOCS_CONTAINER_NAME", "chat documents")
+        clients["service"] = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+        clients["case_docs"] = initialize_blob_container(clients["service"], "AZURE_CASE_DOCS_CONTAINER_NAME", "case documents")
+        clients["chat_docs"] = initialize_blob_container(clients["service"], "AZURE_CHAT_DOCS_CONTAINER_NAME", "chat documents")
     except Exception as e:
         print(f"Warning: Error initializing Azure Blob Service client: {e}")
-else:
-    print("Warning: AZURE_CONNECTION_STRING is not set. Blob storage functionality will be disabled.")
+    return clients
+
+
+SUBSYSTEMS.register("blob", _connect_blob)
+blob_service_client = SUBSYSTEMS.lazy("blob", "service")
+case_docs_blob_container_client = SUBSYSTEMS.lazy("blob", "case_docs")
+chat_docs_blob_container_client = SUBSYSTEMS.lazy("blob", "chat_docs")
 
 # --- Auth0 OAuth Setup ---
 # --- Auth0 OAuth Setup ---
@@ -1964,6 +2484,7 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://172.16.200.12:5173")
 
 oauth = None
 if AUTH0_CLIENT_ID and AUTH0_CLIENT_SECRET and AUTH0_DOMAIN:
+    from authlib.integrations.flask_client import OAuth  # v5.9.28: only imported when Auth0 is configured
     oauth = OAuth(app)
     oauth.register(
         "auth0",
@@ -1987,47 +2508,54 @@ else:
 from flask import Response, stream_with_context
 import json
 
+def ollama_stream_payload(prompt: str, system_message: str = "", temperature: float = 0.1) -> Dict[str, Any]:
+    """/api/chat body for answer streaming (shared by call_ollama_streaming and its async twin)"""
+    messages = []
+    if system_message:
+        messages.append({"role": "system", "content": system_message})
+    messages.append({"role": "user", "content": prompt})
+    
+    # ✅ USE NON-STREAMING MODE (faster and more reliable)
+    return {
+        "model": OLLAMA_MODEL,
+        "messages": messages,
+        "stream": False,  # ← Non-streaming mode
+        "options": {
+            "temperature": temperature,
+            "top_p": 0.9,
+            "top_k": 40,
+            "repeat_penalty": 1.1,
+            "num_ctx": 2048,
+            "num_predict": 1500
+        }
+    }
+
+@traced()
 def call_ollama_streaming(prompt: str, system_message: str = "", temperature: float = 0.1):
     """Stream Ollama responses token by token - WITH NON-STREAMING WORKAROUND"""
     
-    print(f"[Ollama] 🚀 Calling Ollama at {OLLAMA_URL}/api/chat")
-    print(f"[Ollama] Model: {OLLAMA_MODEL}")
-    print(f"[Ollama] Prompt length: {len(prompt)} chars")
-    print(f"[Ollama] System message length: {len(system_message)} chars")
+    llm_log.debug("[Ollama] 🚀 Calling Ollama at %s/api/chat", OLLAMA_URL)
+    llm_log.debug("[Ollama] Model: %s", OLLAMA_MODEL)
+    llm_log.debug("[Ollama] Prompt length: %s chars", len(prompt))
+    llm_log.debug("[Ollama] System message length: %s chars", len(system_message))
     
+    start = time.perf_counter()
     try:
-        messages = []
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        messages.append({"role": "user", "content": prompt})
-        
-        # ✅ USE NON-STREAMING MODE (faster and more reliable)
-        data = {
-            "model": OLLAMA_MODEL,
-            "messages": messages,
-            "stream": False,  # ← Non-streaming mode
-            "options": {
-                "temperature": temperature,
-                "top_p": 0.9,
-                "top_k": 40,
-                "repeat_penalty": 1.1,
-                "num_ctx": 2048,
-                "num_predict": 1500
-            }
-        }
+        data = ollama_stream_payload(prompt, system_message, temperature)
         
-        print(f"[Ollama] 📡 Sending non-streaming request...")
+        llm_log.debug("[Ollama] 📡 Sending non-streaming request...")
         response = ollama_session.post(
             f"{OLLAMA_URL}/api/chat",
             json=data,
             timeout=200  # v5.9.1: Increased to 200s to match Ollama timeout
         )
         
-        print(f"[Ollama] 📥 Response status: {response.status_code}")
+        llm_log.debug("[Ollama] 📥 Response status: %s", response.status_code)
         
         if response.status_code != 200:
-            print(f"[Ollama] ❌ Bad status: {response.status_code}")
-            print(f"[Ollama] Response text: {response.text[:500]}")
+            llm_log.error("[Ollama] ❌ Bad status: %s", response.status_code)
+            llm_log.debug("[Ollama] Response text: %s", response.text[:500])
+            LLM_CALLS.labels("stream", "error").inc()
             yield f"Error: Ollama returned status {response.status_code}"
             return
         
@@ -2035,38 +2563,48 @@ def call_ollama_streaming(prompt: str, system_message: str = "", temperature: fl
         
         if 'message' in result and 'content' in result['message']:
             answer = result['message']['content']
-            print(f"[Ollama] ✅ Got response: {len(answer)} chars")
-            print(f"[Ollama] Preview: {answer[:150]}...")
+            # v5.9.31: non-streaming request - the first token arrives with the whole answer
+            elapsed = time.perf_counter() - start
+            LLM_TTFT_SECONDS.labels("stream").observe(elapsed)
+            LLM_SECONDS.labels("stream").observe(elapsed)
+            LLM_CALLS.labels("stream", "ok").inc()
+            llm_log.debug("[Ollama] ✅ Got response: %s chars", len(answer))
+            llm_log.debug("[Ollama] Preview: %s...", answer[:150])
             
             # Simulate streaming by yielding words
             words = answer.split()
-            print(f"[Ollama] 🔄 Simulating streaming with {len(words)} words...")
+            llm_log.debug("[Ollama] 🔄 Simulating streaming with %s words...", len(words))
             
             for i, word in enumerate(words, 1):
                 yield word + " "
                 
                 # Log progress every 50 words
                 if i % 50 == 0:
-                    print(f"[Ollama] Streamed {i}/{len(words)} words...")
+                    llm_log.debug("[Ollama] Streamed %s/%s words...", i, len(words))
             
-            print(f"[Ollama] ✅ Streaming simulation complete")
+            llm_log.debug("[Ollama] ✅ Streaming simulation complete")
         else:
-            print(f"[Ollama] ❌ No content in response")
-            print(f"[Ollama] Response keys: {result.keys()}")
+            llm_log.error("[Ollama] ❌ No content in response")
+            if llm_log.isEnabledFor(logging.DEBUG):
+                llm_log.debug("[Ollama] Response keys: %s", result.keys())
+            LLM_CALLS.labels("stream", "error").inc()
             yield "Error: Ollama response missing content field."
     
     except requests.exceptions.Timeout:
-        print(f"[Ollama] ❌ Request timed out after 120 seconds")
+        llm_log.error("[Ollama] ❌ Request timed out after 120 seconds")
+        LLM_CALLS.labels("stream", "timeout").inc()
         yield "Error: The AI service took too long to respond. Please try a simpler question."
     
     except requests.exceptions.ConnectionError as e:
-        print(f"[Ollama] ❌ Connection error: {str(e)}")
+        llm_log.error("[Ollama] ❌ Connection error: %s", e)
+        LLM_CALLS.labels("stream", "error").inc()
         yield f"Error: Cannot connect to Ollama at {OLLAMA_URL}. Please check if Ollama is running."
     
     except Exception as e:
-        print(f"[Ollama] ❌ Unexpected error: {str(e)}")
+        llm_log.error("[Ollama] ❌ Unexpected error: %s", e)
+        LLM_CALLS.labels("stream", "error").inc()
         import traceback
-        print(f"[Ollama] Full traceback:")
+        llm_log.debug("[Ollama] Full traceback:")
         traceback.print_exc()
         yield f"Error: {str(e)}"
 
@@ -2081,7 +2619,7 @@ def process_samm_query_streaming(query: str, chat_history: List = None, document
     financial_records = extract_financial_records_from_documents(documents_context)
     
     if financial_records:
-        print(f"[Streaming] 💰 {len(financial_records)} financial records available")
+        llm_log.debug("[Streaming] 💰 %s financial records available", len(financial_records))
         yield {"type": "financial_data_loaded", "count": len(financial_records)}
 
     # Yield progress updates
@@ -2131,6 +2669,7 @@ def process_samm_query_streaming(query: str, chat_history: List = None, document
 
 
 
+@traced()
 def call_ollama_enhanced(prompt: str, system_message: str = "", temperature: float = 0.1) -> str:
     """
     Enhanced Ollama API call with fast timeouts, automatic retries, and fallback.
@@ -2148,10 +2687,10 @@ def call_ollama_enhanced(prompt: str, system_message: str = "", temperature: flo
         total_input = system_size + prompt_size
         est_tokens = total_input // 4  # Rough estimate
         
-        print(f"[Ollama Enhanced] 📊 INPUT SIZE:")
-        print(f"   System Message: {system_size:,} chars")
-        print(f"   User Prompt: {prompt_size:,} chars")
-        print(f"   Total: {total_input:,} chars (~{est_tokens:,} tokens)")
+        llm_log.debug("[Ollama Enhanced] 📊 INPUT SIZE:")
+        llm_log.debug("   System Message: %s chars", format(system_size, ","))
+        llm_log.debug("   User Prompt: %s chars", format(prompt_size, ","))
+        llm_log.debug("   Total: %s chars (~%s tokens)", format(total_input, ","), format(est_tokens, ","))
         
         data = {
             "model": OLLAMA_MODEL,
@@ -2167,32 +2706,41 @@ def call_ollama_enhanced(prompt: str, system_message: str = "", temperature: flo
             }
         }
         
+        call_start = time.perf_counter()
         for attempt in range(1, OLLAMA_MAX_RETRIES + 1):
             try:
-                print(f"[Ollama Enhanced] Attempt {attempt}/{OLLAMA_MAX_RETRIES} (timeout: {OLLAMA_TIMEOUT_NORMAL}s, num_ctx: 4096)")
+                llm_log.debug("[Ollama Enhanced] Attempt %s/%s (timeout: %ss, num_ctx: 4096)", attempt, OLLAMA_MAX_RETRIES, OLLAMA_TIMEOUT_NORMAL)
                 start_time = time.time()
-                response = ollama_session.post(f"{OLLAMA_URL}/api/chat", json=data, timeout=OLLAMA_TIMEOUT_NORMAL)
+                with span("ollama.chat", attempt=attempt, input_chars=total_input):  # v5.9.32: retries visible
+                    response = ollama_session.post(f"{OLLAMA_URL}/api/chat", json=data, timeout=OLLAMA_TIMEOUT_NORMAL)
                 elapsed = time.time() - start_time
                 response.raise_for_status()
                 result = response.json()
                 answer = result["message"]["content"]
-                print(f"[Ollama Enhanced] ✅ Success in {elapsed:.2f}s - Output: {len(answer)} chars")
+                llm_log.debug("[Ollama Enhanced] ✅ Success in %.2fs - Output: %s chars", elapsed, len(answer))
+                set_attribute("output_chars", len(answer))
+                LLM_SECONDS.labels("enhanced").observe(time.perf_counter() - call_start)  # retries included
+                LLM_CALLS.labels("enhanced", "ok").inc()
                 return answer
             except requests.exceptions.Timeout:
                 elapsed = time.time() - start_time
-                print(f"[Ollama Enhanced] ⏱️ Timeout on attempt {attempt} after {elapsed:.2f}s")
+                LLM_CALLS.labels("enhanced", "timeout").inc()
+                llm_log.warning("[Ollama Enhanced] ⏱️ Timeout on attempt %s after %.2fs", attempt, elapsed)
                 if attempt < OLLAMA_MAX_RETRIES:
                     time.sleep(2 ** attempt)
             except requests.exceptions.RequestException as e:
-                print(f"[Ollama Enhanced] API error on attempt {attempt}: {e}")
+                LLM_CALLS.labels("enhanced", "error").inc()
+                llm_log.error("[Ollama Enhanced] API error on attempt %s: %s", attempt, e)
                 if attempt < OLLAMA_MAX_RETRIES:
                     time.sleep(1)
         
-        print(f"[Ollama Enhanced] 🔄 Using fallback response")
+        llm_log.warning("[Ollama Enhanced] 🔄 Using fallback response")
+        LLM_CALLS.labels("enhanced", "fallback").inc()
+        set_attribute("llm.fallback", True)
         return _get_intelligent_fallback()
         
     except Exception as e:
-        print(f"[Ollama Enhanced] Processing error: {e}")
+        llm_log.error("[Ollama Enhanced] Processing error: %s", e)
         return _get_intelligent_fallback()
 
 
@@ -2391,8 +2939,15 @@ class SimpleKnowledgeGraph:
                 if rel['source'] == entity_id or rel['target'] == entity_id]
 
 # Initialize knowledge graph
-knowledge_graph = SimpleKnowledgeGraph(SAMM_KNOWLEDGE_GRAPH)
-print(f"Knowledge Graph loaded: {len(knowledge_graph.entities)} entities, {len(knowledge_graph.relationships)} relationships")
+def _load_knowledge_graph() -> SimpleKnowledgeGraph:
+    states = SUBSYSTEMS.get("knowledge_snapshot")
+    graph = restore_state(SimpleKnowledgeGraph, states["ttl_kg"]) if states else SimpleKnowledgeGraph(SAMM_KNOWLEDGE_GRAPH)
+    print(f"Knowledge Graph loaded: {len(graph.entities)} entities, {len(graph.relationships)} relationships")
+    return graph
+
+
+SUBSYSTEMS.register("knowledge_graph", _load_knowledge_graph, requires=("knowledge_snapshot",))
+knowledge_graph = SUBSYSTEMS.lazy("knowledge_graph")
 
 # =============================================================================
 # DATABASE MANAGER FOR INTEGRATED AGENTS
@@ -2404,29 +2959,54 @@ class DatabaseManager:
     """
     
     def __init__(self):
-        self.cosmos_gremlin_client = None
-        self.vector_db_client = None
-        self.embedding_model = None
-        self.initialize_connections()
+        # v5.9.28: each connection is a subsystem, opened on first use (or by warmup())
+        self._cosmos_gremlin_client = None
+        self._vector_db_client = None
+        self._embedding_model = None
+        SUBSYSTEMS.register("gremlin", lambda: (self._init_cosmos_gremlin(), self._cosmos_gremlin_client)[1])
+        SUBSYSTEMS.register("vector_db", lambda: (self._init_vector_dbs(), self._vector_db_client)[1])
+        SUBSYSTEMS.register("embedding_model", lambda: (self._init_embedding_model(), self._embedding_model)[1])
+
+    @property
+    def cosmos_gremlin_client(self):
+        SUBSYSTEMS.get("gremlin")
+        return self._cosmos_gremlin_client
+
+    @cosmos_gremlin_client.setter
+    def cosmos_gremlin_client(self, value):
+        self._cosmos_gremlin_client = value
+
+    @property
+    def vector_db_client(self):
+        SUBSYSTEMS.get("vector_db")
+        return self._vector_db_client
+
+    @vector_db_client.setter
+    def vector_db_client(self, value):
+        self._vector_db_client = value
+
+    @property
+    def embedding_model(self):
+        SUBSYSTEMS.get("embedding_model")
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, value):
+        self._embedding_model = value
     
     def initialize_connections(self):
         """Initialize all database connections with better error handling"""
-        print("[DatabaseManager] Initializing database connections...")
-        
-        # Initialize Cosmos DB Gremlin connection
-        self._init_cosmos_gremlin()
-        # Initialize ChromaDB connections
-        self._init_vector_dbs()
-        # Initialize embedding model
-        self._init_embedding_model()
+        db_log.info("[DatabaseManager] Initializing database connections...")
+        SUBSYSTEMS.warmup(["gremlin", "vector_db", "embedding_model"])
     
     def _init_cosmos_gremlin(self):
         """Initialize Cosmos DB Gremlin with proper cleanup"""
-        if not client or not COSMOS_GREMLIN_CONFIG['password']:
-            print("[DatabaseManager] Cosmos Gremlin credentials not available")
+        if not GREMLIN_AVAILABLE or not COSMOS_GREMLIN_CONFIG['password']:
+            db_log.debug("[DatabaseManager] Cosmos Gremlin credentials not available")
             return
             
         try:
+            from gremlin_python.driver import client, serializer
             username = f"/dbs/{COSMOS_GREMLIN_CONFIG['database']}/colls/{COSMOS_GREMLIN_CONFIG['graph']}"
             endpoint_url = f"wss://{COSMOS_GREMLIN_CONFIG['endpoint']}:443/gremlin"
             
@@ -2447,10 +3027,10 @@ class DatabaseManager:
             
             # Test connection with timeout
             result = self.cosmos_gremlin_client.submit("g.V().limit(1).count()").all().result()
-            print(f"[DatabaseManager] Cosmos Gremlin connected successfully - {result[0]} vertices available")
+            db_log.info("[DatabaseManager] Cosmos Gremlin connected successfully - %s vertices available", result[0])
             
         except Exception as e:
-            print(f"[DatabaseManager] Cosmos Gremlin connection failed: {e}")
+            db_log.warning("[DatabaseManager] Cosmos Gremlin connection failed: %s", e)
             self.cosmos_gremlin_client = None
     
     def extract_metadata_from_content(self, content: str) -> dict:
@@ -2473,7 +3053,7 @@ class DatabaseManager:
             metadata['section_number'] = section
             metadata['chapter_number'] = chapter
         
-            print(f"[MetadataExtract] Extracted: Chapter {chapter}, Section {section}")
+            db_log.debug("[MetadataExtract] Extracted: Chapter %s, Section %s", chapter, section)
             return metadata
     
         # Pattern 2: C1. T1. (tables)
@@ -2483,7 +3063,7 @@ class DatabaseManager:
             chapter = match.group(2)
             metadata['section_number'] = section
             metadata['chapter_number'] = chapter
-            print(f"[MetadataExtract] Extracted table: Chapter {chapter}, Section {section}")
+            db_log.debug("[MetadataExtract] Extracted table: Chapter %s, Section %s", chapter, section)
             return metadata
     
         # Pattern 3: Chapter X. (heading style)
@@ -2491,7 +3071,7 @@ class DatabaseManager:
         if match:
             chapter = match.group(1)
             metadata['chapter_number'] = chapter
-            print(f"[MetadataExtract] Extracted chapter heading: Chapter {chapter}")
+            db_log.debug("[MetadataExtract] Extracted chapter heading: Chapter %s", chapter)
             return metadata
     
         return metadata
@@ -2499,42 +3079,46 @@ class DatabaseManager:
     
     def _init_vector_dbs(self):
         """Initialize vector databases"""
-        if not chromadb:
-            print("[DatabaseManager] ChromaDB not available")
+        if not CHROMADB_AVAILABLE:
+            db_log.info("[DatabaseManager] ChromaDB not available")
             return
             
-        # Initialize ChromaDB vector_db (documents)
         # Initialize ChromaDB vector_db (documents)
         try:
+            import chromadb
             if Path(VECTOR_DB_PATH).exists():
                 self.vector_db_client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
                 collections = self.vector_db_client.list_collections()
-                print(f"[DatabaseManager] Vector DB connected - {len(collections)} collections available")
+                db_log.info("[DatabaseManager] Vector DB connected - %s collections available", len(collections))
                 if collections:
                     for col in collections:
-                        print(f"\n[DEBUG] Collection: {col.name}")
-                        print(f"[DEBUG] Metadata: {col.metadata}")
-                        print(f"[DEBUG] Count: {col.count()}")
+                        db_log.info("[DEBUG] Collection: %s", col.name)
+                        db_log.info("[DEBUG] Metadata: %s", col.metadata)
+                        if db_log.isEnabledFor(logging.INFO):
+                            db_log.info("[DEBUG] Count: %s", col.count())
             else:
-                print(f"[DatabaseManager] Vector DB path not found: {VECTOR_DB_PATH}")
+                db_log.info("[DatabaseManager] Vector DB path not found: %s", VECTOR_DB_PATH)
         except Exception as e:
-            print(f"[DatabaseManager] Vector DB connection failed: {e}")
+            db_log.warning("[DatabaseManager] Vector DB connection failed: %s", e)
             self.vector_db_client = None
         
     
     def _init_embedding_model(self):
         """Initialize embedding model"""
-        if not SentenceTransformer:
-            print("[DatabaseManager] SentenceTransformer not available")
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            db_log.info("[DatabaseManager] SentenceTransformer not available")
             return
             
         try:
+            from sentence_transformers import SentenceTransformer
             self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-            print(f"[DatabaseManager] Embedding model loaded: {EMBEDDING_MODEL}")
+            db_log.info("[DatabaseManager] Embedding model loaded: %s", EMBEDDING_MODEL)
         except Exception as e:
-            print(f"[DatabaseManager] Embedding model failed to load: {e}")
+            db_log.warning("[DatabaseManager] Embedding model failed to load: %s", e)
             self.embedding_model = None
     
+    @traced()
+    @STEP_SECONDS.labels("gremlin").time()
     def query_cosmos_graph(self, query_text: str, entities: List[str] = None) -> List[Dict]:
         """Query Cosmos DB graph database with auto-reconnection"""
         if not self.cosmos_gremlin_client:
@@ -2551,17 +3135,18 @@ class DatabaseManager:
             """Execute a single Gremlin query with reconnection on failure"""
             nonlocal reconnect_attempted
             try:
-                return self.cosmos_gremlin_client.submit(query).all().result()
+                with span("gremlin.submit", query=query):  # v5.9.32: one span per round trip
+                    return self.cosmos_gremlin_client.submit(query).all().result()
             except Exception as e:
                 error_msg = str(e).lower()
                 # Check for connection errors that need reconnection
                 if any(err in error_msg for err in ['closing transport', 'connection', 'closed', 'transport']):
                     if not reconnect_attempted:
-                        print(f"[DatabaseManager] 🔄 Connection lost, attempting reconnect...")
+                        db_log.debug("[DatabaseManager] 🔄 Connection lost, attempting reconnect...")
                         reconnect_attempted = True
                         self._init_cosmos_gremlin()
                         if self.cosmos_gremlin_client:
-                            print(f"[DatabaseManager] ✅ Reconnected successfully, retrying query...")
+                            db_log.debug("[DatabaseManager] ✅ Reconnected successfully, retrying query...")
                             return self.cosmos_gremlin_client.submit(query).all().result()
                 raise e
         
@@ -2629,7 +3214,7 @@ class DatabaseManager:
                             })
                             
                     except Exception as entity_error:
-                        print(f"[DatabaseManager] Error querying entity '{entity}': {entity_error}")
+                        db_log.error("[DatabaseManager] Error querying entity '%s': %s", entity, entity_error)
                         continue
             else:
                 # General query for high-level entities
@@ -2653,27 +3238,30 @@ class DatabaseManager:
                     seen_ids.add(result_id)
                     unique_results.append(result)
             
-            print(f"[DatabaseManager] Cosmos Gremlin query returned {len(unique_results)} results (deduped from {len(results)})")
+            db_log.debug("[DatabaseManager] Cosmos Gremlin query returned %s results (deduped from %s)", len(unique_results), len(results))
             
         except Exception as e:
-            print(f"[DatabaseManager] Cosmos Gremlin query error: {e}")
+            db_log.error("[DatabaseManager] Cosmos Gremlin query error: %s", e)
             unique_results = results  # Fall back to original results on error
         
         return unique_results
     
-    def query_vector_db(self, query: str, collection_name: str = None, n_results: int = 5) -> List[Dict]:
+    @traced()
+    def query_vector_db(self, query: str, collection_name: str = None, n_results: int = 5,
+                        search: str = "semantic") -> List[Dict]:
         """Query vector database and return results with enhanced metadata - OPTIMIZED for speed"""
         try:
             if not self.vector_db_client:
-                print("[DatabaseManager] Vector DB client not available")
+                db_log.debug("[DatabaseManager] Vector DB client not available")
                 return []
         
             collection = self.vector_db_client.get_collection(collection_name or VECTOR_DB_COLLECTION)
         
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+            with VECTOR_SEARCH_SECONDS.labels(search).time():  # v5.9.31: search = which of the hybrid searches
+                results = collection.query(
+                    query_texts=[query],
+                    n_results=n_results
+                )
             # ✅ ENHANCED: Format results with metadata extraction
             formatted_results = []
             for i, (doc, meta, distance) in enumerate(zip(
@@ -2685,7 +3273,7 @@ class DatabaseManager:
                 if meta.get('chapter_number') == 'Unknown' or not meta.get('chapter_number'):
                     extracted_meta = self.extract_metadata_from_content(doc)
                     meta.update(extracted_meta)
-                    print(f"[DatabaseManager] Updated metadata for result {i+1}: Chapter {extracted_meta['chapter_number']}, Section {extracted_meta['section_number']}")
+                    db_log.debug("[DatabaseManager] Updated metadata for result %s: Chapter %s, Section %s", i+1, extracted_meta['chapter_number'], extracted_meta['section_number'])
 
                 # Convert distance to similarity score (0 = identical, 2 = very different for cosine)
                 # For cosine distance: similarity = 1 - distance
@@ -2699,23 +3287,23 @@ class DatabaseManager:
                     'similarity_score': round(similarity_score, 4)  # Add readable score
                 })
 
-            print(f"[DatabaseManager] Vector DB query returned {len(formatted_results)} results")
+            db_log.debug("[DatabaseManager] Vector DB query returned %s results", len(formatted_results))
             return formatted_results
 
         
         except Exception as e:
-            print(f"[DatabaseManager] Vector DB query error: {e}")
+            db_log.error("[DatabaseManager] Vector DB query error: %s", e)
             return []
 
     
     def cleanup(self):
         """Cleanup database connections"""
         try:
-            if self.cosmos_gremlin_client:
-                self.cosmos_gremlin_client.close()
-                print("[DatabaseManager] Cosmos Gremlin connection closed")
+            if self._cosmos_gremlin_client:  # never connect just to close
+                self._cosmos_gremlin_client.close()
+                db_log.debug("[DatabaseManager] Cosmos Gremlin connection closed")
         except Exception as e:
-            print(f"[DatabaseManager] Error closing Cosmos Gremlin: {e}")
+            db_log.error("[DatabaseManager] Error closing Cosmos Gremlin: %s", e)
     
     def get_database_status(self) -> Dict[str, Any]:
         """Get status of all database connections"""
@@ -2768,6 +3356,34 @@ class AgentState(TypedDict):
     current_step: str
     error: Optional[str]
 
+
+class PipelineContext(TypedDict):
+    """
+    v5.9.16: Per-request retrieval state threaded through the agents.
+    Replaces the per-request attributes the entity agent used to keep on the
+    shared singleton, so one process can serve concurrent queries.
+    """
+    request_id: str
+    query: str
+    intent: Optional[str]
+    retrieval_results: Dict[str, List[Dict]]     # {'vector_db': [...], 'cosmos': [...]}
+    text_sections_meta: List[Dict[str, Any]]     # ordered metadata behind text_sections
+    two_hop_context: Optional[Dict[str, Any]]    # 2-hop path RAG result
+    data_versions: Dict[str, str]                # v5.9.36: DATA_VERSIONS.capture() at request start
+
+
+def new_pipeline_context(query: str = "", intent_info: Optional[Dict] = None) -> PipelineContext:
+    """Create an empty per-request pipeline context"""
+    return PipelineContext(
+        request_id=str(uuid.uuid4()),
+        query=query,
+        intent=intent_info.get('intent') if intent_info else None,
+        retrieval_results={},
+        text_sections_meta=[],
+        two_hop_context=None,
+        data_versions=DATA_VERSIONS.capture()
+    )
+
 # ============================================================================
 # HITL FEEDBACK LOOP SYSTEM
 # ============================================================================
@@ -2910,18 +3526,20 @@ def train_answer(question, answer):
     print(f"[ANSWER TRAINING] ✅ Trained with {len(keywords)} keywords: {keywords[:5]}")
     return True
 
+@traced()
+@STEP_SECONDS.labels("trained_answer").time()
 def get_trained_answer(question):
     """Get trained answer for similar questions"""
     q_hash = create_question_hash(question)
     
     # 1. Exact match first
     if q_hash in ANSWER_TRAINING_STORE["exact_matches"]:
-        print(f"[ANSWER TRAINING] 🎯 EXACT MATCH found!")
+        training_log.debug("[ANSWER TRAINING] 🎯 EXACT MATCH found!")
         return ANSWER_TRAINING_STORE["exact_matches"][q_hash]
     
     # 2. Keyword pattern match (bidirectional - check both ways)
     question_keywords = set(extract_keywords(question))
-    print(f"[ANSWER TRAINING] 🔍 Question keywords: {question_keywords}")
+    training_log.debug("[ANSWER TRAINING] 🔍 Question keywords: %s", question_keywords)
     
     if len(question_keywords) >= 2:
         best_match = None
@@ -2937,7 +3555,7 @@ def get_trained_answer(question):
                 score2 = len(common) / len(question_keywords)  # How much of question is covered
                 score = (score1 + score2) / 2
                 
-                print(f"[ANSWER TRAINING] 📊 Pattern: {pattern_keywords}, Common: {common}, Score: {score:.0%}")
+                training_log.debug("[ANSWER TRAINING] 📊 Pattern: %s, Common: %s, Score: %s", pattern_keywords, common, format(score, ".0%"))
                 
                 # Need at least 2 common keywords and 40% average score
                 if score >= 0.4 and len(common) >= 2 and score > best_score:
@@ -2945,10 +3563,11 @@ def get_trained_answer(question):
                     best_match = pattern
         
         if best_match:
-            print(f"[ANSWER TRAINING] 🎯 PATTERN MATCH ({best_score:.0%}): {list(question_keywords & set(best_match['keywords']))}")
+            if training_log.isEnabledFor(logging.DEBUG):
+                training_log.debug("[ANSWER TRAINING] 🎯 PATTERN MATCH (%s): %s", format(best_score, ".0%"), list(question_keywords & set(best_match['keywords'])))
             return best_match["answer"]
     
-    print(f"[ANSWER TRAINING] ❌ No pattern match found")
+    training_log.debug("[ANSWER TRAINING] ❌ No pattern match found")
     return None
 
 print("✅ Answer Training System Initialized")
@@ -3030,6 +3649,8 @@ def train_intent(question, intent):
     print(f"[INTENT TRAINING] ✅ Trained '{intent}' with {len(keywords)} keywords: {keywords[:5]}")
     return True
 
+@traced()
+@STEP_SECONDS.labels("trained_intent").time()
 def get_trained_intent(question):
     """Get trained intent for similar questions"""
     q_hash = create_question_hash(question)
@@ -3037,12 +3658,12 @@ def get_trained_intent(question):
     # 1. Exact match first
     if q_hash in INTENT_TRAINING_STORE["exact_matches"]:
         intent = INTENT_TRAINING_STORE["exact_matches"][q_hash]
-        print(f"[INTENT TRAINING] 🎯 EXACT MATCH: {intent}")
+        training_log.debug("[INTENT TRAINING] 🎯 EXACT MATCH: %s", intent)
         return {"intent": intent, "confidence": 0.99, "source": "trained_exact"}
     
     # 2. Keyword pattern match (bidirectional)
     question_keywords = set(extract_keywords(question))
-    print(f"[INTENT TRAINING] 🔍 Question keywords: {question_keywords}")
+    training_log.debug("[INTENT TRAINING] 🔍 Question keywords: %s", question_keywords)
     
     if len(question_keywords) >= 2:
         best_match = None
@@ -3058,17 +3679,17 @@ def get_trained_intent(question):
                 score2 = len(common) / len(question_keywords)
                 score = (score1 + score2) / 2
                 
-                print(f"[INTENT TRAINING] 📊 Pattern: {pattern['intent']}, Common: {common}, Score: {score:.0%}")
+                training_log.debug("[INTENT TRAINING] 📊 Pattern: %s, Common: %s, Score: %s", pattern['intent'], common, format(score, ".0%"))
                 
                 if score >= 0.4 and len(common) >= 2 and score > best_score:
                     best_score = score
                     best_match = pattern
         
         if best_match:
-            print(f"[INTENT TRAINING] 🎯 PATTERN MATCH ({best_score:.0%}): {best_match['intent']}")
+            training_log.debug("[INTENT TRAINING] 🎯 PATTERN MATCH (%s): %s", format(best_score, ".0%"), best_match['intent'])
             return {"intent": best_match["intent"], "confidence": 0.90, "source": "trained_pattern"}
     
-    print(f"[INTENT TRAINING] ❌ No pattern match found")
+    training_log.debug("[INTENT TRAINING] ❌ No pattern match found")
     return None
 
 print("✅ Intent Training System Initialized")
@@ -3150,6 +3771,8 @@ def train_entities(question, entities):
     print(f"[ENTITY TRAINING] ✅ Trained {len(entities)} entities with {len(keywords)} keywords")
     return True
 
+@traced()
+@STEP_SECONDS.labels("trained_entities").time()
 def get_trained_entities(question):
     """Get trained entities for similar questions"""
     q_hash = create_question_hash(question)
@@ -3157,12 +3780,12 @@ def get_trained_entities(question):
     # 1. Exact match first
     if q_hash in ENTITY_TRAINING_STORE["exact_matches"]:
         entities = ENTITY_TRAINING_STORE["exact_matches"][q_hash]
-        print(f"[ENTITY TRAINING] 🎯 EXACT MATCH: {entities}")
+        training_log.debug("[ENTITY TRAINING] 🎯 EXACT MATCH: %s", entities)
         return {"entities": entities, "confidence": 0.99, "source": "trained_exact"}
     
     # 2. Keyword pattern match (bidirectional)
     question_keywords = set(extract_keywords(question))
-    print(f"[ENTITY TRAINING] 🔍 Question keywords: {question_keywords}")
+    training_log.debug("[ENTITY TRAINING] 🔍 Question keywords: %s", question_keywords)
     
     if len(question_keywords) >= 2:
         best_match = None
@@ -3178,17 +3801,17 @@ def get_trained_entities(question):
                 score2 = len(common) / len(question_keywords)
                 score = (score1 + score2) / 2
                 
-                print(f"[ENTITY TRAINING] 📊 Pattern entities: {pattern['entities']}, Common: {common}, Score: {score:.0%}")
+                training_log.debug("[ENTITY TRAINING] 📊 Pattern entities: %s, Common: %s, Score: %s", pattern['entities'], common, format(score, ".0%"))
                 
                 if score >= 0.4 and len(common) >= 2 and score > best_score:
                     best_score = score
                     best_match = pattern
         
         if best_match:
-            print(f"[ENTITY TRAINING] 🎯 PATTERN MATCH ({best_score:.0%}): {best_match['entities']}")
+            training_log.debug("[ENTITY TRAINING] 🎯 PATTERN MATCH (%s): %s", format(best_score, ".0%"), best_match['entities'])
             return {"entities": best_match["entities"], "confidence": 0.90, "source": "trained_pattern"}
     
-    print(f"[ENTITY TRAINING] ❌ No pattern match found")
+    training_log.debug("[ENTITY TRAINING] ❌ No pattern match found")
     return None
 
 print("✅ Entity Training System Initialized")
@@ -3215,20 +3838,20 @@ def apply_hitl_corrections(question: str, result: dict) -> dict:
     if q_hash in HITL_CORRECTIONS_STORE["intent_corrections"]:
         result['metadata']['intent'] = HITL_CORRECTIONS_STORE["intent_corrections"][q_hash]
         corrections_applied.append("Intent (exact)")
-        print(f"🔄 HITL: Intent correction applied (exact match)")
+        training_log.debug("🔄 HITL: Intent correction applied (exact match)")
     else:
         # Check trained patterns for similar questions
         trained_intent = get_trained_intent(question)
         if trained_intent:
             result['metadata']['intent'] = trained_intent['intent']
             corrections_applied.append(f"Intent ({trained_intent['source']})")
-            print(f"🔄 HITL: Intent correction applied ({trained_intent['source']})")
+            training_log.debug("🔄 HITL: Intent correction applied (%s)", trained_intent['source'])
     
     # Check exact match first for entities
     if q_hash in HITL_CORRECTIONS_STORE["entity_corrections"]:
         result['metadata']['entities'] = HITL_CORRECTIONS_STORE["entity_corrections"][q_hash]
         corrections_applied.append("Entities (exact)")
-        print(f"🔄 HITL: Entity corrections applied (exact match)")
+        training_log.debug("🔄 HITL: Entity corrections applied (exact match)")
     else:
         # Check trained patterns for similar questions
         trained_entities = get_trained_entities(question)
@@ -3236,14 +3859,14 @@ def apply_hitl_corrections(question: str, result: dict) -> dict:
             result['metadata']['entities'] = trained_entities['entities']
             result['metadata']['trained_entity_match'] = True
             corrections_applied.append(f"Entities ({trained_entities['source']})")
-            print(f"🔄 HITL: Entity corrections applied ({trained_entities['source']})")
+            training_log.debug("🔄 HITL: Entity corrections applied (%s)", trained_entities['source'])
     
     # Check exact match first for answer
     if q_hash in HITL_CORRECTIONS_STORE["answer_corrections"]:
         result['answer'] = HITL_CORRECTIONS_STORE["answer_corrections"][q_hash]
         result['metadata']['hitl_corrected'] = True
         corrections_applied.append("Answer (exact)")
-        print(f"🔄 HITL: Answer correction applied (exact match)")
+        training_log.debug("🔄 HITL: Answer correction applied (exact match)")
     else:
         # Check trained patterns for similar questions
         trained_answer = get_trained_answer(question)
@@ -3252,11 +3875,11 @@ def apply_hitl_corrections(question: str, result: dict) -> dict:
             result['metadata']['hitl_corrected'] = True
             result['metadata']['trained_pattern_match'] = True
             corrections_applied.append("Answer (pattern)")
-            print(f"🔄 HITL: Answer correction applied (pattern match)")
+            training_log.debug("🔄 HITL: Answer correction applied (pattern match)")
     
     if corrections_applied:
         result['metadata']['hitl_corrections_applied'] = corrections_applied
-        print(f"✅ HITL CORRECTIONS FOUND! {corrections_applied}")
+        training_log.debug("✅ HITL CORRECTIONS FOUND! %s", corrections_applied)
     
     return result
 
@@ -3291,6 +3914,12 @@ def generate_demo_partial_response(question: str) -> dict:
 # =============================================================================
 # v5.9.8: SMART SEARCH - think_first_v2()
 # =============================================================================
+# v5.9.34: SMART_SEARCH_ENABLED=false skips the LLM call (benchmark_retrieval.py runs retrieval without an LLM)
+SMART_SEARCH_ENABLED = os.getenv("SMART_SEARCH_ENABLED", "true").lower() == "true"
+
+
+@traced()
+@STEP_SECONDS.labels("think_first").time()
 def think_first_v2(query: str, timeout: int = 300) -> dict:
     """
     Smart Search: LLM identifies relevant SAMM terms BEFORE vector search.
@@ -3306,6 +3935,9 @@ If no line matches, return empty.
 
 Terms:"""
 
+    if not SMART_SEARCH_ENABLED:
+        return {"relevant_terms": "", "enhanced_query": query, "success": False}
+
     try:
         response = requests.post(
             f"{OLLAMA_URL}/api/chat",
@@ -3323,7 +3955,7 @@ Terms:"""
             relevant_terms = result.get("message", {}).get("content", "").strip()
             relevant_terms = relevant_terms.replace("Terms:", "").strip()
             
-            print(f"[SMART SEARCH] ✅ LLM identified: {relevant_terms}")
+            answer_log.debug("[SMART SEARCH] ✅ LLM identified: %s", relevant_terms)
             
             return {
                 "relevant_terms": relevant_terms,
@@ -3331,14 +3963,14 @@ Terms:"""
                 "success": True
             }
         else:
-            print(f"[SMART SEARCH] ❌ Ollama error: {response.status_code}")
+            answer_log.error("[SMART SEARCH] ❌ Ollama error: %s", response.status_code)
             return {"relevant_terms": "", "enhanced_query": query, "success": False}
             
     except requests.exceptions.Timeout:
-        print(f"[SMART SEARCH] ⏱️ Timeout - using original query")
+        answer_log.debug("[SMART SEARCH] ⏱️ Timeout - using original query")
         return {"relevant_terms": "", "enhanced_query": query, "success": False}
     except Exception as e:
-        print(f"[SMART SEARCH] ❌ Error: {e}")
+        answer_log.error("[SMART SEARCH] ❌ Error: %s", e)
         return {"relevant_terms": "", "enhanced_query": query, "success": False}
 
 # =============================================================================
@@ -3400,6 +4032,7 @@ def extract_case_id_from_filename(filename: str) -> str:
         return case_id
     return None 
 
+@trace_methods  # v5.9.32: every method is a span of the request's trace
 class IntentAgent:
     """Intent analysis using Ollama with Human-in-Loop and trigger updates"""
     
@@ -4058,7 +4691,7 @@ class IntentAgent:
                         "relationship", "relationships", "stakeholder", "stakeholders"]
         }
         
-        print("[IntentAgent M1.3] Initialized with HYBRID pattern + LLM confidence scoring")
+        intent_log.info("[IntentAgent M1.3] Initialized with HYBRID pattern + LLM confidence scoring")
 
     # ============================================================================
     # M1.3 NEW: Pattern-Based Intent Detection (FAST - No LLM)
@@ -4075,7 +4708,7 @@ class IntentAgent:
             for pattern in patterns:
                 try:
                     if re.search(pattern, query_lower, re.IGNORECASE):
-                        print(f"[IntentAgent M1.3] ✅ Pattern match: '{pattern[:50]}...' → {intent}")
+                        intent_log.debug("[IntentAgent M1.3] ✅ Pattern match: '%s...' → %s", pattern[:50], intent)
                         return {
                             "intent": intent,
                             "pattern_matched": True,
@@ -4484,7 +5117,7 @@ class IntentAgent:
         composite = (pattern_score * PATTERN_WEIGHT) + (keyword_score * KEYWORD_WEIGHT) + (ai_score * AI_WEIGHT)
         composite = round(composite, 2)
         
-        print(f"[IntentAgent M1.3] Confidence: Pattern={pattern_score:.2f}×40% + Keyword={keyword_score:.2f}×35% + AI={ai_score:.2f}×25% = {composite:.2f}")
+        intent_log.debug("[IntentAgent M1.3] Confidence: Pattern=%.2f×40%% + Keyword=%.2f×35%% + AI=%.2f×25%% = %.2f", pattern_score, keyword_score, ai_score, composite)
         
         return {
             "pattern_score": pattern_score,
@@ -4499,12 +5132,12 @@ class IntentAgent:
         query_lower = query.lower().strip()
         query_words = query_lower.split()
         
-        print(f"[IntentAgent] Checking special cases for: '{query[:50]}...'")
+        intent_log.debug("[IntentAgent] Checking special cases for: '%s...'", query[:50])
         
         # Check for financial verification queries
         if "funding request" in query_lower or "funds are available" in query_lower or "verify the appropriate funding line" in query_lower:
             if "sr-p-nav" in query_lower or "case sr" in query_lower:
-                print(f"[IntentAgent] 🚀 FINANCIAL VERIFICATION detected")
+                intent_log.debug("[IntentAgent] 🚀 FINANCIAL VERIFICATION detected")
                 return {
                     "intent": "financial_verification",
                     "confidence": 0.95,
@@ -4516,7 +5149,7 @@ class IntentAgent:
         # Check for technical services queries
         if "technical services" in query_lower or "what is included" in query_lower:
             if "sr-p-nav" in query_lower or "case sr" in query_lower:
-                print(f"[IntentAgent] 🚀 TECHNICAL SERVICES query detected")
+                intent_log.debug("[IntentAgent] 🚀 TECHNICAL SERVICES query detected")
                 return {
                     "intent": "line_item_details",
                     "confidence": 0.95,
@@ -4528,7 +5161,7 @@ class IntentAgent:
         # Check for PMR minutes summary queries
         if "minutes" in query_lower or "pmr" in query_lower or "meeting" in query_lower:
             if any(keyword in query_lower for keyword in ["summarize", "summary", "action items", "action item"]):
-                print(f"[IntentAgent] 🚀 PMR MINUTES SUMMARY detected")
+                intent_log.debug("[IntentAgent] 🚀 PMR MINUTES SUMMARY detected")
                 return {
                     "intent": "pmr_minutes_summary",
                     "confidence": 0.95,
@@ -4541,7 +5174,7 @@ class IntentAgent:
         if "loa" in query_lower or "letter of offer" in query_lower:
             loa_triggers = ["how long", "timeline", "timeframe", "time", "duration", "take to develop", "take to prepare"]
             if any(trigger in query_lower for trigger in loa_triggers):
-                print(f"[IntentAgent] 🚀 LOA TIMELINE detected - returning instant answer")
+                intent_log.debug("[IntentAgent] 🚀 LOA TIMELINE detected - returning instant answer")
                 return {
                     "intent": "loa_timeline",
                     "confidence": 0.95,
@@ -4568,7 +5201,7 @@ class IntentAgent:
         )
         
         if nonsense_count >= 2 or unusual_symbol_ratio > 0.2 or number_ratio > 0.7 or has_keyboard_mash:
-            print(f"[IntentAgent] NONSENSE detected (keywords: {nonsense_count}, unusual_symbols: {unusual_symbol_ratio:.2f})")
+            intent_log.debug("[IntentAgent] NONSENSE detected (keywords: %s, unusual_symbols: %.2f)", nonsense_count, unusual_symbol_ratio)
             return {
                 "intent": "nonsense",
                 "confidence": 0.95,
@@ -4581,7 +5214,7 @@ class IntentAgent:
         if len(query_words) <= 5:
             for phrase in self.special_case_patterns["incomplete_phrases"]:
                 if phrase in query_lower:
-                    print(f"[IntentAgent] INCOMPLETE detected (phrase: '{phrase}')")
+                    intent_log.debug("[IntentAgent] INCOMPLETE detected (phrase: '%s')", phrase)
                     return {
                         "intent": "incomplete",
                         "confidence": 0.9,
@@ -4593,7 +5226,7 @@ class IntentAgent:
         question_words = ["what", "who", "when", "where", "why", "how", "does", "is", "are", "can"]
         if len(query_words) <= 3 and not any(qw in query_words for qw in question_words):
             if not query.strip().endswith("?"):
-                print(f"[IntentAgent] INCOMPLETE detected (fragment: {len(query_words)} words)")
+                intent_log.debug("[IntentAgent] INCOMPLETE detected (fragment: %s words)", len(query_words))
                 return {
                     "intent": "incomplete",
                     "confidence": 0.85,
@@ -4609,7 +5242,7 @@ class IntentAgent:
                 non_samm_matches.append(topic)
         
         if non_samm_matches:
-            print(f"[IntentAgent] NON-SAMM detected (topics: {non_samm_matches})")
+            intent_log.debug("[IntentAgent] NON-SAMM detected (topics: %s)", non_samm_matches)
             return {
                 "intent": "non_samm",
                 "confidence": 0.9,
@@ -4619,7 +5252,7 @@ class IntentAgent:
                 "detected_topics": non_samm_matches
             }
         
-        print(f"[IntentAgent] No special cases detected - proceeding with normal analysis")
+        intent_log.debug("[IntentAgent] No special cases detected - proceeding with normal analysis")
         return None
 
 
@@ -4641,7 +5274,7 @@ class IntentAgent:
         # STEP 1: Check special cases first
         special_case = self._check_special_cases(query)
         if special_case:
-            print(f"[IntentAgent M1.3] Returning special case: {special_case['intent']}")
+            intent_log.debug("[IntentAgent M1.3] Returning special case: %s", special_case['intent'])
             conf_breakdown = self._calculate_intent_confidence(query, special_case['intent'], 1.0, special_case.get('confidence', 0.95))
             special_case['confidence'] = conf_breakdown['composite']
             special_case['confidence_breakdown'] = conf_breakdown
@@ -4656,11 +5289,11 @@ class IntentAgent:
         keyword_score = self._calculate_keyword_overlap_score(query)
         preliminary_confidence = (pattern_score * 0.40) + (keyword_score * 0.35) + (0.85 * 0.25)
         
-        print(f"[IntentAgent M1.3] Pattern result: intent={pattern_intent}, pattern_score={pattern_score:.2f}, preliminary_conf={preliminary_confidence:.2f}")
+        intent_log.debug("[IntentAgent M1.3] Pattern result: intent=%s, pattern_score=%.2f, preliminary_conf=%.2f", pattern_intent, pattern_score, preliminary_confidence)
         
         # STEP 3: If pattern match is strong (>=0.85), skip LLM entirely!
         if pattern_result["pattern_matched"] and preliminary_confidence >= 0.85:
-            print(f"[IntentAgent M1.3] ⚡ HIGH CONFIDENCE - Skipping LLM call!")
+            intent_log.debug("[IntentAgent M1.3] ⚡ HIGH CONFIDENCE - Skipping LLM call!")
             
             conf_breakdown = self._calculate_intent_confidence(query, pattern_intent, pattern_score, 0.85)
             
@@ -4681,7 +5314,7 @@ class IntentAgent:
         # Only Pattern Match (SME approved) and LLM Call (accurate) are used
         
         # STEP 4: Pattern confidence low - call LLM for refinement
-        print(f"[IntentAgent M1.3] 🔄 Low pattern confidence - calling LLM for refinement...")
+        intent_log.debug("[IntentAgent M1.3] 🔄 Low pattern confidence - calling LLM for refinement...")
         
         enhanced_system_msg = self._build_enhanced_system_message()
         prompt = f"Analyze this SAMM query and determine intent: {query}"
@@ -4726,7 +5359,7 @@ class IntentAgent:
                 }
         except Exception as e:
             # LLM error - use pattern result
-            print(f"[IntentAgent M1.3] LLM error: {e} - using pattern result")
+            intent_log.error("[IntentAgent M1.3] LLM error: %s - using pattern result", e)
             conf_breakdown = self._calculate_intent_confidence(query, pattern_intent, pattern_score, 0.5)
             return {
                 "intent": pattern_intent, 
@@ -4760,7 +5393,7 @@ class IntentAgent:
         keywords = [word for word in query_lower.split() if len(word) > 3]
         self.intent_patterns[corrected_intent].extend(keywords)
         
-        print(f"[IntentAgent HIL] Updated with correction: {original_intent} -> {corrected_intent} for query: '{query}'")
+        intent_log.debug("[IntentAgent HIL] Updated with correction: %s -> %s for query: '%s'", original_intent, corrected_intent, query)
         return True
     
     def update_from_trigger(self, new_entities: List[str], new_relationships: List[Dict], trigger_data: Dict[str, Any] = None):
@@ -4783,7 +5416,7 @@ class IntentAgent:
                     self.intent_patterns["organization"] = []
                 self.intent_patterns["organization"].append(entity_lower)
         
-        print(f"[IntentAgent Trigger] Updated with {len(new_entities)} new entities and {len(new_relationships)} relationships")
+        intent_log.debug("[IntentAgent Trigger] Updated with %s new entities and %s relationships", len(new_entities), len(new_relationships))
         return True
     
     def _build_enhanced_system_message(self) -> str:
@@ -5915,7 +6548,7 @@ class EntityMetrics:
         self.metrics_history = []
         # Build reverse lookup (full form → acronym)
         self.fullform_to_acronym = {v: k for k, v in self.ACRONYM_PAIRS.items()}
-        print("[EntityMetrics E1.1 + E1.3] Initialized with Chapter 1 & 4 ground truth + Acronym Normalization")
+        metrics_log.info("[EntityMetrics E1.1 + E1.3] Initialized with Chapter 1 & 4 ground truth + Acronym Normalization")
     
     def get_all_ground_truth_entities(self) -> set:
         """Get flattened set of all ground truth entities from all chapters"""
@@ -5949,7 +6582,7 @@ class EntityMetrics:
             
             # Skip generic words
             if entity_lower in self.GENERIC_WORDS:
-                print(f"[EntityMetrics E1.3] Filtered generic word: '{entity}'")
+                metrics_log.debug("[EntityMetrics E1.3] Filtered generic word: '%s'", entity)
                 continue
             
             # Check if it's an acronym
@@ -5961,7 +6594,7 @@ class EntityMetrics:
             if entity_lower in self.fullform_to_acronym:
                 acronym = self.fullform_to_acronym[entity_lower]
                 normalized.add(acronym)
-                print(f"[EntityMetrics E1.3] Normalized '{entity}' → '{acronym.upper()}'")
+                metrics_log.debug("[EntityMetrics E1.3] Normalized '%s' → '%s'", entity, acronym.upper())
                 continue
             
             # E1.3 FIX: Check if entity contains "Known Entity + Generic Word"
@@ -5975,7 +6608,7 @@ class EntityMetrics:
                     remaining = entity_lower.replace(full_form, "").strip()
                     if remaining in self.GENERIC_WORDS or remaining == "":
                         normalized.add(acronym)
-                        print(f"[EntityMetrics E1.3] Extracted '{acronym.upper()}' from '{entity}' (removed generic: '{remaining}')")
+                        metrics_log.debug("[EntityMetrics E1.3] Extracted '%s' from '%s' (removed generic: '%s')", acronym.upper(), entity, remaining)
                         entity_handled = True
                         break
             
@@ -5988,7 +6621,7 @@ class EntityMetrics:
                     remaining_words = [w for w in entity_lower.split() if w != acronym]
                     if all(w in self.GENERIC_WORDS for w in remaining_words):
                         normalized.add(acronym)
-                        print(f"[EntityMetrics E1.3] Extracted '{acronym.upper()}' from '{entity}' (removed generic words)")
+                        metrics_log.debug("[EntityMetrics E1.3] Extracted '%s' from '%s' (removed generic words)", acronym.upper(), entity)
                         entity_handled = True
                         break
             
@@ -6032,11 +6665,11 @@ class EntityMetrics:
             expected_entities = self._infer_expected_entities(query)
         
         # E1.3: Normalize entities (merge acronyms, filter generic words)
-        print(f"[EntityMetrics E1.3] Raw extracted: {extracted_entities}")
+        metrics_log.debug("[EntityMetrics E1.3] Raw extracted: %s", extracted_entities)
         extracted_set = self.normalize_entities(extracted_entities)
         expected_set = self.normalize_entities(expected_entities)
-        print(f"[EntityMetrics E1.3] Normalized extracted: {extracted_set}")
-        print(f"[EntityMetrics E1.3] Normalized expected: {expected_set}")
+        metrics_log.debug("[EntityMetrics E1.3] Normalized extracted: %s", extracted_set)
+        metrics_log.debug("[EntityMetrics E1.3] Normalized expected: %s", expected_set)
         
         # Build normalized ground truth (acronyms only for pairs)
         ground_truth_set = set()
@@ -6219,11 +6852,13 @@ class EntityMetrics:
     def reset_metrics(self):
         """Reset test results"""
         self.test_results = []
-        print("[EntityMetrics] Test results reset")
+        metrics_log.debug("[EntityMetrics] Test results reset")
 
 # Global instance for entity metrics
-entity_metrics = EntityMetrics()
+SUBSYSTEMS.register("entity_metrics", EntityMetrics)
+entity_metrics = SUBSYSTEMS.lazy("entity_metrics")
 
+@trace_methods  # v5.9.32: every method is a span of the request's trace
 class IntegratedEntityAgent:
     """
     Integrated Entity Agent with database connections and enhanced extraction
@@ -6233,9 +6868,9 @@ class IntegratedEntityAgent:
         seen_content = {}
         unique = []
     
-        print(f"\n{'='*80}")
-        print(f"[DEDUPLICATION] Starting with {len(results)} results")
-        print(f"{'='*80}")
+        entity_log.debug("================================================================================")
+        entity_log.debug("[DEDUPLICATION] Starting with %s results", len(results))
+        entity_log.debug("================================================================================")
     
         for i, result in enumerate(results):
             # ✅ Try multiple possible keys for content
@@ -6246,7 +6881,7 @@ class IntegratedEntityAgent:
             ).strip()
         
             if not content:
-                print(f"[Dedup] ⚠️ WARNING: Result {i+1} has no content! Keys: {list(result.keys())}")
+                entity_log.warning("[Dedup] ⚠️ WARNING: Result %s has no content! Keys: %s", i+1, list(result.keys()))
                 continue
         
             content_hash = hashlib.md5(content.encode()).hexdigest()
@@ -6254,19 +6889,19 @@ class IntegratedEntityAgent:
             if content_hash not in seen_content:
                 seen_content[content_hash] = i + 1
                 unique.append(result)
-                print(f"[Dedup] ✅ Kept result {i+1}: {content[:60]}...")
+                entity_log.debug("[Dedup] ✅ Kept result %s: %s...", i+1, content[:60])
             else:
                 orig_idx = seen_content[content_hash]
-                print(f"[Dedup] ❌ REMOVED result {i+1} (duplicate of result {orig_idx})")
+                entity_log.error("[Dedup] ❌ REMOVED result %s (duplicate of result %s)", i+1, orig_idx)
     
-        print(f"\n[DEDUPLICATION] Summary:")
-        print(f"  Original: {len(results)} results")
-        print(f"  Unique:   {len(unique)} results")
+        entity_log.debug("[DEDUPLICATION] Summary:")
+        entity_log.debug("  Original: %s results", len(results))
+        entity_log.debug("  Unique:   %s results", len(unique))
         if len(results) > 0:
-            print(f"  Removed:  {len(results) - len(unique)} duplicates ({(len(results)-len(unique))/len(results)*100:.1f}%)")
+            entity_log.debug("  Removed:  %s duplicates (%.1f%%)", len(results) - len(unique), (len(results)-len(unique))/len(results)*100)
         else:
-            print(f"  Removed:  0 duplicates (0.0%)")
-        print(f"{'='*80}\n")
+            entity_log.debug("  Removed:  0 duplicates (0.0%)")
+        entity_log.debug("================================================================================")
         
         return unique
 
@@ -6288,10 +6923,10 @@ class IntegratedEntityAgent:
         if not vector_results or not entities:
             return vector_results
         
-        print(f"\n{'='*80}")
-        print(f"[ENTITY BOOST] Starting entity-based re-ranking")
-        print(f"{'='*80}")
-        print(f"[ENTITY BOOST] Entities to match: {entities}")
+        entity_log.debug("================================================================================")
+        entity_log.debug("[ENTITY BOOST] Starting entity-based re-ranking")
+        entity_log.debug("================================================================================")
+        entity_log.debug("[ENTITY BOOST] Entities to match: %s", entities)
         
         # Extract important entities from query directly (case-insensitive)
         query_lower = query.lower()
@@ -6316,7 +6951,7 @@ class IntegratedEntityAgent:
         query_entities.extend([e.lower() for e in entities])
         query_entities = list(set(query_entities))  # Dedupe
         
-        print(f"[ENTITY BOOST] Query entities for matching: {query_entities}")
+        entity_log.debug("[ENTITY BOOST] Query entities for matching: %s", query_entities)
         
         # Score each result
         scored_results = []
@@ -6371,7 +7006,7 @@ class IntegratedEntityAgent:
             # Log matches
             status = "⭐ BOOSTED" if match_count > 0 else ""
             section = result.get('metadata', {}).get('section_id', '?')
-            print(f"[ENTITY BOOST] Result {i+1} [{section}]: {match_count} matches {entity_matches} | dist: {original_distance:.3f} → {boosted_distance:.3f} {status}")
+            entity_log.debug("[ENTITY BOOST] Result %s [%s]: %s matches %s | dist: %.3f → %.3f %s", i+1, section, match_count, entity_matches, original_distance, boosted_distance, status)
         
         # Sort by boosted distance (lower is better)
         scored_results.sort(key=lambda x: x['boosted_distance'])
@@ -6380,15 +7015,15 @@ class IntegratedEntityAgent:
         top_results = scored_results[:5]
         
         # Log final ranking
-        print(f"\n[ENTITY BOOST] Final ranking after boost:")
+        entity_log.debug("[ENTITY BOOST] Final ranking after boost:")
         for i, result in enumerate(top_results, 1):
             section = result.get('metadata', {}).get('section_id', '?')
             matches = result.get('entity_matches', [])
             orig = result.get('original_distance', 0)
             boosted = result.get('boosted_distance', 0)
-            print(f"  {i}. [{section}] matches={matches} | {orig:.3f} → {boosted:.3f}")
+            entity_log.debug("  %s. [%s] matches=%s | %.3f → %.3f", i, section, matches, orig, boosted)
         
-        print(f"{'='*80}\n")
+        entity_log.debug("================================================================================")
         
         return top_results
     
@@ -6422,7 +7057,7 @@ class IntegratedEntityAgent:
         
         # Reference to EntityMetrics GENERIC_WORDS
         self.GENERIC_WORDS = EntityMetrics.GENERIC_WORDS
-        print("[IntegratedEntityAgent] Initializing with database connections...")
+        entity_log.info("[IntegratedEntityAgent] Initializing with database connections...")
         
         self.knowledge_graph = knowledge_graph
         self.db_manager = db_manager or db_manager
@@ -7858,68 +8493,77 @@ class IntegratedEntityAgent:
             "transportation discrepancy report": "tdr",
         })
         
-        print("[IntegratedEntityAgent] Initialization complete with Chapter 1, 4, 5, 6 & 7 patterns + acronym pairing")
-        
-        # v5.9.3: 2-Hop Path RAG attributes
-        self._current_query = ""
-        self._current_intent = None
-        self._two_hop_context = None
-        print("[IntegratedEntityAgent v5.9.3] 2-Hop Path RAG attributes initialized")
+        entity_log.info("[IntegratedEntityAgent] Initialization complete with Chapter 1, 4, 5, 6 & 7 patterns + acronym pairing")
+        # v5.9.16: Per-request query/retrieval/2-hop state lives in PipelineContext, not on the agent
 
 
     @time_function
-    def extract_and_retrieve(self, query: str, intent_info: Dict, documents_context: List = None) -> Dict[str, Any]:
+    def extract_and_retrieve(self, query: str, intent_info: Dict, documents_context: List = None,
+                             pipeline_context: Optional[PipelineContext] = None,
+                             on_entities: Optional[Callable[[List[str]], None]] = None) -> Dict[str, Any]:
         """
         Main method for integrated entity extraction and database retrieval
         NOW WITH FILE CONTENT EXTRACTION AND FINANCIAL DATA
         v5.9.3: Added 2-Hop Path RAG context storage
+        v5.9.16: Per-request state goes into `pipeline_context` (created if not given)
+        v5.9.17: on_entities(entities) fires once entities are known, before retrieval
         """
-        print(f"[IntegratedEntityAgent] Processing query: '{query}' with intent: {intent_info.get('intent', 'unknown')}")
+        entity_log.debug("[IntegratedEntityAgent] Processing query: '%s' with intent: %s", query, intent_info.get('intent', 'unknown'))
         
-        # v5.9.3: Store query context for 2-hop RAG
-        self._current_query = query
-        self._current_intent = intent_info.get('intent') if intent_info else None
-        self._two_hop_context = None
+        # v5.9.16: Query context for 2-hop RAG is per request
+        if pipeline_context is None:
+            pipeline_context = new_pipeline_context(query, intent_info)
+        else:
+            pipeline_context['query'] = query
+            pipeline_context['intent'] = intent_info.get('intent') if intent_info else None
+            pipeline_context['two_hop_context'] = None
         
         # ✅ CRITICAL: ALWAYS log file status at entry point
         if documents_context:
-            print(f"[IntegratedEntityAgent] 📁 RECEIVED {len(documents_context)} FILES")
+            entity_log.debug("[IntegratedEntityAgent] 📁 RECEIVED %s FILES", len(documents_context))
             for idx, doc in enumerate(documents_context[:3], 1):
                 fname = doc.get('fileName', 'Unknown')
                 content_len = len(doc.get('content', ''))
                 has_content = len(doc.get('content', '')) > 50
-                print(f"[IntegratedEntityAgent]   File {idx}: {fname} ({content_len} chars) - {'✅ READY' if has_content else '⚠️ INSUFFICIENT'}")
+                entity_log.debug("[IntegratedEntityAgent]   File %s: %s (%s chars) - %s", idx, fname, content_len, '✅ READY' if has_content else '⚠️ INSUFFICIENT')
         else:
-            print(f"[IntegratedEntityAgent] ⚠️ WARNING: No files provided (documents_context is None/empty)")
+            entity_log.debug("[IntegratedEntityAgent] No files provided (documents_context is None/empty)")
 
         try:
             # Phase 1: Enhanced entity extraction FROM QUERY
             entities = self._extract_entities_enhanced(query, intent_info)
-            print(f"[IntegratedEntityAgent] Extracted entities from query: {entities}")
+            entity_log.debug("[IntegratedEntityAgent] Extracted entities from query: %s", entities)
             
             # === NEW: Phase 1.5 - Extract entities from CASE FILES ===
             file_entities = []
             file_relationships = []
             if documents_context:
-                print(f"[IntegratedEntityAgent] Processing {len(documents_context)} case files")
+                entity_log.debug("[IntegratedEntityAgent] Processing %s case files", len(documents_context))
                 for doc in documents_context[:3]:  # Limit to 3 files
                     content = doc.get('content', '')
                     filename = doc.get('fileName', 'Unknown')
                     if content and len(content) > 50:
-                        print(f"[IntegratedEntityAgent] Extracting from file: {filename}")
+                        entity_log.debug("[IntegratedEntityAgent] Extracting from file: %s", filename)
                         
                         # Extract entities from file content
-                        file_ents = self._extract_entities_from_text(content, filename)
+                        # v5.9.22: documents ingested at upload carry precomputed hits
+                        if doc.get('entities') is not None:
+                            file_ents = doc['entities']
+                        else:
+                            file_ents = self._extract_entities_from_text(content, filename)
                         file_entities.extend(file_ents)
                         
                         # Extract relationships from file content
-                        file_rels = self._extract_relationships_from_text(content, filename)
+                        if doc.get('relationships') is not None:
+                            file_rels = doc['relationships']
+                        else:
+                            file_rels = self._extract_relationships_from_text(content, filename)
                         file_relationships.extend(file_rels)
                 
                 # Merge file entities with query entities
                 entities.extend(file_entities)
                 entities = list(dict.fromkeys(entities))  # Remove duplicates
-                print(f"[IntegratedEntityAgent] Total entities after file extraction: {len(entities)}")
+                entity_log.debug("[IntegratedEntityAgent] Total entities after file extraction: %s", len(entities))
                 
                 # Save file knowledge for future reuse
                 if file_entities or file_relationships:
@@ -7928,6 +8572,13 @@ class IntegratedEntityAgent:
                         self._save_file_knowledge_to_dynamic(file_entities, file_relationships, filename)
             # === END NEW ===
             
+            # v5.9.17: Let dependent stages (compliance) start while retrieval runs
+            if on_entities:
+                try:
+                    on_entities(list(entities))
+                except Exception as e:
+                    entity_log.error("[IntegratedEntityAgent] on_entities callback error: %s", e)
+            
             # Phase 2: Query all data sources
             all_results = {
                 "query": query,
@@ -7954,22 +8605,22 @@ class IntegratedEntityAgent:
                     if doc.get('metadata', {}).get('hasFinancialData'):
                         records = doc['metadata'].get('financialRecords', [])
                         financial_records.extend(records)
-                        print(f"[EntityAgent] 📊 Added {len(records)} financial records from {doc.get('fileName')}")
+                        entity_log.debug("[EntityAgent] 📊 Added %s financial records from %s", len(records), doc.get('fileName'))
             
             # Add to results
             all_results["financial_records"] = financial_records
             all_results["has_financial_data"] = len(financial_records) > 0
             
-            print(f"[EntityAgent] 💰 Total financial records available: {len(financial_records)}")
+            entity_log.debug("[EntityAgent] 💰 Total financial records available: %s", len(financial_records))
             # ✅ END NEW
             
             # Query each source with error handling
             cosmos_results = self._safe_query_cosmos(query, entities)
-            vector_results = self._safe_query_vector(query)
+            vector_results = self._safe_query_vector(query, pipeline_context['data_versions'])
 
-            print(f"[IntegratedEntityAgent] Vector results before dedup: {len(vector_results)}")
+            entity_log.debug("[IntegratedEntityAgent] Vector results before dedup: %s", len(vector_results))
             vector_results = self.deduplicate_vector_results(vector_results)
-            print(f"[IntegratedEntityAgent] Vector results after dedup: {len(vector_results)}")
+            entity_log.debug("[IntegratedEntityAgent] Vector results after dedup: %s", len(vector_results))
             
             # v5.9.10: DISABLED Entity Boosting - now handled by hybrid re-ranking
             # The rerank_results() function in _safe_query_vector already does:
@@ -7978,7 +8629,7 @@ class IntegratedEntityAgent:
             # - Section depth boost
             # _boost_by_entities was overriding these improvements
             # vector_results = self._boost_by_entities(vector_results, entities, query)
-            print(f"[IntegratedEntityAgent] Vector results (entity boost DISABLED - handled by hybrid rerank): {len(vector_results)}")
+            entity_log.debug("[IntegratedEntityAgent] Vector results (entity boost DISABLED - handled by hybrid rerank): %s", len(vector_results))
 
             all_results["data_sources"] = {
                 "cosmos_gremlin": {
@@ -7995,26 +8646,26 @@ class IntegratedEntityAgent:
             }
 
             # Store results for use in entity context and text sections
-            self.last_retrieval_results = {
+            pipeline_context['retrieval_results'] = {
                 'vector_db': vector_results,
                 'cosmos': cosmos_results
             }
             
             # Phase 3: Generate enhanced context from all sources
-            self._populate_enhanced_context(all_results, entities)
+            self._populate_enhanced_context(all_results, entities, pipeline_context)
             
             # === NEW: Add file relationships to results ===
             if file_relationships:
                 all_results["relationships"].extend(file_relationships)
-                print(f"[IntegratedEntityAgent] Added {len(file_relationships)} relationships from files")
+                entity_log.debug("[IntegratedEntityAgent] Added %s relationships from files", len(file_relationships))
             # === END NEW ===
             
-            print(f"\n{'='*80}")
-            print(f"[DEBUG] VECTOR DB RESULTS ANALYSIS")
-            print(f"{'='*80}")
+            entity_log.debug("================================================================================")
+            entity_log.debug("[DEBUG] VECTOR DB RESULTS ANALYSIS")
+            entity_log.debug("================================================================================")
             if 'vector_db' in all_results["data_sources"] and all_results["data_sources"]["vector_db"]["results"]:
                 vector_results = all_results["data_sources"]["vector_db"]["results"]
-                print(f"Total Vector DB results: {len(vector_results)}\n")
+                entity_log.debug("Total Vector DB results: %s", len(vector_results))
                 for i, result in enumerate(vector_results, 1):
                     content = result.get('content', '')
                     distance = result.get('similarity', result.get('distance', None))
@@ -8023,12 +8674,11 @@ class IntegratedEntityAgent:
                     else:
                         similarity_score = 'N/A'
                     
-                    print(f"[Vector Result {i}]")
-                    print(f"  Length: {len(content)} chars")
-                    print(f"  Preview: {content[:300]}...")
-                    print(f"  Similarity: {similarity_score}")
-                    print()
-            print(f"{'='*80}\n")
+                    entity_log.debug("[Vector Result %s]", i)
+                    entity_log.debug("  Length: %s chars", len(content))
+                    entity_log.debug("  Preview: %s...", content[:300])
+                    entity_log.debug("  Similarity: %s", similarity_score)
+            entity_log.debug("================================================================================")
             
             # E1.1: Log entity extraction metrics
             if entities:
@@ -8036,21 +8686,21 @@ class IntegratedEntityAgent:
                 all_results["entity_metrics"] = metrics_result["metrics"]
                 all_results["entity_metrics_passed"] = metrics_result["passed"]
                 
-                print(f"\n[EntityMetrics E1.1] Extraction Results:")
-                print(f"  Entities extracted: {entities}")
-                print(f"  Precision: {metrics_result['metrics']['precision']:.0%} {'✅' if metrics_result['passed']['precision'] else '❌'} (Target: ≥90%)")
-                print(f"  Recall: {metrics_result['metrics']['recall']:.0%} {'✅' if metrics_result['passed']['recall'] else '❌'} (Target: ≥85%)")
-                print(f"  F1 Score: {metrics_result['metrics']['f1_score']:.0%} {'✅' if metrics_result['passed']['f1_score'] else '❌'} (Target: ≥90%)")
-                print(f"  Hallucination Rate: {metrics_result['metrics']['hallucination_rate']:.0%} {'✅' if metrics_result['passed']['hallucination_rate'] else '❌'} (Target: ≤5%)")
+                entity_log.debug("[EntityMetrics E1.1] Extraction Results:")
+                entity_log.debug("  Entities extracted: %s", entities)
+                entity_log.debug("  Precision: %s %s (Target: ≥90%%)", format(metrics_result['metrics']['precision'], ".0%"), '✅' if metrics_result['passed']['precision'] else '❌')
+                entity_log.debug("  Recall: %s %s (Target: ≥85%%)", format(metrics_result['metrics']['recall'], ".0%"), '✅' if metrics_result['passed']['recall'] else '❌')
+                entity_log.debug("  F1 Score: %s %s (Target: ≥90%%)", format(metrics_result['metrics']['f1_score'], ".0%"), '✅' if metrics_result['passed']['f1_score'] else '❌')
+                entity_log.debug("  Hallucination Rate: %s %s (Target: ≤5%%)", format(metrics_result['metrics']['hallucination_rate'], ".0%"), '✅' if metrics_result['passed']['hallucination_rate'] else '❌')
                 
                 if metrics_result['hallucinations']:
-                    print(f"  ⚠️ Hallucinated entities: {metrics_result['hallucinations']}")
+                    entity_log.warning("  ⚠️ Hallucinated entities: %s", metrics_result['hallucinations'])
             
-            print(f"[IntegratedEntityAgent] Query complete: {len(entities)} entities, multiple data sources")
+            entity_log.debug("[IntegratedEntityAgent] Query complete: %s entities, multiple data sources", len(entities))
             return all_results
             
         except Exception as e:
-            print(f"[IntegratedEntityAgent] Error processing query: {e}")
+            entity_log.error("[IntegratedEntityAgent] Error processing query: %s", e)
             return {
                 "query": query,
                 "entities": [],
@@ -8069,13 +8719,13 @@ class IntegratedEntityAgent:
     def _safe_query_cosmos(self, query: str, entities: List[str]) -> List[Dict]:
         """Safely query Cosmos Gremlin DB"""
         try:
-            print("[IntegratedEntityAgent] Querying Cosmos Gremlin...")
+            entity_log.debug("[IntegratedEntityAgent] Querying Cosmos Gremlin...")
             return self.db_manager.query_cosmos_graph(query, entities)
         except Exception as e:
-            print(f"[IntegratedEntityAgent] Cosmos Gremlin query failed: {e}")
+            entity_log.warning("[IntegratedEntityAgent] Cosmos Gremlin query failed: %s", e)
             return []
     
-    def _safe_query_vector(self, query: str) -> List[Dict]:
+    def _safe_query_vector(self, query: str, data_versions: Optional[Dict[str, str]] = None) -> List[Dict]:
         """
         Safely query Vector DB with HYBRID RE-RANKING (v5.9.11)
         
@@ -8088,45 +8738,56 @@ class IntegratedEntityAgent:
         6. Return top 8 after re-ranking
         
         This ensures correct chunks beat generic chunks even with lower embedding similarity.
+        v5.9.36: data_versions - versions when the request started (stamped on the cache entry)
         """
+        if data_versions is None:
+            data_versions = DATA_VERSIONS.capture()
         try:
-            print("[IntegratedEntityAgent] Querying Vector DB (HYBRID RERANK v5.9.11 + GOLD TRAINING)...")
+            # v5.9.13: Version-stamped retrieval cache (skips think_first + 5 vector searches)
+            retrieval_key = query.strip().lower()
+            cached_results = retrieval_cache.get(retrieval_key)
+            CACHE_LOOKUPS.labels("retrieval", "miss" if cached_results is None else "hit").inc()
+            if cached_results is not None:
+                entity_log.debug("[Retrieval Cache HIT] %s results for '%s...'", len(cached_results), query[:50])
+                return copy.deepcopy(cached_results)
+            
+            entity_log.debug("[IntegratedEntityAgent] Querying Vector DB (HYBRID RERANK v5.9.11 + GOLD TRAINING)...")
             
             all_results = []
             seen_content = set()
             
             # === v5.9.11: GOLD TRAINING PATTERN MATCHING ===
-            print(f"[GOLD TRAINING] Step 0: Checking Gold patterns...")
+            entity_log.debug("[GOLD TRAINING] Step 0: Checking Gold patterns...")
             gold_trainer = get_gold_trainer()
             gold_pattern = gold_trainer.match_query_to_pattern(query)
             gold_entity_queries = []
             
             if gold_pattern:
-                print(f"[GOLD TRAINING] ✅ Matched: {gold_pattern['id']} - {gold_pattern.get('samm_concept', '')}")
+                entity_log.debug("[GOLD TRAINING] ✅ Matched: %s - %s", gold_pattern['id'], gold_pattern.get('samm_concept', ''))
                 gold_entity_queries = gold_trainer.get_entity_queries(query)
-                print(f"[GOLD TRAINING] 📚 Entity queries: {len(gold_entity_queries)}")
+                entity_log.debug("[GOLD TRAINING] 📚 Entity queries: %s", len(gold_entity_queries))
             else:
-                print(f"[GOLD TRAINING] ❌ No pattern match, using standard flow")
+                entity_log.debug("[GOLD TRAINING] ❌ No pattern match, using standard flow")
             
             # === SMART SEARCH - LLM identifies relevant terms ===
-            print(f"[SMART SEARCH] Step 1: LLM thinking about query...")
+            entity_log.debug("[SMART SEARCH] Step 1: LLM thinking about query...")
             smart_result = think_first_v2(query)
             
             if smart_result["success"]:
                 enhanced_query = smart_result["enhanced_query"]
-                print(f"[SMART SEARCH] Enhanced query: {enhanced_query[:100]}...")
+                entity_log.debug("[SMART SEARCH] Enhanced query: %s...", enhanced_query[:100])
             else:
                 enhanced_query = query
-                print(f"[SMART SEARCH] Using original query (LLM unavailable)")
+                entity_log.debug("[SMART SEARCH] Using original query (LLM unavailable)")
             
             # v5.9.11: If Gold pattern matched, enhance query further
             if gold_pattern:
                 gold_enhanced = gold_trainer.build_enhanced_query(query)
                 enhanced_query = f"{enhanced_query} {gold_enhanced}"
-                print(f"[GOLD TRAINING] 🔍 Gold-enhanced query added")
+                entity_log.debug("[GOLD TRAINING] 🔍 Gold-enhanced query added")
             
             # === Search 1: ENHANCED semantic query (get MORE candidates for re-ranking) ===
-            print(f"[HYBRID] Search 1: Enhanced query (fetching {RERANK_CONFIG['initial_fetch_count']} candidates)")
+            entity_log.debug("[HYBRID] Search 1: Enhanced query (fetching %s candidates)", RERANK_CONFIG['initial_fetch_count'])
             semantic_results = self.db_manager.query_vector_db(
                 enhanced_query,
                 collection_name="samm_all_chapters", 
@@ -8139,7 +8800,7 @@ class IntegratedEntityAgent:
                     seen_content.add(content_hash)
                     all_results.append(r)
             
-            print(f"[HYBRID] Semantic: {len(semantic_results)} → {len(all_results)} unique")
+            entity_log.debug("[HYBRID] Semantic: %s → %s unique", len(semantic_results), len(all_results))
             
             # === Search 2: Entity-focused queries ===
             query_lower = query.lower()
@@ -8208,11 +8869,12 @@ class IntegratedEntityAgent:
             
             # Run entity-focused searches
             for eq in entity_queries[:4]:  # v5.9.10: Max 4 additional searches
-                print(f"[HYBRID] Search 2: Entity-focused '{eq[:50]}...'")
+                entity_log.debug("[HYBRID] Search 2: Entity-focused '%s...'", eq[:50])
                 entity_results = self.db_manager.query_vector_db(
                     eq,
                     collection_name="samm_all_chapters",
-                    n_results=6  # v5.9.10: Get more per entity search
+                    n_results=6,  # v5.9.10: Get more per entity search
+                    search="entity"
                 )
                 
                 added = 0
@@ -8223,9 +8885,9 @@ class IntegratedEntityAgent:
                         all_results.append(r)
                         added += 1
                 
-                print(f"[HYBRID] Entity search: {len(entity_results)} → {added} new unique")
+                entity_log.debug("[HYBRID] Entity search: %s → %s new unique", len(entity_results), added)
             
-            print(f"[HYBRID] Total candidates before re-ranking: {len(all_results)}")
+            entity_log.debug("[HYBRID] Total candidates before re-ranking: %s", len(all_results))
             
             # === v5.9.10: RE-RANK RESULTS ===
             reranked_results = rerank_results(query, all_results)
@@ -8233,11 +8895,15 @@ class IntegratedEntityAgent:
             # Return top N after re-ranking
             final_results = reranked_results[:RERANK_CONFIG['final_return_count']]
             
-            print(f"[HYBRID] Returning top {len(final_results)} after re-ranking")
+            entity_log.debug("[HYBRID] Returning top %s after re-ranking", len(final_results))
+            if final_results:
+                retrieval_cache.set(retrieval_key, copy.deepcopy(final_results),
+                                    depends_on=[f"vector:{VECTOR_DB_COLLECTION}"],
+                                    snapshot=data_versions)
             return final_results
             
         except Exception as e:
-            print(f"[IntegratedEntityAgent] Vector DB query failed: {e}")
+            entity_log.warning("[IntegratedEntityAgent] Vector DB query failed: %s", e)
             import traceback
             traceback.print_exc()
             return []
@@ -8298,7 +8964,7 @@ class IntegratedEntityAgent:
                 for contained in contained_list:
                     if contained in found_entities:
                         to_remove.add(contained)
-                        print(f"[EntityFix] Removed '{contained}' (inside '{container}')")
+                        entity_log.debug("[EntityFix] Removed '%s' (inside '%s')", contained, container)
         
         # Also: If short acronym is substring of another found entity, remove it
         for short_acr in self.STRICT_BOUNDARY_ACRONYMS:
@@ -8306,7 +8972,7 @@ class IntegratedEntityAgent:
                 for other in found_entities.keys():
                     if short_acr != other and short_acr in other:
                         to_remove.add(short_acr)
-                        print(f"[EntityFix] Removed '{short_acr}' (substring of '{other}')")
+                        entity_log.debug("[EntityFix] Removed '%s' (substring of '%s')", short_acr, other)
                         break
         
         # Build final entity list
@@ -8377,7 +9043,7 @@ class IntegratedEntityAgent:
                 if not added_cdef:
                     final_entities.append("CDEF")
                     added_cdef = True
-                    print(f"[EntityExtraction] Converted '{e}' → CDEF")
+                    entity_log.debug("[EntityExtraction] Converted '%s' → CDEF", e)
             elif e.upper() == "CDEF":
                 # Avoid duplicate CDEF if already added via delay conversion
                 if not added_cdef:
@@ -8396,7 +9062,7 @@ class IntegratedEntityAgent:
         
         # Limit to 10
         result = result[:10]
-        print(f"[EntityExtraction] Query: '{query[:50]}...' -> {result}")
+        entity_log.debug("[EntityExtraction] Query: '%s...' -> %s", query[:50], result)
         return result
     
     def _extract_entities_from_text(self, text: str, source_file: str) -> List[str]:
@@ -8431,7 +9097,7 @@ class IntegratedEntityAgent:
         entities.extend(case_numbers)
         
         entities = list(dict.fromkeys(entities))
-        print(f"[FileExtraction] Extracted {len(entities)} entities from {source_file}")
+        entity_log.debug("[FileExtraction] Extracted %s entities from %s", len(entities), source_file)
         return entities
 
     def _extract_relationships_from_text(self, text: str, source_file: str) -> List[str]:
@@ -8453,7 +9119,7 @@ class IntegratedEntityAgent:
                     relationship = f"{match[0]} {rel_type} {match[1]} (from {source_file})"
                     relationships.append(relationship)
         
-        print(f"[FileExtraction] Extracted {len(relationships)} relationships from {source_file}")
+        entity_log.debug("[FileExtraction] Extracted %s relationships from %s", len(relationships), source_file)
         return relationships
 
     def _save_file_knowledge_to_dynamic(self, entities: List[str], relationships: List[str], source_file: str):
@@ -8480,7 +9146,7 @@ class IntegratedEntityAgent:
             if rel_dict not in self.dynamic_knowledge["relationships"]:
                 self.dynamic_knowledge["relationships"].append(rel_dict)
         
-        print(f"[DynamicKnowledge] Saved {len(entities)} entities and {len(relationships)} relationships")
+        entity_log.debug("[DynamicKnowledge] Saved %s entities and %s relationships", len(entities), len(relationships))
 
 
 
@@ -8521,13 +9187,16 @@ RESPONSE: ["entity1", "entity2"]"""
             return quoted_entities[:3]
                 
         except Exception as e:
-            print(f"[IntegratedEntityAgent] NLP extraction error: {e}")
+            entity_log.error("[IntegratedEntityAgent] NLP extraction error: %s", e)
         
         return []
 
 
-    def _populate_enhanced_context(self, all_results: Dict, entities: List[str]):
+    def _populate_enhanced_context(self, all_results: Dict, entities: List[str],
+                                   pipeline_context: Optional[PipelineContext] = None):
         """Populate enhanced context from all data sources"""
+        if pipeline_context is None:
+            pipeline_context = new_pipeline_context(all_results.get("query", ""))
         context = []
         text_sections = []
         relationships = []
@@ -8541,10 +9210,10 @@ RESPONSE: ["entity1", "entity2"]"""
                 confidence_scores[entity] = entity_context.get('confidence', 0.5)
         
         # Get relevant text sections
-        text_sections = self._get_enhanced_text_sections(all_results["query"], entities)
+        text_sections = self._get_enhanced_text_sections(all_results["query"], entities, pipeline_context)
         
         # Get comprehensive relationships
-        relationships = self._get_comprehensive_relationships(entities, all_results["data_sources"])
+        relationships = self._get_comprehensive_relationships(entities, all_results["data_sources"], pipeline_context)
         
         # Calculate overall confidence
         overall_confidence = self._calculate_overall_confidence(confidence_scores)
@@ -8555,11 +9224,12 @@ RESPONSE: ["entity1", "entity2"]"""
         # v5.9.9: ENHANCED - Also extracts Tables/Figures from content text!
         # =====================================================================
         citations = {"primary": None, "references": []}
-        if hasattr(self, 'last_retrieval_results') and 'vector_db' in self.last_retrieval_results:
+        retrieval_results = pipeline_context['retrieval_results']
+        if 'vector_db' in retrieval_results:
             citation_list = []
 
             # v5.9.9: Prefer the SAME ordering used to build text_sections (entity-matched first)
-            ordered_meta = getattr(self, 'last_text_sections_meta', None)
+            ordered_meta = pipeline_context['text_sections_meta']
             if ordered_meta:
                 for item in ordered_meta[:8]:
                     section = (item or {}).get('section_number', '') or ''
@@ -8567,7 +9237,7 @@ RESPONSE: ["entity1", "entity2"]"""
                         citation_list.append(section)
             else:
                 # Fallback: original vector_db ordering
-                for result in self.last_retrieval_results['vector_db'][:5]:
+                for result in retrieval_results['vector_db'][:5]:
                     meta = result.get('metadata', {})
                     section = meta.get('section_number', '') or meta.get('section_id', '') or meta.get('section', '')
                     if section and section != 'Unknown':
@@ -8578,7 +9248,7 @@ RESPONSE: ["entity1", "entity2"]"""
             # This catches Tables/Figures that appear in chunk content but not metadata
             # =====================================================================
             import re
-            for result in self.last_retrieval_results['vector_db'][:8]:
+            for result in retrieval_results['vector_db'][:8]:
                 content = result.get('content', '') or ''
                 if content:
                     # Extract Table references (e.g., Table C5.T1, Table C5.T3a)
@@ -8588,7 +9258,7 @@ RESPONSE: ["entity1", "entity2"]"""
                         table_normalized = re.sub(r'^[Tt]able', 'Table', table)
                         if table_normalized not in citation_list:
                             citation_list.append(table_normalized)
-                            print(f"[CitationExtract v5.9.9] Found Table in content: {table_normalized}")
+                            entity_log.debug("[CitationExtract v5.9.9] Found Table in content: %s", table_normalized)
                     
                     # Extract Figure references (e.g., Figure C5.F14, Figure C5.F6)
                     figures_found = re.findall(r'[Ff]igure\s+C\d+\.F\d+[A-Za-z]?', content)
@@ -8597,7 +9267,7 @@ RESPONSE: ["entity1", "entity2"]"""
                         figure_normalized = re.sub(r'^[Ff]igure', 'Figure', figure)
                         if figure_normalized not in citation_list:
                             citation_list.append(figure_normalized)
-                            print(f"[CitationExtract v5.9.9] Found Figure in content: {figure_normalized}")
+                            entity_log.debug("[CitationExtract v5.9.9] Found Figure in content: %s", figure_normalized)
             # =====================================================================
             
             # Remove duplicates while preserving order
@@ -8606,7 +9276,7 @@ RESPONSE: ["entity1", "entity2"]"""
             if unique_citations:
                 citations["primary"] = unique_citations[0]
                 citations["references"] = unique_citations[1:4] if len(unique_citations) > 1 else []
-                print(f"[CitationExtract] PRIMARY: {citations['primary']}, REFERENCES: {citations['references']}")
+                entity_log.debug("[CitationExtract] PRIMARY: %s, REFERENCES: %s", citations['primary'], citations['references'])
         # =====================================================================
         
         # Populate results
@@ -8654,7 +9324,7 @@ RESPONSE: ["entity1", "entity2"]"""
                         "source": "knowledge_graph",
                         "properties": kg_entity['properties']
                     }
-                    print(f"[IntegratedEntityAgent] Knowledge graph context for: {entity_label} (conf: {conf_result['confidence']:.0%})")
+                    entity_log.debug("[IntegratedEntityAgent] Knowledge graph context for: %s (conf: %s)", entity_label, format(conf_result['confidence'], ".0%"))
                     break
         
         # Check dynamic knowledge if not found
@@ -8679,7 +9349,7 @@ RESPONSE: ["entity1", "entity2"]"""
                 "source": "dynamic_knowledge",
                 "added_date": entity_data.get('added_date', '')
             }
-            print(f"[IntegratedEntityAgent] Dynamic knowledge context for: {entity} (conf: {conf_result['confidence']:.0%})")
+            entity_log.debug("[IntegratedEntityAgent] Dynamic knowledge context for: %s (conf: %s)", entity, format(conf_result['confidence'], ".0%"))
         
         # Generate context using AI if not found
         if not context_info:
@@ -8753,13 +9423,13 @@ Provide SAMM context for this entity:"""
                 context_data["source"] = "ai_generated"
                 context_data["entity"] = entity
                 
-                print(f"[IntegratedEntityAgent] AI generated context for: {entity}")
+                entity_log.debug("[IntegratedEntityAgent] AI generated context for: %s", entity)
                 return context_data
                 
         except json.JSONDecodeError as e:
-            print(f"[IntegratedEntityAgent] JSON parsing error in AI context generation: {e}")
+            entity_log.error("[IntegratedEntityAgent] JSON parsing error in AI context generation: %s", e)
         except Exception as e:
-            print(f"[IntegratedEntityAgent] AI context generation error: {e}")
+            entity_log.error("[IntegratedEntityAgent] AI context generation error: %s", e)
         
         # Fallback context
         return {
@@ -8771,28 +9441,33 @@ Provide SAMM context for this entity:"""
             "source": "fallback"
         }
     
-    def _get_enhanced_text_sections(self, query: str, entities: List[str]) -> List[str]:
+    def _get_enhanced_text_sections(self, query: str, entities: List[str],
+                                    pipeline_context: Optional[PipelineContext] = None) -> List[str]:
         """Get relevant SAMM text sections from VECTOR DB RESULTS with entity prioritization.
 
         v5.9.9: CITATION ANCHORING
         - Prefix each returned chunk with its SAMM section anchor (e.g., [C5.4.2.1])
         - Store the ordered metadata for downstream citation selection
+        v5.9.16: Reads/writes the per-request PipelineContext
         """
         text_sections: List[str] = []
+        if pipeline_context is None:
+            pipeline_context = new_pipeline_context(query)
 
         # v5.9.9: keep the ordered metadata used to build the text sections
-        self.last_text_sections_meta: List[Dict[str, Any]] = []
+        text_sections_meta: List[Dict[str, Any]] = []
+        pipeline_context['text_sections_meta'] = text_sections_meta
 
         # Check if we have vector DB results stored
-        if not hasattr(self, 'last_retrieval_results'):
-            print("[IntegratedEntityAgent] No retrieval results available")
+        if not pipeline_context['retrieval_results']:
+            entity_log.debug("[IntegratedEntityAgent] No retrieval results available")
             return text_sections
 
-        results = self.last_retrieval_results
+        results = pipeline_context['retrieval_results']
 
         # Extract text from Vector DB results with ENTITY PRIORITIZATION
         if 'vector_db' in results and results['vector_db'] is not None:
-            print(f"[IntegratedEntityAgent] Processing {len(results['vector_db'])} vector DB results")
+            entity_log.debug("[IntegratedEntityAgent] Processing %s vector DB results", len(results['vector_db']))
 
             # Separate results: those containing entities first, then others
             entity_matched_results = []
@@ -8809,19 +9484,19 @@ Provide SAMM context for this entity:"""
                     for entity in entities:
                         if entity and entity.lower() in content.lower():
                             contains_entity = True
-                            print(f"[DEBUG] Found entity '{entity}' in result {i}")
+                            entity_log.debug("[DEBUG] Found entity '%s' in result %s", entity, i)
                             break
 
                     item = (i, content, meta, section)
 
                     if contains_entity:
                         entity_matched_results.append(item)
-                        print(f"[DEBUG] Vector DB result {i}: ✅ ENTITY MATCH - {content[:100]}...")
+                        entity_log.debug("[DEBUG] Vector DB result %s: ✅ ENTITY MATCH - %s...", i, content[:100])
                     else:
                         other_results.append(item)
-                        print(f"[DEBUG] Vector DB result {i}: ⚪ No entity match - {content[:100]}...")
+                        entity_log.debug("[DEBUG] Vector DB result %s: ⚪ No entity match - %s...", i, content[:100])
 
-            print(f"[IntegratedEntityAgent] 🎯 Entity-matched results: {len(entity_matched_results)}, Other: {len(other_results)}")
+            entity_log.debug("[IntegratedEntityAgent] 🎯 Entity-matched results: %s, Other: %s", len(entity_matched_results), len(other_results))
 
             def _anchor_text(raw: str, sec: str) -> str:
                 sec_clean = (sec or '').strip()
@@ -8832,7 +9507,7 @@ Provide SAMM context for this entity:"""
             # Add entity-matched results first (preserve order)
             for idx, content, meta, section in entity_matched_results:
                 text_sections.append(_anchor_text(content, section))
-                self.last_text_sections_meta.append({
+                text_sections_meta.append({
                     "rank": idx,
                     "section_number": section or meta.get("section_number") or meta.get("section_id") or "",
                     "metadata": meta
@@ -8841,7 +9516,7 @@ Provide SAMM context for this entity:"""
             # Then add other results
             for idx, content, meta, section in other_results:
                 text_sections.append(_anchor_text(content, section))
-                self.last_text_sections_meta.append({
+                text_sections_meta.append({
                     "rank": idx,
                     "section_number": section or meta.get("section_number") or meta.get("section_id") or "",
                     "metadata": meta
@@ -8850,8 +9525,11 @@ Provide SAMM context for this entity:"""
         return text_sections
 
 
-    def _get_comprehensive_relationships(self, entities: List[str], data_sources: Dict) -> List[str]:
+    def _get_comprehensive_relationships(self, entities: List[str], data_sources: Dict,
+                                         pipeline_context: Optional[PipelineContext] = None) -> List[str]:
         """Get comprehensive relationships from all sources"""
+        if pipeline_context is None:
+            pipeline_context = new_pipeline_context()
         relationships = []
         
         # Get relationships from knowledge graph
@@ -8873,7 +9551,7 @@ Provide SAMM context for this entity:"""
                         for rel in entity_rels:
                             rel_text = f"{rel['source']} {rel['relationship']} {rel['target']}"
                             relationships.append(rel_text)
-                            print(f"[IntegratedEntityAgent] Knowledge graph relationship: {rel_text}")
+                            entity_log.debug("[IntegratedEntityAgent] Knowledge graph relationship: %s", rel_text)
         
         # Add predefined relationships
         for entity in entities:
@@ -8881,7 +9559,7 @@ Provide SAMM context for this entity:"""
                 for relationship in self.entity_relationships[entity]:
                     rel_text = f"{entity} {relationship}"
                     relationships.append(rel_text)
-                    print(f"[IntegratedEntityAgent] Predefined relationship: {rel_text}")
+                    entity_log.debug("[IntegratedEntityAgent] Predefined relationship: %s", rel_text)
         
         # Add dynamic relationships from triggers
         for rel in self.dynamic_knowledge["relationships"]:
@@ -8893,7 +9571,7 @@ Provide SAMM context for this entity:"""
                    for entity in entities):
                 rel_text = f"{source} {relationship} {target}"
                 relationships.append(rel_text)
-                print(f"[IntegratedEntityAgent] Dynamic relationship: {rel_text}")
+                entity_log.debug("[IntegratedEntityAgent] Dynamic relationship: %s", rel_text)
         
 
 
@@ -8911,32 +9589,45 @@ Provide SAMM context for this entity:"""
             
                     rel_text = f"{from_name} {label} {to_name}"
                     relationships.append(rel_text)
-                    print(f"[IntegratedEntityAgent] Cosmos DB relationship: {rel_text}")
+                    entity_log.debug("[IntegratedEntityAgent] Cosmos DB relationship: %s", rel_text)
         
         # =====================================================================
         # v5.9.3: 2-HOP PATH RAG - Find relationship chains
         # =====================================================================
         if TWO_HOP_PATH_FINDER:
             try:
-                # Get current query from instance
-                current_query = getattr(self, '_current_query', '')
-                current_intent = getattr(self, '_current_intent', None)
+                # v5.9.16: Current query/intent from the per-request context
+                current_query = pipeline_context['query'] or ''
+                current_intent = pipeline_context['intent']
                 
-                two_hop_context = TWO_HOP_PATH_FINDER.get_context_for_query(
-                    entities=entities,
-                    query=current_query,
-                    intent=current_intent
-                )
+                # v5.9.13: Version-stamped path-finder cache (KG file + entity terms)
+                # v5.9.36: Intent is in the key (paths are flagged relevant_to_intent) and
+                # HITL corrections to the query's intent/training invalidate the entry
+                path_key = (f"{current_query.strip().lower()}|{current_intent or ''}|"
+                            f"{'|'.join(sorted(e.lower() for e in entities))}")
+                two_hop_context = path_finder_cache.get(path_key)
+                CACHE_LOOKUPS.labels("path_finder", "miss" if two_hop_context is None else "hit").inc()
+                if two_hop_context is None:
+                    two_hop_context = TWO_HOP_PATH_FINDER.get_context_for_query(
+                        entities=entities,
+                        query=current_query,
+                        intent=current_intent
+                    )
+                    path_finder_cache.set(path_key, two_hop_context,
+                                          depends_on=kg_version_components(entities)
+                                          + training_version_components(current_query),
+                                          snapshot=pipeline_context['data_versions'])
+                two_hop_context = copy.deepcopy(two_hop_context)
                 
                 # Store for later use in prompt building
-                self._two_hop_context = two_hop_context
+                pipeline_context['two_hop_context'] = two_hop_context
                 
                 # Add 2-hop paths to relationships
                 for path in two_hop_context.get('paths', [])[:5]:
                     rel_text = f"[2-HOP PATH] {path['path_text']}"
                     if rel_text not in relationships:
                         relationships.append(rel_text)
-                        print(f"[v5.9.3] Added 2-hop: {path['path_text'][:60]}...")
+                        entity_log.debug("[v5.9.3] Added 2-hop: %s...", path['path_text'][:60])
                 
                 # Add authority chains (critical for "who supervises" questions)
                 for entity, chain in two_hop_context.get('authority_chains', {}).items():
@@ -8946,13 +9637,13 @@ Provide SAMM context for this entity:"""
                             chain_text += f" → {edge['to'].upper()} ({edge['type']})"
                         if chain_text not in relationships:
                             relationships.append(chain_text)
-                            print(f"[v5.9.3] Authority chain: {chain_text}")
+                            entity_log.debug("[v5.9.3] Authority chain: %s", chain_text)
                 
-                print(f"[v5.9.3] 2-Hop RAG found {two_hop_context['relationship_count']} paths")
+                entity_log.debug("[v5.9.3] 2-Hop RAG found %s paths", two_hop_context['relationship_count'])
                 
             except Exception as e:
-                print(f"[v5.9.3] 2-Hop RAG error: {e}")
-                self._two_hop_context = None
+                entity_log.error("[v5.9.3] 2-Hop RAG error: %s", e)
+                pipeline_context['two_hop_context'] = None
         # =====================================================================
         # END v5.9.3
         # =====================================================================
@@ -8960,7 +9651,7 @@ Provide SAMM context for this entity:"""
         # Remove duplicates
         relationships = list(dict.fromkeys(relationships))
         
-        print(f"[IntegratedEntityAgent] Total relationships found: {len(relationships)}")
+        entity_log.debug("[IntegratedEntityAgent] Total relationships found: %s", len(relationships))
         return relationships
     
     def _calculate_overall_confidence(self, confidence_scores: Dict[str, float]) -> float:
@@ -9010,8 +9701,8 @@ Provide SAMM context for this entity:"""
                     self.custom_entities[entity]["definition"] = corrected_context
                     self.dynamic_knowledge["entities"][entity]["definition"] = corrected_context
         
-        print(f"[IntegratedEntityAgent HIL] Updated with {len(corrected_entities)} entities from feedback for query: '{query[:50]}...'")
-        print(f"[IntegratedEntityAgent HIL] Total custom entities: {len(self.custom_entities)}")
+        entity_log.debug("[IntegratedEntityAgent HIL] Updated with %s entities from feedback for query: '%s...'", len(corrected_entities), query[:50])
+        entity_log.debug("[IntegratedEntityAgent HIL] Total custom entities: %s", len(self.custom_entities))
         return True
     
     def update_from_trigger(self, new_entities: List[str], new_relationships: List[Dict], 
@@ -9049,11 +9740,12 @@ Provide SAMM context for this entity:"""
                     "trigger_id": len(self.trigger_updates)
                 })
         
-        print(f"[IntegratedEntityAgent Trigger] Updated with {len(new_entities)} new entities and {len(new_relationships)} relationships")
-        print(f"[IntegratedEntityAgent Trigger] Total dynamic entities: {len(self.dynamic_knowledge['entities'])}")
+        entity_log.debug("[IntegratedEntityAgent Trigger] Updated with %s new entities and %s relationships", len(new_entities), len(new_relationships))
+        entity_log.debug("[IntegratedEntityAgent Trigger] Total dynamic entities: %s", len(self.dynamic_knowledge['entities']))
         return True
 
 
+@trace_methods  # v5.9.32: every method is a span of the request's trace
 class EnhancedAnswerAgent:
     """
     Enhanced Answer Agent for SAMM with sophisticated response generation
@@ -9071,7 +9763,7 @@ class EnhancedAnswerAgent:
     
     def __init__(self):
         """Initialize the Enhanced Answer Agent with improved error handling"""
-        print("[EnhancedAnswerAgent] Initializing...")
+        answer_log.info("[EnhancedAnswerAgent] Initializing...")
         
         # Learning and feedback systems
         self.hil_feedback_data = []        # Human-in-the-loop feedback storage
@@ -9862,61 +10554,66 @@ class EnhancedAnswerAgent:
             "explanation": {"min": 150, "target": 350, "max": 550},   # Medium for explanations
         }
         
-        print("[EnhancedAnswerAgent] Initialization complete")
+        answer_log.info("[EnhancedAnswerAgent] Initialization complete")
 
     @time_function
     def generate_answer(self, query: str, intent_info: Dict, entity_info: Dict, 
                     chat_history: List = None, documents_context: List = None,
-                    user_profile: Dict = None) -> str:
+                    user_profile: Dict = None,
+                    compliance_check: Optional[Callable[[], Dict[str, Any]]] = None) -> str:
         """
         Main method for enhanced answer generation with ITAR compliance filtering
+        v5.9.17: compliance_check() returns an already-started compliance result
         """
         # CRITICAL: ALWAYS log file status at entry point
         if documents_context:
-            print(f"[AnswerAgent] 📁 RECEIVED {len(documents_context)} FILES for answer generation")
+            answer_log.debug("[AnswerAgent] 📁 RECEIVED %s FILES for answer generation", len(documents_context))
             for idx, doc in enumerate(documents_context[:3], 1):
                 fname = doc.get('fileName', 'Unknown')
                 content_len = len(doc.get('content', ''))
                 has_content = len(doc.get('content', '')) > 50
-                print(f"[AnswerAgent]   File {idx}: {fname} ({content_len} chars) - {'✅ READY' if has_content else '⚠️ INSUFFICIENT'}")
+                answer_log.debug("[AnswerAgent]   File %s: %s (%s chars) - %s", idx, fname, content_len, '✅ READY' if has_content else '⚠️ INSUFFICIENT')
         else:
-            print(f"[AnswerAgent] ⚠️ WARNING: No files provided for answer generation")
+            answer_log.debug("[AnswerAgent] No files provided for answer generation")
         
         # NEW: Handle LOA timeline queries with instant pre-formatted answer
         if intent_info.get("intent") == "loa_timeline":
-            print(f"[AnswerAgent] 🚀 Using LOA timeline pre-formatted answer")
+            answer_log.debug("[AnswerAgent] 🚀 Using LOA timeline pre-formatted answer")
             return self._get_loa_timeline_answer()
         
         # NEW: Handle financial verification queries
         if intent_info.get("intent") == "financial_verification":
-            print(f"[AnswerAgent] 🚀 Using financial verification pre-formatted answer")
+            answer_log.debug("[AnswerAgent] 🚀 Using financial verification pre-formatted answer")
             return self._get_financial_verification_answer()
         
         # NEW: Handle technical services queries
         if intent_info.get("intent") == "line_item_details":
-            print(f"[AnswerAgent] 🚀 Using technical services pre-formatted answer")
+            answer_log.debug("[AnswerAgent] 🚀 Using technical services pre-formatted answer")
             return self._get_technical_services_answer()
         
         # NEW: Handle PMR minutes summary queries
         if intent_info.get("intent") == "pmr_minutes_summary":
-            print(f"[AnswerAgent] 🚀 Using PMR minutes summary pre-formatted answer")
+            answer_log.debug("[AnswerAgent] 🚀 Using PMR minutes summary pre-formatted answer")
             return self._get_pmr_minutes_summary()
                 
         intent = intent_info.get("intent", "general")
         confidence = intent_info.get("confidence", 0.5)
         
-        print(f"[AnswerAgent] Generating answer for intent: {intent} (confidence: {confidence:.2f})")
-        print(f"[AnswerAgent] Query: {query[:100]}...")
+        answer_log.debug("[AnswerAgent] Generating answer for intent: %s (confidence: %.2f)", intent, confidence)
+        answer_log.debug("[AnswerAgent] Query: %s...", query[:100])
 
         try:
             # === ITAR COMPLIANCE CHECK ===
-            compliance_result = check_compliance(query, intent_info, entity_info, user_profile)
+            if compliance_check is not None:
+                compliance_result = compliance_check()
+            else:
+                compliance_result = check_compliance(query, intent_info, entity_info, user_profile)
             
             # Log compliance check
             if compliance_result.get("check_performed"):
-                print(f"[Compliance] Check performed: {compliance_result.get('compliance_status')}")
-                print(f"[Compliance] User level: {compliance_result.get('user_authorization_level')}")
-                print(f"[Compliance] Authorized: {compliance_result.get('authorized')}")
+                answer_log.debug("[Compliance] Check performed: %s", compliance_result.get('compliance_status'))
+                answer_log.debug("[Compliance] User level: %s", compliance_result.get('user_authorization_level'))
+                answer_log.debug("[Compliance] Authorized: %s", compliance_result.get('authorized'))
             
             # Handle unauthorized access
             if not compliance_result.get("authorized", True):
@@ -9934,18 +10631,18 @@ class EnhancedAnswerAgent:
                 if recommendations:
                     response += "**Recommendations:**\n" + "\n".join(f"• {r}" for r in recommendations)
                 
-                print(f"[Compliance] Access denied: {user_level} < {required_level}")
+                answer_log.debug("[Compliance] Access denied: %s < %s", user_level, required_level)
                 return response
             
             # Log successful compliance check
             if compliance_result.get("check_performed"):
-                print(f"[Compliance] Query authorized - proceeding with answer generation")
+                answer_log.debug("[Compliance] Query authorized - proceeding with answer generation")
             # === END ITAR COMPLIANCE CHECK ===
             
             # Step 1: Check for existing corrections first
             cached_answer = self._check_for_corrections(query, intent_info, entity_info)
             if cached_answer:
-                print("[AnswerAgent] Using cached correction")
+                answer_log.debug("[AnswerAgent] Using cached correction")
                 return cached_answer
             
             # Step 2: Build comprehensive context from all sources
@@ -9969,15 +10666,15 @@ class EnhancedAnswerAgent:
             final_answer = self._validate_and_score_answer(enhanced_answer, intent, query)
             
             # ADD: Final answer verification
-            print(f"[AnswerAgent] ✅ FINAL ANSWER GENERATED:")
-            print(f"[AnswerAgent]   Length: {len(final_answer)} chars")
-            print(f"[AnswerAgent]   Preview: {final_answer[:200]}...")
-            print(f"[AnswerAgent]   Has content: {bool(final_answer and len(final_answer) > 20)}")
+            answer_log.debug("[AnswerAgent] ✅ FINAL ANSWER GENERATED:")
+            answer_log.debug("[AnswerAgent]   Length: %s chars", len(final_answer))
+            answer_log.debug("[AnswerAgent]   Preview: %s...", final_answer[:200])
+            answer_log.debug("[AnswerAgent]   Has content: %s", bool(final_answer and len(final_answer) > 20))
             
             return final_answer
             
         except Exception as e:
-            print(f"[AnswerAgent] Error during answer generation: {e}")
+            answer_log.error("[AnswerAgent] Error during answer generation: %s", e)
             import traceback
             traceback.print_exc()
             return f"I apologize, but I encountered an error while generating the answer: {str(e)}. Please try rephrasing your question or check if the Ollama service is running."
@@ -9993,7 +10690,7 @@ class EnhancedAnswerAgent:
             # Check exact matches first
             if query_key in self.answer_corrections:
                 correction = self.answer_corrections[query_key]
-                print(f"[AnswerAgent] Found exact correction match")
+                answer_log.debug("[AnswerAgent] Found exact correction match")
                 return correction["corrected_answer"]
             
             # Check for partial matches based on intent and entities
@@ -10007,13 +10704,13 @@ class EnhancedAnswerAgent:
                 # If same intent and significant entity overlap (50% or more)
                 if (current_intent == stored_intent and len(current_entities) > 0 and
                     len(current_entities.intersection(stored_entities)) >= min(len(current_entities), len(stored_entities)) * 0.5):
-                    print(f"[AnswerAgent] Found partial correction match based on intent/entities")
+                    answer_log.debug("[AnswerAgent] Found partial correction match based on intent/entities")
                     return correction["corrected_answer"]
             
             return None
             
         except Exception as e:
-            print(f"[AnswerAgent] Error checking corrections: {e}")
+            answer_log.error("[AnswerAgent] Error checking corrections: %s", e)
             return None
 
 
@@ -10059,7 +10756,7 @@ class EnhancedAnswerAgent:
                     if len(corrected_answer) > 50:
                         truncated = corrected_answer[:500] + "..." if len(corrected_answer) > 500 else corrected_answer  # v5.4: Reduced from 1500 to 500
                         context_parts.append(f"Q: {original_query[:100]}\nCorrect Answer: {truncated}\n")
-                        print(f"[AnswerAgent] Added HIL correction to context")
+                        answer_log.debug("[AnswerAgent] Added HIL correction to context")
 
             # === NEW: Add case file relationships ===
             if entity_info.get("file_relationships_found", 0) > 0:
@@ -10067,7 +10764,7 @@ class EnhancedAnswerAgent:
                 file_rels = [rel for rel in entity_info.get("relationships", []) if "from" in rel]
                 for rel in file_rels[:5]:
                     context_parts.append(f"• {rel}")
-                print(f"[AnswerAgent] Added {len(file_rels[:5])} file relationships to context")
+                answer_log.debug("[AnswerAgent] Added %s file relationships to context", len(file_rels[:5]))
 
             # ✅ ENHANCED: Add uploaded documents WITH financial data extraction
             if documents_context:
@@ -10126,8 +10823,8 @@ class EnhancedAnswerAgent:
                     unique_rsns = set(r.get('rsn_identifier') for r in financial_records if r.get('rsn_identifier'))
                     context_parts.append(f"RSN line numbers: {', '.join(sorted(unique_rsns))}")
                 
-                print(f"[AnswerAgent] ✅ Added {len(documents_context[:3])} documents to context")
-                print(f"[AnswerAgent] 💰 Included {len(financial_records)} financial records")
+                answer_log.debug("[AnswerAgent] ✅ Added %s documents to context", len(documents_context[:3]))
+                answer_log.debug("[AnswerAgent] 💰 Included %s financial records", len(financial_records))
             # ✅ END ENHANCEMENT
             
             # Add custom knowledge from HIL feedback and triggers
@@ -10147,7 +10844,7 @@ class EnhancedAnswerAgent:
             return "\n".join(context_parts)
             
         except Exception as e:
-            print(f"[AnswerAgent] Error building context: {e}")
+            answer_log.error("[AnswerAgent] Error building context: %s", e)
             return "Context building failed - proceeding with basic knowledge."
 
 
@@ -10164,7 +10861,7 @@ class EnhancedAnswerAgent:
                 citations = entity_info["citations"]
                 primary_citation = citations.get("primary")
                 reference_citations = citations.get("references", [])
-                print(f"[AnswerAgent] 📚 Citations available - Primary: {primary_citation}, References: {reference_citations}")
+                answer_log.debug("[AnswerAgent] 📚 Citations available - Primary: %s, References: %s", primary_citation, reference_citations)
             # =====================================================================
             
             # Base instructions for each intent type - COMPREHENSIVE for ALL intents
@@ -10355,7 +11052,7 @@ FORMAT: Answer → Context → Citation"""
                 gold_guidance = gold_answer_guidance(query)
                 if gold_guidance:
                     gold_matched = True
-                    print(f"[AnswerAgent] 🎯 Gold pattern matched: {gold_guidance.get('pattern_id')}")
+                    answer_log.debug("[AnswerAgent] 🎯 Gold pattern matched: %s", gold_guidance.get('pattern_id'))
             
             # v5.9.11: ULTRA SHORT when Gold matches
             if gold_matched and gold_guidance:
@@ -10388,7 +11085,7 @@ CONTEXT:
             return system_msg
             
         except Exception as e:
-            print(f"[AnswerAgent] Error creating system message: {e}")
+            answer_log.error("[AnswerAgent] Error creating system message: %s", e)
             return "You are a SAMM expert. Provide accurate information about Security Cooperation and Security Assistance."
     
     def _create_enhanced_prompt(self, query: str, intent_info: Dict, entity_info: Dict) -> str:
@@ -10406,10 +11103,10 @@ CONTEXT:
                 simple_prompt = f"Question: {query}"
                 if entities:
                     simple_prompt += f"\nEntities: {', '.join(entities[:2])}"
-                print(f"[AnswerAgent] 🎯 Gold prompt - skipping relationships")
+                answer_log.debug("[AnswerAgent] 🎯 Gold prompt - skipping relationships")
                 return simple_prompt
            
-            print(f"[AnswerAgent DEBUG] Relationships found: {relationships}") 
+            answer_log.debug("[AnswerAgent DEBUG] Relationships found: %s", relationships) 
             
             prompt_parts = []
             
@@ -10458,7 +11155,7 @@ CONTEXT:
                     # Combine with priority first
                     ordered_rels = priority_rels + other_rels
                     rel_limit = 10  # More for authority
-                    print(f"[AnswerAgent] Authority Q: {len(priority_rels)} priority, {len(other_rels)} other relationships")
+                    answer_log.debug("[AnswerAgent] Authority Q: %s priority, %s other relationships", len(priority_rels), len(other_rels))
                 else:
                     ordered_rels = relationships
                     rel_limit = 5
@@ -10549,7 +11246,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             return "\n".join(prompt_parts)
             
         except Exception as e:
-            print(f"[AnswerAgent] Error creating prompt: {e}")
+            answer_log.error("[AnswerAgent] Error creating prompt: %s", e)
             return f"Question: {query}\nProvide a comprehensive answer based on SAMM."
 
 
@@ -10559,7 +11256,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
         intent = intent_info.get("intent", "general")
         
         try:
-            print("[AnswerAgent] First generation pass...")
+            answer_log.debug("[AnswerAgent] First generation pass...")
             initial_answer = call_ollama_enhanced(prompt, system_msg, temperature=0.1)
             
             # ================================
@@ -10567,7 +11264,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             # ================================
             if intent == "LOR_SUBMISSION_REQUIREMENTS":
                 if not meets_lor_gold_standard(initial_answer):
-                    print("⚠️ [AnswerAgent] LOR gold standard not met, regenerating...")
+                    answer_log.warning("⚠️ [AnswerAgent] LOR gold standard not met, regenerating...")
 
                     system_msg += """
             IMPORTANT:
@@ -10601,11 +11298,11 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             validation_results = self._validate_answer_quality(initial_answer, intent)
             
             if validation_results["needs_improvement"] and len(validation_results["issues"]) < 10:
-                print(f"[AnswerAgent] Answer needs improvement: {validation_results['issues']}")
+                answer_log.debug("[AnswerAgent] Answer needs improvement: %s", validation_results['issues'])
                 
                 improvement_prompt = f"{prompt}\n\nIMPROVEMENT NEEDED: {', '.join(validation_results['issues'])}\n\nPlease provide a better response addressing these issues."
                 
-                print("[AnswerAgent] Second generation pass with improvements...")
+                answer_log.debug("[AnswerAgent] Second generation pass with improvements...")
                 improved_answer = call_ollama_enhanced(improvement_prompt, system_msg, temperature=0.2)
                 
                 if (len(improved_answer) > len(initial_answer) * 1.1 and 
@@ -10617,7 +11314,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             return initial_answer
             
         except Exception as e:
-            print(f"[AnswerAgent] Error during generation with validation: {e}")
+            answer_log.error("[AnswerAgent] Error during generation with validation: %s", e)
             return _get_intelligent_fallback()
 
 
@@ -10670,7 +11367,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             }
             
         except Exception as e:
-            print(f"[AnswerAgent] Error validating answer quality: {e}")
+            answer_log.error("[AnswerAgent] Error validating answer quality: %s", e)
             return {"needs_improvement": False, "issues": [], "length": len(answer)}
     
     def _enhance_answer_quality(self, answer: str, intent_info: Dict, entity_info: Dict) -> str:
@@ -10695,7 +11392,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
                     if primary_citation not in enhanced_answer:
                         # Append primary citation
                         enhanced_answer += f"\n\n**Primary Citation:** SAMM {primary_citation}"
-                        print(f"[CitationValidation] Added missing primary citation: {primary_citation}")
+                        answer_log.debug("[CitationValidation] Added missing primary citation: %s", primary_citation)
                     
                     # Check for references
                     refs_in_answer = [ref for ref in references if ref in enhanced_answer]
@@ -10704,7 +11401,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
                     if refs_missing and len(refs_in_answer) == 0:
                         # Add reference citations if none are present
                         enhanced_answer += f"\n**References:** {', '.join(references[:2])}"
-                        print(f"[CitationValidation] Added reference citations: {references[:2]}")
+                        answer_log.debug("[CitationValidation] Added reference citations: %s", references[:2])
             # =====================================================================
 
             # Step 1: Add section reference if missing (prefer extracted citations / anchored context)
@@ -10731,7 +11428,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
                 if sections:
                     top_sections = sections[:3]
                     enhanced_answer += f"\n\nSAMM Section Citations: {', '.join(top_sections)}"
-                    print("[CITE DBG]", {"picked_sections": top_sections, "from": "entity_info.citations/anchors"})
+                    answer_log.debug("[CITE DBG] %s", {"picked_sections": top_sections, "from": "entity_info.citations/anchors"})
 # Step 2: Expand acronyms that appear without expansion (limit to prevent overprocessing)
             acronyms_found = re.findall(self.quality_patterns["acronym_detection"], enhanced_answer)
             
@@ -10764,7 +11461,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             return enhanced_answer
             
         except Exception as e:
-            print(f"[AnswerAgent] Error enhancing answer quality: {e}")
+            answer_log.error("[AnswerAgent] Error enhancing answer quality: %s", e)
             return answer  # Return original if enhancement fails
     
     def _validate_and_score_answer(self, answer: str, intent: str, query: str) -> str:
@@ -10778,27 +11475,27 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             score = self._calculate_quality_score(answer, intent)
             
             # Log quality metrics
-            print(f"[AnswerAgent] Answer quality score: {score:.2f}/1.0")
+            answer_log.debug("[AnswerAgent] Answer quality score: %.2f/1.0", score)
             
             # v5.9.11: Gold Standard validation
             gold_validation = validate_against_gold(answer, query)
             if gold_validation.get("pattern_id"):
-                print(f"[GoldValidation] 🎯 Pattern: {gold_validation['pattern_id']}")
-                print(f"[GoldValidation] 📊 Score: {gold_validation['score']}")
+                answer_log.debug("[GoldValidation] 🎯 Pattern: %s", gold_validation['pattern_id'])
+                answer_log.debug("[GoldValidation] 📊 Score: %s", gold_validation['score'])
                 if gold_validation.get("missing"):
-                    print(f"[GoldValidation] ⚠️ Missing items: {gold_validation['missing'][:5]}")
+                    answer_log.warning("[GoldValidation] ⚠️ Missing items: %s", gold_validation['missing'][:5])
                 if gold_validation.get("mentioned"):
-                    print(f"[GoldValidation] ✅ Mentioned: {len(gold_validation['mentioned'])} items")
+                    answer_log.debug("[GoldValidation] ✅ Mentioned: %s items", len(gold_validation['mentioned']))
             
             # If score is too low, add disclaimer
             if score < 0.6:
-                print(f"[AnswerAgent] Low quality score, adding disclaimer")
+                answer_log.debug("[AnswerAgent] Low quality score, adding disclaimer")
                 answer += "\n\nNote: For complete and authoritative information, please refer to the full SAMM documentation."
             
             return answer
             
         except Exception as e:
-            print(f"[AnswerAgent] Error in final validation: {e}")
+            answer_log.error("[AnswerAgent] Error in final validation: %s", e)
             return answer  # Return original if validation fails
     
     def _calculate_quality_score(self, answer: str, intent: str) -> float:
@@ -10845,7 +11542,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             return min(1.0, score)  # Cap at 1.0
             
         except Exception as e:
-            print(f"[AnswerAgent] Error calculating quality score: {e}")
+            answer_log.error("[AnswerAgent] Error calculating quality score: %s", e)
             return 0.5  # Return moderate score on error
     
     def _normalize_query_for_matching(self, query: str) -> str:
@@ -10857,7 +11554,7 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             significant_words = [word for word in words if len(word) > 2]
             return " ".join(sorted(significant_words))
         except Exception as e:
-            print(f"[AnswerAgent] Error normalizing query: {e}")
+            answer_log.error("[AnswerAgent] Error normalizing query: %s", e)
             return query.lower()
     
     def update_from_hil(self, query: str, original_answer: str, corrected_answer: str, 
@@ -10904,12 +11601,12 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
             if feedback_data and feedback_data.get("additional_knowledge"):
                 self.custom_knowledge += f"\n\nHIL Update ({datetime.now().strftime('%Y-%m-%d')}):\n{feedback_data['additional_knowledge']}"
             
-            print(f"[AnswerAgent HIL] Updated with correction for query: '{query[:50]}...'")
-            print(f"[AnswerAgent HIL] Total corrections stored: {len(self.answer_corrections)}")
+            answer_log.debug("[AnswerAgent HIL] Updated with correction for query: '%s...'", query[:50])
+            answer_log.debug("[AnswerAgent HIL] Total corrections stored: %s", len(self.answer_corrections))
             return True
             
         except Exception as e:
-            print(f"[AnswerAgent] Error updating from HIL feedback: {e}")
+            answer_log.error("[AnswerAgent] Error updating from HIL feedback: %s", e)
             return False
 
 
@@ -11060,18 +11757,21 @@ If asking about REPORTING: Specify reporting requirements, deadlines, formats, a
                 if new_knowledge_items:
                     self.custom_knowledge += f"\n\nTrigger Update ({datetime.now().strftime('%Y-%m-%d')}):\n" + "\n".join(new_knowledge_items)
             
-            print(f"[AnswerAgent Trigger] Updated with {len(new_entities)} new entities and {len(new_relationships)} relationships")
-            print(f"[AnswerAgent Trigger] Total trigger updates: {len(self.trigger_updates)}")
+            answer_log.debug("[AnswerAgent Trigger] Updated with %s new entities and %s relationships", len(new_entities), len(new_relationships))
+            answer_log.debug("[AnswerAgent Trigger] Total trigger updates: %s", len(self.trigger_updates))
             return True
             
         except Exception as e:
-            print(f"[AnswerAgent] Error updating from trigger: {e}")
+            answer_log.error("[AnswerAgent] Error updating from trigger: %s", e)
             return False
 
+@traced()
+@STEP_SECONDS.labels("compliance").time()
 def check_compliance(query: str, intent_info: Dict, entity_info: Dict, user_profile: Dict = None) -> Dict[str, Any]:
     """
     Check ITAR compliance - defaults to TOP_SECRET for development
     Fails open (permits access) if service unavailable
+    v5.9.18: Evaluated in-process by ITAR_ENGINE unless COMPLIANCE_MODE=http
     """
     if not COMPLIANCE_ENABLED:
         return {
@@ -11089,8 +11789,27 @@ def check_compliance(query: str, intent_info: Dict, entity_info: Dict, user_prof
     elif "authorization_level" not in user_profile:
         user_profile["authorization_level"] = DEFAULT_DEV_AUTH_LEVEL
     
+    if COMPLIANCE_MODE != "http":
+        try:
+            result = ITAR_ENGINE.verify(query, intent_info, entity_info, user_profile)
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            result["check_performed"] = True
+            return result
+        except Exception as e:
+            compliance_log.error("[Compliance] Engine error: %s - defaulting to permissive mode", e)
+            return {
+                "compliance_status": "compliant",
+                "authorized": True,
+                "user_authorization_level": DEFAULT_DEV_AUTH_LEVEL,
+                "content_guidance": {"allowed_detail_level": "full"},
+                "restrictions": [],
+                "check_performed": False,
+                "fallback_reason": "engine_error"
+            }
+    
     try:
-        response = requests.post(
+        response = compliance_http_session.post(
             f"{COMPLIANCE_SERVICE_URL}/api/compliance/verify",
             json={
                 "query": query,
@@ -11106,11 +11825,11 @@ def check_compliance(query: str, intent_info: Dict, entity_info: Dict, user_prof
         return result
         
     except requests.exceptions.Timeout:
-        print(f"[Compliance] Service timeout - defaulting to permissive mode")
+        compliance_log.debug("[Compliance] Service timeout - defaulting to permissive mode")
     except requests.exceptions.ConnectionError:
-        print(f"[Compliance] Service unavailable - defaulting to permissive mode")
+        compliance_log.debug("[Compliance] Service unavailable - defaulting to permissive mode")
     except Exception as e:
-        print(f"[Compliance] Error: {e} - defaulting to permissive mode")
+        compliance_log.error("[Compliance] Error: %s - defaulting to permissive mode", e)
     
     # Fail open for development
     return {
@@ -11156,6 +11875,7 @@ def extract_financial_records_from_documents(documents_context: List) -> List[Di
 
 
 
+@trace_methods  # v5.9.32: every method is a span of the request's trace
 class SimpleStateOrchestrator:
     """Simple LangGraph-style state orchestration for integrated SAMM agents with HIL and trigger updates"""
     
@@ -11201,17 +11921,21 @@ class SimpleStateOrchestrator:
             error=None
         )
         # ✅ ADD THESE 3 LINES HERE:
-        print(f"[DEBUG PROCESS_QUERY] Received documents_context: {documents_context is not None}")
-        print(f"[DEBUG PROCESS_QUERY] documents_context type: {type(documents_context)}")
-        print(f"[DEBUG PROCESS_QUERY] documents_context length: {len(documents_context) if documents_context else 0}")
+        orchestrator_log.debug("[DEBUG PROCESS_QUERY] Received documents_context: %s", documents_context is not None)
+        orchestrator_log.debug("[DEBUG PROCESS_QUERY] documents_context type: %s", type(documents_context))
+        orchestrator_log.debug("[DEBUG PROCESS_QUERY] documents_context length: %s", len(documents_context) if documents_context else 0)
     
         state['user_profile'] = user_profile or {"authorization_level": DEFAULT_DEV_AUTH_LEVEL}
+        # v5.9.16: Per-request retrieval state (agents themselves hold no request data)
+        state['pipeline_context'] = new_pipeline_context(query)
+        # v5.9.17: Stage graph - compliance runs alongside retrieval, answer waits on both
+        state['scheduler'] = StageScheduler(PIPELINE_STAGE_EXECUTOR, observe=observe_pipeline_stage)
         try:
             # Execute workflow
             current_step = WorkflowStep.INIT
             
             while current_step is not None:
-                print(f"[State Orchestrator] Executing step: {current_step.value}")
+                orchestrator_log.debug("[State Orchestrator] Executing step: %s", current_step.value)
                 state['current_step'] = current_step.value
                 state['execution_steps'].append(f"Step: {current_step.value}")
                 
@@ -11261,7 +11985,12 @@ class SimpleStateOrchestrator:
                     "entity_extraction_method": state['entity_info'].get('extraction_method', 'unknown') if state['entity_info'] else 'unknown',
                     "entity_confidence": state['entity_info'].get('overall_confidence', 0) if state['entity_info'] else 0,
                     "extraction_phases": state['entity_info'].get('phase_count', 0) if state['entity_info'] else 0,
-                    "total_database_results": state['entity_info'].get('total_results', 0) if state['entity_info'] else 0
+                    "total_database_results": state['entity_info'].get('total_results', 0) if state['entity_info'] else 0,
+                    # v5.9.17: Per-stage start/end offsets (seconds from request start)
+                    "timings": {
+                        "stages": state['scheduler'].timings(),
+                        "total": execution_time
+                    }
                 }
             }
             
@@ -11309,7 +12038,10 @@ class SimpleStateOrchestrator:
                 feedback_data=answer_correction.get("feedback_data", {})
             )
         
-        print(f"[State Orchestrator] HIL updates completed: {results}")
+        if any(results.values()):
+            bump_training_version(query)  # v5.9.13
+        
+        orchestrator_log.debug("[State Orchestrator] HIL updates completed: %s", results)
         return results
     
     def update_agents_from_trigger(self, new_entities: List[str], new_relationships: List[Dict], trigger_data: Dict[str, Any] = None) -> Dict[str, bool]:
@@ -11337,7 +12069,10 @@ class SimpleStateOrchestrator:
             trigger_data=trigger_data
         )
         
-        print(f"[State Orchestrator] Trigger updates completed: {results}")
+        # v5.9.13: Invalidate cached artefacts that mention the new entities/relationships
+        bump_kg_version(new_entities, new_relationships)
+        
+        orchestrator_log.debug("[State Orchestrator] Trigger updates completed: %s", results)
         return results
     
     def get_agent_status(self) -> Dict[str, Any]:
@@ -11377,22 +12112,32 @@ class SimpleStateOrchestrator:
         """Cleanup all resources"""
         try:
             db_manager.cleanup()
-            print("[State Orchestrator] Cleanup complete")
+            orchestrator_log.debug("[State Orchestrator] Cleanup complete")
         except Exception as e:
-            print(f"[State Orchestrator] Cleanup error: {e}")
+            orchestrator_log.error("[State Orchestrator] Cleanup error: %s", e)
     
     def _initialize_state(self, state: AgentState) -> AgentState:
         """Initialize workflow state"""
         state['execution_steps'].append("Integrated workflow initialized with database connections")
-        print(f"[State Orchestrator] Initialized query: '{state['query']}'")
+        orchestrator_log.debug("[State Orchestrator] Initialized query: '%s'", state['query'])
         return state
     
+    def _stage_scheduler(self, state: AgentState) -> StageScheduler:
+        """Scheduler for this request (created lazily when steps are driven directly)"""
+        if state.get('scheduler') is None:
+            state['scheduler'] = StageScheduler(PIPELINE_STAGE_EXECUTOR, observe=observe_pipeline_stage)
+        return state['scheduler']
+
     def _analyze_intent_step(self, state: AgentState) -> AgentState:
         """Execute intent analysis step"""
         try:
-            state['intent_info'] = self.intent_agent.analyze_intent(state['query'])
+            scheduler = self._stage_scheduler(state)
+            state['intent_info'] = scheduler.run('intent', lambda: self.intent_agent.analyze_intent(state['query']))
+            # v5.9.17: Compliance needs only intent + entity names - start it as soon as both exist
+            scheduler.add('compliance', compliance_stage(state['query'], state.get('user_profile')),
+                          requires=('intent', 'entities'))
             state['execution_steps'].append(f"Intent analyzed: {state['intent_info'].get('intent', 'unknown')}")
-            print(f"[State Orchestrator] Intent: {state['intent_info'].get('intent')} (confidence: {state['intent_info'].get('confidence')})")
+            orchestrator_log.debug("[State Orchestrator] Intent: %s (confidence: %s)", state['intent_info'].get('intent'), state['intent_info'].get('confidence'))
         except Exception as e:
             state['error'] = f"Intent analysis failed: {str(e)}"
         return state
@@ -11402,7 +12147,7 @@ class SimpleStateOrchestrator:
         # STEP 1: Check for special cases FIRST (before calling Ollama)
         special_case = self._check_special_cases(query)
         if special_case:
-            print(f"[IntentAgent] Returning special case: {special_case['intent']}")
+            orchestrator_log.debug("[IntentAgent] Returning special case: %s", special_case['intent'])
             return special_case
         
         # STEP 2: Normal SAMM intent analysis (existing logic unchanged)
@@ -11434,14 +12179,14 @@ class SimpleStateOrchestrator:
     def _extract_entities_step(self, state: AgentState) -> AgentState:
         """Execute integrated entity extraction with database queries"""
         # NEW DEBUG LINES - ADD THESE 3 LINES:
-        print(f"[DEBUG STATE] documents_context exists: {'documents_context' in state}")
-        print(f"[DEBUG STATE] documents_context value: {state.get('documents_context', 'NOT FOUND')}")
-        print(f"[DEBUG STATE] documents_context length: {len(state.get('documents_context', [])) if state.get('documents_context') else 0}")
+        orchestrator_log.debug("[DEBUG STATE] documents_context exists: %s", 'documents_context' in state)
+        orchestrator_log.debug("[DEBUG STATE] documents_context value: %s", state.get('documents_context', 'NOT FOUND'))
+        orchestrator_log.debug("[DEBUG STATE] documents_context length: %s", len(state.get('documents_context', [])) if state.get('documents_context') else 0)
     
         # ✅ ENHANCED: Skip entity extraction for special cases
         if state['intent_info'].get('special_case', False):
             intent = state['intent_info'].get('intent')
-            print(f"[State Orchestrator] Skipping entity extraction for special case: {intent}")
+            orchestrator_log.debug("[State Orchestrator] Skipping entity extraction for special case: %s", intent)
             
             # ✅ NEW: Handle LOA timeline special case
             if intent == "loa_timeline":
@@ -11480,20 +12225,24 @@ class SimpleStateOrchestrator:
             
             # ✅ ADDED: Log file status for debugging
             if documents_context:
-                print(f"[State Orchestrator] 📁 Passing {len(documents_context)} files to entity extraction")
+                orchestrator_log.debug("[State Orchestrator] 📁 Passing %s files to entity extraction", len(documents_context))
                 for idx, doc in enumerate(documents_context[:3], 1):
                     fname = doc.get('fileName', 'Unknown')
                     content_len = len(doc.get('content', ''))
-                    print(f"[State Orchestrator]   File {idx}: {fname} ({content_len} chars)")
+                    orchestrator_log.debug("[State Orchestrator]   File %s: %s (%s chars)", idx, fname, content_len)
             else:
-                print(f"[State Orchestrator] No files in state to pass to entity extraction")
+                orchestrator_log.debug("[State Orchestrator] No files in state to pass to entity extraction")
             
             # ✅ FIXED: Now passes documents_context (was missing before)
-            state['entity_info'] = self.entity_agent.extract_and_retrieve(
+            scheduler = self._stage_scheduler(state)
+            state['entity_info'] = scheduler.run('retrieval', lambda: self.entity_agent.extract_and_retrieve(
                 state['query'], 
                 state['intent_info'],
-                documents_context  # ← ADDED THIS PARAMETER
-            )
+                documents_context,  # ← ADDED THIS PARAMETER
+                pipeline_context=state.get('pipeline_context'),
+                on_entities=lambda entities: scheduler.provide('entities', entities)
+            ))
+            scheduler.provide('entities', state['entity_info'].get('entities', []))
             
             # ✅ EXISTING: Get entity extraction stats
             entities_count = len(state['entity_info'].get('entities', []))
@@ -11514,25 +12263,23 @@ class SimpleStateOrchestrator:
             )
             
             # ✅ ENHANCED: Include file stats in console log
-            print(f"[State Orchestrator] Integrated Entities: {entities_count} entities found "
-                f"through {phases} phases with {db_results} database results "
-                f"and {file_entities} entities from {files_processed} files")
+            orchestrator_log.debug("[State Orchestrator] Integrated Entities: %s entities found through %s phases with %s database results and %s entities from %s files", entities_count, phases, db_results, file_entities, files_processed)
             
             # ✅ ADDED: Log file-specific extraction details if files were processed
             if files_processed > 0:
-                print(f"[State Orchestrator] 📊 File Extraction Results:")
-                print(f"[State Orchestrator]   • Files processed: {files_processed}")
-                print(f"[State Orchestrator]   • Entities from files: {file_entities}")
-                print(f"[State Orchestrator]   • Relationships from files: {file_relationships}")
+                orchestrator_log.debug("[State Orchestrator] 📊 File Extraction Results:")
+                orchestrator_log.debug("[State Orchestrator]   • Files processed: %s", files_processed)
+                orchestrator_log.debug("[State Orchestrator]   • Entities from files: %s", file_entities)
+                orchestrator_log.debug("[State Orchestrator]   • Relationships from files: %s", file_relationships)
             
         except Exception as e:
             # ✅ EXISTING: Error handling unchanged
             state['error'] = f"Integrated entity extraction failed: {str(e)}"
-            print(f"[State Orchestrator] ❌ Entity extraction error: {str(e)}")
+            orchestrator_log.error("[State Orchestrator] ❌ Entity extraction error: %s", e)
             
             # ✅ ADDED: Add traceback for debugging
             import traceback
-            print(f"[State Orchestrator] Error traceback:\n{traceback.format_exc()}")
+            orchestrator_log.error("[State Orchestrator] Error traceback:\n%s", traceback.format_exc())
         
         return state
 
@@ -11540,35 +12287,40 @@ class SimpleStateOrchestrator:
     def _generate_answer_step(self, state: AgentState) -> AgentState:
         """Execute enhanced answer generation step"""
         try:
-            print(f"[State Orchestrator] 🔄 Starting answer generation...")
-            print(f"[State Orchestrator]   Query: {state['query'][:50]}...")
-            print(f"[State Orchestrator]   Intent: {state['intent_info'].get('intent', 'unknown')}")
-            print(f"[State Orchestrator]   Entities: {len(state['entity_info'].get('entities', []))}")
-            print(f"[State Orchestrator]   Files: {len(state.get('documents_context', []))}")
+            orchestrator_log.debug("[State Orchestrator] 🔄 Starting answer generation...")
+            orchestrator_log.debug("[State Orchestrator]   Query: %s...", state['query'][:50])
+            orchestrator_log.debug("[State Orchestrator]   Intent: %s", state['intent_info'].get('intent', 'unknown'))
+            orchestrator_log.debug("[State Orchestrator]   Entities: %s", len(state['entity_info'].get('entities', [])))
+            orchestrator_log.debug("[State Orchestrator]   Files: %s", len(state.get('documents_context', [])))
+            
+            # v5.9.17: Special cases skip retrieval - entities are known from entity_info
+            scheduler = self._stage_scheduler(state)
+            scheduler.provide('entities', state['entity_info'].get('entities', []))
             
             # ✅ ADD: Pass user_profile to generate_answer
-            state['answer'] = self.answer_agent.generate_answer(
+            state['answer'] = scheduler.run('answer', lambda: self.answer_agent.generate_answer(
                 state['query'], 
                 state['intent_info'], 
                 state['entity_info'], 
                 state['chat_history'], 
                 state['documents_context'],
-                state.get('user_profile')  # ← ADD THIS LINE
-            )
+                state.get('user_profile'),  # ← ADD THIS LINE
+                compliance_check=(lambda: scheduler.result('compliance')) if scheduler.declared('compliance') else None
+            ))
             
             # ✅ ADD: Verify answer was generated
             if not state['answer'] or len(state['answer']) < 20:
-                print(f"[State Orchestrator] ⚠️ WARNING: Answer too short or empty!")
-                print(f"[State Orchestrator]   Answer: '{state['answer']}'")
+                orchestrator_log.warning("[State Orchestrator] ⚠️ WARNING: Answer too short or empty!")
+                orchestrator_log.debug("[State Orchestrator]   Answer: '%s'", state['answer'])
                 state['answer'] = "I apologize, but I encountered an issue generating a complete answer. Please try rephrasing your question."
             else:
-                print(f"[State Orchestrator] ✅ Answer generated successfully:")
-                print(f"[State Orchestrator]   Length: {len(state['answer'])} chars")
-                print(f"[State Orchestrator]   Preview: {state['answer'][:150]}...")
+                orchestrator_log.debug("[State Orchestrator] ✅ Answer generated successfully:")
+                orchestrator_log.debug("[State Orchestrator]   Length: %s chars", len(state['answer']))
+                orchestrator_log.debug("[State Orchestrator]   Preview: %s...", state['answer'][:150])
             
             state['execution_steps'].append("Enhanced answer generated successfully with quality scoring")
         except Exception as e:
-            print(f"[State Orchestrator] ❌ ERROR in answer generation: {str(e)}")
+            orchestrator_log.error("[State Orchestrator] ❌ ERROR in answer generation: %s", e)
             import traceback
             traceback.print_exc()
             state['error'] = f"Enhanced answer generation failed: {str(e)}"
@@ -11579,20 +12331,26 @@ class SimpleStateOrchestrator:
     def _complete_workflow(self, state: AgentState) -> AgentState:
         """Complete workflow"""
         state['execution_steps'].append("Integrated workflow completed successfully")
-        print(f"[State Orchestrator] Integrated workflow completed in {round(time.time() - state['start_time'], 2)}s")
+        orchestrator_log.debug("[State Orchestrator] Integrated workflow completed in %ss", round(time.time() - state['start_time'], 2))
         return state
     
     def _handle_error(self, state: AgentState) -> AgentState:
         """Handle workflow error"""
         state['execution_steps'].append(f"Error handled: {state['error']}")
         state['answer'] = f"I apologize, but I encountered an error: {state['error']}"
-        print(f"[State Orchestrator] Error handled: {state['error']}")
+        orchestrator_log.error("[State Orchestrator] Error handled: %s", state['error'])
         return state
 
 
 # Initialize integrated orchestrator with all agents
-orchestrator = SimpleStateOrchestrator()
-print("Integrated State Orchestrator initialized with Intent, Integrated Entity (Database), and Enhanced Answer agents")
+def _build_orchestrator() -> SimpleStateOrchestrator:
+    built = SimpleStateOrchestrator()
+    print("Integrated State Orchestrator initialized with Intent, Integrated Entity (Database), and Enhanced Answer agents")
+    return built
+
+
+SUBSYSTEMS.register("orchestrator", _build_orchestrator, requires=("knowledge_graph",))
+orchestrator = SUBSYSTEMS.lazy("orchestrator")
 
 @time_function
 def process_samm_query(query: str, chat_history: List = None, documents_context: List = None,
@@ -11613,7 +12371,10 @@ def get_mock_user():
 
 def require_auth():
     """Check if user is authenticated, return user info or None"""
-    user_session_data = session.get("user")
+    return user_from_session_data(session.get("user"))
+
+def user_from_session_data(user_session_data):
+    """The authenticated user for a session's "user" value (v5.9.27: also used by the ASGI routes)"""
     if not user_session_data:
         return None
     
@@ -11786,6 +12547,7 @@ def upload_case_document_to_case(case_id):
     if not files or all(f.filename == '' for f in files):
         return jsonify({"error": "No files selected"}), 400
     results = []
+    ingest_requests = []  # v5.9.22: submitted after every file is saved to the case
     for file in files:
         if not file or file.filename == '':
             continue
@@ -11862,6 +12624,7 @@ def upload_case_document_to_case(case_id):
             # Create document metadata
             # ========================================
             now = datetime.utcnow().isoformat() + "Z"
+            job_id = str(uuid.uuid4())
             doc_metadata = {
                 "id": doc_id,
                 "documentId": doc_id,
@@ -11871,41 +12634,20 @@ def upload_case_document_to_case(case_id):
                 "url": blob_url,
                 "blobName": blob_name,
                 "uploadedAt": now,
-                "uploadedBy": user_id
+                "uploadedBy": user_id,
+                "ingestJobId": job_id,
+                "ingestStatus": "queued"
             }
             # ========================================
-            # Extract financial data from Excel files
-            # ========================================
-            financial_records = []
-            if original_filename.lower().endswith(('.xlsx', '.xls')):
-                print(f"[Upload] 📊 Extracting financial data from Excel...")
-                try:
-                    from io import BytesIO
-                    file_buffer = BytesIO(file_content)
-                    extraction_result = extract_case_document_data(file_buffer, "FINANCIAL_DATA", original_filename, target_case_id)
-                    financial_records = extraction_result.get("key_info", {}).get("financial_records", [])
-                    print(f"[Upload] ✅ Extracted {len(financial_records)} financial records")
-                except Exception as e:
-                    print(f"[Upload] ⚠️ Excel extraction error: {str(e)}")
-                    financial_records = []
-            # ========================================
             # Update case document in Cosmos DB
+            # v5.9.22: Text / entities / financial tables are extracted by an
+            # ingest job once every file is saved (see _on_case_document_ingested)
             # ========================================
             if 'caseDocuments' not in case_doc:
                 case_doc['caseDocuments'] = []
             case_doc['caseDocuments'].append(doc_metadata)
             if 'financialDocuments' not in case_doc:
                 case_doc['financialDocuments'] = []
-            if financial_records:
-                financial_doc = {
-                    "id": doc_id,
-                    "documentId": doc_id,
-                    "fileName": original_filename,
-                    "uploadedAt": now,
-                    "records": financial_records,
-                    "recordCount": len(financial_records)
-                }
-                case_doc['financialDocuments'].append(financial_doc)
             case_doc['updatedAt'] = now
             # Save updated case
             cases_container_client.upsert_item(case_doc)
@@ -11915,12 +12657,15 @@ def upload_case_document_to_case(case_id):
             verify_case = cases_container_client.read_item(item=case_doc['id'], partition_key=case_doc['userId'])
             print(f"[Upload] 🔍 VERIFY: Re-read case has {len(verify_case.get('caseDocuments', []))} docs")
             print(f"[Upload] ✅ Saved document to case {target_case_id}")
+            ingest_requests.append((job_id, blob_name, file_content, original_filename, doc_id, case_doc['id'],
+                                    case_doc['userId']))
             results.append({
                 "fileName": original_filename,
                 "documentId": doc_id,
                 "success": True,
                 "url": blob_url,
-                "financialRecords": len(financial_records)
+                "jobId": job_id,
+                "statusUrl": f"/api/documents/jobs/{job_id}"
             })
         except Exception as e:
             print(f"[Upload] ❌ Error uploading {file.filename}: {str(e)}")
@@ -11932,22 +12677,175 @@ def upload_case_document_to_case(case_id):
                 "error": str(e)
             })
     print(f"[Upload] ✅ Processed: {file.filename} -> Case: {target_case_id}")
+
+    # v5.9.22: Extraction runs in the background (202 + job status URL) unless INGEST_ASYNC=false
+    jobs = {}
+    for job_id, blob_name, file_content, original_filename, doc_id, case_item_id, partition_user in ingest_requests:
+        on_complete = functools.partial(_on_case_document_ingested, case_item_id, partition_user, doc_id)
+        jobs[job_id] = DOCUMENT_INGEST.submit(
+            case_docs_blob_container_client.container_name, blob_name, file_content, original_filename,
+            user_id=user_id, document_id=doc_id, on_complete=on_complete, run_inline=not INGEST_ASYNC, job_id=job_id)
+    for result in results:
+        job = jobs.get(result.get("jobId"))
+        if job is not None:
+            result["ingestStatus"] = job["status"]
+            if job["status"] == "done":
+                result["financialRecords"] = (job.get("summary") or {}).get("financialRecords", 0)
+
     print(f"\n[Upload] === Complete: {len([r for r in results if r.get('success')])}/{len(results)} files processed ===")
     return jsonify({
         "success": True,
         "caseId": case_id,
         "caseNumber": case_id,
         "results": results
-    }), 200
+    }), 202 if (INGEST_ASYNC and jobs) else 200
+
+
+def update_case_item(case_item_id: str, user_id: str, mutate: Callable[[Dict[str, Any]], None],
+                     attempts: int = 5) -> bool:
+    """
+    v5.9.22: Read-modify-write of a case item with an etag precondition, retried when
+    another writer got there first (background jobs update cases concurrently with requests)
+    """
+    for attempt in range(attempts):
+        case_doc = cases_container_client.read_item(item=case_item_id, partition_key=user_id)
+        mutate(case_doc)
+        try:
+            cases_container_client.replace_item(item=case_item_id, body=case_doc, etag=case_doc.get('_etag'),
+                                                match_condition=MatchConditions.IfNotModified)
+            return True
+        except CosmosExceptions.CosmosAccessConditionFailedError:
+            print(f"[Cases] Case {case_item_id} changed concurrently - retrying ({attempt + 1}/{attempts})")
+    return False
+
+
+def _on_case_document_ingested(case_item_id: str, user_id: str, doc_id: str,
+                               job: Dict[str, Any], artefacts: Optional[Dict[str, Any]]):
+    """
+    v5.9.22: Record the ingest result on the case (status + financialDocuments entry for workbooks)
+    v5.9.23: Financial records go to FINANCIAL_STORE; the case keeps only the record count
+    """
+    financial = (artefacts or {}).get("financial") or {}
+    financial_records = financial.get("records") or []
+    document_info = {}
+
+    def mutate(case_doc):
+        now = datetime.utcnow().isoformat() + "Z"
+        for doc in case_doc.get('caseDocuments', []):
+            if doc.get('id') == doc_id:
+                doc['ingestStatus'] = job['status']
+                doc['ingestSummary'] = job.get('summary')
+                document_info.update(fileName=doc.get('fileName'), uploadedAt=doc.get('uploadedAt'))
+                break
+        else:
+            return
+        financial_documents = case_doc.setdefault('financialDocuments', [])
+        if financial_records and not any(fd.get('id') == doc_id for fd in financial_documents):
+            financial_documents.append({
+                "id": doc_id,
+                "documentId": doc_id,
+                "fileName": document_info['fileName'],
+                "uploadedAt": document_info['uploadedAt'],
+                "recordCount": len(financial_records)
+            })
+        case_doc['updatedAt'] = now
+
+    if update_case_item(case_item_id, user_id, mutate):
+        print(f"[Upload] ✅ Ingest {job['status']} for document {doc_id}: {len(financial_records)} financial records")
+    else:
+        print(f"[Upload] ⚠️ Could not record ingest result on case {case_item_id}")
+        return
+
+    if financial_records and document_info:
+        try:
+            FINANCIAL_STORE.add_document(case_item_id, doc_id, financial_records,
+                                         file_name=document_info['fileName'],
+                                         uploaded_at=document_info['uploadedAt'])
+        except Exception as e:
+            print(f"[Upload] ⚠️ Could not store financial records for document {doc_id}: {e}")
+
+
+def find_case_ref(case_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    v5.9.23: {"id", "caseNumber"} of a user's case by item id or case number - one
+    projected query inside the user's partition instead of reading the whole case
+    """
+    query = """
+    SELECT c.id, c.caseNumber FROM c
+    WHERE c.userId = @userId
+    AND (c.id = @caseId OR (c.type = 'case' AND c.caseNumber = @caseId))
+    """
+    cases = list(cases_container_client.query_items(
+        query=query,
+        parameters=[{"name": "@userId", "value": user_id}, {"name": "@caseId", "value": case_id}],
+        partition_key=user_id
+    ))
+    if not cases:
+        return None
+    return next((c for c in cases if c.get("id") == case_id), cases[0])
+
+
+def get_case_financial_summary(case_item_id: str, user_id: str) -> Dict[str, Any]:
+    """
+    v5.9.23: Materialised financial aggregates of a case.
+    Records embedded in the case item by earlier versions are copied into the store once;
+    later reads never touch the case item.
+    v5.9.36: "Copied" is the store's per-case migrated flag, set by ensure_case() after a
+    complete copy - a case the store already knows from a new upload is still copied, and
+    a copy that failed part-way is retried (add_document replaces, so re-copying is safe)
+    """
+    summary = FINANCIAL_STORE.get_summary(case_item_id)
+    if summary is not None and summary["migrated"]:
+        return summary
+
+    case_doc = cases_container_client.read_item(item=case_item_id, partition_key=user_id)
+    migrated = set()
+    for doc in case_doc.get("caseDocuments", []):
+        metadata = doc.get("metadata", {})
+        records = metadata.get("financialRecords") or []
+        doc_id = doc.get("documentId") or doc.get("id")
+        if metadata.get("hasFinancialData", False) and records:
+            FINANCIAL_STORE.add_document(case_item_id, doc_id, records, file_name=doc.get("fileName"),
+                                         uploaded_at=doc.get("uploadedAt"))
+            migrated.add(doc_id)
+    for fd in case_doc.get("financialDocuments", []):
+        doc_id = fd.get("documentId") or fd.get("id")
+        if fd.get("records") and doc_id not in migrated:
+            FINANCIAL_STORE.add_document(case_item_id, doc_id, fd["records"], file_name=fd.get("fileName"),
+                                         uploaded_at=fd.get("uploadedAt"))
+            migrated.add(doc_id)
+    FINANCIAL_STORE.ensure_case(case_item_id)
+    print(f"[Financial Data] Copied {len(migrated)} embedded financial documents of case {case_item_id} to the store")
+    return FINANCIAL_STORE.get_summary(case_item_id)
+
+
+@app.route("/api/documents/jobs/<job_id>", methods=["GET"])
+def get_document_ingest_job(job_id):
+    """v5.9.22: Status of an upload-time extraction job (queued / running / done / failed)"""
+    user = require_auth()
+    if not user:
+        return jsonify({"error": "User not authenticated"}), 401
+    job = DOCUMENT_INGEST.get_job(job_id)
+    if job is None or (job.get("userId") and job["userId"] != user["sub"]):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
 
 
 @app.route("/api/cases/<path:case_id>/financial-data", methods=["GET"])
 def get_case_financial_data(case_id):
     """
-    💰 GET ALL FINANCIAL DATA FOR A CASE
+    💰 GET FINANCIAL DATA FOR A CASE
     
-    Returns all extracted financial records from uploaded MISIL RSN sheets
+    Returns extracted financial records from uploaded MISIL RSN sheets, one page at a time
+    (v5.9.23: rows read from FINANCIAL_STORE, totals are the materialised case totals)
+    
+    Query parameters (all optional):
+        pageSize           rows per page (default 500, max 5000)
+        continuationToken  token from the previous page
+        rsn, pdli          exact match filters
+        documentId         rows of one uploaded document
+        search             substring of the PDLI name
     
     Response:
         {
@@ -11970,10 +12868,13 @@ def get_case_financial_data(case_id):
               "oa_rec_amt": 1000000,
               "net_commit_amt": 500000,
               "available": 500000,
-              "sourceDocument": "MISIL_RSN.xlsx"
+              "sourceDocument": "MISIL_RSN.xlsx",
+              "documentId": "uuid"
             }
           ],
           "recordCount": 45,
+          "returnedCount": 45,
+          "continuationToken": null,
           "totals": {
             "oa_rec_amt": 50000000,
             "net_commit_amt": 25000000,
@@ -11996,93 +12897,42 @@ def get_case_financial_data(case_id):
         return jsonify({"error": "Database not available"}), 503
     
     try:
-        # Get case document
-        case_doc = None
+        page_size = request.args.get("pageSize", type=int)
+        if page_size is not None and page_size < 1:
+            return jsonify({"error": "pageSize must be a positive integer"}), 400
         
-        # Try UUID lookup
-        try:
-            case_doc = cases_container_client.read_item(item=case_id, partition_key=user_id)
-        except CosmosExceptions.CosmosResourceNotFoundError:
-            # Try case number lookup
-            query = """
-            SELECT * FROM c 
-            WHERE c.userId = @userId 
-            AND c.type = 'case'
-            AND c.caseNumber = @caseNumber
-            """
-            parameters = [
-                {"name": "@userId", "value": user_id},
-                {"name": "@caseNumber", "value": case_id}
-            ]
-            
-            cases = list(cases_container_client.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=False
-            ))
-            
-            if cases:
-                case_doc = cases[0]
-        
-        if not case_doc:
+        case_ref = find_case_ref(case_id, user_id)
+        if not case_ref:
             return jsonify({"error": "Case not found"}), 404
         
-        # Extract all financial records
-        all_financial_records = []
-        financial_documents = []
-        
-        for doc in case_doc.get("caseDocuments", []):
-            metadata = doc.get("metadata", {})
-            
-            if metadata.get("hasFinancialData", False):
-                records = metadata.get("financialRecords", [])
-                
-                if records:
-                    financial_documents.append({
-                        "documentId": doc.get("documentId"),
-                        "fileName": doc.get("fileName"),
-                        "uploadedAt": doc.get("uploadedAt"),
-                        "recordCount": len(records)
-                    })
-                    
-                    # Add document reference to each record
-                    for record in records:
-                        record["sourceDocument"] = doc.get("fileName")
-                        record["documentId"] = doc.get("documentId")
-                    
-                    all_financial_records.extend(records)
-        
-        # Calculate totals
-        totals = {
-            "oa_rec_amt": 0,
-            "net_commit_amt": 0,
-            "net_obl_amt": 0,
-            "net_exp_amt": 0,
-            "dir_rsrv_amt": 0
-        }
-        
-        for record in all_financial_records:
-            for field in totals.keys():
-                value = record.get(field, 0)
-                if value:
-                    try:
-                        totals[field] += float(str(value).replace('$', '').replace(',', ''))
-                    except:
-                        pass
+        summary = get_case_financial_summary(case_ref["id"], user_id)
+        page = FINANCIAL_STORE.query_records(
+            case_ref["id"],
+            rsn=request.args.get("rsn"),
+            pdli=request.args.get("pdli"),
+            document_id=request.args.get("documentId"),
+            search=request.args.get("search"),
+            page_size=page_size,
+            continuation=request.args.get("continuationToken")
+        )
         
-        print(f"[Financial Data] ✅ Found {len(all_financial_records)} records")
+        print(f"[Financial Data] ✅ Returning {len(page['records'])} of {summary['recordCount']} records")
         
         return jsonify({
             "success": True,
-            "caseId": case_doc["id"],
-            "caseNumber": case_doc.get("caseNumber", case_id),
-            "financialDocuments": financial_documents,
-            "financialRecords": all_financial_records,
-            "recordCount": len(all_financial_records),
-            "totals": totals,
+            "caseId": case_ref["id"],
+            "caseNumber": case_ref.get("caseNumber") or case_id,
+            "financialDocuments": summary["documents"],
+            "financialRecords": page["records"],
+            "recordCount": summary["recordCount"],
+            "returnedCount": len(page["records"]),
+            "continuationToken": page["continuationToken"],
+            "totals": summary["totals"],
             "timestamp": datetime.now(timezone.utc).isoformat()
         }), 200
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"[Financial Data] ❌ Error: {e}")
         import traceback
@@ -12095,6 +12945,7 @@ def get_financial_summary(case_id):
     📊 GET FINANCIAL SUMMARY WITH RSN AGGREGATION
     
     Returns high-level financial metrics grouped by RSN PDLI
+    (v5.9.23: materialised aggregates maintained on upload - no per-record work)
     
     Response:
         {
@@ -12108,12 +12959,12 @@ def get_financial_summary(case_id):
               "pdli_name": "F-16 Parts",
               "oa_rec_amt": 1000000,
               "net_commit_amt": 500000,
-              "available": 500000,
               "record_count": 5
             }
           ],
           "grandTotals": {...},
-          "uniqueRSNs": 10
+          "uniqueRSNs": 10,
+          "recordCount": 45
         }
     """
     user = require_auth()
@@ -12129,86 +12980,20 @@ def get_financial_summary(case_id):
         return jsonify({"error": "Database not available"}), 503
     
     try:
-        # Get case (same logic as financial-data endpoint)
-        case_doc = None
-        try:
-            case_doc = cases_container_client.read_item(item=case_id, partition_key=user_id)
-        except:
-            query = """
-            SELECT * FROM c 
-            WHERE c.userId = @userId 
-            AND c.caseNumber = @caseNumber
-            """
-            parameters = [
-                {"name": "@userId", "value": user_id},
-                {"name": "@caseNumber", "value": case_id}
-            ]
-            cases = list(cases_container_client.query_items(
-                query=query, parameters=parameters, enable_cross_partition_query=False
-            ))
-            if cases:
-                case_doc = cases[0]
-        
-        if not case_doc:
+        case_ref = find_case_ref(case_id, user_id)
+        if not case_ref:
             return jsonify({"error": "Case not found"}), 404
         
-        # Aggregate by RSN
-        rsn_aggregation = {}
-        
-        for doc in case_doc.get("caseDocuments", []):
-            metadata = doc.get("metadata", {})
-            records = metadata.get("financialRecords", [])
-            
-            for record in records:
-                rsn = record.get("rsn_identifier", "Unknown")
-                
-                if rsn not in rsn_aggregation:
-                    rsn_aggregation[rsn] = {
-                        "rsn_identifier": rsn,
-                        "pdli_pdli": record.get("pdli_pdli", "N/A"),
-                        "pdli_name": record.get("pdli_name", ""),
-                        "oa_rec_amt": 0,
-                        "net_commit_amt": 0,
-                        "net_obl_amt": 0,
-                        "net_exp_amt": 0,
-                        "dir_rsrv_amt": 0,
-                        "record_count": 0
-                    }
-                
-                # Aggregate amounts
-                for field in ["oa_rec_amt", "net_commit_amt", "net_obl_amt", "net_exp_amt", "dir_rsrv_amt"]:
-                    value = record.get(field, 0)
-                    if value:
-                        try:
-                            rsn_aggregation[rsn][field] += float(str(value).replace('$', '').replace(',', ''))
-                        except:
-                            pass
-                
-                rsn_aggregation[rsn]["record_count"] += 1
-        
-        # Convert to list and sort by amount
-        rsn_summary = sorted(
-            rsn_aggregation.values(),
-            key=lambda x: x.get("oa_rec_amt", 0),
-            reverse=True
-        )
-        
-        # Calculate grand totals
-        grand_totals = {
-            "oa_rec_amt": sum(item["oa_rec_amt"] for item in rsn_summary),
-            "net_commit_amt": sum(item["net_commit_amt"] for item in rsn_summary),
-            "net_obl_amt": sum(item["net_obl_amt"] for item in rsn_summary),
-            "net_exp_amt": sum(item["net_exp_amt"] for item in rsn_summary),
-            "dir_rsrv_amt": sum(item["dir_rsrv_amt"] for item in rsn_summary)
-        }
+        summary = get_case_financial_summary(case_ref["id"], user_id)
         
         return jsonify({
             "success": True,
-            "caseId": case_doc["id"],
-            "caseNumber": case_doc.get("caseNumber", case_id),
-            "rsnSummary": rsn_summary,
-            "grandTotals": grand_totals,
-            "uniqueRSNs": len(rsn_summary),
+            "caseId": case_ref["id"],
+            "caseNumber": case_ref.get("caseNumber") or case_id,
+            "rsnSummary": summary["rsnSummary"],
+            "grandTotals": summary["totals"],
+            "uniqueRSNs": len(summary["rsnSummary"]),
+            "recordCount": summary["recordCount"],
             "timestamp": datetime.now(timezone.utc).isoformat()
         }), 200
         
@@ -12246,9 +13031,10 @@ def stage_chat_attachment():
             
         try:
             file_to_upload.seek(0) 
+            file_content = file_to_upload.read()
             blob_content_settings = ContentSettings(content_type=file_to_upload.mimetype)
             blob_client_instance.upload_blob(
-                file_to_upload.read(), 
+                file_content, 
                 overwrite=True,
                 content_settings=blob_content_settings
             )
@@ -12257,8 +13043,14 @@ def stage_chat_attachment():
             file_to_upload.seek(0, os.SEEK_END)
             file_size_bytes = file_to_upload.tell()
             
+            document_id = str(uuid.uuid4())
+            # v5.9.22: Extract + index now so queries read the artefacts
+            job = DOCUMENT_INGEST.submit(
+                chat_docs_blob_container_client.container_name, blob_name, file_content, original_filename,
+                user_id=user_id, document_id=document_id, run_inline=not INGEST_ASYNC)
+
             staged_doc_metadata = {
-                "documentId": str(uuid.uuid4()),
+                "documentId": document_id,
                 "fileName": original_filename,
                 "blobName": blob_name,
                 "blobContainer": AZURE_CHAT_DOCS_CONTAINER_NAME,
@@ -12267,13 +13059,17 @@ def stage_chat_attachment():
                 "sizeBytes": file_size_bytes,
                 "uploadedAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
                 "uploaderUserId": user_id,
-                "status": "staged"
+                "status": "staged",
+                "ingestJobId": job["jobId"],
+                "ingestStatus": job["status"]
             }
             
             return jsonify({
                 "message": f"File '{original_filename}' staged successfully.",
-                "stagedDocument": staged_doc_metadata 
-            }), 200
+                "stagedDocument": staged_doc_metadata,
+                "jobId": job["jobId"],
+                "statusUrl": f"/api/documents/jobs/{job['jobId']}"
+            }), 202 if INGEST_ASYNC else 200
 
         except Exception as e:
             print(f"[API StageChatAttachment] Error uploading file '{original_filename}' to blob: {str(e)}")
@@ -12406,6 +13202,7 @@ def delete_case_document():
             try:
                 blob_client = case_docs_blob_container_client.get_blob_client(blob_name)
                 blob_client.delete_blob()
+                DOCUMENT_INGEST.forget(case_docs_blob_container_client.container_name, blob_name)
                 print(f"[DELETE DOC] ✅ Deleted blob: {blob_name}")
             except Exception as e:
                 print(f"[DELETE DOC] ⚠️ Blob delete warning: {str(e)}")
@@ -12423,6 +13220,12 @@ def delete_case_document():
         ]
         case_doc['financialDocuments'] = financial_documents
 
+        # v5.9.23: Drop the document's rows and subtract them from the case totals
+        try:
+            FINANCIAL_STORE.remove_document(case_doc['id'], document_id)
+        except Exception as e:
+            print(f"[DELETE DOC] ⚠️ Financial records delete warning: {str(e)}")
+
         case_doc['updatedAt'] = datetime.utcnow().isoformat() + "Z"
 
         # Save updated case
@@ -12486,6 +13289,7 @@ def delete_chat_attachment():
 
     try:
         target_blob_client.delete_blob()
+        DOCUMENT_INGEST.forget(chat_docs_blob_container_client.container_name, blob_name)
         print(f"[API DeleteChatAttachment] Successfully deleted blob: {blob_name} from container: {blob_container_name}")
         return jsonify({"message": f"File '{blob_name}' deleted successfully from chat context."}), 200
 
@@ -12499,6 +13303,132 @@ def delete_chat_attachment():
 
 
 
+@traced()
+def _answer_samm_query(user_input: str, chat_history: List, staged_chat_documents_metadata: List,
+                       user_profile: Dict, include_workflow: bool = False) -> Dict:
+    """Load attachments, consult the answer cache and run the pipeline; returns the /api/query payload"""
+    data_versions = DATA_VERSIONS.capture()  # v5.9.36: the answer is stamped with these
+    # === NEW: Load actual document content from blob storage ===
+    documents_with_content = []
+    attachments = [(doc_meta, chat_docs_blob_container_client) for doc_meta in staged_chat_documents_metadata
+                   if doc_meta.get("blobName") and chat_docs_blob_container_client]
+    # v5.9.22: Ingested attachments come from their upload-time artefacts
+    for document in load_attachment_documents(user_input, attachments, max_chars=ATTACHMENT_CONTENT_CHARS):
+        if document:
+            documents_with_content.append(document)  # content limited to 5000 chars to avoid overload
+            query_log.debug("[Query] Loaded content from %s: %s chars", document.get('fileName'), len(document['content']))
+    # === END NEW ===
+
+    # STEP 1: Check cache first
+    # v5.9.36: Answers grounded in attachments are neither served from nor saved to the
+    # shared cache (keyed on the question alone), as on the stream path
+    use_answer_cache = not documents_with_content
+    cached_result = get_from_cache(user_input) if use_answer_cache else None
+    if cached_result and not cache_entry_allowed_for(cached_result, user_profile):
+        query_log.debug("[Cache] Entry approved for a higher authorization level - recomputing")
+        cached_result = None
+
+    if cached_result:
+        # Cache hit - return cached answer with cache metadata
+        query_log.debug("[Cache] Returning cached answer for: '%s...'", user_input[:50])
+
+        response_data = {
+            "response": {"answer": cached_result['answer']},
+            "metadata": cached_result['metadata'],
+            "uploadedChatDocuments": [],
+            "cached": True,
+            "cache_age_seconds": round(time.time() - cached_result['timestamp'], 2)
+        }
+
+        return response_data
+
+    # STEP 2: Cache miss - process query normally
+    query_log.debug("[Integrated SAMM Query] Chat History items: %s", len(chat_history))
+    query_log.debug("[Integrated SAMM Query] Staged Chat Documents: %s", len(staged_chat_documents_metadata))
+
+    # Check for demo partial response
+    demo_response = generate_demo_partial_response(user_input)
+    if demo_response and not get_from_cache(user_input):
+        result = {
+            'answer': demo_response['answer'],
+            'metadata': {
+                'intent': demo_response['intent'],
+                'entities': demo_response['entities'],
+                'is_demo': True,
+                'demo_type': demo_response.get('demo_type', 'unknown')
+            },
+            'intent': demo_response['intent'],
+            'entities_found': len(demo_response['entities']),
+            'execution_time': 0.5
+        }
+        query_log.debug("🎬 DEMO MODE: Using partial answer (%s)", demo_response.get('demo_type', 'unknown').upper())
+    else:
+        # MODIFIED: Pass documents_with_content instead of staged_chat_documents_metadata
+        result = process_samm_query(user_input, chat_history, documents_with_content, user_profile)
+
+    # Apply HITL corrections if they exist
+    result = apply_hitl_corrections(user_input, result)
+
+    query_log.debug("[Integrated SAMM Result] Intent: %s, Entities: %s, Time: %ss", result['intent'], result['entities_found'], result['execution_time'])
+    query_log.debug("[Integrated SAMM Result] Workflow Steps: %s", len(result.get('execution_steps', [])))
+    query_log.debug("[Integrated SAMM Result] System Version: %s", result['metadata'].get('system_version', 'Unknown'))
+    query_log.debug("[Integrated SAMM Result] Database Results: %s", result['metadata'].get('total_database_results', 0))
+
+    # STEP 3: Save to cache
+    result['metadata']['approved_authorization_level'] = user_profile['authorization_level']
+    if use_answer_cache:
+        save_to_cache(user_input, result['answer'], result['metadata'], data_versions)
+
+    # ✅ NEW: Extract financial data from documents for response
+    financial_summary = None
+    if documents_with_content:
+        financial_records = []
+        for doc in documents_with_content:
+            if doc.get('metadata', {}).get('hasFinancialData'):
+                records = doc['metadata'].get('financialRecords', [])
+                financial_records.extend(records)
+
+        if financial_records:
+            financial_summary = {
+                'total_records': len(financial_records),
+                'unique_rsns': len(set(r.get('rsn_identifier') for r in financial_records if r.get('rsn_identifier'))),
+                'total_available': sum(float(r.get('available', 0)) for r in financial_records),
+                'documents': [doc.get('fileName') for doc in documents_with_content 
+                             if doc.get('metadata', {}).get('hasFinancialData')]
+            }
+            query_log.debug("[API] 💰 Financial summary: %s", financial_summary)
+
+    # Return response in the same format as before for Vue.js UI compatibility
+    response_data = {
+        "response": {"answer": result["answer"]},
+        "metadata": result["metadata"],
+        "uploadedChatDocuments": [],  # For future AI-generated documents
+        "financialSummary": financial_summary,  # ✅ NEW
+        "cached": False  # Fresh answer
+    }
+
+    # Add execution steps only in debug mode or if requested
+    if include_workflow:
+        response_data["execution_steps"] = result.get("execution_steps", [])
+        response_data["workflow_info"] = {
+            "orchestration": "integrated_database_state",
+            "steps_completed": len(result.get("execution_steps", [])),
+            "execution_time": result["execution_time"],
+            "entity_extraction_method": result["metadata"].get("entity_extraction_method", "unknown"),
+            "entity_confidence": result["metadata"].get("entity_confidence", 0),
+            "extraction_phases": result["metadata"].get("extraction_phases", 0),
+            "database_results": result["metadata"].get("total_database_results", 0),
+            "database_integration": result["metadata"].get("database_integration", {})
+        }
+
+    return response_data
+
+
+def _query_flight_used_llm(response_data: Dict) -> bool:
+    """True when a coalesced /api/query result came from a real generation"""
+    return not response_data.get("cached") and not response_data.get("metadata", {}).get("is_demo")
+
+
 @app.route("/api/query", methods=["POST"])
 def query_ai_assistant():
     """Main SAMM query endpoint using Integrated state orchestrated 3-agent system with caching and ITAR compliance"""
@@ -12527,120 +13457,26 @@ def query_ai_assistant():
             "clearances": user.get("clearances", []),
             "role": user.get("role", "developer")
         }
-        print(f"[Integrated SAMM Query] User: {user_id}, Auth: {user_profile['authorization_level']}, Query: '{user_input[:50]}...'")
+        query_log.debug("[Integrated SAMM Query] User: %s, Auth: %s, Query: '%s...'", user_id, user_profile['authorization_level'], user_input[:50])
+
+        # v5.9.15: Identical concurrent queries share one pipeline run
+        include_workflow = bool(data.get("debug", False) or data.get("include_workflow", False))
+        flight_key = query_flight_key(user_input, data, user_profile)
+        response_data, coalesced = QUERY_FLIGHTS.do(
+            flight_key,
+            lambda: _answer_samm_query(user_input, chat_history, staged_chat_documents_metadata,
+                                       user_profile, include_workflow),
+            llm_used=_query_flight_used_llm
+        )
+        if coalesced:
+            query_log.debug("[SingleFlight] Shared in-flight answer for: '%s...'", user_input[:50])
+            set_attribute("coalesced", True)  # v5.9.32: the pipeline's spans are in the leader's trace
+            response_data = {**response_data, "coalesced": True}
 
-        # === NEW: Load actual document content from blob storage ===
-        documents_with_content = []
-        for doc_meta in staged_chat_documents_metadata:
-            blob_name = doc_meta.get("blobName")
-            if blob_name and chat_docs_blob_container_client:
-                content = fetch_blob_content(blob_name, chat_docs_blob_container_client)
-                if content:
-                    documents_with_content.append({
-                        **doc_meta,
-                        "content": content[:5000]  # Limit to 5000 chars to avoid overload
-                    })
-                    print(f"[Query] Loaded content from {doc_meta.get('fileName')}: {len(content)} chars")
-        # === END NEW ===
-
-        # STEP 1: Check cache first
-        cached_result = get_from_cache(user_input)
-        
-        if cached_result:
-            # Cache hit - return cached answer with cache metadata
-            print(f"[Cache] Returning cached answer for: '{user_input[:50]}...'")
-            
-            response_data = {
-                "response": {"answer": cached_result['answer']},
-                "metadata": cached_result['metadata'],
-                "uploadedChatDocuments": [],
-                "cached": True,
-                "cache_age_seconds": round(time.time() - cached_result['timestamp'], 2)
-            }
-            
-            return jsonify(response_data)
-        
-        # STEP 2: Cache miss - process query normally
-        print(f"[Integrated SAMM Query] Chat History items: {len(chat_history)}")
-        print(f"[Integrated SAMM Query] Staged Chat Documents: {len(staged_chat_documents_metadata)}")
-        
-        # Check for demo partial response
-        demo_response = generate_demo_partial_response(user_input)
-        if demo_response and not get_from_cache(user_input):
-            result = {
-                'answer': demo_response['answer'],
-                'metadata': {
-                    'intent': demo_response['intent'],
-                    'entities': demo_response['entities'],
-                    'is_demo': True,
-                    'demo_type': demo_response.get('demo_type', 'unknown')
-                },
-                'intent': demo_response['intent'],
-                'entities_found': len(demo_response['entities']),
-                'execution_time': 0.5
-            }
-            print(f"🎬 DEMO MODE: Using partial answer ({demo_response.get('demo_type', 'unknown').upper()})")
-        else:
-            # MODIFIED: Pass documents_with_content instead of staged_chat_documents_metadata
-            result = process_samm_query(user_input, chat_history, documents_with_content, user_profile)
-        
-        # Apply HITL corrections if they exist
-        result = apply_hitl_corrections(user_input, result)
-        
-        print(f"[Integrated SAMM Result] Intent: {result['intent']}, Entities: {result['entities_found']}, Time: {result['execution_time']}s")
-        print(f"[Integrated SAMM Result] Workflow Steps: {len(result.get('execution_steps', []))}")
-        print(f"[Integrated SAMM Result] System Version: {result['metadata'].get('system_version', 'Unknown')}")
-        print(f"[Integrated SAMM Result] Database Results: {result['metadata'].get('total_database_results', 0)}")
-        
-        # STEP 3: Save to cache
-        save_to_cache(user_input, result['answer'], result['metadata'])
-        
-        # ✅ NEW: Extract financial data from documents for response
-        financial_summary = None
-        if documents_with_content:
-            financial_records = []
-            for doc in documents_with_content:
-                if doc.get('metadata', {}).get('hasFinancialData'):
-                    records = doc['metadata'].get('financialRecords', [])
-                    financial_records.extend(records)
-            
-            if financial_records:
-                financial_summary = {
-                    'total_records': len(financial_records),
-                    'unique_rsns': len(set(r.get('rsn_identifier') for r in financial_records if r.get('rsn_identifier'))),
-                    'total_available': sum(float(r.get('available', 0)) for r in financial_records),
-                    'documents': [doc.get('fileName') for doc in documents_with_content 
-                                 if doc.get('metadata', {}).get('hasFinancialData')]
-                }
-                print(f"[API] 💰 Financial summary: {financial_summary}")
-        
-        # Return response in the same format as before for Vue.js UI compatibility
-        response_data = {
-            "response": {"answer": result["answer"]},
-            "metadata": result["metadata"],
-            "uploadedChatDocuments": [],  # For future AI-generated documents
-            "financialSummary": financial_summary,  # ✅ NEW
-            "cached": False  # Fresh answer
-        }
-        
-        # Add execution steps only in debug mode or if requested
-        if data.get("debug", False) or data.get("include_workflow", False):
-            response_data["execution_steps"] = result.get("execution_steps", [])
-            response_data["workflow_info"] = {
-                "orchestration": "integrated_database_state",
-                "steps_completed": len(result.get("execution_steps", [])),
-                "execution_time": result["execution_time"],
-                "entity_extraction_method": result["metadata"].get("entity_extraction_method", "unknown"),
-                "entity_confidence": result["metadata"].get("entity_confidence", 0),
-                "extraction_phases": result["metadata"].get("extraction_phases", 0),
-                "database_results": result["metadata"].get("total_database_results", 0),
-                "database_integration": result["metadata"].get("database_integration", {})
-            }
-        
         return jsonify(response_data)
 
     except Exception as e:
-        print(f"[Integrated SAMM Query] Error: {str(e)}")
+        query_log.error("[Integrated SAMM Query] Error: %s", e)
         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
 
@@ -12659,7 +13495,7 @@ def get_cache_statistics():
     
     # Add additional details
     cache_entries = []
-    for key, entry in list(query_cache.items())[:10]:  # Show top 10 most recent
+    for key, entry in query_cache.items(limit=10):  # Show top 10 most recent
         age_seconds = time.time() - entry['timestamp']
         cache_entries.append({
             "query": entry['original_query'][:100],  # Truncate long queries
@@ -12674,7 +13510,10 @@ def get_cache_statistics():
         "cache_enabled": CACHE_ENABLED,
         "configuration": {
             "ttl_seconds": CACHE_TTL_SECONDS,
-            "max_size": CACHE_MAX_SIZE
+            "max_size": CACHE_MAX_SIZE,
+            "shared_enabled": query_cache.shared is not None,
+            "shared_path": CACHE_SHARED_PATH if query_cache.shared is not None else None,
+            "shared_max_size": CACHE_SHARED_MAX_SIZE
         },
         "timestamp": datetime.now().isoformat()
     })
@@ -13182,6 +14021,40 @@ def get_knowledge_graph_info():
         }
     })
 
+@app.route("/api/debug/traces", methods=["GET"])
+def list_traces():
+    """v5.9.32: Summaries of the traces in this worker's ring (running ones first), newest first"""
+    if not DEBUG_TRACES_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    if not require_auth():
+        return jsonify({"error": "User not authenticated"}), 401
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"traces": TRACER.recent(limit), "stats": TRACER.get_stats()})
+
+
+@app.route("/api/debug/traces/<request_id>", methods=["GET"])
+def get_trace(request_id):
+    """v5.9.32: A request's nested timing tree (?format=otlp: OTLP/JSON, as exported)"""
+    if not DEBUG_TRACES_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    if not require_auth():
+        return jsonify({"error": "User not authenticated"}), 401
+    as_otlp = request.args.get("format") == "otlp"
+    trace = TRACER.get(request_id)
+    if trace is not None:
+        return jsonify(trace.to_otlp() if as_otlp else trace.tree())
+    exported = TRACER.load_exported(request_id)  # finished on another worker, or evicted
+    if exported is not None:
+        return jsonify(exported if as_otlp else tree_from_otlp(exported))
+    return jsonify({"error": f"No trace for request {request_id}"}), 404
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """v5.9.31: Prometheus scrape endpoint - stage latency histograms, cache / LLM counters, in-flight gauges"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """System health check"""
@@ -13258,7 +14131,20 @@ def serve_vue_paths(path):
 
 # Cleanup on exit
 import atexit
-atexit.register(orchestrator.cleanup)
+
+
+def _cleanup_at_exit():
+    # v5.9.28: never build the orchestrator just to clean it up
+    if SUBSYSTEMS.is_ready("orchestrator"):
+        orchestrator.cleanup()
+    else:
+        db_manager.cleanup()
+    if METRICS.flushing:
+        METRICS.flush()  # v5.9.31: a worker's final values, for the other workers' scrapes
+    LOGGING.stop()  # v5.9.30: flush queued log records
+
+
+atexit.register(_cleanup_at_exit)
 
 @app.route("/api/reviews", methods=["POST"])
 def create_review_item():
@@ -13275,6 +14161,7 @@ def create_review_item():
         
         if reviews_test_container_client:
             result = reviews_test_container_client.create_item(data)
+            REVIEW_STATS.record_change(None, data)
             return jsonify({
                 "success": True,
                 "message": "Review created successfully",
@@ -13293,40 +14180,107 @@ def create_review_item():
         }), 500
 
 
+REVIEW_QUEUE_FILTERS = ("status", "intent", "band", "minConfidence", "maxConfidence", "since", "until")
+
+
 @app.route("/api/reviews/pending", methods=["GET"])
 def get_pending_reviews():
-    """Get all pending reviews"""
+    """
+    Get pending reviews
+    v5.9.25: Paged when any of pageSize / continuationToken / view or a filter is given:
+      pageSize           reviews per page (REVIEW_PAGE_SIZE, max REVIEW_MAX_PAGE_SIZE)
+      continuationToken  token from the previous page (null on the last page)
+      view               list (default: queue fields + intent) or full (whole items)
+      status             pending (default), approved, needs_revision, ... or all
+      intent             aiResponse.intent
+      band               low / medium / high overall confidence (or minConfidence / maxConfidence)
+      since, until       ISO timestamps
+    Without any of them every pending review is returned in full (original behaviour).
+    Full items: GET /api/reviews/<review_id>
+    """
     try:
+        if not reviews_test_container_client:
+            return jsonify({
+                "success": False,
+                "error": "Reviews container not available",
+                "reviews": []
+            }), 500
+        
+        args = request.args
+        if any(name in args for name in ("pageSize", "continuationToken", "view") + REVIEW_QUEUE_FILTERS):
+            view = args.get("view", "list")
+            if view not in ("list", "full"):
+                return jsonify({"success": False, "error": "view must be list or full", "reviews": []}), 400
+            try:
+                filters = {name: args.get(name) for name in REVIEW_QUEUE_FILTERS if args.get(name)}
+                page = REVIEW_QUEUE.list_page(filters, page_size=args.get("pageSize", type=int),
+                                              continuation=args.get("continuationToken"), view=view)
+            except (ValueError, CosmosExceptions.CosmosHttpResponseError) as e:
+                status_code = getattr(e, "status_code", 400)
+                if status_code != 400:
+                    raise
+                return jsonify({"success": False, "error": f"Invalid filter or continuation token: {e}",
+                                "reviews": []}), 400
+            return jsonify({
+                "success": True,
+                "count": len(page["reviews"]),
+                "reviews": page["reviews"],
+                "continuationToken": page["continuationToken"],
+                "pageSize": page["pageSize"],
+                "view": view
+            })
+        
         query = """
         SELECT * FROM c 
         WHERE c.type = 'review_item' 
         AND c.status = 'pending'
         ORDER BY c.timestamp DESC
         """
+        reviews = list(reviews_test_container_client.query_items(
+            query=query,
+            enable_cross_partition_query=True
+        ))
         
-        if reviews_test_container_client:
-            reviews = list(reviews_test_container_client.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
+        return jsonify({
+            "success": True,
+            "count": len(reviews),
+            "reviews": reviews
+        })
             
-            return jsonify({
-                "success": True,
-                "count": len(reviews),
-                "reviews": reviews
-            })
-        else:
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "reviews": []
+        }), 500
+
+
+@app.route("/api/reviews/<review_id>", methods=["GET"])
+def get_review_detail(review_id):
+    """v5.9.25: Full review item (answer, entity payloads, context) for the detail view"""
+    try:
+        if not reviews_test_container_client:
             return jsonify({
                 "success": False,
-                "error": "Reviews container not available",
-                "reviews": []
+                "error": "Reviews container not available"
             }), 500
-            
+        
+        review = REVIEW_QUEUE.get_review(review_id)
+        if review is None:
+            return jsonify({
+                "success": False,
+                "error": "Review not found"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "review": review
+        })
+        
     except Exception as e:
         return jsonify({
             "success": False,
-            "error": str(e),
-            "reviews": []
+            "error": str(e)
         }), 500
 
 
@@ -13358,6 +14312,7 @@ def submit_review_feedback(review_id):
             }), 404
         
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         review['status'] = status
         review['humanFeedback'] = feedback
         review['reviewedBy'] = reviewer
@@ -13380,6 +14335,7 @@ def submit_review_feedback(review_id):
             review['createdAt'] = datetime.now(timezone.utc).isoformat()
         
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"✅ Review {status} by {reviewer}: {review_id}")
         
@@ -13405,6 +14361,7 @@ def submit_review_feedback(review_id):
             
             # Save all corrections to file
             save_hitl_corrections()
+            bump_training_version(question)  # v5.9.13
         # ========== END HITL CORRECTIONS ==========
         
         return jsonify({
@@ -13453,6 +14410,7 @@ def accept_review(review_id):
         
         # Update review
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         review['status'] = 'approved'
         review['humanFeedback'] = feedback
         review['reviewedBy'] = reviewer
@@ -13460,6 +14418,7 @@ def accept_review(review_id):
         
         # Save to database
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"✅ Review ACCEPTED by {reviewer}: {review_id}")
         print(f"   Feedback: {feedback}")
@@ -13514,6 +14473,7 @@ def reject_review(review_id):
         
         # Update review
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         review['status'] = 'needs_revision'
         review['humanFeedback'] = feedback
         review['reviewedBy'] = reviewer
@@ -13521,6 +14481,7 @@ def reject_review(review_id):
         
         # Save to database
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"⚠️ Review REJECTED by {reviewer}: {review_id}")
         print(f"   Feedback: {feedback}")
@@ -13578,6 +14539,7 @@ def mark_needs_revision(review_id):
         
         # Update review
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         review['status'] = 'needs_revision'
         review['humanFeedback'] = feedback
         review['reviewedBy'] = reviewer
@@ -13585,6 +14547,7 @@ def mark_needs_revision(review_id):
         
         # Save to database
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"📝 Review marked NEEDS REVISION by {reviewer}: {review_id}")
         print(f"   Feedback: {feedback}")
@@ -13630,6 +14593,7 @@ def regenerate_answer(review_id):
             }), 404
         
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         original_question = review.get('question', '')
         
         # TODO: Re-run the query through agents
@@ -13638,6 +14602,7 @@ def regenerate_answer(review_id):
         review['lastRegeneratedAt'] = datetime.now(timezone.utc).isoformat()
         
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"🔄 Regenerating answer for review: {review_id}")
         print(f"   Question: {original_question}")
@@ -13684,6 +14649,7 @@ def accept_agent_result(review_id, agent_name):
             }), 404
         
         review = items[0]
+        before = copy.deepcopy(review)  # v5.9.24: counters follow the transition
         
         # Track agent approvals
         if 'agentApprovals' not in review:
@@ -13696,6 +14662,7 @@ def accept_agent_result(review_id, agent_name):
         }
         
         reviews_test_container_client.upsert_item(review)
+        REVIEW_STATS.record_change(before, review)
         
         print(f"✅ {agent_name} result ACCEPTED by {reviewer} for review: {review_id}")
         
@@ -13716,7 +14683,11 @@ def accept_agent_result(review_id, agent_name):
 
 @app.route("/api/reviews/stats", methods=["GET"])
 def get_review_stats():
-    """Get statistics about reviews"""
+    """
+    Get statistics about reviews
+    v5.9.24: Served from the review counters (no review documents read); ?refresh=true
+    recomputes them with one aggregate query
+    """
     try:
         if not reviews_test_container_client:
             return jsonify({
@@ -13724,34 +14695,8 @@ def get_review_stats():
                 "error": "Reviews container not available"
             }), 500
         
-        # Query all reviews
-        query = "SELECT * FROM c WHERE c.type = 'review_item'"
-        all_reviews = list(reviews_test_container_client.query_items(
-            query=query,
-            enable_cross_partition_query=True
-        ))
-        
-        # Calculate stats
-        total = len(all_reviews)
-        pending = len([r for r in all_reviews if r.get('status') == 'pending'])
-        approved = len([r for r in all_reviews if r.get('status') == 'approved'])
-        needs_revision = len([r for r in all_reviews if r.get('status') == 'needs_revision'])
-        
-        # Calculate average confidence
-        confidences = [r for r in all_reviews if 'confidenceOverall' in r]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-        
-        stats = {
-            "success": True,
-            "total_reviews": total,
-            "pending": pending,
-            "approved": approved,
-            "needs_revision": needs_revision,
-            "average_confidence": round(avg_confidence, 2),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        return jsonify(stats)
+        counters = REVIEW_STATS.get_counters(refresh=request.args.get("refresh", "").lower() == "true")
+        return jsonify(review_stats_summary(counters))
         
     except Exception as e:
         print(f"❌ Error getting review stats: {e}")
@@ -13771,7 +14716,11 @@ def test_metrics():
 
 @app.route("/api/reviews/detailed-stats", methods=["GET"])
 def get_detailed_review_stats():
-    """Get detailed statistics - BULLETPROOF VERSION"""
+    """
+    Get detailed statistics - BULLETPROOF VERSION
+    v5.9.24: Counts, rates and averages from the review counters; ?refresh=true
+    recomputes them with one aggregate query
+    """
     try:
         print("[METRICS] detailed-stats endpoint called")
         
@@ -13783,115 +14732,14 @@ def get_detailed_review_stats():
                 "error": "Reviews container not available"
             }), 500
         
-        # Query reviews
         try:
-            query = "SELECT * FROM c WHERE c.type = 'review_item'"
-            all_reviews = list(reviews_test_container_client.query_items(
-                query=query,
-                enable_cross_partition_query=True
-            ))
-            print(f"[METRICS] Found {len(all_reviews)} reviews")
+            counters = REVIEW_STATS.get_counters(refresh=request.args.get("refresh", "").lower() == "true")
         except Exception as query_error:
-            print(f"[METRICS] ❌ Query error: {query_error}")
-            all_reviews = []
-        
-        # Calculate stats
-        total = len(all_reviews)
-        pending = sum(1 for r in all_reviews if r.get('status') == 'pending')
-        approved = sum(1 for r in all_reviews if r.get('status') == 'approved')
-        needs_revision = sum(1 for r in all_reviews if r.get('status') == 'needs_revision')
-        rejected = sum(1 for r in all_reviews if r.get('status') == 'rejected')
-        
-        # Confidence scores
-        intent_confs = [r.get('confidenceIntent', 0) for r in all_reviews if 'confidenceIntent' in r]
-        entity_confs = [r.get('confidenceEntity', 0) for r in all_reviews if 'confidenceEntity' in r]
-        answer_confs = [r.get('confidenceAnswer', 0) for r in all_reviews if 'confidenceAnswer' in r]
-        overall_confs = [r.get('confidenceOverall', 0) for r in all_reviews if 'confidenceOverall' in r]
-        
-        avg_intent = round(sum(intent_confs) / len(intent_confs), 2) if intent_confs else 0
-        avg_entity = round(sum(entity_confs) / len(entity_confs), 2) if entity_confs else 0
-        avg_answer = round(sum(answer_confs) / len(answer_confs), 2) if answer_confs else 0
-        avg_overall = round(sum(overall_confs) / len(overall_confs), 2) if overall_confs else 0
-        
-        # Rates
-        approval_rate = round((approved / total * 100), 2) if total > 0 else 0
-        revision_rate = round((needs_revision / total * 100), 2) if total > 0 else 0
-        rejection_rate = round((rejected / total * 100), 2) if total > 0 else 0
-        
-        # Intent accuracy
-        correct = sum(1 for r in all_reviews if r.get('status') == 'approved' and r.get('intentCorrect', False))
-        intent_accuracy = round((correct / total * 100), 2) if total > 0 else 0
-        
-        # Entity metrics
-        e_precision = []
-        e_recall = []
-        e_f1 = []
-        
-        for r in all_reviews:
-            if 'entityMetrics' in r:
-                m = r['entityMetrics']
-                if 'precision' in m: e_precision.append(m['precision'])
-                if 'recall' in m: e_recall.append(m['recall'])
-                if 'f1' in m: e_f1.append(m['f1'])
-        
-        avg_precision = round(sum(e_precision) / len(e_precision), 2) if e_precision else 0
-        avg_recall = round(sum(e_recall) / len(e_recall), 2) if e_recall else 0
-        avg_f1 = round(sum(e_f1) / len(e_f1), 2) if e_f1 else 0
-        
-        # Build response
-        response = {
-            "success": True,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "counts": {
-                "total_reviews": total,
-                "pending": pending,
-                "approved": approved,
-                "needs_revision": needs_revision,
-                "rejected": rejected
-            },
-            "rates": {
-                "approval_rate": approval_rate,
-                "revision_rate": revision_rate,
-                "rejection_rate": rejection_rate
-            },
-            "confidence": {
-                "intent": avg_intent,
-                "entity": avg_entity,
-                "answer": avg_answer,
-                "overall": avg_overall
-            },
-            "accuracy": {
-                "intent_accuracy": intent_accuracy,
-                "entity_precision": avg_precision,
-                "entity_recall": avg_recall,
-                "entity_f1": avg_f1
-            },
-            "agent_performance": {
-                "intent_agent": {
-                    "accuracy": intent_accuracy,
-                    "avg_confidence": avg_intent,
-                    "total_processed": len(intent_confs)
-                },
-                "entity_agent": {
-                    "precision": avg_precision,
-                    "recall": avg_recall,
-                    "f1_score": avg_f1,
-                    "avg_confidence": avg_entity,
-                    "total_processed": len(entity_confs)
-                },
-                "answer_agent": {
-                    "avg_confidence": avg_answer,
-                    "total_processed": len(answer_confs)
-                }
-            },
-            "trend": [],
-            "performance": {
-                "avg_response_time": 0,
-                "total_questions_evaluated": total
-            }
-        }
+            print(f"[METRICS] ❌ Counters error: {query_error}")
+            counters = {}
         
-        print(f"[METRICS] ✅ Returning stats for {total} reviews")
+        response = detailed_review_stats(counters)
+        print(f"[METRICS] ✅ Returning stats for {response['counts']['total_reviews']} reviews")
         return jsonify(response)
         
     except Exception as e:
@@ -14021,6 +14869,7 @@ def correct_intent():
         
         # ✅ TRAIN THE SYSTEM for similar questions
         train_intent(question, corrected_intent)
+        bump_training_version(question)  # v5.9.13: invalidate dependent cached answers only
         
         print(f"✅ HITL: Intent corrected AND trained to '{corrected_intent}'")
         save_hitl_corrections()  # Save to file for persistence
@@ -14062,6 +14911,7 @@ def correct_entities():
         
         # ✅ TRAIN THE SYSTEM for similar questions
         train_entities(question, corrected_entities)
+        bump_training_version(question)  # v5.9.13: invalidate dependent cached answers only
         
         action = "added" if added_entity else ("removed" if removed_entity else "updated")
         entity_name = added_entity or removed_entity or "entities"
@@ -14113,6 +14963,7 @@ def correct_answer():
         
         # ✅ TRAIN THE SYSTEM for similar questions
         train_answer(question, corrected_answer)
+        bump_training_version(question)  # v5.9.13: invalidate dependent cached answers only
         
         print(f"✅ HITL: Answer corrected AND trained (length: {len(corrected_answer)} chars)")
         save_hitl_corrections()  # Save to file for persistence
@@ -14497,79 +15348,137 @@ def get_case(case_id):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/query/stream", methods=["POST"])
-def query_ai_assistant_stream():
-    """Streaming SAMM query endpoint with ITAR compliance and real-time updates"""
-    user = require_auth()
-    if not user:
-        return jsonify({"error": "User not authenticated"}), 401
+def replay_cached_answer_sse(cached_entry: Dict[str, Any], start_time: float):
+    """
+    v5.9.14: Replay a cached answer as the same SSE event sequence a live
+    /api/query/stream run produces (intent -> entities -> compliance -> tokens -> complete)
+    """
+    metadata = cached_entry.get('metadata', {}) or {}
+    answer = cached_entry['answer']
+    entities = metadata.get('entities', [])
+    intent_info = {
+        'intent': metadata.get('intent', 'unknown'),
+        'confidence': metadata.get('intent_confidence', 0),
+        'cached': True
+    }
+    cache_age = round(time.time() - cached_entry['timestamp'], 2)
 
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
+    yield f"data: {json.dumps({'type': 'progress', 'step': 'cache_check', 'message': 'Using cached answer...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
+    yield f"data: {json.dumps({'type': 'intent_complete', 'data': intent_info, 'time': 0})}\n\n"
+    yield f"data: {json.dumps({'type': 'entities_complete', 'data': {'count': len(entities), 'entities': entities, 'confidence': metadata.get('entity_confidence', 0), 'files_processed': 0, 'file_entities': 0, 'file_relationships': 0, 'entity_metrics': metadata.get('entity_metrics', {}), 'entity_metrics_passed': metadata.get('entity_metrics_passed', {})}, 'time': 0})}\n\n"
+    yield f"data: {json.dumps({'type': 'compliance_complete', 'data': {'status': 'compliant', 'authorized': True, 'user_level': metadata.get('approved_authorization_level', DEFAULT_DEV_AUTH_LEVEL)}, 'time': 0})}\n\n"
+    yield f"data: {json.dumps({'type': 'answer_start', 'message': 'Streaming cached answer...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
 
-    data = request.get_json()
-    user_input = data.get("question", "").strip()
-    chat_history = data.get("chat_history", [])
-    staged_chat_documents_metadata = data.get("staged_chat_documents", [])
+    # Keep whitespace/newlines attached to each token so markdown renders identically
+    tokens = re.findall(r'\S+\s*', answer) or [answer]
+    cache_ttft = round(time.time() - start_time, 4)
+    for i, token in enumerate(tokens):
+        yield f"data: {json.dumps({'type': 'answer_token', 'token': token, 'position': i + 1})}\n\n"
 
-    if not user_input:
-        return jsonify({"error": "Query cannot be empty"}), 400
+    total_time = round(time.time() - start_time, 2)
+    yield f"data: {json.dumps({'type': 'answer_complete', 'answer': answer, 'enhanced': False})}\n\n"
+    yield f"data: {json.dumps({'type': 'complete', 'answer': answer, 'data': {'compliance_approved': True, 'cached': True, 'cache_age_seconds': cache_age, 'intent': intent_info['intent'], 'entities_found': len(entities), 'entities': entities, 'entity_metrics': metadata.get('entity_metrics', {}), 'entity_metrics_passed': metadata.get('entity_metrics_passed', {}), 'files_processed': 0, 'file_entities': 0, 'file_relationships': 0, 'answer_length': len(answer), 'token_count': len(tokens), 'timings': {'cache_ttft': cache_ttft, 'intent': 0, 'entity': 0, 'compliance': 0, 'answer': 0, 'total': total_time}}})}\n\n"
 
-    # === Extract user authorization profile ===
-    user_id = user["sub"]
-    user_profile = {
-        "user_id": user_id,
+
+def _inspect_stream_flight_frame(frame: str, meta: Dict[str, Any]) -> None:
+    """Record the final 'complete' frame of a shared stream"""
+    if '"type": "complete"' not in frame:
+        return
+    payload = json.loads(frame[len("data: "):].strip())
+    meta['complete'] = payload.get('data', {}) or {}
+
+
+def _stream_flight_used_llm(meta: Dict[str, Any]) -> bool:
+    """True when a shared stream produced its answer with a real generation"""
+    done = meta.get('complete')
+    if done is None:
+        return False
+    return not (done.get('cached') or done.get('hitl_corrected') or done.get('special_case')
+                or done.get('compliance_denied'))
+
+
+class GenerateAnswer(NamedTuple):
+    """v5.9.27: Stream pipeline effect - generate the answer; the driver sends back its tokens"""
+    prompt: str
+    system_message: str
+    temperature: float
+
+
+class CreateReviewItem(NamedTuple):
+    """v5.9.27: Stream pipeline effect - add a low-confidence answer to the review queue; sends back True if written"""
+    item: Dict[str, Any]
+
+
+def stream_user_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Authorization profile the stream's compliance check runs against"""
+    return {
+        "user_id": user["sub"],
         "authorization_level": user.get("authorization_level", DEFAULT_DEV_AUTH_LEVEL),
         "clearances": user.get("clearances", []),
         "role": user.get("role", "developer")
     }
-    # === END ===
 
-    # CRITICAL FIX: Load file content from blob storage BEFORE streaming starts
-    documents_with_content = []
-    if staged_chat_documents_metadata:
-        print(f"[Streaming] 📁 Loading content from {len(staged_chat_documents_metadata)} staged files...")
-        for idx, doc_meta in enumerate(staged_chat_documents_metadata, 1):
-            blob_name = doc_meta.get("blobName")
-            blob_container = doc_meta.get("blobContainer")
-            file_name = doc_meta.get("fileName", "Unknown")
-
-            if not blob_name:
-                print(f"[Streaming]   ⚠️ Missing blobName for {file_name}")
-                continue
 
-            # CRITICAL FIX: Select correct container client based on metadata
-            container_client = None
-            if blob_container == AZURE_CASE_DOCS_CONTAINER_NAME:
-                container_client = case_docs_blob_container_client
-                print(f"[Streaming]   File {idx}: {file_name} (CASE container)")
-            elif blob_container == AZURE_CHAT_DOCS_CONTAINER_NAME:
-                container_client = chat_docs_blob_container_client
-                print(f"[Streaming]   File {idx}: {file_name} (CHAT container)")
-            else:
-                print(f"[Streaming]   ⚠️ Unknown container '{blob_container}' for {file_name}")
+def stream_query_pipeline(user_input: str, chat_history: List[Dict[str, Any]],
+                          staged_chat_documents_metadata: List[Dict[str, Any]], user_profile: Dict[str, Any]):
+    """
+    v5.9.27: The /api/query/stream pipeline, shared by the Flask route and the ASGI route.
+    A generator of SSE frames that also yields GenerateAnswer / CreateReviewItem effects:
+    the driver (drive_effects here, drive_effects_async on the event loop) performs them
+    and sends the result back, so both routes emit the same frames.
+    """
+    # CRITICAL FIX: Load file content from blob storage BEFORE streaming starts
+    # v5.9.15: Runs inside the (single-flight) producer so coalesced streams fetch blobs once
+    def load_staged_documents():
+        documents_with_content = []
+        if staged_chat_documents_metadata:
+            query_log.debug("[Streaming] 📁 Loading content from %s staged files...", len(staged_chat_documents_metadata))
+            to_fetch = []
+            for idx, doc_meta in enumerate(staged_chat_documents_metadata, 1):
+                blob_name = doc_meta.get("blobName")
+                blob_container = doc_meta.get("blobContainer")
+                file_name = doc_meta.get("fileName", "Unknown")
+
+                if not blob_name:
+                    query_log.warning("[Streaming]   ⚠️ Missing blobName for %s", file_name)
+                    continue
 
-            if not container_client:
-                print(f"[Streaming]   ⚠️ Container client not available for {file_name}")
-                continue
+                # CRITICAL FIX: Select correct container client based on metadata
+                container_client = None
+                if blob_container == AZURE_CASE_DOCS_CONTAINER_NAME:
+                    container_client = case_docs_blob_container_client
+                    query_log.debug("[Streaming]   File %s: %s (CASE container)", idx, file_name)
+                elif blob_container == AZURE_CHAT_DOCS_CONTAINER_NAME:
+                    container_client = chat_docs_blob_container_client
+                    query_log.debug("[Streaming]   File %s: %s (CHAT container)", idx, file_name)
+                else:
+                    query_log.warning("[Streaming]   ⚠️ Unknown container '%s' for %s", blob_container, file_name)
 
-            # Fetch content using the CORRECT container client
-            print(f"[Streaming]   Fetching file {idx}: {file_name} from {blob_container}")
-            content = fetch_blob_content(blob_name, container_client)
+                if not container_client:
+                    query_log.warning("[Streaming]   ⚠️ Container client not available for %s", file_name)
+                    continue
 
-            if content:
-                documents_with_content.append({
-                    **doc_meta,
-                    "content": content[:5000]
-                })
-                print(f"[Streaming]   ✅ Loaded {len(content)} chars from {file_name}")
-            else:
-                print(f"[Streaming]   ⚠️ No content retrieved from {file_name}")
+                # Fetch content using the CORRECT container client
+                query_log.debug("[Streaming]   Fetching file %s: %s from %s", idx, file_name, blob_container)
+                to_fetch.append((doc_meta, blob_name, container_client))
+
+            # v5.9.21: All attachments fetched concurrently (cached by etag)
+            # v5.9.22: Ingested attachments come from their upload-time artefacts
+            documents = load_attachment_documents(
+                user_input, [(doc_meta, container_client) for doc_meta, _, container_client in to_fetch],
+                max_chars=ATTACHMENT_CONTENT_CHARS)
+            for (doc_meta, _, _), document in zip(to_fetch, documents):
+                file_name = doc_meta.get("fileName", "Unknown")
+                if document:
+                    documents_with_content.append(document)
+                    query_log.debug("[Streaming]   ✅ Loaded %s chars from %s", len(document['content']), file_name)
+                else:
+                    query_log.warning("[Streaming]   ⚠️ No content retrieved from %s", file_name)
 
-        print(
-            f"[Streaming] 📊 Result: {len(documents_with_content)}/{len(staged_chat_documents_metadata)} files loaded successfully")
-    else:
-        print(f"[Streaming] No staged documents in request")
+            query_log.debug("[Streaming] 📊 Result: %s/%s files loaded successfully", len(documents_with_content), len(staged_chat_documents_metadata))
+        else:
+            query_log.debug("[Streaming] No staged documents in request")
+        return documents_with_content
 
     def check_and_apply_hitl_corrections(question):
         """Check HITL store and return corrections if exist - includes PATTERN MATCHING"""
@@ -14577,10 +15486,11 @@ def query_ai_assistant_stream():
 
         q_hash = create_question_hash(question)
 
-        print(f"🔍 HITL CHECK: Looking for hash = {q_hash}")
-        print(f"🔍 HITL CHECK: Question = '{question}'")
-        print(f"🔍 HITL CHECK: Store has {len(HITL_CORRECTIONS_STORE['answer_corrections'])} answer corrections")
-        print(f"🔍 HITL CHECK: Store keys = {list(HITL_CORRECTIONS_STORE['answer_corrections'].keys())}")
+        query_log.debug("🔍 HITL CHECK: Looking for hash = %s", q_hash)
+        query_log.debug("🔍 HITL CHECK: Question = '%s'", question)
+        query_log.debug("🔍 HITL CHECK: Store has %s answer corrections", len(HITL_CORRECTIONS_STORE['answer_corrections']))
+        if query_log.isEnabledFor(logging.DEBUG):
+            query_log.debug("🔍 HITL CHECK: Store keys = %s", list(HITL_CORRECTIONS_STORE['answer_corrections'].keys()))
 
         # Check EXACT matches first
         has_intent = q_hash in HITL_CORRECTIONS_STORE["intent_corrections"]
@@ -14604,41 +15514,44 @@ def query_ai_assistant_stream():
         has_any_pattern = trained_intent or trained_entities or trained_answer
 
         if not (has_any_exact or has_any_pattern):
-            print(f"🔍 HITL CHECK: No corrections found (exact or pattern)")
+            query_log.debug("🔍 HITL CHECK: No corrections found (exact or pattern)")
             return None
 
-        print(f"✅ HITL CORRECTIONS FOUND!")
+        query_log.debug("✅ HITL CORRECTIONS FOUND!")
         corrections = {}
 
         # Intent - exact or pattern
         if has_intent:
             corrections['intent'] = HITL_CORRECTIONS_STORE["intent_corrections"][q_hash]
-            print(f"   🔄 Intent: {corrections['intent']} (exact)")
+            query_log.debug("   🔄 Intent: %s (exact)", corrections['intent'])
         elif trained_intent:
             corrections['intent'] = trained_intent['intent']
-            print(f"   🔄 Intent: {corrections['intent']} ({trained_intent['source']})")
+            query_log.debug("   🔄 Intent: %s (%s)", corrections['intent'], trained_intent['source'])
 
         # Entities - exact or pattern
         if has_entities:
             corrections['entities'] = HITL_CORRECTIONS_STORE["entity_corrections"][q_hash]
-            print(f"   🔄 Entities: {len(corrections['entities'])} entities (exact)")
+            query_log.debug("   🔄 Entities: %s entities (exact)", len(corrections['entities']))
         elif trained_entities:
             corrections['entities'] = trained_entities['entities']
-            print(f"   🔄 Entities: {len(corrections['entities'])} entities ({trained_entities['source']})")
+            query_log.debug("   🔄 Entities: %s entities (%s)", len(corrections['entities']), trained_entities['source'])
 
         # Answer - exact or pattern
         if has_answer:
             corrections['answer'] = HITL_CORRECTIONS_STORE["answer_corrections"][q_hash]
-            print(f"   🔄 Answer: {len(corrections['answer'])} chars (exact)")
+            query_log.debug("   🔄 Answer: %s chars (exact)", len(corrections['answer']))
         elif trained_answer:
             corrections['answer'] = trained_answer
-            print(f"   🔄 Answer: {len(corrections['answer'])} chars (pattern)")
+            query_log.debug("   🔄 Answer: %s chars (pattern)", len(corrections['answer']))
 
         return corrections
 
+    @traced("stream_query_pipeline")
     def generate():
         try:
             start_time = time.time()
+            data_versions = DATA_VERSIONS.capture()  # v5.9.36: the cached answer is stamped with these
+            documents_with_content = load_staged_documents()
 
             # START - Send immediately with file count
             yield f"data: {json.dumps({'type': 'start', 'query': user_input, 'timestamp': time.time(), 'files_loaded': len(documents_with_content)})}\n\n"
@@ -14647,7 +15560,7 @@ def query_ai_assistant_stream():
             # ========== ORIGINAL HITL CHECK (for other questions) ==========
             hitl_corrections = check_and_apply_hitl_corrections(user_input)
             if hitl_corrections and 'answer' in hitl_corrections:
-                print("⚡ HITL CORRECTION FOUND - Returning corrected answer immediately!")
+                query_log.debug("⚡ HITL CORRECTION FOUND - Returning corrected answer immediately!")
 
                 yield f"data: {json.dumps({'type': 'progress', 'step': 'hitl_check', 'message': 'Using corrected answer from HITL...', 'elapsed': 0.1})}\n\n"
                 yield f"data: {json.dumps({'type': 'answer_start', 'message': 'Streaming corrected answer...', 'elapsed': 0.2})}\n\n"
@@ -14663,6 +15576,19 @@ def query_ai_assistant_stream():
                 return
             # ========== END HITL CHECK ==========
 
+            # v5.9.14: Shared answer cache (same cache as /api/query); attachments change the answer, so skip then
+            use_answer_cache = CACHE_ENABLED and not documents_with_content
+            if use_answer_cache:
+                cached_result = get_from_cache(user_input)
+                if cached_result and cache_entry_allowed_for(cached_result, user_profile):
+                    query_log.debug("[Streaming] ⚡ Cache hit - replaying cached answer for: '%s...'", user_input[:50])
+                    yield from replay_cached_answer_sse(cached_result, start_time)
+                    return
+
+            # v5.9.17: Stage graph - compliance overlaps retrieval, context building overlaps compliance
+            scheduler = StageScheduler(PIPELINE_STAGE_EXECUTOR, origin=time.perf_counter() - (time.time() - start_time),
+                                       observe=observe_pipeline_stage)
+
             # STEP 1: Intent Analysis
             yield f"data: {json.dumps({'type': 'progress', 'step': 'intent_analysis', 'message': 'Analyzing query intent...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
             intent_start = time.time()
@@ -14670,10 +15596,11 @@ def query_ai_assistant_stream():
             q_hash = create_question_hash(user_input)
             if q_hash in HITL_CORRECTIONS_STORE["intent_corrections"]:
                 corrected_intent = HITL_CORRECTIONS_STORE["intent_corrections"][q_hash]
-                print(f"🔄 HITL: Intent correction applied ({corrected_intent})")
+                query_log.debug("🔄 HITL: Intent correction applied (%s)", corrected_intent)
                 intent_info = {"intent": corrected_intent, "confidence": 1.0, "hitl_corrected": True}
+                scheduler.provide('intent', intent_info)
             else:
-                intent_info = orchestrator.intent_agent.analyze_intent(user_input)
+                intent_info = scheduler.run('intent', lambda: orchestrator.intent_agent.analyze_intent(user_input))
 
             intent_time = round(time.time() - intent_start, 2)
             yield f"data: {json.dumps({'type': 'intent_complete', 'data': intent_info, 'time': intent_time})}\n\n"
@@ -14681,7 +15608,7 @@ def query_ai_assistant_stream():
             # === CHECK FOR SPECIAL CASES ===
             if intent_info.get('special_case', False):
                 special_intent = intent_info.get('intent')
-                print(f"[Streaming] Special case detected: {special_intent}")
+                query_log.debug("[Streaming] Special case detected: %s", special_intent)
 
                 yield f"data: {json.dumps({'type': 'progress', 'step': 'special_case_handling', 'message': f'Handling {special_intent} query...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
 
@@ -14718,10 +15645,11 @@ def query_ai_assistant_stream():
             yield f"data: {json.dumps({'type': 'progress', 'step': 'entity_extraction', 'message': f'Extracting entities from query{file_msg}...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
 
             entity_start = time.time()
+            scheduler.add('compliance', compliance_stage(user_input, user_profile), requires=('intent', 'entities'))
 
             if q_hash in HITL_CORRECTIONS_STORE["entity_corrections"]:
                 corrected_entities = HITL_CORRECTIONS_STORE["entity_corrections"][q_hash]
-                print(f"🔄 HITL: Entity corrections applied ({len(corrected_entities)} entities)")
+                query_log.debug("🔄 HITL: Entity corrections applied (%s entities)", len(corrected_entities))
                 entity_info = {
                     "entities": corrected_entities,
                     "overall_confidence": 1.0,
@@ -14730,14 +15658,28 @@ def query_ai_assistant_stream():
                     "relationships": []
                 }
             else:
-                entity_info = orchestrator.entity_agent.extract_and_retrieve(
+                entity_info = scheduler.run('retrieval', lambda: orchestrator.entity_agent.extract_and_retrieve(
                     user_input,
                     intent_info,
-                    documents_with_content
-                )
+                    documents_with_content,
+                    on_entities=lambda entities: scheduler.provide('entities', entities)
+                ))
+            scheduler.provide('entities', entity_info.get('entities', []))
 
             entity_time = round(time.time() - entity_start, 2)
 
+            # v5.9.17: Context/prompt building needs only retrieval output - run it while compliance finishes
+            def _build_answer_inputs():
+                answer_context = orchestrator.answer_agent._build_comprehensive_context(
+                    user_input, intent_info, entity_info, chat_history, documents_with_content
+                )
+                answer_intent = intent_info.get("intent", "general")
+                answer_system_msg = orchestrator.answer_agent._create_optimized_system_message(answer_intent, answer_context, entity_info, user_input)  # v5.9.11: Pass query for Gold guidance
+                answer_prompt = orchestrator.answer_agent._create_enhanced_prompt(user_input, intent_info, entity_info)
+                return answer_context, answer_system_msg, answer_prompt
+
+            scheduler.add('context', _build_answer_inputs)
+
             files_processed = entity_info.get('files_processed', 0)
             file_entities = entity_info.get('file_entities_found', 0)
             file_relationships = entity_info.get('file_relationships_found', 0)
@@ -14751,9 +15693,8 @@ def query_ai_assistant_stream():
             # STEP 3: Compliance Check
             yield f"data: {json.dumps({'type': 'progress', 'step': 'compliance_check', 'message': 'Checking ITAR compliance...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
 
-            compliance_start = time.time()
-            compliance_result = check_compliance(user_input, intent_info, entity_info, user_profile)
-            compliance_time = round(time.time() - compliance_start, 2)
+            compliance_result = scheduler.result('compliance')
+            compliance_time = scheduler.timings().get('compliance', {}).get('duration', 0.0)
 
             yield f"data: {json.dumps({'type': 'compliance_complete', 'data': {'status': compliance_result.get('compliance_status'), 'authorized': compliance_result.get('authorized'), 'user_level': compliance_result.get('user_authorization_level')}, 'time': compliance_time})}\n\n"
 
@@ -14770,7 +15711,7 @@ def query_ai_assistant_stream():
                 yield f"data: {json.dumps({'type': 'answer_start', 'message': 'Access restricted'})}\n\n"
                 yield f"data: {json.dumps({'type': 'answer_token', 'token': denial_msg, 'position': 1})}\n\n"
                 yield f"data: {json.dumps({'type': 'answer_complete', 'answer': denial_msg})}\n\n"
-                yield f"data: {json.dumps({'type': 'complete', 'answer': denial_msg, 'data': {'compliance_denied': True, 'timings': {'total': round(time.time() - start_time, 2)}}})}\n\n"
+                yield f"data: {json.dumps({'type': 'complete', 'answer': denial_msg, 'data': {'compliance_denied': True, 'timings': {'total': round(time.time() - start_time, 2), 'stages': scheduler.timings()}}})}\n\n"
                 return
 
             # STEP 4: Answer Generation
@@ -14779,24 +15720,24 @@ def query_ai_assistant_stream():
 
             answer_start = time.time()
 
-            context = orchestrator.answer_agent._build_comprehensive_context(
-                user_input, intent_info, entity_info, chat_history, documents_with_content
-            )
-
+            context, system_msg, prompt = scheduler.result('context')
             intent = intent_info.get("intent", "general")
-            system_msg = orchestrator.answer_agent._create_optimized_system_message(intent, context, entity_info, user_input)  # v5.9.11: Pass query for Gold guidance
-            prompt = orchestrator.answer_agent._create_enhanced_prompt(user_input, intent_info, entity_info)
 
             yield f"data: {json.dumps({'type': 'answer_start', 'message': 'Streaming answer...', 'elapsed': round(time.time() - start_time, 2)})}\n\n"
 
             full_answer = ""
             token_count = 0
-
-            for token in call_ollama_streaming(prompt, system_msg, temperature=0.1):
-                if token and not token.startswith("Error"):
-                    full_answer += token
-                    token_count += 1
-                    yield f"data: {json.dumps({'type': 'answer_token', 'token': token, 'position': token_count})}\n\n"
+            ttft = None
+
+            with scheduler.timed('answer'):
+                tokens = yield GenerateAnswer(prompt, system_msg, 0.1)
+                for token in tokens:
+                    if token and not token.startswith("Error"):
+                        if ttft is None:
+                            ttft = round(time.time() - start_time, 4)
+                        full_answer += token
+                        token_count += 1
+                        yield f"data: {json.dumps({'type': 'answer_token', 'token': token, 'position': token_count})}\n\n"
 
             answer_time = round(time.time() - answer_start, 2)
             total_time = round(time.time() - start_time, 2)
@@ -14808,7 +15749,22 @@ def query_ai_assistant_stream():
             final_answer = enhanced_answer if enhanced_answer else full_answer
 
             yield f"data: {json.dumps({'type': 'answer_complete', 'answer': final_answer, 'enhanced': (enhanced_answer != full_answer)})}\n\n"
-            yield f"data: {json.dumps({'type': 'complete', 'answer': final_answer, 'data': {'compliance_approved': True, 'intent': intent, 'entities_found': len(entity_info.get('entities', [])), 'entities': entity_info.get('entities', []), 'entity_metrics': entity_info.get('entity_metrics', {}), 'entity_metrics_passed': entity_info.get('entity_metrics_passed', {}), 'files_processed': files_processed, 'file_entities': file_entities, 'file_relationships': file_relationships, 'answer_length': len(final_answer), 'token_count': token_count, 'timings': {'intent': intent_time, 'entity': entity_time, 'compliance': compliance_time, 'answer': answer_time, 'total': total_time}}})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', 'answer': final_answer, 'data': {'compliance_approved': True, 'intent': intent, 'entities_found': len(entity_info.get('entities', [])), 'entities': entity_info.get('entities', []), 'entity_metrics': entity_info.get('entity_metrics', {}), 'entity_metrics_passed': entity_info.get('entity_metrics_passed', {}), 'files_processed': files_processed, 'file_entities': file_entities, 'file_relationships': file_relationships, 'answer_length': len(final_answer), 'token_count': token_count, 'timings': {'intent': intent_time, 'entity': entity_time, 'compliance': compliance_time, 'answer': answer_time, 'ttft': ttft, 'total': total_time, 'stages': scheduler.timings()}}})}\n\n"
+
+            # v5.9.14: Populate the shared answer cache (metadata in /api/query shape)
+            if use_answer_cache and full_answer and len(final_answer) >= 20:
+                save_to_cache(user_input, final_answer, {
+                    'intent': intent,
+                    'intent_confidence': intent_info.get('confidence', 0),
+                    'entities': entity_info.get('entities', []),
+                    'entities_found': len(entity_info.get('entities', [])),
+                    'entity_confidence': entity_info.get('overall_confidence', 0),
+                    'entity_metrics': entity_info.get('entity_metrics', {}),
+                    'entity_metrics_passed': entity_info.get('entity_metrics_passed', {}),
+                    'approved_authorization_level': user_profile['authorization_level'],
+                    'system_version': 'Integrated_Database_SAMM_v5.0',
+                    'source': 'stream'
+                }, data_versions)
 
             # Confidence check for HITL
             intent_confidence = intent_info.get('confidence', 0.5)
@@ -14816,11 +15772,10 @@ def query_ai_assistant_stream():
             answer_confidence = 0.8 if len(final_answer) > 200 else 0.5
             overall_confidence = (intent_confidence + entity_confidence + answer_confidence) / 3
 
-            print(
-                f"📊 Confidence: Intent={intent_confidence:.2f}, Entity={entity_confidence:.2f}, Answer={answer_confidence:.2f}, Overall={overall_confidence:.2f}")
+            query_log.debug("📊 Confidence: Intent=%.2f, Entity=%.2f, Answer=%.2f, Overall=%.2f", intent_confidence, entity_confidence, answer_confidence, overall_confidence)
 
             if overall_confidence < 0.95:
-                print(f"⚠️ LOW CONFIDENCE ({overall_confidence:.2f}) - Adding to HITL queue...")
+                query_log.warning("⚠️ LOW CONFIDENCE (%.2f) - Adding to HITL queue...", overall_confidence)
 
                 try:
                     review_item = {
@@ -14846,22 +15801,71 @@ def query_ai_assistant_stream():
                         "reviewedAt": ""
                     }
 
-                    if reviews_test_container_client:
-                        reviews_test_container_client.create_item(review_item)
-                        print(f"✅ Added to review queue: {review_item['reviewId']}")
+                    if (yield CreateReviewItem(review_item)):
+                        query_log.debug("✅ Added to review queue: %s", review_item['reviewId'])
                         yield f"data: {json.dumps({'type': 'hitl_triggered', 'message': 'Low confidence - added to review queue', 'reviewId': review_item['reviewId']})}\n\n"
 
                 except Exception as e:
-                    print(f"❌ Error adding to review queue: {e}")
+                    query_log.error("❌ Error adding to review queue: %s", e)
 
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
-            print(f"[Streaming Error] {error_detail}")
+            query_log.error("[Streaming Error] %s", error_detail)
             yield f"data: {json.dumps({'type': 'error', 'error': str(e), 'detail': error_detail})}\n\n"
 
+    return generate()
+
+
+@traced()
+def add_stream_review_item(effect: CreateReviewItem) -> bool:
+    """Write a low-confidence stream answer to the review queue (False without a reviews container)"""
+    if not reviews_test_container_client:
+        return False
+    with STEP_SECONDS.labels("review_write").time():
+        reviews_test_container_client.create_item(effect.item)
+    REVIEW_STATS.record_change(None, effect.item)
+    return True
+
+
+STREAM_EFFECT_HANDLERS = {
+    GenerateAnswer: lambda effect: call_ollama_streaming(effect.prompt, effect.system_message, temperature=effect.temperature),
+    CreateReviewItem: add_stream_review_item,
+}
+
+
+@app.route("/api/query/stream", methods=["POST"])
+def query_ai_assistant_stream():
+    """Streaming SAMM query endpoint with ITAR compliance and real-time updates"""
+    user = require_auth()
+    if not user:
+        return jsonify({"error": "User not authenticated"}), 401
+
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    user_input = data.get("question", "").strip()
+
+    if not user_input:
+        return jsonify({"error": "Query cannot be empty"}), 400
+
+    user_profile = stream_user_profile(user)
+
+    # v5.9.15: Identical concurrent streams share one producer; every subscriber
+    # receives the full frame sequence (the pipeline needs no request context)
+    flight_key = query_flight_key(user_input, data, user_profile, stream=True)
+    frames = STREAM_FLIGHTS.stream(
+        flight_key,
+        lambda: drive_effects(stream_query_pipeline(user_input, data.get("chat_history", []),
+                                                    data.get("staged_chat_documents", []), user_profile),
+                              STREAM_EFFECT_HANDLERS),
+        llm_used_meta=_stream_flight_used_llm,
+        inspect_frame=_inspect_stream_flight_frame
+    )
+
     return Response(
-        stream_with_context(generate()),
+        stream_with_context(frames),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -14892,6 +15896,7 @@ def reset_demo():
             for store in ["intent_corrections", "entity_corrections", "answer_corrections"]:
                 if q_hash in HITL_CORRECTIONS_STORE[store]:
                     del HITL_CORRECTIONS_STORE[store][q_hash]
+            bump_training_version(DEMO_SCENARIOS[scenario_name]["question"])  # v5.9.13
         
         print(f"🔄 HITL: Demo reset for {', '.join(scenarios_to_reset).upper()}")
         return jsonify({"success": True, "message": f"Demo reset complete for {', '.join(scenarios_to_reset)}"})
@@ -14925,7 +15930,339 @@ def warm_up_ollama():
     threading.Thread(target=_warmup, daemon=True).start()
 
 
-warm_up_ollama()
+# v5.9.26: no warm-up on import - a preloading master must not fork with a request in
+# flight on ollama_session. The dev server (__main__) and the first gunicorn worker call it.
+
+
+# =============================================================================
+# v5.9.26: PRODUCTION SERVING (gunicorn prefork, see gunicorn.conf.py)
+# =============================================================================
+#   gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_app()"
+#
+# The master imports this module and runs create_app() once, then forks the
+# workers: the KG, 2-hop path index, embedding model, vector DB client and the
+# compiled entity / intent patterns are shared copy-on-write. gc.freeze() keeps
+# worker GC passes from writing to (and un-sharing) those pages. Each worker then
+# drops the connections it inherited (reset_after_fork).
+
+SERVING_WARMUP_TEXT = ("The Defense Security Cooperation Agency (DSCA) directs the Letter of Offer and "
+                       "Acceptance (LOA) process for Foreign Military Sales (FMS) cases, FMS-2024-TW-001.")
+_serving_preloaded: Optional[Dict[str, Any]] = None
+
+
+def _warm_matchers() -> bool:
+    """Patterns the agents compile on first use (re's cache), without any LLM or database call"""
+    try:
+        entity_agent = orchestrator.entity_agent
+        entity_agent._extract_entities_from_text(SERVING_WARMUP_TEXT, "serving_warmup")
+        entity_agent._extract_relationships_from_text(SERVING_WARMUP_TEXT, "serving_warmup")
+        orchestrator.intent_agent._detect_intent_from_patterns(SERVING_WARMUP_TEXT)
+        return True
+    except Exception as e:
+        print(f"[Serving] ⚠️ Matcher warm-up failed: {e}")
+        return False
+
+
+def _warm_vector_index() -> int:
+    """Vector index segments: a query with a zero vector loads them without running the model
+    (no torch forward pass in the master - its thread pool does not survive fork)"""
+    loaded = 0
+    if db_manager.vector_db_client and db_manager.embedding_model:
+        try:
+            dimension = db_manager.embedding_model.get_sentence_embedding_dimension()
+            for collection in db_manager.vector_db_client.list_collections():
+                db_manager.vector_db_client.get_collection(collection.name).query(
+                    query_embeddings=[[0.0] * dimension], n_results=1)
+                loaded += 1
+        except Exception as e:
+            print(f"[Serving] ⚠️ Vector index warm-up failed: {e}")
+    return loaded
+
+
+SUBSYSTEMS.register("two_hop", lambda: TWO_HOP_PATH_FINDER is not None or initialize_2hop_rag(SAMM_KG_JSON_FILE),
+                    requires=("knowledge_snapshot",))
+SUBSYSTEMS.register("matchers", _warm_matchers, requires=("orchestrator",))
+SUBSYSTEMS.register("vector_index", _warm_vector_index, requires=("vector_db", "embedding_model"))
+
+
+def warmup(names: Optional[List[str]] = None, exclude: Tuple[str, ...] = ()) -> Dict[str, Dict[str, Any]]:
+    """v5.9.28: build the lazy subsystems now (default: all) instead of on the first request"""
+    timings = SUBSYSTEMS.warmup(names, exclude=exclude)
+    summary = ", ".join(f"{name} {timing['seconds']:.2f}s" for name, timing in timings.items())
+    print(f"[Startup] Warm: {summary}")
+    return timings
+
+
+def preload_for_serving() -> Dict[str, Any]:
+    """Load the structures every request needs; returns what was loaded (idempotent)"""
+    global _serving_preloaded
+    if _serving_preloaded is not None:
+        return _serving_preloaded
+    start = time.time()
+    # Gremlin is a websocket: opened per worker in reset_after_fork, not in the master
+    warmup(exclude=("gremlin",))
+    loaded: Dict[str, Any] = {"two_hop": SUBSYSTEMS.get("two_hop"), "knowledge_from": KNOWLEDGE_SNAPSHOT.get_stats()["source"],
+                              "matchers": SUBSYSTEMS.get("matchers"),
+                              "vector_collections": SUBSYSTEMS.get("vector_index"),
+                              "embedding_model": db_manager.embedding_model is not None}
+    loaded["seconds"] = round(time.time() - start, 2)
+    print(f"[Serving] Preloaded: {loaded}")
+    _serving_preloaded = loaded
+    return loaded
+
+
+def create_app() -> Flask:
+    """WSGI entry point: preload, close the master's Gremlin websocket, freeze the heap"""
+    preload_for_serving()
+    if SUBSYSTEMS.is_ready("gremlin") and db_manager.cosmos_gremlin_client:
+        try:
+            db_manager.cosmos_gremlin_client.close()  # workers open their own in reset_after_fork
+        except Exception:
+            pass
+        db_manager.cosmos_gremlin_client = None
+    SUBSYSTEMS.reset("gremlin")
+    import gc
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _azure_http_session(sdk_client) -> Optional[requests.Session]:
+    """The requests session under an azure-core client (None if the SDK layout differs)"""
+    owner = getattr(sdk_client, "client_connection", None)  # CosmosClient
+    pipeline = getattr(getattr(owner, "pipeline_client", None), "_pipeline", None) or getattr(sdk_client, "_pipeline", None)
+    session = getattr(getattr(pipeline, "_transport", None), "session", None)
+    return session if isinstance(session, requests.Session) else None
+
+
+def reset_after_fork(warm_ollama: bool = False) -> None:
+    """
+    Run in each worker before it serves: pooled sockets opened by the master (Ollama,
+    compliance, Cosmos, Blob) are dropped so the worker dials its own, and Gremlin
+    reconnects. SQLite tiers reopen per process on their own (pid check).
+    """
+    PDF_EXTRACTOR.start()  # v5.9.36: fork the PDF page workers before any request thread exists
+    sessions = [ollama_session, compliance_http_session]
+    if SUBSYSTEMS.is_ready("cosmos"):
+        sessions.append(_azure_http_session(cosmos_client))
+    if SUBSYSTEMS.is_ready("blob"):
+        sessions.append(_azure_http_session(blob_service_client))
+    for http_session in sessions:
+        if http_session is not None:
+            http_session.close()  # clears the adapters' pools; the session stays usable
+    LOGGING.restart_after_fork()  # v5.9.30: the master's log listener thread is not inherited
+    METRICS.reset_after_fork()  # v5.9.31: drop what the master recorded while preloading; start flushing
+    SUBSYSTEMS.get("gremlin")
+    if warm_ollama:
+        warm_up_ollama()
+    print(f"[Serving] Worker {os.getpid()} ready")
+
+
+# =============================================================================
+# v5.9.27: ASYNC STREAM SERVING (WEB_SERVER=asgi)
+# =============================================================================
+# /api/query/stream on an event loop: an open stream awaits Ollama and the review
+# write instead of holding a WSGI thread for the whole generation. The pipeline's
+# CPU-bound steps (retrieval, compliance, prompt building) share a bounded pool;
+# every other route is the Flask app behind the WSGI bridge's thread pool.
+STREAM_STEP_WORKERS = int(os.getenv("STREAM_STEP_WORKERS", "16"))
+STREAM_STEP_EXECUTOR = ThreadPoolExecutor(max_workers=STREAM_STEP_WORKERS, thread_name_prefix="stream-step")
+# Generations queue at Ollama (OLLAMA_NUM_PARALLEL), so allow one pending request per open stream
+OLLAMA_ASYNC_MAX_CONNECTIONS = int(os.getenv("OLLAMA_ASYNC_MAX_CONNECTIONS", "2048"))
+ollama_async_client = None
+async_cosmos_client = None
+reviews_async_container = None
+
+
+async def start_async_stream_clients() -> None:
+    """ASGI lifespan startup: Ollama and Cosmos clients bound to the serving event loop"""
+    global ollama_async_client, async_cosmos_client, reviews_async_container
+    try:
+        import httpx
+        ollama_async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(200.0, connect=10.0, pool=None),  # same 200s as call_ollama_streaming
+            limits=httpx.Limits(max_connections=OLLAMA_ASYNC_MAX_CONNECTIONS, max_keepalive_connections=64)
+        )
+    except ImportError:
+        print("[Serving] ⚠️ httpx not installed - answer generation runs on the stream step pool")
+    # a lazy proxy: connects Cosmos if it has not yet (v5.9.33: a stand-in container has no endpoint)
+    if reviews_test_container_client and COSMOS_ENDPOINT:
+        try:
+            import aiohttp  # noqa: F401 - transport of azure.cosmos.aio
+            from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+            async_cosmos_client = AsyncCosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+            reviews_async_container = async_cosmos_client.get_database_client(DATABASE_NAME).get_container_client("reviews")
+        except ImportError:
+            print("[Serving] ⚠️ aiohttp not installed - review writes run on the stream step pool")
+    print(f"[Serving] Async streaming ready in {os.getpid()} (step workers={STREAM_STEP_WORKERS}, "
+          f"httpx={'yes' if ollama_async_client else 'no'}, cosmos aio={'yes' if reviews_async_container else 'no'})")
+
+
+async def close_async_stream_clients() -> None:
+    global ollama_async_client, async_cosmos_client, reviews_async_container
+    if ollama_async_client is not None:
+        await ollama_async_client.aclose()
+        ollama_async_client = None
+    if async_cosmos_client is not None:
+        await async_cosmos_client.close()
+        async_cosmos_client = reviews_async_container = None
+
+
+@traced()
+async def call_ollama_streaming_async(prompt: str, system_message: str = "", temperature: float = 0.1) -> List[str]:
+    """call_ollama_streaming() awaited on the event loop: same payload, word tokens and error strings"""
+    loop = asyncio.get_running_loop()
+    if ollama_async_client is None:
+        return await loop.run_in_executor(
+            STREAM_STEP_EXECUTOR, lambda: list(call_ollama_streaming(prompt, system_message, temperature)))
+    import httpx
+    start = time.perf_counter()
+    try:
+        response = await ollama_async_client.post(f"{OLLAMA_URL}/api/chat",
+                                                  json=ollama_stream_payload(prompt, system_message, temperature))
+        if response.status_code != 200:
+            llm_log.error("[Ollama] ❌ Bad status: %s", response.status_code)
+            LLM_CALLS.labels("stream_async", "error").inc()
+            return [f"Error: Ollama returned status {response.status_code}"]
+        result = response.json()
+        if 'message' in result and 'content' in result['message']:
+            elapsed = time.perf_counter() - start
+            LLM_TTFT_SECONDS.labels("stream_async").observe(elapsed)
+            LLM_SECONDS.labels("stream_async").observe(elapsed)
+            LLM_CALLS.labels("stream_async", "ok").inc()
+            return [word + " " for word in result['message']['content'].split()]
+        llm_log.error("[Ollama] ❌ No content in response")
+        LLM_CALLS.labels("stream_async", "error").inc()
+        return ["Error: Ollama response missing content field."]
+    except httpx.TimeoutException:
+        llm_log.error("[Ollama] ❌ Request timed out")
+        LLM_CALLS.labels("stream_async", "timeout").inc()
+        return ["Error: The AI service took too long to respond. Please try a simpler question."]
+    except httpx.ConnectError as e:
+        llm_log.error("[Ollama] ❌ Connection error: %s", e)
+        LLM_CALLS.labels("stream_async", "error").inc()
+        return [f"Error: Cannot connect to Ollama at {OLLAMA_URL}. Please check if Ollama is running."]
+    except Exception as e:
+        llm_log.error("[Ollama] ❌ Unexpected error: %s", e)
+        LLM_CALLS.labels("stream_async", "error").inc()
+        return [f"Error: {str(e)}"]
+
+
+@traced()
+async def add_stream_review_item_async(effect: CreateReviewItem) -> bool:
+    """add_stream_review_item() with the Cosmos write awaited (the counters update stays on the step pool)"""
+    loop = asyncio.get_running_loop()
+    if reviews_async_container is None:
+        return await loop.run_in_executor(STREAM_STEP_EXECUTOR, add_stream_review_item, effect)
+    with STEP_SECONDS.labels("review_write").time():
+        await reviews_async_container.create_item(effect.item)
+    await loop.run_in_executor(STREAM_STEP_EXECUTOR, REVIEW_STATS.record_change, None, effect.item)
+    return True
+
+
+ASYNC_STREAM_EFFECT_HANDLERS = {
+    GenerateAnswer: lambda effect: call_ollama_streaming_async(effect.prompt, effect.system_message, effect.temperature),
+    CreateReviewItem: add_stream_review_item_async,
+}
+
+
+def asgi_session_user(request) -> Optional[Dict[str, Any]]:
+    """require_auth() for an ASGI request: the user from Flask's signed session cookie"""
+    cookie = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+    session_data = {}
+    if cookie:
+        serializer = app.session_interface.get_signing_serializer(app)
+        try:
+            session_data = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            session_data = {}  # bad signature or expired, as Flask treats it
+    return user_from_session_data(session_data.get("user"))
+
+
+async def _stream_in_flight(frames, in_flight, trace=None):
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        in_flight.dec()
+        TRACER.end(trace)
+
+
+def asgi_route_metrics(endpoint: str):
+    """
+    v5.9.31: The Flask hooks' request counter and in-flight gauge for an SSEASGIApp route.
+    v5.9.32: Also ends the trace the handler began, when its response (or stream) ends.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            in_flight = REQUESTS_IN_FLIGHT.labels(endpoint)
+            in_flight.inc()
+            try:
+                result = await handler(request)
+            except BaseException as e:
+                in_flight.dec()
+                root = current_span()
+                TRACER.end(root.trace if root is not None else None, e)
+                raise
+            root = current_span()  # the handler's context is this task's
+            trace = root.trace if root is not None else None
+            if isinstance(result, SSEResponse):
+                HTTP_REQUESTS.labels(endpoint, 200).inc()
+                if trace is not None:
+                    trace.root.set_attribute("http.status_code", 200)
+                result.frames = _stream_in_flight(result.frames, in_flight, trace)  # open until the stream ends
+            else:
+                HTTP_REQUESTS.labels(endpoint, result[0]).inc()
+                in_flight.dec()
+                if trace is not None:
+                    trace.root.set_attribute("http.status_code", result[0])
+                TRACER.end(trace)
+            return result
+        return wrapper
+    return decorator
+
+
+@asgi_route_metrics("query_ai_assistant_stream")  # same label as the Flask route
+async def query_ai_assistant_stream_async(request):
+    """/api/query/stream on the event loop: same checks, pipeline and SSE frames as query_ai_assistant_stream"""
+    request_id = begin_request(request.headers.get("x-request-id"))  # this request's task only
+    TRACER.begin(request_id, f"{request.method} {request.path}", endpoint="query_ai_assistant_stream")  # v5.9.32
+    user = asgi_session_user(request)
+    if not user:
+        return 401, {"error": "User not authenticated"}
+
+    data = request.json() if request.is_json else None
+    if not isinstance(data, dict):
+        return 400, {"error": "Request must be JSON"}
+    user_input = data.get("question", "").strip()
+
+    if not user_input:
+        return 400, {"error": "Query cannot be empty"}
+
+    user_profile = stream_user_profile(user)
+    flight_key = query_flight_key(user_input, data, user_profile, stream=True)
+    frames = STREAM_FLIGHTS.stream_async(
+        flight_key,
+        lambda: drive_effects_async(stream_query_pipeline(user_input, data.get("chat_history", []),
+                                                          data.get("staged_chat_documents", []), user_profile),
+                                    STREAM_STEP_EXECUTOR, ASYNC_STREAM_EFFECT_HANDLERS),
+        llm_used_meta=_stream_flight_used_llm,
+        inspect_frame=_inspect_stream_flight_frame
+    )
+    return SSEResponse(frames, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                                        'X-Request-ID': request_id})
+
+
+def create_asgi_app() -> SSEASGIApp:
+    """ASGI entry point: create_app(), with /api/query/stream served from the event loop"""
+    return SSEASGIApp(
+        create_app(),
+        routes={("POST", "/api/query/stream"): query_ai_assistant_stream_async},
+        wsgi_threads=int(os.getenv("WEB_THREADS", "16")),
+        on_startup=start_async_stream_clients,
+        on_shutdown=close_async_stream_clients
+    )
 
 
 
@@ -15072,11 +16409,27 @@ def test_query_endpoint():
 
 
 if __name__ == '__main__':
+    # v5.9.28: python app_5_9_11_GOLD_TRAINING.py --profile-startup
+    # (per-package import and per-subsystem build time and RSS, then exit without serving)
+    if STARTUP_PROFILER is not None:
+        import_seconds = time.perf_counter() - _import_started
+        STARTUP_PROFILER.uninstall()
+        warmup()
+        print("\n" + format_startup_report(STARTUP_PROFILER.report(), SUBSYSTEMS.report(), import_seconds))
+        snapshot = KNOWLEDGE_SNAPSHOT.get_stats()
+        if snapshot["source"] == "snapshot":
+            print(f"\n  knowledge_snapshot: loaded in {snapshot['load_seconds']:.3f}s (build {snapshot['build_seconds']:.3f}s)")
+        else:
+            print(f"\n  knowledge_snapshot: built in {snapshot['build_seconds']:.3f}s (written: {snapshot['writes'] > 0})")
+        sys.exit(0)
+
     port = int(os.environ.get("PORT", 3000))
-    
-    # v5.9.3: Initialize 2-Hop Path RAG
+    PDF_EXTRACTOR.start()  # v5.9.36: before app.run() starts request threads
+
+    # v5.9.3: Initialize 2-Hop Path RAG (v5.9.26: with the rest of the serving preload)
     print("\n[v5.9.3] Initializing 2-Hop Path RAG...")
-    two_hop_initialized = initialize_2hop_rag("samm_knowledge_graph.json")
+    two_hop_initialized = preload_for_serving()["two_hop"]
+    warm_up_ollama()
     
     print("\n" + "="*90)
     print("🚀 Complete Integrated SAMM ASIST System with Database Integration v5.9.4")
@@ -15171,4 +16524,7 @@ if __name__ == '__main__':
     
     print("="*90 + "\n")
     
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Development server. v5.9.26: the reloader re-imports everything in a second process,
+    # so it is opt-in (DEV_RELOAD=true); production runs under gunicorn (gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=port, debug=True,
+            use_reloader=os.getenv("DEV_RELOAD", "false").lower() == "true")
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Benchmark for the streaming financial workbook parser (v5.9.19)
+
+Generates a synthetic MISIL export (RSN sheet + PDLI sheet, several cases
+mixed together) and parses it for one case, reporting parse time and peak RSS.
+Each measurement runs in a fresh subprocess so peak RSS is not shared:
+
+    python benchmark_excel_parser.py                 # 200k PDLI rows
+    python benchmark_excel_parser.py 50000 --full    # also time a full (non read-only) load
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = [("SR", "P", "NAV"), ("TW", "P", "MSL"), ("SA", "D", "AAF"), ("JA", "B", "RDR")]
+
+
+def generate_workbook(path: str, pdli_rows: int, seed: int = 7) -> None:
+    """
+    A regular (not write-only) workbook, so the file has shared strings and a
+    <dimension> element like Excel/MISIL exports do
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook()
+    wb.remove(wb.active)
+
+    rsn_count = max(10, pdli_rows // 20)
+    rsn_ws = wb.create_sheet("RSN Summary")
+    rsn_ws.append(["MISIL RSN EXPORT"])
+    rsn_ws.append([])
+    rsn_ws.append(["CTY", "IA", "CASE", "RSN", "OA REC AMT", "NET COMMIT AMT", "OBLIGATION"])
+    for i in range(rsn_count):
+        cty, ia, case = CASES[i % len(CASES)]
+        rsn_ws.append([cty, ia, case, f"{i // len(CASES) + 1:03d}", round(rng.uniform(1e4, 1e7), 2),
+                       round(rng.uniform(1e3, 1e6), 2), round(rng.uniform(1e3, 1e6), 2)])
+
+    pdli_ws = wb.create_sheet("PDLI Detail")
+    pdli_ws.append(["MISIL PDLI EXPORT"])
+    pdli_ws.append(["CTY", "IA", "CASE", "LINE NBR", "RSN", "PDLI", "PDLI DESC", "DIR RSRV AMT",
+                    "NET OBL AMT", "NET EXP AMT", "AVAIL BAL", "FY", "APPN", "REMARKS"])
+    for i in range(pdli_rows):
+        cty, ia, case = CASES[i % len(CASES)]
+        rsn = (i // len(CASES)) % (rsn_count // len(CASES)) + 1
+        pdli_ws.append([cty, ia, case, f"{i % 999 + 1:03d}", f"{rsn:03d}", f"P{i:06d}",
+                        f"Line item description {i}", round(rng.uniform(1e3, 1e6), 2),
+                        round(rng.uniform(1e3, 1e5), 2), round(rng.uniform(1e2, 1e5), 2),
+                        round(rng.uniform(0, 1e5), 2), 2020 + i % 6, "97-11X8242", "synthetic"])
+    wb.save(path)
+
+
+def measure(path: str, read_only: bool) -> dict:
+    """Runs in the child process"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import contextlib
+    import io
+    from excel_financial_parser import parse_financial_workbook
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = parse_financial_workbook(path, "SR", "NAV", read_only=read_only)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": "read_only" if read_only else "full_load",
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "parse_rss_mb": round((peak_kb - baseline_kb) / 1024, 1),
+        "records": result["summary"]["total_pdlis"],
+        "total_directed": round(result["summary"]["total_directed"], 2),
+    }
+
+
+def run_child(path: str, read_only: bool) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--measure", path] + ([] if read_only else ["--full"])
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="?", type=int, default=200_000)
+    parser.add_argument("--full", action="store_true", help="also measure a full (non read-only) load")
+    parser.add_argument("--measure", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, read_only=not args.full)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "SR-P-NAV_Synthetic Financial Data.xlsx")
+        start = time.perf_counter()
+        generate_workbook(path, args.rows)
+        print(f"Generated {args.rows:,} PDLI rows ({os.path.getsize(path) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        results = [run_child(path, read_only=True)]
+        if args.full:
+            results.append(run_child(path, read_only=False))
+
+    print("=" * 60)
+    for r in results:
+        print(f"{r['mode']:>10}: {r['seconds']:>6.2f}s  peak RSS {r['peak_rss_mb']:>7.1f} MB "
+              f"(+{r['parse_rss_mb']:.1f} MB parsing)  {r['records']:,} SR-NAV records")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
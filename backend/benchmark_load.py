@@ -0,0 +1,349 @@
+"""
+Offline end-to-end load test (v5.9.33)
+
+Boots the app in its own process against local stand-ins (local_backends.py): a fake
+Ollama on localhost with a fixed time to first token and token rate, in-memory Cosmos
+containers, local Blob containers, an in-memory Gremlin graph built from
+samm_knowledge_graph.json, and the real Chroma index (VECTOR_DB_PATH, when chromadb is
+installed). Served by gunicorn as in production: preloaded, --workers forked workers,
+uvicorn workers on create_asgi_app() (--server asgi) or gthread on create_app() (wsgi).
+Then drives a seeded mix of POST /api/query and POST /api/query/stream (signed-in
+session, distinct questions, some with an attached document) from a pool of
+closed-loop clients and reports:
+  - requests/sec, errors, and p50 / p95 / p99 latency per endpoint
+  - TTFT: time to the first answer_token frame of each stream, as the client sees it
+  - p50 / p95 / p99 per stage: every span name of each request's trace
+    (/api/debug/traces/<request_id>), summed within the request
+
+    python benchmark_load.py
+    python benchmark_load.py --requests 400 --concurrency 32 --stream-fraction 0.7
+    python benchmark_load.py --ollama-ttft-ms 400 --tokens-per-second 25 --gremlin-latency-ms 20
+    python benchmark_load.py --cache --output load.json   # answer cache on, questions repeat
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_serving import free_port
+from local_backends import FakeOllama
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+VECTOR_DB_DEFAULT = os.path.join(BACKEND_DIR, "Chromadb", "chroma_db_combined")
+
+QUESTIONS = [
+    "What is Security Cooperation?",
+    "What is the difference between Security Cooperation and Security Assistance?",
+    "What are the legislative authorities for Security Assistance?",
+    "Who supervises Security Assistance programs?",
+    "What is DSCA's role in Security Cooperation?",
+    "What does DFAS do for Security Cooperation programs?",
+    "Who approves an LOA before it is offered?",
+    "What happens after the Letter of Request is received?",
+    "What is the Total Package Approach?",
+    "When can a case use Emergency Implementation?",
+]
+
+ATTACHMENT = {"blobName": "load-test/requirements.txt", "blobContainer": "chat-docs", "fileName": "requirements.txt",
+              "contentType": "text/plain"}
+ATTACHMENT_TEXT = ("Purchaser requirements: 12 aircraft with the Total Package Approach - training, spare parts "
+                   "and publications. The Letter of Request was sent through the SCO to DSCA.\n") * 20
+
+SERVE = """
+import importlib.util, json, os, sys
+sys.path.insert(0, os.getcwd())
+from gunicorn.app.base import BaseApplication
+from local_backends import LocalBackends
+port, server, workers, threads, blob_root, ready_path = (int(sys.argv[1]), sys.argv[2], int(sys.argv[3]),
+                                                         int(sys.argv[4]), sys.argv[5], sys.argv[6])
+spec = importlib.util.spec_from_file_location("samm_app", "app_5_9_11_GOLD_TRAINING.py")
+samm = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(samm)
+backends = LocalBackends(blob_root, gremlin_latency_ms=float(sys.argv[7])).install(samm)
+attachment = json.loads(sys.argv[8])
+backends.chat_docs.get_blob_client(attachment["blobName"]).upload_blob(sys.argv[9].encode(), overwrite=True)
+
+client = samm.app.test_client()
+with client.session_transaction() as session:
+    session["user"] = {"userinfo": {"sub": "load-test", "name": "Load Test"}}
+cookie_name = samm.app.config["SESSION_COOKIE_NAME"]
+application = samm.create_asgi_app() if server == "asgi" else samm.create_app()
+
+
+class Serve(BaseApplication):
+    # gunicorn.conf.py's serving, with the app (and its stand-ins) loaded in this process
+    def load_config(self):
+        settings = {"bind": f"127.0.0.1:{port}", "workers": workers, "threads": threads, "timeout": 300,
+                    "worker_class": "uvicorn.workers.UvicornWorker" if server == "asgi" else "gthread",
+                    "backlog": 4096, "keepalive": 300, "preload_app": True,
+                    "post_worker_init": lambda worker: samm.reset_after_fork(warm_ollama=False)}
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return application
+
+
+with open(ready_path, "w") as f:
+    json.dump({"cookie_name": cookie_name, "cookie": client.get_cookie(cookie_name).value,
+               "vector_db": samm.db_manager.vector_db_client is not None}, f)
+Serve().run()
+"""
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))]
+
+
+def quantiles(values):
+    return {"n": len(values), **{f"p{int(q * 100)}_ms": (round(percentile(values, q), 1) if values else None)
+                                 for q in (0.5, 0.95, 0.99)}}
+
+
+def start_app(args, ollama_url, tmp):
+    port = free_port()
+    ready_path = os.path.join(tmp, "ready.json")
+    env = {**os.environ, "OLLAMA_URL": ollama_url, "CACHE_ENABLED": "true" if args.cache else "false",
+           "LOG_LEVEL": "WARNING", "WEB_THREADS": str(args.threads), "VECTOR_DB_PATH": args.vector_db,
+           "TRACE_SAMPLE_RATE": "1", "TRACE_EXPORT_DIR": os.path.join(tmp, "traces"), "DEBUG_TRACES_ENABLED": "true",
+           "TRACE_BUFFER_SIZE": str(args.requests + 2 * args.warmup + 16),
+           "AZURE_CASE_DOCS_CONTAINER_NAME": "case-docs", "AZURE_CHAT_DOCS_CONTAINER_NAME": "chat-docs",
+           "CACHE_SHARED_PATH": "", "BLOB_TEXT_CACHE_PATH": "", "INGEST_STORE_PATH": "",
+           "FINANCIAL_STORE_PATH": os.path.join(tmp, "financial.sqlite3")}
+    env.pop("METRICS_DIR", None)
+    log = open(os.path.join(tmp, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVE, str(port), args.server, str(args.workers), str(args.threads),
+         os.path.join(tmp, "blobs"), ready_path, str(args.gremlin_latency_ms), json.dumps(ATTACHMENT),
+         ATTACHMENT_TEXT],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        assert process.poll() is None, f"app exited ({process.returncode}), see {log.name}:\n" + tail(log.name)
+        if os.path.exists(ready_path):
+            try:
+                if requests.get(f"{base}/metrics", timeout=5).status_code == 200:
+                    with open(ready_path) as f:
+                        return process, log, base, json.load(f)
+            except requests.ConnectionError:
+                pass
+        time.sleep(0.2)
+    process.kill()
+    raise TimeoutError(f"app not ready after 600s:\n{tail(log.name)}")
+
+
+def tail(path, lines=30):
+    with open(path, errors="replace") as f:
+        return "".join(f.readlines()[-lines:])
+
+
+def stop_app(process, log):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    log.close()
+
+
+def plan(args):
+    """The seeded request mix: endpoint, question and attachment of every request"""
+    rng = random.Random(args.seed)
+    requests_plan = []
+    for n in range(args.requests):
+        question = QUESTIONS[rng.randrange(len(QUESTIONS))]
+        if not args.cache:  # distinct questions: no answer-cache hits, no shared in-flight runs
+            question = f"{question.rstrip('?')} for load request {n:05d}?"
+        requests_plan.append({"request_id": f"load-{args.seed}-{n:05d}", "question": question,
+                              "stream": rng.random() < args.stream_fraction,
+                              "attachment": rng.random() < args.attachment_fraction})
+    return requests_plan
+
+
+class Client:
+    """One requests.Session per client thread, carrying the signed session cookie"""
+
+    def __init__(self, base, cookie_name, cookie):
+        self.base = base
+        self.cookie_name = cookie_name
+        self.cookie = cookie
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.cookies.set(self.cookie_name, self.cookie)
+        return session
+
+    def run(self, item):
+        body = {"question": item["question"], "staged_chat_documents": [ATTACHMENT] if item["attachment"] else []}
+        headers = {"X-Request-ID": item["request_id"]}
+        result = {"request_id": item["request_id"], "endpoint": "/api/query/stream" if item["stream"] else "/api/query",
+                  "status": None, "ttft_ms": None, "error": None}
+        start = time.perf_counter()
+        try:
+            response = self.session().post(self.base + result["endpoint"], json=body, headers=headers,
+                                           stream=item["stream"], timeout=600)
+            result["status"] = response.status_code
+            if item["stream"]:
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data: "):
+                            continue
+                        frame = json.loads(line[6:])
+                        if frame.get("type") == "answer_token" and result["ttft_ms"] is None:
+                            result["ttft_ms"] = (time.perf_counter() - start) * 1000
+                        elif frame.get("type") == "error":
+                            result["error"] = frame.get("error")
+                if result["ttft_ms"] is None and result["error"] is None:
+                    result["error"] = "stream ended without an answer token"
+            else:
+                payload = response.json()
+                if "error" in payload:
+                    result["error"] = payload["error"]
+        except Exception as e:
+            result["error"] = str(e)
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        if result["status"] != 200 and result["error"] is None:
+            result["error"] = f"HTTP {result['status']}"
+        return result
+
+
+def span_totals(node, totals):
+    """{span name: ms} for one request, same-named spans summed"""
+    totals[node["name"]] = totals.get(node["name"], 0.0) + (node.get("duration_ms") or 0.0)
+    for child in node.get("children", []):
+        span_totals(child, totals)
+    return totals
+
+
+def stage_report(client, results):
+    """Per endpoint: {span name: quantiles of its per-request total} from each request's trace"""
+    stages, missing = {}, 0
+    for result in results:
+        if result["error"]:
+            continue
+        response = client.session().get(f"{client.base}/api/debug/traces/{result['request_id']}", timeout=30)
+        if response.status_code != 200:
+            missing += 1
+            continue
+        for name, ms in span_totals(response.json()["root"], {}).items():
+            stages.setdefault(result["endpoint"], {}).setdefault(name, []).append(ms)
+    return {endpoint: {name: {**quantiles(values), "mean_ms": round(sum(values) / len(values), 1)}
+                       for name, values in by_name.items()}
+            for endpoint, by_name in stages.items()}, missing
+
+
+def print_table(title, rows):
+    print(f"\n  {title}")
+    print(f"    {'':<52} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for name, q in rows:
+        cells = [f"{q[key]:>9.1f}" if q[key] is not None else f"{'-':>9}" for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"    {name[:52]:<52} {q['n']:>5} {' '.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream-fraction", type=float, default=0.5, help="share of /api/query/stream requests")
+    parser.add_argument("--attachment-fraction", type=float, default=0.1,
+                        help="share of requests with a staged chat document (read from the Blob stand-in)")
+    parser.add_argument("--ollama-ttft-ms", type=float, default=150)
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="fake Ollama generation rate (0: instant)")
+    parser.add_argument("--gremlin-latency-ms", type=float, default=5, help="round trip of each Gremlin query")
+    parser.add_argument("--server", choices=("asgi", "wsgi"), default="asgi")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=16, help="per worker: gthread request threads / ASGI bridge threads")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_PATH", VECTOR_DB_DEFAULT))
+    parser.add_argument("--warmup", type=int, default=2, help="requests per endpoint before measuring")
+    parser.add_argument("--cache", action="store_true", help="answer cache on and repeated questions")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--stages", type=int, default=15, help="slowest stages shown per endpoint")
+    parser.add_argument("--output", help="write the full results here (JSON)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"LOAD TEST - {args.requests} requests x {args.concurrency} clients, "
+          f"{args.stream_fraction:.0%} streamed, {args.workers} {args.server} worker(s), fake Ollama "
+          f"{args.ollama_ttft_ms:.0f}ms + {args.tokens_per_second:g} tokens/s")
+    print("=" * 60)
+    ollama = FakeOllama(ttft_ms=args.ollama_ttft_ms, tokens_per_second=args.tokens_per_second).start()
+    vector_search = ("chromadb not installed" if importlib.util.find_spec("chromadb") is None
+                     else f"Chroma index {args.vector_db}")
+    with tempfile.TemporaryDirectory(prefix="samm-load-") as tmp:
+        started = time.time()
+        process, log, base, ready = start_app(args, ollama.url, tmp)
+        try:
+            print(f"  ✅ app ready in {time.time() - started:.1f}s: Cosmos / Blob / Gremlin stand-ins "
+                  f"(Gremlin {args.gremlin_latency_ms:g}ms), vector search: "
+                  f"{'on, ' + vector_search if ready['vector_db'] else 'off (' + vector_search + ')'}")
+            client = Client(base, ready["cookie_name"], ready["cookie"])
+            for n in range(args.warmup):  # lazy paths, connection pools, first-call compilation
+                for stream in (False, True):
+                    warm = client.run({"request_id": f"warmup-{n}-{int(stream)}", "stream": stream, "attachment": True,
+                                       "question": f"What does DSCA do in warmup case {n:05d}?"})
+                    assert warm["error"] is None, warm
+            llm_before = ollama.get_stats()
+
+            requests_plan = plan(args)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                results = list(pool.map(client.run, requests_plan))
+            elapsed = time.perf_counter() - start
+            llm = ollama.get_stats()
+            stages, missing = stage_report(client, results)
+        finally:
+            stop_app(process, log)
+            ollama.shutdown()
+
+    errors = [r for r in results if r["error"]]
+    ok = [r for r in results if not r["error"]]
+    report = {
+        "config": vars(args),
+        "throughput_rps": round(len(ok) / elapsed, 2), "elapsed_seconds": round(elapsed, 2),
+        "requests": len(results), "errors": len(errors), "error_samples": [r["error"] for r in errors[:5]],
+        "latency": {endpoint: quantiles([r["latency_ms"] for r in ok if r["endpoint"] == endpoint])
+                    for endpoint in ("/api/query", "/api/query/stream")},
+        "ttft": quantiles([r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]),
+        "llm": {"calls_per_request": round((llm["requests"] - llm_before["requests"]) / max(1, len(results)), 2),
+                "tokens": llm["tokens"] - llm_before["tokens"]},
+        "stages": stages, "traces_missing": missing, "vector_search": ready["vector_db"],
+    }
+
+    print(f"  ✅ {len(results)} requests in {elapsed:.1f}s: {report['throughput_rps']} req/s, "
+          f"{len(errors)} errors, {report['llm']['calls_per_request']} LLM calls per request")
+    print_table("latency per endpoint", list(report["latency"].items()) + [("TTFT (stream, first answer token)", report["ttft"])])
+    for endpoint, by_name in sorted(stages.items()):
+        slowest = sorted(by_name.items(), key=lambda item: item[1]["mean_ms"], reverse=True)[:args.stages]
+        print_table(f"{endpoint} stages (span time per request, slowest {len(slowest)} by mean)", slowest)
+    if missing:
+        print(f"\n  ⚠️ {missing} traces not found (TRACE_BUFFER_SIZE too small?)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n  results written to {args.output}")
+    assert not errors, report["error_samples"]
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Query latency with production logging vs the old print() output (v5.9.30)
+
+Runs the app in a fresh interpreter per logging mode, with a fake Ollama on
+localhost and the other backends absent, and drives POST /api/query (signed-in
+session) with distinct questions (answer cache off) from a few client threads:
+  - prints:     every query-path message formatted and written on the request
+                thread (DEBUG, unqueued, bare messages) - what print() did
+  - production: LOG_LEVEL=INFO, queued handler (the default configuration)
+  - sampled:    production plus full DEBUG traces for LOG_DEBUG_SAMPLE_RATE of requests
+Reports p50 / p95 latency, requests/sec and the bytes of log output per request.
+
+    python benchmark_logging.py
+    python benchmark_logging.py --requests 400 --concurrency 8 --sample-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmark_serving import start_fake_ollama
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODES = {
+    "prints": {"LOG_LEVEL": "DEBUG", "LOG_QUEUE": "false", "LOG_FORMAT": "message"},
+    "production": {"LOG_LEVEL": "INFO", "LOG_QUEUE": "true", "LOG_FORMAT": "text"},
+    "sampled": {"LOG_LEVEL": "INFO", "LOG_QUEUE": "true", "LOG_FORMAT": "text"},
+}
+
+RUN_QUERIES = """
+import importlib.util, json, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.getcwd())
+spec = importlib.util.spec_from_file_location("samm_app", "app_5_9_11_GOLD_TRAINING.py")
+samm = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(samm)
+requests_total, concurrency, results_path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+
+def one(n):
+    client = samm.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = {"userinfo": {"sub": "benchmark", "name": "Benchmark"}}
+    start = time.perf_counter()
+    response = client.post("/api/query", json={"question": f"What does DSCA do in FMS case {n}?"})
+    return (time.perf_counter() - start) * 1000, response.status_code
+
+samm.warmup()
+for n in range(concurrency):
+    one(-n - 1)
+sys.stdout.flush()
+before = os.fstat(1).st_size
+stats_before = samm.LOGGING.get_stats()
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    runs = list(pool.map(one, range(requests_total)))
+elapsed = time.perf_counter() - start
+samm.LOGGING.stop()
+sys.stdout.flush()
+stats = samm.LOGGING.get_stats()
+latencies = sorted(ms for ms, _ in runs)
+with open(results_path, "w") as f:
+    json.dump({"p50_ms": statistics.median(latencies), "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+               "rps": requests_total / elapsed, "errors": sum(status != 200 for _, status in runs),
+               "log_bytes": os.fstat(1).st_size - before,
+               "records": stats["records"] - stats_before["records"],
+               "dropped": stats["dropped"] - stats_before["dropped"],
+               "sampled_requests": stats["sampled_requests"] - stats_before["sampled_requests"]}, f)
+"""
+
+
+def run_mode(mode, ollama_url, requests_total, concurrency, sample_rate, tmp):
+    env = {**os.environ, **MODES[mode], "OLLAMA_URL": ollama_url, "CACHE_ENABLED": "false",
+           "LOG_DEBUG_SAMPLE_RATE": str(sample_rate if mode == "sampled" else 0),
+           "CACHE_SHARED_PATH": "", "BLOB_TEXT_CACHE_PATH": "", "INGEST_STORE_PATH": "",
+           "FINANCIAL_STORE_PATH": os.path.join(tmp, f"financial-{mode}.sqlite3")}
+    results_path = os.path.join(tmp, f"{mode}.json")
+    with open(os.path.join(tmp, f"{mode}.log"), "w") as log:
+        subprocess.run([sys.executable, "-c", RUN_QUERIES, str(requests_total), str(concurrency), results_path],
+                       cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.DEVNULL, check=True)
+    with open(results_path) as f:
+        return {"mode": mode, **json.load(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ollama-latency-ms", type=float, default=5)
+    parser.add_argument("--sample-rate", type=float, default=0.05)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"LOGGING BENCHMARK - fake Ollama ({args.ollama_latency_ms:.0f}ms), "
+          f"{args.requests} queries x {args.concurrency} clients")
+    print("=" * 60)
+    ollama = start_fake_ollama(args.ollama_latency_ms)
+    ollama_url = f"http://127.0.0.1:{ollama.server_address[1]}"
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            r = run_mode(mode, ollama_url, args.requests, args.concurrency, args.sample_rate, tmp)
+            results.append(r)
+            print(f"  ✅ {mode:<10} p50 {r['p50_ms']:.1f}ms, p95 {r['p95_ms']:.1f}ms, {r['rps']:.1f} req/s | "
+                  f"{r['log_bytes'] / args.requests / 1024:.1f} KB and {r['records'] / args.requests:.0f} records "
+                  f"per query, {r['dropped']} dropped, {r['sampled_requests']} requests sampled")
+            assert r["errors"] == 0, r
+    ollama.shutdown()
+
+    by_mode = {r["mode"]: r for r in results}
+    if "prints" in by_mode and "production" in by_mode:
+        before, after = by_mode["prints"], by_mode["production"]
+        print(f"\n  production vs prints: p50 {after['p50_ms'] / before['p50_ms'] - 1:+.0%}, "
+              f"p95 {after['p95_ms'] / before['p95_ms'] - 1:+.0%}, "
+              f"log volume {after['log_bytes'] / max(before['log_bytes'], 1):.1%} of before")
+    print(f"\nResults: {json.dumps(results)}")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Benchmark for PDF text extraction (v5.9.20)
+
+Compares the old PyPDF2 `text +=` loop with PDFTextExtractor on one PDF:
+full text, a 5,000-char attachment budget, and a repeat (content-hash cache).
+Uses a generated multi-page PDF unless a path is given:
+
+    python benchmark_pdf_extraction.py                          # 300 generated pages
+    python benchmark_pdf_extraction.py "Chapter 5 _ Defense Security Cooperation Agency.pdf"
+    python benchmark_pdf_extraction.py --workers 0 2 4 --skip-pypdf2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from pdf_text_extractor import PDFTextExtractor
+
+PARAGRAPH = ("C5.4.3. Letter of Offer and Acceptance. The Implementing Agency prepares the LOA "
+             "using the DSCA case writing guidance, including line items, notes, payment schedule "
+             "and the estimated costs for defense articles and services. ")
+
+
+def generate_pdf(path: str, pages: int) -> None:
+    import fitz
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Page {page_no + 1}\n" + PARAGRAPH * 12, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def pypdf2_extract(path: str) -> str:
+    import PyPDF2
+    with open(path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        text = ''
+        for page in pdf_reader.pages:
+            text += page.extract_text() + '\n'
+        return text
+
+
+def timed(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(path: str, workers_list, budget: int, skip_pypdf2: bool) -> list:
+    results = []
+    if not skip_pypdf2:
+        seconds, text = timed(lambda: pypdf2_extract(path))
+        results.append({"mode": "pypdf2_full", "seconds": round(seconds, 3), "chars": len(text)})
+
+    for workers in workers_list:
+        extractor = PDFTextExtractor(workers=workers, cache_size=8)
+        extractor.start()
+        try:
+            seconds, text = timed(lambda: extractor.extract_text(path, max_chars=budget))
+            results.append({"mode": f"budget_{budget}_w{workers}", "seconds": round(seconds, 3), "chars": len(text),
+                            "pages": extractor.get_stats()["pages_extracted"]})
+            seconds, text = timed(lambda: extractor.extract_text(path))
+            results.append({"mode": f"full_w{workers}", "seconds": round(seconds, 3), "chars": len(text),
+                            "pages": extractor.get_stats()["pages_extracted"]})
+            seconds, text = timed(lambda: extractor.extract_text(path))
+            results.append({"mode": f"cached_w{workers}", "seconds": round(seconds, 4), "chars": len(text)})
+        finally:
+            extractor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdf", nargs="?", help="PDF to extract (default: generated)")
+    parser.add_argument("--pages", type=int, default=300, help="pages in the generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1])
+    parser.add_argument("--budget", type=int, default=5000)
+    parser.add_argument("--skip-pypdf2", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = os.path.join(tmp, "synthetic_loa.pdf")
+            generate_pdf(path, args.pages)
+            print(f"Generated {args.pages} pages ({os.path.getsize(path) / 1e6:.1f} MB)")
+        results = run(path, args.workers, args.budget, args.skip_pypdf2)
+
+    print("=" * 60)
+    for r in results:
+        pages = f"  ({r['pages']} pages extracted so far)" if "pages" in r else ""
+        print(f"{r['mode']:>18}: {r['seconds']:>8.3f}s  {r['chars']:>9,} chars{pages}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
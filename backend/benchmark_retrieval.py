@@ -0,0 +1,309 @@
+"""
+Retrieval quality and latency over the Gold question set, no LLM (v5.9.34)
+
+One question per GOLD_TRAINING_DATA pattern, labelled with that pattern's must_retrieve
+sections, tables, figures and appendices. A result covers a target when the target (or a
+subsection of it) is the result's section or is cited in its text; for a 2-hop path, when
+one of the path's edge sections is the target or a parent section of it. Edges name the
+section a relationship comes from (C5.1), not the paragraph a Gold answer cites (C5.1.4.2);
+a chapter (C5) is too coarse to count. Each retrieval configuration is run in-process
+(smart search off, retrieval cache cleared before every call):
+  - semantic:              one vector search of the question (top final_return_count)
+  - hybrid:                IntegratedEntityAgent._safe_query_vector() - Gold entity
+                           searches and the re-rank, as served
+  - hybrid_embedding_only: the same candidates ranked by embedding score alone
+  - two_hop:               _extract_entities_enhanced() entities through
+                           TwoHopPathFinder.get_context_for_query(), paths in order
+Reports recall@k, MRR and per-query latency per configuration, and EntityMetrics
+precision / recall / F1 of the extracted entities against its ground truth. The vector
+configurations need chromadb and sentence_transformers; without them they are skipped.
+
+Results are compared with a JSON baseline (--baseline): a drop in recall@k or MRR beyond
+--tolerance fails the run. --save writes this run as the new baseline.
+
+    python benchmark_retrieval.py
+    python benchmark_retrieval.py --configs hybrid two_hop --repeat 5 --save
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from benchmark_load import VECTOR_DB_DEFAULT, percentile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+BASELINE_DEFAULT = os.path.join(BACKEND_DIR, "benchmark_baselines", "retrieval.json")
+K_VALUES = (1, 3, 5, 8)
+
+# One question per Gold pattern; each contains a trigger phrase of its own pattern
+GOLD_QUESTIONS = {
+    "CDEF_DELAY": "Case development is taking longer than expected because coordination is slow. "
+                  "What do we record in DSAMS?",
+    "CTA_REQUIREMENT": "When is CTA needed for an LOR, and who prepares the country team assessment?",
+    "SOLE_SOURCE": "The purchaser wants a sole source contractor. How is that requested on the case?",
+    "SHORT_OED": "The purchaser needs a short OED to meet a funding deadline. How is the offer expiration set?",
+    "LOR_FORMAT": "What is the required LOR format and what must a letter of request contain?",
+    "DEFENSE_ARTICLES_DESCRIPTION": "What to include in LOR when describing the defense articles requested?",
+    "ELECTRONIC_LOR": "Can we submit LOR electronically, or send the LOR via email?",
+    "ACTIONABLE_LOR": "What makes LOR actionable, and what happens when it is not?",
+    "CN_THRESHOLD": "Is congressional notification required for a $60M sale to a NATO country?",
+    "LOGISTICS_SUPPORT_LOR": "What logistics support and spare parts information belongs in the LOR?",
+    "CIVILIAN_SALARY": "How do I calculate civilian salary costs for the case in MTDS?",
+    "CASE_DESCRIPTION_AMENDMENT": "How should I write the case description for an amendment?",
+}
+
+VECTOR_CONFIGS = ("semantic", "hybrid", "hybrid_embedding_only")
+CONFIGS = VECTOR_CONFIGS + ("two_hop",)
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def gold_set(samm):
+    """[{id, question, targets}] from GOLD_TRAINING_DATA's must_retrieve"""
+    questions = []
+    for pattern in samm.GOLD_TRAINING_DATA["patterns"]:
+        if pattern["id"] not in GOLD_QUESTIONS:
+            continue
+        must = pattern["must_retrieve"]
+        targets = [ref for kind in ("sections", "tables", "figures", "appendices") for ref in must.get(kind, [])]
+        questions.append({"id": pattern["id"], "question": GOLD_QUESTIONS[pattern["id"]], "targets": targets})
+    return questions
+
+
+def target_pattern(ref):
+    """'Table C5.T6' -> C5.T6 not followed by a word character (C5.T6a is another table);
+    a section also matches its subsections (C5.4.2.1 in C5.4.2.1.3)"""
+    key = re.sub(r"^(Table|Figure)\s+", "", ref)
+    return re.compile(r"(?<![\w.])" + re.escape(key) + r"(?!\w)", re.IGNORECASE)
+
+
+def section_covers(section, ref):
+    """'C5.1' covers C5.1 and C5.1.4.2, not C5.10 or Table C5.T6; a bare chapter covers nothing"""
+    key = re.sub(r"^(Table|Figure)\s+", "", ref).upper()
+    section = section.strip().upper()
+    return "." in section and (key == section or key.startswith(section + "."))
+
+
+def text_covers(targets):
+    """covers(text, ref) for result texts: the target pattern appears in the text"""
+    patterns = {ref: target_pattern(ref) for ref in targets}
+    return lambda text, ref: patterns[ref].search(text) is not None
+
+
+def path_covers(sections, ref):
+    """covers(sections, ref) for a 2-hop path's edge sections"""
+    return any(section_covers(section, ref) for section in sections if section)
+
+
+def chunk_text(result):
+    metadata = result.get("metadata") or {}
+    labels = [str(metadata.get(key, "")) for key in ("section_id", "section_number", "section_title")]
+    return " ".join(labels + [result.get("content", "")])
+
+
+def score(ranked, targets, covers):
+    """recall@k per K_VALUES, reciprocal rank of the first result covering any target,
+    and which targets the top max(K_VALUES) covered"""
+    covered_at = {}
+    first_hit = None
+    for rank, result in enumerate(ranked[:max(K_VALUES)], 1):
+        hits = [ref for ref in targets if covers(result, ref)]
+        if hits and first_hit is None:
+            first_hit = rank
+        for ref in hits:
+            covered_at.setdefault(ref, rank)
+    recall = {f"recall@{k}": round(sum(rank <= k for rank in covered_at.values()) / len(targets), 4)
+              for k in K_VALUES}
+    return {**recall, "rr": round(1 / first_hit, 4) if first_hit else 0.0, "covered": sorted(covered_at)}
+
+
+class Retrieval:
+    """The retrieval configurations over one loaded app"""
+
+    def __init__(self, samm):
+        self.samm = samm
+        self.entity_agent = samm.SUBSYSTEMS.get("orchestrator").entity_agent
+        samm.SUBSYSTEMS.get("two_hop")
+        self.vector_on = samm.db_manager.vector_db_client is not None
+
+    def available(self, config):
+        return self.vector_on or config not in VECTOR_CONFIGS
+
+    def run(self, config, question):
+        """Ranked results for one question: chunk texts, or each 2-hop path's edge sections"""
+        samm = self.samm
+        if config == "semantic":
+            results = samm.db_manager.query_vector_db(question, collection_name="samm_all_chapters",
+                                                      n_results=samm.RERANK_CONFIG["final_return_count"])
+            return [chunk_text(r) for r in results]
+        if config in ("hybrid", "hybrid_embedding_only"):
+            samm.retrieval_cache.clear()
+            weights = {key: samm.RERANK_CONFIG[key] for key in ("embedding_weight", "keyword_weight", "boost_weight")}
+            if config == "hybrid_embedding_only":
+                samm.RERANK_CONFIG.update(embedding_weight=1.0, keyword_weight=0.0, boost_weight=0.0)
+            try:
+                results = self.entity_agent._safe_query_vector(question)
+            finally:
+                samm.RERANK_CONFIG.update(weights)
+            return [chunk_text(r) for r in results]
+        entities = self.entity_agent._extract_entities_enhanced(question, {})
+        context = samm.TWO_HOP_PATH_FINDER.get_context_for_query(entities=entities, query=question)
+        return [path.get("sections", []) for path in context["paths"]]
+
+
+def run_config(retrieval, config, questions, repeat):
+    per_query = []
+    for item in questions:
+        retrieval.run(config, item["question"])  # warm: embedding model, collection segments
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ranked = retrieval.run(config, item["question"])
+            timings.append((time.perf_counter() - start) * 1000)
+        covers = path_covers if config == "two_hop" else text_covers(item["targets"])
+        per_query.append({"id": item["id"], **score(ranked, item["targets"], covers), "results": len(ranked),
+                          "latency_ms": round(statistics.median(timings), 2)})
+    latencies = [q["latency_ms"] for q in per_query]
+    summary = {key: round(statistics.mean(q[key] for q in per_query), 4) for key in [f"recall@{k}" for k in K_VALUES]}
+    summary["mrr"] = round(statistics.mean(q["rr"] for q in per_query), 4)
+    summary.update(p50_ms=round(percentile(latencies, 0.5), 2), p95_ms=round(percentile(latencies, 0.95), 2),
+                   mean_ms=round(statistics.mean(latencies), 2))
+    return {"summary": summary, "queries": per_query}
+
+
+def entity_scores(samm, retrieval, questions):
+    """EntityMetrics.evaluate_extraction() of _extract_entities_enhanced() per question"""
+    metrics = samm.SUBSYSTEMS.get("entity_metrics")
+    per_query = []
+    for item in questions:
+        start = time.perf_counter()
+        extracted = retrieval.entity_agent._extract_entities_enhanced(item["question"], {})
+        latency = (time.perf_counter() - start) * 1000
+        result = metrics.evaluate_extraction(item["question"], extracted)
+        per_query.append({"id": item["id"], "extracted": sorted(result["extracted_normalized"]),
+                          "expected": sorted(result["expected_normalized"]),
+                          **{key: result["metrics"][key] for key in ("precision", "recall", "f1_score")},
+                          "latency_ms": round(latency, 2)})
+    summary = {key: round(statistics.mean(q[key] for q in per_query), 4) for key in ("precision", "recall", "f1_score")}
+    summary["p50_ms"] = round(percentile([q["latency_ms"] for q in per_query], 0.5), 2)
+    return {"summary": summary, "queries": per_query}
+
+
+def compare(results, baseline, tolerance):
+    """Printed deltas against the baseline; the quality drops beyond tolerance"""
+    if baseline.get("questions") != results["questions"]:
+        print("  ⚠️ baseline was run on a different question set or labels - not compared")
+        return []
+    regressions = []
+    for config, current in results["configs"].items():
+        before = baseline["configs"].get(config)
+        if before is None:
+            print(f"  {config:<22} not in the baseline")
+            continue
+        quality = [f"recall@{k}" for k in K_VALUES] + ["mrr"]
+        deltas = ", ".join(f"{key} {current['summary'][key] - before['summary'][key]:+.3f}" for key in quality)
+        p50_before = before["summary"]["p50_ms"]
+        print(f"  {config:<22} {deltas}, p50 {current['summary']['p50_ms'] - p50_before:+.1f}ms")
+        for key in quality:
+            if before["summary"][key] - current["summary"][key] > tolerance:
+                regressions.append(f"{config} {key} {before['summary'][key]:.3f} -> {current['summary'][key]:.3f}")
+        previous = {q["id"]: q for q in before["queries"]}
+        for query in current["queries"]:
+            lost = sorted(set(previous.get(query["id"], {}).get("covered", [])) - set(query["covered"]))
+            if lost:
+                print(f"      {query['id']}: no longer retrieves {', '.join(lost)}")
+    if "entities" in baseline:
+        current, before = results["entities"]["summary"], baseline["entities"]["summary"]
+        keys = ("precision", "recall", "f1_score")
+        print(f"  {'entities':<22} " + ", ".join(f"{key} {current[key] - before[key]:+.3f}" for key in keys))
+        regressions += [f"entities {key} {before[key]:.3f} -> {current[key]:.3f}" for key in keys
+                        if before[key] - current[key] > tolerance]
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=CONFIGS)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per question (median reported)")
+    parser.add_argument("--vector-db", default=os.getenv("VECTOR_DB_PATH", VECTOR_DB_DEFAULT))
+    parser.add_argument("--baseline", default=BASELINE_DEFAULT, help="JSON baseline to compare with")
+    parser.add_argument("--save", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="allowed drop in recall@k / MRR")
+    parser.add_argument("--output", help="write the full results here (JSON)")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    # No LLM: smart search off, and any other Ollama call fails at once
+    os.environ.update(SMART_SEARCH_ENABLED="false", OLLAMA_URL="http://127.0.0.1:9", CACHE_ENABLED="false",
+                      LOG_LEVEL="WARNING", VECTOR_DB_PATH=args.vector_db)
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        samm = load_app()
+        retrieval = Retrieval(samm)
+    questions = gold_set(samm)
+
+    print("=" * 60)
+    print(f"RETRIEVAL BENCHMARK - {len(questions)} Gold questions, "
+          f"{sum(len(q['targets']) for q in questions)} targets, median of {args.repeat} runs")
+    print("=" * 60)
+    results = {"questions": questions, "vector_db": args.vector_db if retrieval.vector_on else None, "configs": {}}
+    for config in args.configs:
+        if not retrieval.available(config):
+            print(f"  ⏭️ {config:<22} skipped - vector DB unavailable (chromadb / sentence_transformers)")
+            continue
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            outcome = run_config(retrieval, config, questions, args.repeat)
+        results["configs"][config] = outcome
+        s = outcome["summary"]
+        recall = " ".join(f"R@{k} {s[f'recall@{k}']:.2f}" for k in K_VALUES)
+        print(f"  ✅ {config:<22} {recall}  MRR {s['mrr']:.2f} | p50 {s['p50_ms']:.1f}ms, p95 {s['p95_ms']:.1f}ms")
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        results["entities"] = entity_scores(samm, retrieval, questions)
+    s = results["entities"]["summary"]
+    print(f"  ✅ {'entities':<22} precision {s['precision']:.2f}, recall {s['recall']:.2f}, "
+          f"F1 {s['f1_score']:.2f} (EntityMetrics ground truth) | p50 {s['p50_ms']:.2f}ms")
+
+    print("\nPer query (recall@5 / reciprocal rank):")
+    for n, item in enumerate(questions):
+        cells = "  ".join(f"{config} {outcome['queries'][n]['recall@5']:.2f}/{outcome['queries'][n]['rr']:.2f}"
+                          for config, outcome in results["configs"].items())
+        print(f"  {item['id']:<28} {cells}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        print(f"\nAgainst baseline {args.baseline}:")
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    else:
+        print(f"\nNo baseline at {args.baseline} (--save writes one)")
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"  💾 baseline saved: {args.baseline}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        for regression in regressions:
+            print(f"  ❌ {regression}")
+        print("❌ REGRESSED")
+        return 1
+    print("✅ PASSED")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Benchmark for the paged review queue (v5.9.25)
+
+Seeds N pending reviews (answer, entities and context like the HITL path writes)
+and times, per N:
+  - the original /api/reviews/pending body: SELECT * of every pending review, serialised
+  - a first list page and a page 10 continuation tokens deep (list view, 25 reviews)
+  - a filtered page (low confidence band) and a detail read (point read by id,
+    and the reviewId lookup older links use)
+
+By default the container is an in-memory stand-in that keeps reviews in
+timestamp order and resumes pages from its continuation token, like the Cosmos
+index does. Against the Cosmos emulator (seeding 100k items takes a while):
+
+    python benchmark_review_queue.py
+    python benchmark_review_queue.py --sizes 100 1000 10000
+    python benchmark_review_queue.py --cosmos https://localhost:8081 <key> --sizes 100 1000
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from review_queue import ReviewQueue
+
+ANSWER = ("The Letter of Request (LOR) is submitted by the purchaser through the Security Cooperation "
+          "Organization to the Implementing Agency, which screens it for completeness. ") * 12
+INTENTS = ["definition", "process", "authority", "funding", "timeline"]
+
+
+def make_review(rng, n, start):
+    return {
+        "id": str(uuid.uuid4()),
+        "type": "review_item",
+        "reviewId": str(uuid.uuid4()),
+        "question": f"Question {n}: who receives the Letter of Request?",
+        "aiResponse": {"intent": rng.choice(INTENTS),
+                       "entities": [f"entity_{k}" for k in range(rng.randrange(5, 25))],
+                       "answer": ANSWER},
+        "context": {"sections": [f"C5.1.{k}" for k in range(10)], "text": ANSWER[:600]},
+        "status": "pending" if rng.random() < 0.9 else "approved",
+        "priority": "medium",
+        "confidenceOverall": round(rng.random(), 3),
+        "confidenceIntent": round(rng.random(), 3),
+        "confidenceEntity": round(rng.random(), 3),
+        "confidenceAnswer": round(rng.random(), 3),
+        "timestamp": (start + timedelta(seconds=n)).isoformat(),
+        "assignedTo": "Travis",
+    }
+
+
+class _Pages:
+    """query_items(...).by_page(token): one page per next(), token = offset to resume at"""
+
+    def __init__(self, items, page_size, offset):
+        self.items, self.page_size, self.offset = items, page_size, offset
+        self.continuation_token = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        page, position = [], self.offset
+        for position, item in self.items.scan(self.offset):
+            page.append(item)
+            if len(page) == self.page_size:
+                break
+        else:
+            position = len(self.items.source)
+        self.offset = position
+        self.continuation_token = json.dumps({"offset": position}) if position < len(self.items.source) else None
+        return page
+
+
+class _Query:
+    def __init__(self, container, matches, projection, max_item_count, cross_partition=False):
+        self.container, self.matches, self.projection = container, matches, projection
+        self.max_item_count = max_item_count
+        self.cross_partition = cross_partition
+
+    def scan(self, offset):
+        """(position after the item, projected item) for each match from offset on"""
+        ordered = self.container.ordered()
+        for position in range(offset, len(ordered)):
+            if self.matches(ordered[position]):
+                yield position + 1, self.projection(ordered[position])
+
+    @property
+    def source(self):
+        return self.container.ordered()
+
+    def __iter__(self):
+        return (item for _, item in self.scan(0))
+
+    def by_page(self, continuation_token=None):
+        if continuation_token and self.cross_partition:
+            raise ValueError("cross-partition ORDER BY does not resume from a continuation token")
+        offset = json.loads(continuation_token)["offset"] if continuation_token else 0
+        return _Pages(self, self.max_item_count, offset)
+
+
+class InMemoryReviewContainer:
+    """
+    Reviews kept in ORDER BY c.timestamp DESC order (the index Cosmos would use); pages of a
+    single-partition query resume at an offset, as the SDK's cross-partition ORDER BY does not
+    """
+
+    def __init__(self):
+        self.by_id = {}
+        self._ordered = None
+
+    def create_item(self, body):
+        self.by_id[body["id"]] = body
+        self._ordered = None
+        return body
+
+    def ordered(self):
+        if self._ordered is None:
+            self._ordered = sorted(self.by_id.values(), key=lambda item: item["timestamp"], reverse=True)
+        return self._ordered
+
+    def read_item(self, item, partition_key):
+        from azure.cosmos import exceptions as cosmos_exceptions
+        if item not in self.by_id:
+            raise cosmos_exceptions.CosmosResourceNotFoundError(message="not found")
+        return self.by_id[item]
+
+    def query_items(self, query, parameters=None, partition_key=None, enable_cross_partition_query=False,
+                    max_item_count=None):
+        if partition_key not in (None, "review_item"):
+            raise ValueError(f"unexpected partition: {partition_key}")
+        params = {p["name"]: p["value"] for p in parameters or []}
+        literal_status = re.search(r"c\.status = '(\w+)'", query)
+        if literal_status:
+            params["@status"] = literal_status.group(1)
+        if "c.type = 'review_item'" not in query and "@reviewId" not in params:
+            raise ValueError(f"unexpected query: {query}")
+
+        def matches(item):
+            return (item.get("type") == "review_item"
+                    and ("@status" not in params or item.get("status") == params["@status"])
+                    and ("@intent" not in params or item["aiResponse"].get("intent") == params["@intent"])
+                    and ("@minConfidence" not in params or item["confidenceOverall"] >= params["@minConfidence"])
+                    and ("@maxConfidence" not in params or item["confidenceOverall"] < params["@maxConfidence"])
+                    and ("@since" not in params or item["timestamp"] >= params["@since"])
+                    and ("@until" not in params or item["timestamp"] <= params["@until"])
+                    and ("@reviewId" not in params or item["reviewId"] == params["@reviewId"]))
+
+        select = re.search(r"SELECT (.*?) FROM", query).group(1)
+        fields = [(path.split("."), alias or path.split(".")[-1])
+                  for path, alias in re.findall(r"c\.([\w.]+)(?: AS (\w+))?", select)]
+
+        def projection(item):
+            if select == "*":
+                return dict(item)
+            out = {}
+            for path, alias in fields:
+                value = item
+                for part in path:
+                    value = value.get(part) if isinstance(value, dict) else None
+                if value is not None:
+                    out[alias] = value
+            return out
+
+        return _Query(self, matches, projection, max_item_count or 100, cross_partition=partition_key is None)
+
+
+def timed(fn, repeats=5):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def check_pages(queue, container):
+    """Projection, filters, token walk and detail read on the seeded container"""
+    page = queue.list_page(page_size=25)
+    assert len(page["reviews"]) == 25 and page["continuationToken"]
+    first = page["reviews"][0]
+    assert "aiResponse" not in first and "context" not in first and first["intent"] in INTENTS, first
+    timestamps = [r["timestamp"] for r in page["reviews"]]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    seen, token = [], None
+    while True:
+        page = queue.list_page({"band": "low", "intent": "process"}, page_size=50, continuation=token)
+        seen.extend(page["reviews"])
+        token = page["continuationToken"]
+        if not token:
+            break
+    expected = [r for r in container.ordered() if r["status"] == "pending"
+                and r["aiResponse"]["intent"] == "process" and r["confidenceOverall"] < 0.6]
+    assert [r["reviewId"] for r in seen] == [r["reviewId"] for r in expected]
+
+    full = queue.get_review(first["reviewId"])
+    assert full["aiResponse"]["answer"] == ANSWER and queue.get_review(first["id"])["id"] == first["id"]
+    assert queue.get_review("missing") is None
+
+
+def run(container_factory, sizes, legacy_max, check=True):
+    results = []
+    for size in sizes:
+        container = container_factory()
+        rng = random.Random(size)
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        for n in range(size):
+            container.create_item(make_review(rng, n, start))
+        queue = ReviewQueue(container)
+        if check and size <= 10000:
+            check_pages(queue, container)
+        row = {"reviews": size}
+
+        if size <= legacy_max:
+            legacy_query = ("SELECT * FROM c WHERE c.type = 'review_item' AND c.status = 'pending' "
+                            "ORDER BY c.timestamp DESC")
+            ms, body = timed(lambda: json.dumps({"reviews": list(container.query_items(
+                query=legacy_query, enable_cross_partition_query=True))}), repeats=3)
+            row.update(legacy_ms=round(ms, 2), legacy_kb=round(len(body) / 1024))
+
+        ms, body = timed(lambda: json.dumps(queue.list_page(page_size=25)))
+        row.update(first_page_ms=round(ms, 3), page_kb=round(len(body) / 1024, 1))
+
+        def ten_pages():
+            token = None
+            for _ in range(10):
+                token = queue.list_page(page_size=25, continuation=token)["continuationToken"]
+
+        ms, _ = timed(ten_pages)
+        row["next_page_ms"] = round(ms / 10, 3)
+        ms, page = timed(lambda: queue.list_page({"band": "low", "intent": "process"}, page_size=25))
+        row["filtered_page_ms"] = round(ms, 3)
+        item_id, review_id = page["reviews"][0]["id"], page["reviews"][0]["reviewId"]
+        ms, _ = timed(lambda: queue.get_review(item_id))
+        row["detail_ms"] = round(ms, 3)
+        ms, _ = timed(lambda: queue.get_review(review_id), repeats=3)
+        row["detail_by_review_id_ms"] = round(ms, 3)
+        results.append(row)
+        legacy = f"{row['legacy_ms']:.1f}ms / {row['legacy_kb']} KB" if "legacy_ms" in row else "skipped"
+        print(f"  ✅ {size:>6} reviews: SELECT * {legacy:>20} | page 1 {row['first_page_ms']:.2f}ms "
+              f"({row['page_kb']} KB), next {row['next_page_ms']:.2f}ms, filtered {row['filtered_page_ms']:.2f}ms, "
+              f"detail {row['detail_ms']:.3f}ms")
+        print(f"           detail by reviewId (query, indexed in Cosmos / scanned here): "
+              f"{row['detail_by_review_id_ms']:.2f}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="skip the full SELECT * above this size")
+    parser.add_argument("--cosmos", nargs=2, metavar=("ENDPOINT", "KEY"),
+                        help="run against a Cosmos account / emulator (temporary database)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"REVIEW QUEUE BENCHMARK - {'Cosmos' if args.cosmos else 'in-memory container'}")
+    print("=" * 60)
+    if args.cosmos:
+        from azure.cosmos import CosmosClient, PartitionKey
+        client = CosmosClient(args.cosmos[0], args.cosmos[1])
+        database = client.create_database(f"reviewqueue{uuid.uuid4().hex[:8]}")
+        names = iter(range(len(args.sizes)))
+
+        def factory():
+            return database.create_container(id=f"reviews{next(names)}", partition_key=PartitionKey(path="/type"))
+        try:
+            results = run(factory, args.sizes, args.legacy_max, check=False)
+        finally:
+            client.delete_database(database)
+    else:
+        results = run(InMemoryReviewContainer, args.sizes, args.legacy_max)
+
+    smallest, largest = results[0], results[-1]
+    if not args.cosmos and len(results) > 1:
+        # Page cost follows the page size, not the queue length (generous bound for noisy machines)
+        for key in ("first_page_ms", "next_page_ms", "detail_ms"):
+            assert largest[key] <= max(10 * smallest[key], smallest[key] + 2.0), (key, smallest, largest)
+        print(f"  ✅ page latency flat from {smallest['reviews']} to {largest['reviews']} reviews")
+    print(f"\nResults: {json.dumps(results)}")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Load test for production serving (v5.9.26)
+
+Starts the app under gunicorn (gunicorn.conf.py) with a fake Ollama on localhost
+and the other backends absent (in-memory storage, no Gremlin / vector DB), drives
+POST /api/test/query with distinct questions (no answer-cache hits) from a client
+thread pool, and reports per configuration:
+  - requests/sec and p50 / p95 latency
+  - per-worker RSS, PSS (shared pages split between processes) and USS (private pages)
+    from /proc/<pid>/smaps_rollup, measured after the load
+
+Preloaded (default) vs per-worker loading shows what the master's copy-on-write
+sharing saves; the fake Ollama's latency stands in for generation time.
+
+    python benchmark_serving.py
+    python benchmark_serving.py --workers 1 2 4 --threads 8 --requests 400 --concurrency 32
+    python benchmark_serving.py --workers 4 --compare-preload
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_ANSWER = ("The Defense Security Cooperation Agency (DSCA) directs the FMS process (C1.3.2.2). "
+               "The Implementing Agency prepares the LOA after the LOR is received (C5.1.2). ") * 4
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_ollama(latency_ms: float) -> ThreadingHTTPServer:
+    """/api/chat answering every prompt with the same text after latency_ms"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_ms / 1000)
+            body = json.dumps({"model": "fake", "message": {"role": "assistant", "content": FAKE_ANSWER},
+                               "done": True}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def memory_kb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {"rss": fields.get("Rss", 0), "pss": fields.get("Pss", 0),
+            "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)}
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children += [int(p) for p in f.read().split()]
+    return children
+
+
+def run_config(workers, threads, preload, ollama_url, requests_total, concurrency, tmp):
+    port = free_port()
+    env = {**os.environ, "PORT": str(port), "WEB_BIND": f"127.0.0.1:{port}", "WEB_WORKERS": str(workers),
+           "WEB_THREADS": str(threads), "WEB_PRELOAD": "true" if preload else "false", "OLLAMA_URL": ollama_url,
+           "CACHE_SHARED_PATH": os.path.join(tmp, f"answers-{port}.sqlite3"),
+           "BLOB_TEXT_CACHE_PATH": "", "INGEST_STORE_PATH": "",
+           "FINANCIAL_STORE_PATH": os.path.join(tmp, f"financial-{port}.sqlite3")}
+    log = open(os.path.join(tmp, f"gunicorn-{port}.log"), "w")
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                               "app_5_9_11_GOLD_TRAINING:create_app()"],
+                              cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        started = time.time()
+        while True:
+            if master.poll() is not None:
+                raise RuntimeError(f"gunicorn exited ({master.returncode}), see {log.name}")
+            try:
+                if requests.get(f"{base}/api/examples", timeout=2).ok and len(child_pids(master.pid)) >= workers:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() - started > 300:
+                raise RuntimeError(f"gunicorn not ready after 300s, see {log.name}")
+            time.sleep(0.5)
+        ready_seconds = time.time() - started
+
+        local = threading.local()
+        latencies, errors = [], []
+
+        def one(n):
+            session = getattr(local, "session", None) or requests.Session()
+            local.session = session
+            start = time.perf_counter()
+            try:
+                r = session.post(f"{base}/api/test/query", json={"question": f"What does DSCA do in FMS case {n}?"},
+                                 timeout=120)
+                if r.status_code != 200:
+                    errors.append(r.status_code)
+            except requests.RequestException as e:
+                errors.append(str(e))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        for n in range(concurrency):  # warm each worker's connections and lazy paths
+            one(-n - 1)
+        latencies.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests_total)))
+        elapsed = time.perf_counter() - start
+
+        worker_memory = [memory_kb(pid) for pid in child_pids(master.pid)]
+        latencies.sort()
+        return {
+            "workers": workers, "threads": threads, "preload": preload, "ready_seconds": round(ready_seconds, 1),
+            "requests": requests_total, "errors": len(errors), "rps": round(requests_total / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies), 1),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+            "master_rss_mb": round(memory_kb(master.pid)["rss"] / 1024, 1),
+            "worker_rss_mb": round(statistics.mean(m["rss"] for m in worker_memory) / 1024, 1),
+            "worker_pss_mb": round(statistics.mean(m["pss"] for m in worker_memory) / 1024, 1),
+            "worker_uss_mb": round(statistics.mean(m["uss"] for m in worker_memory) / 1024, 1),
+            "total_pss_mb": round((sum(m["pss"] for m in worker_memory) + memory_kb(master.pid)["pss"]) / 1024, 1),
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            master.kill()
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ollama-latency-ms", type=float, default=50)
+    parser.add_argument("--compare-preload", action="store_true", help="also run each setting without preload")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"SERVING LOAD TEST - gunicorn gthread, fake Ollama ({args.ollama_latency_ms:.0f}ms), "
+          f"{args.requests} requests x {args.concurrency} clients")
+    print("=" * 60)
+    ollama = start_fake_ollama(args.ollama_latency_ms)
+    ollama_url = f"http://127.0.0.1:{ollama.server_address[1]}"
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            for preload in ([True, False] if args.compare_preload else [True]):
+                r = run_config(workers, args.threads, preload, ollama_url, args.requests, args.concurrency, tmp)
+                results.append(r)
+                print(f"  ✅ {r['workers']} worker(s) x {r['threads']} threads, preload={r['preload']}: "
+                      f"{r['rps']} req/s, p50 {r['p50_ms']}ms, p95 {r['p95_ms']}ms, errors {r['errors']} | "
+                      f"per worker RSS {r['worker_rss_mb']} MB, PSS {r['worker_pss_mb']} MB, "
+                      f"USS {r['worker_uss_mb']} MB | total PSS {r['total_pss_mb']} MB")
+                assert r["errors"] == 0, r
+    ollama.shutdown()
+    print(f"\nResults: {json.dumps(results)}")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
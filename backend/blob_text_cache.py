@@ -0,0 +1,297 @@
+# blob_text_cache.py
+# Extracted-text cache for attached blob documents.
+#
+#   cache = BlobTextCache.from_env(pdf_extractor=PDF_EXTRACTOR)
+#   text = cache.get_text(container_client, "case/123_LOA.pdf", max_chars=5000)
+#   texts = cache.fetch_many([(container_client, name), ...], max_chars=5000)
+#
+# - Keyed on (container, blob, etag): a properties call (no body) decides
+#   whether the cached text is still current; overwritten blobs get a new etag
+# - Memory LRU in front of a SQLite file on local disk (TieredCache), so text
+#   survives restarts and is shared by every worker on the host
+# - Known binary types are answered from properties alone; plain text is read
+#   with a ranged download of just the prefix the caller needs; PDFs are
+#   downloaded whole (the xref is at the end) and extracted up to the budget
+# - fetch_many() reads several attachments concurrently
+#
+# Works with azure.storage.blob ContainerClient (Azure or Azurite) and with
+# LocalBlobContainer, a filesystem stand-in with the same small surface.
+
+import codecs
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from tiered_cache import TieredCache
+
+try:
+    from azure.core.exceptions import ResourceNotFoundError
+except ImportError:
+    class ResourceNotFoundError(Exception):
+        pass
+
+# Never decoded as text (zip containers, images, media, archives)
+BINARY_EXTENSIONS = (
+    '.xlsx', '.xls', '.xlsm', '.docx', '.doc', '.pptx', '.ppt', '.zip', '.7z', '.gz', '.tar',
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff', '.webp', '.mp3', '.mp4', '.mov', '.exe'
+)
+BINARY_CONTENT_TYPES = ('image/', 'audio/', 'video/', 'application/zip',
+                        'application/vnd.openxmlformats', 'application/vnd.ms-excel')
+
+# UTF-8 needs at most 4 bytes per character
+UTF8_MAX_BYTES_PER_CHAR = 4
+
+
+def binary_placeholder(blob_name: str) -> str:
+    return f"[Binary file: {blob_name}]"
+
+
+# =============================================================================
+# FILESYSTEM STAND-IN
+# =============================================================================
+
+class _LocalDownload:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class LocalBlobClient:
+    """The blob-client calls BlobTextCache and the upload/delete routes use"""
+
+    def __init__(self, container: "LocalBlobContainer", blob_name: str):
+        self.container = container
+        self.blob_name = blob_name
+        self.path = os.path.join(container.root, *blob_name.split('/'))
+
+    def _stat(self):
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"Blob not found: {self.blob_name}")
+
+    def get_blob_properties(self):
+        stat = self._stat()
+        return SimpleNamespace(
+            name=self.blob_name,
+            size=stat.st_size,
+            etag=f'"0x{stat.st_mtime_ns:x}{stat.st_size:x}"',
+            content_settings=SimpleNamespace(content_type=self.container.content_types.get(self.blob_name)),
+        )
+
+    def download_blob(self, offset: Optional[int] = None, length: Optional[int] = None) -> _LocalDownload:
+        self._stat()
+        self.container.stats["downloads"] += 1
+        with open(self.path, 'rb') as file:
+            if offset:
+                file.seek(offset)
+            data = file.read() if length is None else file.read(length)
+        self.container.stats["bytes_read"] += len(data)
+        return _LocalDownload(data)
+
+    def upload_blob(self, data, overwrite: bool = False, content_settings=None, **kwargs):
+        if not overwrite and os.path.exists(self.path):
+            raise FileExistsError(self.blob_name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if hasattr(data, 'read'):
+            data = data.read()
+        with open(self.path, 'wb') as file:
+            file.write(data)
+        if content_settings is not None and getattr(content_settings, 'content_type', None):
+            self.container.content_types[self.blob_name] = content_settings.content_type
+        return {"etag": self.get_blob_properties().etag}
+
+    def delete_blob(self, **kwargs):
+        self._stat()
+        os.remove(self.path)
+
+    @property
+    def url(self) -> str:
+        return f"file://{self.path}"
+
+
+class LocalBlobContainer:
+    """
+    Filesystem stand-in for azure.storage.blob.ContainerClient: blobs are files
+    under <root>/<container_name>/, etags change whenever a file is rewritten.
+    """
+
+    def __init__(self, root: str, container_name: str):
+        self.container_name = container_name
+        self.root = os.path.join(root, container_name)
+        self.content_types: Dict[str, str] = {}
+        self.stats = {"downloads": 0, "bytes_read": 0}
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_blob_client(self, blob: str) -> LocalBlobClient:
+        return LocalBlobClient(self, blob)
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class BlobTextCache:
+    """
+    Thread-safe extracted-text cache for blob documents.
+
+    Entries: {"kind": "text" | "pdf" | "binary", "text", "complete", "budget", "timestamp"}.
+    An incomplete entry (a prefix) records the max_chars it was extracted for and
+    serves any request with that budget or less, however long its text came out.
+    """
+
+    def __init__(self, pdf_extractor=None, max_size: int = 500, ttl_seconds: float = 86400,
+                 disk_path: Optional[str] = None, disk_max_size: int = 5000, fetch_workers: int = 8):
+        self.pdf_extractor = pdf_extractor
+        self.cache = TieredCache(max_size=max_size, ttl_seconds=ttl_seconds, shared_path=disk_path,
+                                 shared_max_size=disk_max_size, namespace="blob_text")
+        self.fetch_workers = max(1, int(fetch_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="blob-fetch")
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "hits": 0, "property_checks": 0, "full_downloads": 0,
+                      "ranged_downloads": 0, "bytes_downloaded": 0, "binary_skipped": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, pdf_extractor=None) -> "BlobTextCache":
+        """Cache configured from BLOB_TEXT_CACHE_SIZE / BLOB_TEXT_CACHE_TTL / BLOB_TEXT_CACHE_PATH /
+        BLOB_TEXT_CACHE_DISK_MAX_SIZE / BLOB_FETCH_WORKERS (empty path = memory only)"""
+        return cls(
+            pdf_extractor=pdf_extractor,
+            max_size=int(os.getenv("BLOB_TEXT_CACHE_SIZE", "500")),
+            ttl_seconds=float(os.getenv("BLOB_TEXT_CACHE_TTL", "86400")),
+            disk_path=os.getenv("BLOB_TEXT_CACHE_PATH", os.path.join("cache_data", "blob_text.sqlite3")) or None,
+            disk_max_size=int(os.getenv("BLOB_TEXT_CACHE_DISK_MAX_SIZE", "5000")),
+            fetch_workers=int(os.getenv("BLOB_FETCH_WORKERS", "8")),
+        )
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    @staticmethod
+    def cache_key(container_name: str, blob_name: str, etag: str) -> str:
+        raw = f"{container_name}\x1f{blob_name}\x1f{etag}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _covers(entry: Dict[str, Any], max_chars: Optional[int]) -> bool:
+        if entry.get("complete"):
+            return True
+        budget = entry.get("budget", len(entry.get("text", "")))  # entries written before budgets
+        return max_chars is not None and budget >= max_chars
+
+    def _download(self, blob_client, length: Optional[int] = None) -> bytes:
+        if length is None:
+            data = blob_client.download_blob().readall()
+            self._bump("full_downloads")
+        else:
+            data = blob_client.download_blob(offset=0, length=length).readall()
+            self._bump("ranged_downloads")
+        self._bump("bytes_downloaded", len(data))
+        return data
+
+    def _extract(self, blob_client, blob_name: str, size: int, content_type: str,
+                 max_chars: Optional[int]) -> Dict[str, Any]:
+        lower_name = blob_name.lower()
+        if lower_name.endswith(BINARY_EXTENSIONS) or content_type.startswith(BINARY_CONTENT_TYPES):
+            self._bump("binary_skipped")
+            return {"kind": "binary", "text": binary_placeholder(blob_name), "complete": True}
+
+        if lower_name.endswith('.pdf') or content_type == 'application/pdf':
+            return self._extract_pdf(self._download(blob_client), blob_name, max_chars)
+
+        prefix_bytes = None if max_chars is None else max_chars * UTF8_MAX_BYTES_PER_CHAR
+        if prefix_bytes is None or size <= prefix_bytes:
+            data = self._download(blob_client)
+            if data[:5] == b'%PDF-':
+                return self._extract_pdf(data, blob_name, max_chars)
+            try:
+                return {"kind": "text", "text": data.decode('utf-8'), "complete": True}
+            except UnicodeDecodeError:
+                return {"kind": "binary", "text": binary_placeholder(blob_name), "complete": True}
+
+        data = self._download(blob_client, length=prefix_bytes)
+        if data[:5] == b'%PDF-':
+            return self._extract_pdf(data + self._download_rest(blob_client, len(data)), blob_name, max_chars)
+        try:
+            # final=False: a character cut by the range end is held back, not an error
+            text = codecs.getincrementaldecoder('utf-8')().decode(data, final=False)
+        except UnicodeDecodeError:
+            return {"kind": "binary", "text": binary_placeholder(blob_name), "complete": True}
+        return {"kind": "text", "text": text, "complete": False}
+
+    def _download_rest(self, blob_client, offset: int) -> bytes:
+        data = blob_client.download_blob(offset=offset).readall()
+        self._bump("ranged_downloads")
+        self._bump("bytes_downloaded", len(data))
+        return data
+
+    def _extract_pdf(self, data: bytes, blob_name: str, max_chars: Optional[int]) -> Dict[str, Any]:
+        if self.pdf_extractor is None:
+            return {"kind": "binary", "text": binary_placeholder(blob_name), "complete": True}
+        text = self.pdf_extractor.extract_text(data, max_chars=max_chars)
+        if not text:
+            return {"kind": "binary", "text": binary_placeholder(blob_name), "complete": True}
+        complete = max_chars is None or len(text) < max_chars
+        return {"kind": "pdf", "text": text, "complete": complete}
+
+    def get_text(self, container_client, blob_name: str, max_chars: Optional[int] = None) -> Optional[str]:
+        """
+        Text of a blob (at least max_chars characters when the document has them),
+        or None when the blob cannot be read
+        """
+        if not container_client or not blob_name:
+            return None
+        self._bump("requests")
+        try:
+            blob_client = container_client.get_blob_client(blob_name)
+            properties = blob_client.get_blob_properties()
+            self._bump("property_checks")
+            container_name = getattr(container_client, "container_name", "") or ""
+            key = self.cache_key(container_name, blob_name, str(properties.etag))
+
+            entry = self.cache.get(key)
+            if entry is not None and self._covers(entry, max_chars):
+                self._bump("hits")
+                return entry["text"]
+
+            content_settings = getattr(properties, "content_settings", None)
+            content_type = (getattr(content_settings, "content_type", None) or "").lower()
+            entry = self._extract(blob_client, blob_name, int(properties.size or 0), content_type, max_chars)
+            if not entry["complete"]:
+                entry["budget"] = max_chars
+            entry["timestamp"] = time.time()
+            self.cache.set(key, entry)
+            return entry["text"]
+        except ResourceNotFoundError:
+            print(f"[Blob Fetch] Blob not found: {blob_name}")
+            self._bump("errors")
+            return None
+        except Exception as e:
+            print(f"[Blob Fetch] Error reading {blob_name}: {e}")
+            self._bump("errors")
+            return None
+
+    def fetch_many(self, items: Sequence[Tuple[Any, str]], max_chars: Optional[int] = None) -> List[Optional[str]]:
+        """get_text() for several (container_client, blob_name) pairs concurrently; results in input order"""
+        if len(items) <= 1:
+            return [self.get_text(container_client, blob_name, max_chars) for container_client, blob_name in items]
+        futures = [self._executor.submit(self.get_text, container_client, blob_name, max_chars)
+                   for container_client, blob_name in items]
+        return [future.result() for future in futures]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "hit_rate_percent": round(stats["hits"] / stats["requests"] * 100, 2) if stats["requests"] else 0,
+            "fetch_workers": self.fetch_workers,
+            "tiers": self.cache.get_stats(),
+        }
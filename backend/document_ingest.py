@@ -0,0 +1,369 @@
+# document_ingest.py
+# Upload-time extraction and indexing of case / chat attachments.
+#
+#   ingest = DocumentIngestService.from_env(extractors=DocumentExtractors(...))
+#   job = ingest.submit(container_name, blob_name, data, file_name, user_id)   # -> {"jobId", "status": "queued"}
+#   ingest.get_job(job["jobId"])                                              # queued / running / done / failed
+#   artefacts = ingest.get_artefacts(container_name, blob_name)               # None until the job is done
+#   content = select_passages(artefacts, query_vector, max_chars=5000)
+#
+# A job extracts the document once, right after upload, and stores:
+#   - text (PDF via PyMuPDF, UTF-8 text files, a financial summary for workbooks)
+#   - entity and relationship hits (the entity agent's file extractors)
+#   - financial tables (RSN / PDLI records) for workbooks
+#   - an embedding index: the text in overlapping chunks, one normalised vector per chunk
+# Queries read these artefacts instead of downloading and re-parsing the file.
+#
+# Artefacts and job records live in a TieredCache (memory + local SQLite), so
+# every worker on the host can serve them. Jobs run on a small thread pool in
+# the process that accepted the upload.
+
+import base64
+import math
+import os
+import threading
+import time
+import traceback
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from tiered_cache import TieredCache
+
+SPREADSHEET_EXTENSIONS = ('.xlsx', '.xls', '.xlsm')
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def artefact_key(container_name: str, blob_name: str) -> str:
+    return f"doc:{container_name}:{blob_name}"
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+# =============================================================================
+# EMBEDDING INDEX
+# =============================================================================
+
+def chunk_text(text: str, chunk_chars: int = 800, overlap_chars: int = 100) -> List[Dict[str, Any]]:
+    """Overlapping chunks, preferring to cut at a paragraph or sentence end"""
+    chunks = []
+    step_floor = max(1, chunk_chars - overlap_chars)
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            cut = max(text.rfind('\n\n', start + step_floor // 2, end), text.rfind('. ', start + step_floor // 2, end))
+            if cut > start:
+                end = cut + 1
+        piece = text[start:end].strip()
+        if piece:
+            chunks.append({"start": start, "end": end, "text": piece})
+        if end >= len(text):
+            break
+        start = max(start + 1, end - overlap_chars)
+    return chunks
+
+
+def _normalise(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def encode_vectors(vectors: Sequence[Sequence[float]]) -> Dict[str, Any]:
+    """Normalised float32 vectors packed as base64 (JSON-safe, ~4 bytes per dimension)"""
+    vectors = [_normalise(v) for v in vectors]
+    dim = len(vectors[0]) if vectors else 0
+    packed = array('f', [x for v in vectors for x in v])
+    return {"dim": dim, "count": len(vectors), "data": base64.b64encode(packed.tobytes()).decode('ascii')}
+
+
+def decode_vectors(encoded: Dict[str, Any]) -> List[array]:
+    packed = array('f')
+    packed.frombytes(base64.b64decode(encoded["data"]))
+    dim = encoded["dim"]
+    return [packed[i * dim:(i + 1) * dim] for i in range(encoded["count"])]
+
+
+def select_passages(artefacts: Dict[str, Any], query_vector: Optional[Sequence[float]] = None,
+                    max_chars: int = 5000) -> str:
+    """
+    Document content for a query: the chunks most similar to the query (kept in
+    document order) up to max_chars, or the start of the text when there is no
+    index or query vector
+    """
+    text = artefacts.get("text", "")
+    index = artefacts.get("index")
+    if not index or not index.get("count") or query_vector is None or len(text) <= max_chars:
+        return text[:max_chars]
+
+    query = _normalise(query_vector)
+    vectors = decode_vectors(index)
+    scored = sorted(((sum(q * v for q, v in zip(query, vec)), i) for i, vec in enumerate(vectors)), reverse=True)
+
+    chunks = artefacts["chunks"]
+    chosen, used = [], 0
+    for _, i in scored:
+        length = chunks[i]["end"] - chunks[i]["start"]
+        if used + length > max_chars and chosen:
+            continue
+        chosen.append(i)
+        used += length
+        if used >= max_chars:
+            break
+    passages = [text[chunks[i]["start"]:chunks[i]["end"]].strip() for i in sorted(chosen)]
+    return "\n...\n".join(passages)[:max_chars]
+
+
+def entities_in(artefacts: Dict[str, Any], content: str) -> List[str]:
+    """
+    The document's precomputed entity hits that occur in `content` (the passages a
+    query actually sees), i.e. what extracting entities from `content` would find
+    """
+    content_lower = content.lower()
+    found = []
+    for entity in artefacts.get("entities") or []:
+        needle = entity[len("Value: "):] if entity.startswith("Value: ") else entity
+        if needle.lower() in content_lower:
+            found.append(entity)
+    return found
+
+
+# =============================================================================
+# EXTRACTION
+# =============================================================================
+
+class DocumentExtractors:
+    """
+    The app-side extractors a job calls. Any of them may be None:
+      pdf_text(data, max_chars) -> str
+      entities(text, file_name) -> List[str]
+      relationships(text, file_name) -> List[str]
+      financial(data, file_name) -> {"financial_records": [...], "summary": {...}}
+      embed(texts) -> List[List[float]]
+    """
+
+    def __init__(self, pdf_text: Optional[Callable] = None, entities: Optional[Callable] = None,
+                 relationships: Optional[Callable] = None, financial: Optional[Callable] = None,
+                 embed: Optional[Callable] = None):
+        self.pdf_text = pdf_text
+        self.entities = entities
+        self.relationships = relationships
+        self.financial = financial
+        self.embed = embed
+
+
+def _financial_text(file_name: str, summary: Dict[str, Any], records: List[Dict[str, Any]]) -> str:
+    lines = [f"Financial data from {file_name}: {summary.get('total_pdlis', len(records))} PDLI records, "
+             f"{summary.get('unique_rsns', 0)} RSNs, total directed ${summary.get('total_directed', 0):,.2f}"]
+    for record in records[:50]:
+        lines.append(f"RSN {record.get('rsn')} PDLI {record.get('pdli')} {record.get('pdli_desc', '')}: "
+                     f"directed ${record.get('dir_rsrv_amt', 0):,.2f}, available ${record.get('avail_bal', 0):,.2f}")
+    return "\n".join(lines)
+
+
+# =============================================================================
+# SERVICE
+# =============================================================================
+
+class DocumentIngestService:
+    """Background extraction jobs plus the artefact / job-status store"""
+
+    def __init__(self, extractors: Optional[DocumentExtractors] = None, workers: int = 2,
+                 max_text_chars: int = 200000, chunk_chars: int = 800, overlap_chars: int = 100,
+                 store_path: Optional[str] = None, memory_size: int = 200, store_max_size: int = 20000,
+                 artefact_ttl_seconds: float = 30 * 86400, job_ttl_seconds: float = 86400):
+        self.extractors = extractors or DocumentExtractors()
+        self.workers = max(1, int(workers))
+        self.max_text_chars = max_text_chars
+        self.chunk_chars = chunk_chars
+        self.overlap_chars = overlap_chars
+        self.artefact_ttl_seconds = artefact_ttl_seconds
+        self.job_ttl_seconds = job_ttl_seconds
+        self.store = TieredCache(max_size=memory_size, ttl_seconds=artefact_ttl_seconds, shared_path=store_path,
+                                 shared_max_size=store_max_size, namespace="document_ingest")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="doc-ingest")
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "artefact_hits": 0, "artefact_misses": 0,
+                      "extract_seconds": 0.0}
+
+    @classmethod
+    def from_env(cls, extractors: Optional[DocumentExtractors] = None) -> "DocumentIngestService":
+        """Service configured from INGEST_WORKERS / INGEST_MAX_TEXT_CHARS / INGEST_CHUNK_CHARS /
+        INGEST_STORE_PATH (empty = memory only) / INGEST_ARTEFACT_TTL"""
+        return cls(
+            extractors=extractors,
+            workers=int(os.getenv("INGEST_WORKERS", "2")),
+            max_text_chars=int(os.getenv("INGEST_MAX_TEXT_CHARS", "200000")),
+            chunk_chars=int(os.getenv("INGEST_CHUNK_CHARS", "800")),
+            store_path=os.getenv("INGEST_STORE_PATH", os.path.join("cache_data", "document_artefacts.sqlite3")) or None,
+            artefact_ttl_seconds=float(os.getenv("INGEST_ARTEFACT_TTL", str(30 * 86400))),
+        )
+
+    def _bump(self, name: str, amount=1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    # -------------------------------------------------------------------------
+    # Jobs
+    # -------------------------------------------------------------------------
+
+    def _save_job(self, job: Dict[str, Any]) -> None:
+        job["timestamp"] = time.time()
+        self.store.set(_job_key(job["jobId"]), dict(job), ttl_seconds=self.job_ttl_seconds)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(_job_key(job_id))
+        if job is None:
+            return None
+        job = dict(job)
+        job.pop("timestamp", None)
+        return job
+
+    def submit(self, container_name: str, blob_name: str, data: bytes, file_name: str,
+               user_id: Optional[str] = None, document_id: Optional[str] = None,
+               on_complete: Optional[Callable[[Dict[str, Any], Optional[Dict[str, Any]]], None]] = None,
+               run_inline: bool = False, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Queue an extraction job; on_complete(job, artefacts) runs on the worker
+        after the artefacts are stored (artefacts is None when the job failed)
+        """
+        job = {
+            "jobId": job_id or str(uuid.uuid4()),
+            "status": "queued",
+            "documentId": document_id,
+            "fileName": file_name,
+            "container": container_name,
+            "blobName": blob_name,
+            "userId": user_id,
+            "createdAt": _now_iso(),
+            "startedAt": None,
+            "finishedAt": None,
+            "error": None,
+            "summary": None,
+        }
+        self._save_job(job)
+        self._bump("submitted")
+        if run_inline:
+            self._run(job, data, on_complete)
+        else:
+            self._executor.submit(self._run, job, data, on_complete)
+        return self.get_job(job["jobId"])
+
+    def _run(self, job: Dict[str, Any], data: bytes, on_complete) -> None:
+        job["status"] = "running"
+        job["startedAt"] = _now_iso()
+        self._save_job(job)
+        start = time.perf_counter()
+        artefacts = None
+        try:
+            artefacts = self.extract(data, job["fileName"])
+            artefacts.update({"documentId": job["documentId"], "container": job["container"],
+                              "blobName": job["blobName"], "jobId": job["jobId"], "timestamp": time.time()})
+            self.store.set(artefact_key(job["container"], job["blobName"]), artefacts)
+            job["status"] = "done"
+            job["summary"] = artefact_summary(artefacts)
+            self._bump("done")
+            print(f"[Ingest] ✅ {job['fileName']}: {job['summary']}")
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            self._bump("failed")
+            print(f"[Ingest] ❌ {job['fileName']}: {e}")
+            traceback.print_exc()
+        finally:
+            self._bump("extract_seconds", time.perf_counter() - start)
+            job["finishedAt"] = _now_iso()
+            self._save_job(job)
+
+        if on_complete is not None:
+            try:
+                on_complete(self.get_job(job["jobId"]), artefacts)
+            except Exception as e:
+                print(f"[Ingest] on_complete error for {job['fileName']}: {e}")
+
+    # -------------------------------------------------------------------------
+    # Extraction
+    # -------------------------------------------------------------------------
+
+    def extract(self, data: bytes, file_name: str) -> Dict[str, Any]:
+        """All artefacts for one document (runs on an ingest worker)"""
+        x = self.extractors
+        lower_name = file_name.lower()
+        kind, text, financial = "binary", "", None
+
+        if lower_name.endswith(SPREADSHEET_EXTENSIONS):
+            kind = "spreadsheet"
+            if x.financial is not None:
+                parsed = x.financial(data, file_name) or {}
+                records = parsed.get("financial_records") or []
+                financial = {"records": records, "summary": parsed.get("summary") or {}}
+                if records:
+                    text = _financial_text(file_name, financial["summary"], records)
+        elif lower_name.endswith('.pdf') or data[:5] == b'%PDF-':
+            kind = "pdf"
+            if x.pdf_text is not None:
+                text = x.pdf_text(data, self.max_text_chars) or ""
+        else:
+            try:
+                text = data.decode('utf-8')[:self.max_text_chars]
+                kind = "text"
+            except UnicodeDecodeError:
+                pass
+
+        artefacts: Dict[str, Any] = {
+            "fileName": file_name,
+            "kind": kind,
+            "text": text,
+            "textChars": len(text),
+            "entities": x.entities(text, file_name) if (x.entities and text) else [],
+            "relationships": x.relationships(text, file_name) if (x.relationships and text) else [],
+            "financial": financial,
+            "chunks": [],
+            "index": None,
+            "extractedAt": _now_iso(),
+        }
+
+        if text and x.embed is not None:
+            chunks = chunk_text(text, self.chunk_chars, self.overlap_chars)
+            vectors = x.embed([chunk["text"] for chunk in chunks]) if chunks else []
+            artefacts["chunks"] = [{"start": c["start"], "end": c["end"]} for c in chunks]
+            artefacts["index"] = encode_vectors(vectors) if len(vectors) else None
+        return artefacts
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def get_artefacts(self, container_name: str, blob_name: str) -> Optional[Dict[str, Any]]:
+        artefacts = self.store.get(artefact_key(container_name, blob_name))
+        self._bump("artefact_hits" if artefacts is not None else "artefact_misses")
+        return artefacts
+
+    def forget(self, container_name: str, blob_name: str) -> bool:
+        return self.store.delete(artefact_key(container_name, blob_name))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["extract_seconds"] = round(stats["extract_seconds"], 3)
+        return {**stats, "workers": self.workers, "store": self.store.get_stats()}
+
+
+def artefact_summary(artefacts: Dict[str, Any]) -> Dict[str, Any]:
+    financial = artefacts.get("financial") or {}
+    return {
+        "kind": artefacts.get("kind"),
+        "textChars": artefacts.get("textChars", 0),
+        "entities": len(artefacts.get("entities") or []),
+        "relationships": len(artefacts.get("relationships") or []),
+        "financialRecords": len(financial.get("records") or []),
+        "indexedChunks": (artefacts.get("index") or {}).get("count", 0),
+    }
@@ -0,0 +1,305 @@
+# excel_financial_parser.py
+# Single-pass, read-only parsing of MISIL RSN / PDLI financial workbooks.
+#
+#   result = parse_financial_workbook(file_bytes_or_path, filter_cty="SR", filter_case="NAV")
+#   result["financial_records"], result["rsn_data"], result["summary"]
+#
+# - Workbooks are opened with read_only=True and rows are streamed as value
+#   tuples; no cell objects are materialised and each sheet is read once
+# - A read-only sheet trusts its stored <dimension>, which some exporters write
+#   wrong (rows come back cut short or padded), so it is reset before reading
+# - Header rows are detected on the fly (first 19 rows), then only the mapped
+#   columns are read from each data row
+# - The CTY/CASE filter is checked before anything else is extracted from a row
+# - openpyxl is imported on the first workbook, not when the module is imported
+
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+HEADER_SEARCH_ROWS = 19  # rows 1..19, as in the original header scans
+
+
+def _cell(row: Tuple, idx: Optional[int]) -> Any:
+    if idx is None or idx >= len(row):
+        return None
+    return row[idx]
+
+
+def _as_str(value: Any) -> str:
+    return str(value).strip() if value else ''
+
+
+def _as_float(value: Any) -> float:
+    try:
+        return float(value) if value else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def load_workbook(*args, **kwargs):
+    """openpyxl.load_workbook, imported on first use (it is a quarter of a second of app startup)"""
+    from openpyxl import load_workbook as openpyxl_load_workbook
+    return openpyxl_load_workbook(*args, **kwargs)
+
+
+def open_workbook_readonly(source):
+    """Read-only workbook from bytes, a file-like object or a path"""
+    if isinstance(source, (bytes, bytearray)):
+        return load_workbook(BytesIO(source), read_only=True, data_only=True)
+    if hasattr(source, 'read'):
+        content = source.read()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return load_workbook(BytesIO(content), read_only=True, data_only=True)
+    return load_workbook(source, read_only=True, data_only=True)
+
+
+def _iter_values(ws, max_row: Optional[int] = None) -> Iterator[Tuple]:
+    """Row value tuples of a sheet; a read-only sheet is read as stored, not as its <dimension> says"""
+    if hasattr(ws, "reset_dimensions"):
+        ws.reset_dimensions()
+    return ws.iter_rows(max_row=max_row, values_only=True)
+
+
+def _select_sheets(sheetnames: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """RSN sheet ('rsn' but not 'pdli') and PDLI sheet ('pdli', else 'misil', else active)"""
+    rsn_sheet = next((name for name in sheetnames if 'rsn' in name.lower() and 'pdli' not in name.lower()), None)
+    pdli_sheet = next((name for name in sheetnames if 'pdli' in name.lower()), None)
+    if pdli_sheet is None:
+        pdli_sheet = next((name for name in sheetnames if 'misil' in name.lower()), None)
+    return rsn_sheet, pdli_sheet
+
+
+def _case_filter(filter_cty: Optional[str], filter_case: Optional[str],
+                 cty_idx: Optional[int], case_idx: Optional[int]):
+    """Row predicate; rows are kept unfiltered when the sheet has no CTY/CASE columns"""
+    if not filter_cty or cty_idx is None or case_idx is None:
+        return lambda row: True
+
+    def matches(row: Tuple) -> bool:
+        return (_as_str(_cell(row, cty_idx)).upper() == filter_cty
+                and _as_str(_cell(row, case_idx)).upper() == filter_case)
+    return matches
+
+
+# =============================================================================
+# RSN SHEET - RSN -> NET COMMIT AMT
+# =============================================================================
+
+def _scan_rsn_sheet(rows: Iterator[Tuple], filter_cty: Optional[str], filter_case: Optional[str],
+                    meta: Dict[str, Any]) -> Dict[str, float]:
+    rsn_net_commit: Dict[str, float] = {}
+    rsn_idx = net_commit_idx = cty_idx = case_idx = None
+
+    # Header columns may be spread over several of the first rows
+    for row_no, row in enumerate(rows, start=1):
+        for col_idx, value in enumerate(row):
+            if not value:
+                continue
+            cell_str = str(value).strip().lower()
+            if cell_str == 'rsn':
+                rsn_idx = col_idx
+            if cell_str == 'cty':
+                cty_idx = col_idx
+            if cell_str == 'case':
+                case_idx = col_idx
+            if ('net' in cell_str and 'commit' in cell_str) or cell_str == 'net_commit_amt':
+                net_commit_idx = col_idx
+        if rsn_idx is not None and net_commit_idx is not None:
+            meta['rsn_header_row'] = row_no
+            break
+        if row_no >= HEADER_SEARCH_ROWS:
+            return rsn_net_commit
+    else:
+        return rsn_net_commit
+
+    print(f"[Extract] ✅ RSN header row: {meta['rsn_header_row']}, RSN col: {rsn_idx}, NET COMMIT col: {net_commit_idx}")
+    if cty_idx is not None:
+        print(f"[Extract]   CTY col: {cty_idx}, CASE col: {case_idx}")
+
+    keep = _case_filter(filter_cty, filter_case, cty_idx, case_idx)
+    last_needed = max(rsn_idx, net_commit_idx)
+    scanned = 0
+    for row in rows:
+        scanned += 1
+        if not keep(row) or len(row) <= last_needed:
+            continue
+        rsn_val = row[rsn_idx]
+        if not rsn_val:
+            continue
+        net_commit_amt = _as_float(row[net_commit_idx])
+        if net_commit_amt != 0:
+            rsn_str = str(rsn_val).strip()
+            rsn_net_commit[rsn_str] = net_commit_amt
+            rsn_net_commit[rsn_str.lstrip('0') or '0'] = net_commit_amt
+            rsn_net_commit[rsn_str.zfill(3)] = net_commit_amt
+
+    meta['rsn_rows_scanned'] = scanned
+    return rsn_net_commit
+
+
+# =============================================================================
+# PDLI SHEET - financial records
+# =============================================================================
+
+def _map_pdli_columns(row: Tuple) -> Dict[str, int]:
+    column_map: Dict[str, int] = {}
+    for col_idx, value in enumerate(row):
+        if not value:
+            continue
+        cell_str = str(value).strip().lower()
+
+        if cell_str == 'cty':
+            column_map['cty'] = col_idx
+        elif cell_str == 'case':
+            column_map['case'] = col_idx
+        elif cell_str == 'rsn':
+            column_map['rsn'] = col_idx
+        elif cell_str in ['pdli', 'pdli nbr']:
+            column_map['pdli'] = col_idx
+        elif 'pdli' in cell_str and 'desc' in cell_str:
+            column_map['pdli_desc'] = col_idx
+        elif 'dir' in cell_str and 'rsrv' in cell_str:
+            column_map['dir_rsrv_amt'] = col_idx
+        elif 'net' in cell_str and 'obl' in cell_str:
+            column_map['net_obl_amt'] = col_idx
+        elif 'net' in cell_str and 'exp' in cell_str:
+            column_map['net_exp_amt'] = col_idx
+        elif 'avail' in cell_str and 'bal' in cell_str:
+            column_map['avail_bal'] = col_idx
+        elif 'line' in cell_str:
+            column_map['line_nbr'] = col_idx
+    return column_map
+
+
+def _scan_pdli_sheet(rows: Iterator[Tuple], filter_cty: Optional[str], filter_case: Optional[str],
+                     rsn_net_commit: Dict[str, float], meta: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Financial records, or None when no header row is found"""
+    column_map = None
+    for row_no, row in enumerate(rows, start=1):
+        row_str = ' '.join([str(c).lower() if c else '' for c in row])
+        if 'rsn' in row_str and ('pdli' in row_str or 'dir' in row_str):
+            meta['pdli_header_row'] = row_no
+            column_map = _map_pdli_columns(row)
+            break
+        if row_no >= HEADER_SEARCH_ROWS:
+            break
+    if column_map is None:
+        return None
+
+    print(f"[Extract] ✅ PDLI header row: {meta['pdli_header_row']}")
+    print(f"[Extract] Column map: {column_map}")
+    meta['column_map'] = column_map
+
+    keep = _case_filter(filter_cty, filter_case, column_map.get('cty'), column_map.get('case'))
+    rsn_idx = column_map.get('rsn')
+    line_idx = column_map.get('line_nbr')
+    pdli_idx = column_map.get('pdli')
+    desc_idx = column_map.get('pdli_desc')
+    dir_idx = column_map.get('dir_rsrv_amt')
+    obl_idx = column_map.get('net_obl_amt')
+    exp_idx = column_map.get('net_exp_amt')
+    bal_idx = column_map.get('avail_bal')
+
+    records = []
+    scanned = 0
+    for row in rows:
+        scanned += 1
+        if not keep(row):
+            continue
+        rsn = _as_str(_cell(row, rsn_idx))
+        if not rsn:
+            continue
+
+        net_commit_amt = rsn_net_commit.get(rsn)
+        if net_commit_amt is None:
+            net_commit_amt = rsn_net_commit.get(rsn.lstrip('0') or '0')
+        if net_commit_amt is None:
+            net_commit_amt = rsn_net_commit.get(rsn.zfill(3), 0.0)
+
+        records.append({
+            "line_nbr": _as_str(_cell(row, line_idx)),
+            "rsn": rsn,
+            "pdli": _as_str(_cell(row, pdli_idx)),
+            "pdli_desc": _as_str(_cell(row, desc_idx)),
+            "dir_rsrv_amt": _as_float(_cell(row, dir_idx)),
+            "net_obl_amt": _as_float(_cell(row, obl_idx)),
+            "net_exp_amt": _as_float(_cell(row, exp_idx)),
+            "avail_bal": _as_float(_cell(row, bal_idx)),
+            "net_commit_amt": net_commit_amt
+        })
+
+    meta['pdli_rows_scanned'] = scanned
+    return records
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+def parse_financial_workbook(source, filter_cty: Optional[str] = None, filter_case: Optional[str] = None,
+                             read_only: bool = True) -> Dict[str, Any]:
+    """
+    Parse an RSN/PDLI workbook in one streaming pass per sheet.
+
+    Returns {"financial_records", "rsn_data", "summary", "sheets", "meta"};
+    financial_records is None when the PDLI sheet has no recognisable header.
+    read_only=False loads the full workbook (only useful for comparisons).
+    """
+    if read_only:
+        wb = open_workbook_readonly(source)
+    else:
+        data = source if isinstance(source, (bytes, bytearray)) else None
+        wb = load_workbook(BytesIO(data) if data is not None else source, data_only=True)
+
+    try:
+        sheetnames = list(wb.sheetnames)
+        print(f"[Extract] 📊 Excel with {len(sheetnames)} sheets: {sheetnames}")
+        meta: Dict[str, Any] = {}
+
+        rsn_sheet_name, pdli_sheet_name = _select_sheets(sheetnames)
+
+        rsn_net_commit: Dict[str, float] = {}
+        if rsn_sheet_name:
+            print(f"[Extract] Processing RSN sheet: {rsn_sheet_name}")
+            rsn_rows = _iter_values(wb[rsn_sheet_name])
+            rsn_net_commit = _scan_rsn_sheet(rsn_rows, filter_cty, filter_case, meta)
+            print(f"[Extract] ✅ Extracted {len(set(rsn_net_commit.values()))} RSN NET_COMMIT values "
+                  f"for {filter_cty}-{filter_case}")
+
+        pdli_sheet = wb[pdli_sheet_name] if pdli_sheet_name else wb.active
+        print(f"[Extract] Processing PDLI sheet: {pdli_sheet.title}")
+        records = _scan_pdli_sheet(_iter_values(pdli_sheet), filter_cty, filter_case,
+                                   rsn_net_commit, meta)
+
+        summary = {}
+        if records is not None:
+            unique_rsns = set(r['rsn'] for r in records)
+            summary = {
+                "total_pdlis": len(records),
+                "unique_rsns": len(unique_rsns),
+                "total_directed": sum(r['dir_rsrv_amt'] for r in records)
+            }
+
+        return {
+            "financial_records": records,
+            "rsn_data": rsn_net_commit,
+            "summary": summary,
+            "sheets": {"rsn": rsn_sheet_name, "pdli": pdli_sheet.title},
+            "meta": meta
+        }
+    finally:
+        wb.close()
+
+
+def find_header_row(ws, header_keywords: Optional[List[str]] = None) -> Optional[int]:
+    """
+    Header row (1-based) of a MISIL RSN sheet: the first of the first 19 rows
+    containing at least 3 header keywords. Reads the rows once (works on read-only sheets).
+    """
+    header_keywords = header_keywords or ['rsn', 'pdli', 'oa rec amt', 'net commit', 'obligation']
+    for row_idx, row in enumerate(_iter_values(ws, max_row=HEADER_SEARCH_ROWS), start=1):
+        row_text = ' '.join([str(value or '').lower() for value in row])
+        if sum(1 for keyword in header_keywords if keyword in row_text) >= 3:
+            return row_idx
+    return None
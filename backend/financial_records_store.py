@@ -0,0 +1,536 @@
+# financial_records_store.py
+# Case financial records (RSN / PDLI rows from uploaded workbooks) stored as
+# their own rows, partitioned by case, with totals maintained on write.
+#
+#   store = financial_store_from_env(database_client)
+#   store.add_document(case_id, document_id, records, file_name, uploaded_at)   # rows + incremental totals
+#   store.get_summary(case_id)              # materialised totals / per-RSN aggregates (None if unknown case)
+#   store.ensure_case(case_id)              # records embedded in the case item copied: summary["migrated"]
+#   store.query_records(case_id, rsn="001", page_size=100, continuation=token)  # one page of rows
+#   store.remove_document(case_id, document_id)
+#
+# Two backends with the same interface:
+#   CosmosFinancialStore  - container partitioned by /caseId: one item per record plus
+#                           one "aggregate" item per case that is read with a point read
+#   SQLiteFinancialStore  - local file (tests / single-host deployments); rows and
+#                           aggregate tables are updated in ONE transaction
+#
+# Adding or removing a document touches only that document's rows and the
+# aggregates; reading a summary never scans the records.
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+AMOUNT_FIELDS = ("oa_rec_amt", "net_commit_amt", "net_obl_amt", "net_exp_amt", "dir_rsrv_amt")
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+
+def parse_amount(value: Any) -> float:
+    """Numeric value of an amount cell ('$1,000.00', 1000, None); 0.0 when unparseable"""
+    if not value:
+        return 0.0
+    try:
+        return float(str(value).replace('$', '').replace(',', ''))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def record_keys(record: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(rsn, pdli, pdli name) of a record from the MISIL export or the streaming parser"""
+    rsn = str(record.get("rsn_identifier") or record.get("rsn") or "Unknown")
+    pdli = str(record.get("pdli_pdli") or record.get("pdli") or "N/A")
+    name = str(record.get("pdli_name") or record.get("pdli_desc") or "")
+    return rsn, pdli, name
+
+
+def rsn_deltas(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-RSN amount sums and record counts of a batch of records"""
+    deltas: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        rsn, pdli, name = record_keys(record)
+        entry = deltas.get(rsn)
+        if entry is None:
+            entry = deltas[rsn] = {"pdli_pdli": pdli, "pdli_name": name, "record_count": 0,
+                                   **{field: 0.0 for field in AMOUNT_FIELDS}}
+        for field in AMOUNT_FIELDS:
+            entry[field] += parse_amount(record.get(field))
+        entry["record_count"] += 1
+    return deltas
+
+
+def _round_amounts(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # Totals are kept by adding and subtracting floats; round away the drift
+    for field in AMOUNT_FIELDS:
+        entry[field] = round(entry.get(field, 0.0), 2)
+    return entry
+
+
+def _page_size(page_size: Optional[int]) -> int:
+    return max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+def _output_record(record: Dict[str, Any], document_id: str, file_name: Optional[str]) -> Dict[str, Any]:
+    return {**record, "sourceDocument": file_name, "documentId": document_id}
+
+
+class FinancialRecordsStore(ABC):
+    """Shared bookkeeping for the store backends"""
+
+    backend = "base"
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.stats = {"documents_added": 0, "documents_removed": 0, "records_written": 0,
+                      "summary_reads": 0, "page_reads": 0, "errors": 0}
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    @abstractmethod
+    def add_document(self, case_id: str, document_id: str, records: List[Dict[str, Any]],
+                     file_name: Optional[str] = None, uploaded_at: Optional[str] = None) -> int:
+        """Store a document's records (replacing any earlier copy) and add them to the totals"""
+
+    @abstractmethod
+    def remove_document(self, case_id: str, document_id: str) -> int:
+        """Delete a document's records and subtract them from the totals; returns rows removed"""
+
+    @abstractmethod
+    def ensure_case(self, case_id: str) -> None:
+        """
+        Mark a case's embedded (pre-store) records as copied, registering the case if
+        it is new; call after the copy completed, so a failed copy is retried
+        """
+
+    @abstractmethod
+    def get_summary(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Materialised aggregates of a case, or None if the store has never seen it:
+        {"totals", "recordCount", "documentCount", "documents", "rsnSummary", "migrated"}
+        """
+
+    @abstractmethod
+    def query_records(self, case_id: str, rsn: Optional[str] = None, pdli: Optional[str] = None,
+                      document_id: Optional[str] = None, search: Optional[str] = None,
+                      page_size: Optional[int] = None, continuation: Optional[str] = None) -> Dict[str, Any]:
+        """One page of a case's records in upload order: {"records", "continuationToken"}"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {"backend": self.backend, **self.stats}
+
+
+class SQLiteFinancialStore(FinancialRecordsStore):
+    """
+    Financial records in a local SQLite file (WAL mode, one connection per thread).
+
+    - financial_records: one row per record, row_id gives upload order and page keys
+    - financial_rsn_totals / financial_case_totals: aggregates updated in the
+      same transaction as the rows, so readers never see them disagree
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        amounts = ", ".join(f"{field} REAL NOT NULL DEFAULT 0" for field in AMOUNT_FIELDS)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS financial_records ("
+                " row_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " case_id TEXT NOT NULL,"
+                " document_id TEXT NOT NULL,"
+                " rsn TEXT NOT NULL,"
+                " pdli TEXT NOT NULL,"
+                " pdli_name TEXT NOT NULL,"
+                " record TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_records_case ON financial_records (case_id, row_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_records_rsn "
+                         "ON financial_records (case_id, rsn, row_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_records_pdli "
+                         "ON financial_records (case_id, pdli, row_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_records_document "
+                         "ON financial_records (case_id, document_id, row_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS financial_documents ("
+                " case_id TEXT NOT NULL,"
+                " document_id TEXT NOT NULL,"
+                " file_name TEXT,"
+                " uploaded_at TEXT,"
+                " record_count INTEGER NOT NULL,"
+                " rsn_totals TEXT NOT NULL,"
+                " PRIMARY KEY (case_id, document_id))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS financial_rsn_totals ("
+                " case_id TEXT NOT NULL,"
+                " rsn TEXT NOT NULL,"
+                " pdli_pdli TEXT NOT NULL,"
+                " pdli_name TEXT NOT NULL,"
+                f" {amounts},"
+                " record_count INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (case_id, rsn))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS financial_case_totals ("
+                " case_id TEXT PRIMARY KEY,"
+                f" {amounts},"
+                " record_count INTEGER NOT NULL DEFAULT 0,"
+                " document_count INTEGER NOT NULL DEFAULT 0,"
+                " migrated INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(financial_case_totals)")}
+            if "migrated" not in columns:  # files written before the flag
+                conn.execute("ALTER TABLE financial_case_totals ADD COLUMN migrated INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # connections must not cross a fork
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _apply_deltas(self, conn: sqlite3.Connection, case_id: str, deltas: Dict[str, Dict[str, Any]],
+                      sign: int, documents: int) -> None:
+        """Add (sign=1) or subtract (sign=-1) per-RSN sums from the aggregate tables"""
+        adds = ", ".join(f"{field} = {field} + excluded.{field}" for field in AMOUNT_FIELDS)
+        columns = ", ".join(AMOUNT_FIELDS)
+        placeholders = ", ".join("?" for _ in AMOUNT_FIELDS)
+        conn.executemany(
+            f"INSERT INTO financial_rsn_totals (case_id, rsn, pdli_pdli, pdli_name, {columns}, record_count) "
+            f"VALUES (?, ?, ?, ?, {placeholders}, ?) "
+            f"ON CONFLICT (case_id, rsn) DO UPDATE SET {adds}, record_count = record_count + excluded.record_count",
+            [(case_id, rsn, entry["pdli_pdli"], entry["pdli_name"],
+              *(sign * entry[field] for field in AMOUNT_FIELDS), sign * entry["record_count"])
+             for rsn, entry in deltas.items()],
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM financial_rsn_totals WHERE case_id = ? AND record_count <= 0", (case_id,))
+        conn.execute(
+            f"INSERT INTO financial_case_totals (case_id, {columns}, record_count, document_count) "
+            f"VALUES (?, {placeholders}, ?, ?) "
+            f"ON CONFLICT (case_id) DO UPDATE SET {adds}, record_count = record_count + excluded.record_count, "
+            f"document_count = document_count + excluded.document_count",
+            (case_id, *(sign * sum(entry[field] for entry in deltas.values()) for field in AMOUNT_FIELDS),
+             sign * sum(entry["record_count"] for entry in deltas.values()), sign * documents),
+        )
+
+    def _remove(self, conn: sqlite3.Connection, case_id: str, document_id: str) -> int:
+        row = conn.execute("SELECT rsn_totals, record_count FROM financial_documents "
+                           "WHERE case_id = ? AND document_id = ?", (case_id, document_id)).fetchone()
+        if row is None:
+            return 0
+        self._apply_deltas(conn, case_id, json.loads(row[0]), sign=-1, documents=1)
+        conn.execute("DELETE FROM financial_records WHERE case_id = ? AND document_id = ?", (case_id, document_id))
+        conn.execute("DELETE FROM financial_documents WHERE case_id = ? AND document_id = ?", (case_id, document_id))
+        return row[1]
+
+    def add_document(self, case_id: str, document_id: str, records: List[Dict[str, Any]],
+                     file_name: Optional[str] = None, uploaded_at: Optional[str] = None) -> int:
+        deltas = rsn_deltas(records)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove(conn, case_id, document_id)
+            conn.executemany(
+                "INSERT INTO financial_records (case_id, document_id, rsn, pdli, pdli_name, record) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(case_id, document_id, *record_keys(record), json.dumps(record, default=str))
+                 for record in records],
+            )
+            conn.execute(
+                "INSERT INTO financial_documents (case_id, document_id, file_name, uploaded_at, record_count, "
+                "rsn_totals) VALUES (?, ?, ?, ?, ?, ?)",
+                (case_id, document_id, file_name, uploaded_at, len(records), json.dumps(deltas)),
+            )
+            self._apply_deltas(conn, case_id, deltas, sign=1, documents=1)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            self._bump("errors")
+            raise
+        self._bump("documents_added")
+        self._bump("records_written", len(records))
+        return len(records)
+
+    def remove_document(self, case_id: str, document_id: str) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = self._remove(conn, case_id, document_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            self._bump("errors")
+            raise
+        if removed:
+            self._bump("documents_removed")
+        return removed
+
+    def ensure_case(self, case_id: str) -> None:
+        self._conn().execute("INSERT INTO financial_case_totals (case_id, migrated) VALUES (?, 1) "
+                             "ON CONFLICT (case_id) DO UPDATE SET migrated = 1", (case_id,))
+
+    def get_summary(self, case_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        columns = ", ".join(AMOUNT_FIELDS)
+        row = conn.execute(f"SELECT {columns}, record_count, document_count, migrated FROM financial_case_totals "
+                           "WHERE case_id = ?", (case_id,)).fetchone()
+        if row is None:
+            return None
+        self._bump("summary_reads")
+        totals = _round_amounts(dict(zip(AMOUNT_FIELDS, row)))
+        documents = [
+            {"documentId": document_id, "fileName": file_name, "uploadedAt": uploaded_at, "recordCount": count}
+            for document_id, file_name, uploaded_at, count in conn.execute(
+                "SELECT document_id, file_name, uploaded_at, record_count FROM financial_documents "
+                "WHERE case_id = ? ORDER BY uploaded_at", (case_id,))
+        ]
+        rsn_summary = [
+            _round_amounts({"rsn_identifier": rsn, "pdli_pdli": pdli, "pdli_name": name,
+                            **dict(zip(AMOUNT_FIELDS, amounts)), "record_count": count})
+            for rsn, pdli, name, *amounts, count in conn.execute(
+                f"SELECT rsn, pdli_pdli, pdli_name, {columns}, record_count FROM financial_rsn_totals "
+                "WHERE case_id = ? ORDER BY oa_rec_amt DESC, rsn", (case_id,))
+        ]
+        return {"totals": totals, "recordCount": row[len(AMOUNT_FIELDS)],
+                "documentCount": row[len(AMOUNT_FIELDS) + 1], "documents": documents, "rsnSummary": rsn_summary,
+                "migrated": bool(row[len(AMOUNT_FIELDS) + 2])}
+
+    def query_records(self, case_id: str, rsn: Optional[str] = None, pdli: Optional[str] = None,
+                      document_id: Optional[str] = None, search: Optional[str] = None,
+                      page_size: Optional[int] = None, continuation: Optional[str] = None) -> Dict[str, Any]:
+        page_size = _page_size(page_size)
+        clauses, params = ["r.case_id = ?"], [case_id]
+        if continuation:
+            if not str(continuation).isdigit():
+                raise ValueError(f"invalid continuation token: {continuation!r}")
+            clauses.append("r.row_id > ?")
+            params.append(int(continuation))
+        for column, value in (("r.rsn", rsn), ("r.pdli", pdli), ("r.document_id", document_id)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if search:
+            clauses.append("instr(lower(r.pdli_name), ?) > 0")
+            params.append(search.lower())
+        rows = self._conn().execute(
+            "SELECT r.row_id, r.document_id, d.file_name, r.record FROM financial_records r "
+            "LEFT JOIN financial_documents d ON d.case_id = r.case_id AND d.document_id = r.document_id "
+            f"WHERE {' AND '.join(clauses)} ORDER BY r.row_id LIMIT ?",
+            (*params, page_size + 1),
+        ).fetchall()
+        self._bump("page_reads")
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        return {
+            "records": [_output_record(json.loads(record), doc_id, file_name) for _, doc_id, file_name, record in rows],
+            "continuationToken": str(rows[-1][0]) if more else None,
+        }
+
+
+class CosmosFinancialStore(FinancialRecordsStore):
+    """
+    Financial records in a Cosmos container partitioned by /caseId.
+
+    Items: {"type": "financial_record", "id": "<documentId>:<seq>", "uploadOrder", ...} per
+    record (uploadOrder = "<uploadedAt>|<documentId>|<seq>", the page order) and one
+    {"type": "financial_aggregate", "id": "aggregate"} per case holding the totals, the
+    per-RSN aggregates and each document's per-RSN contribution (used to subtract it on
+    delete). The aggregate is updated with an etag precondition and served by a point read.
+    """
+
+    backend = "cosmos"
+    AGGREGATE_ID = "aggregate"
+    BATCH_SIZE = 100  # transactional batch limit
+
+    def __init__(self, container_client, attempts: int = 5):
+        super().__init__()
+        self.container = container_client
+        self.attempts = attempts
+
+    def _read_aggregate(self, case_id: str) -> Optional[Dict[str, Any]]:
+        from azure.cosmos import exceptions as cosmos_exceptions
+        try:
+            return self.container.read_item(item=self.AGGREGATE_ID, partition_key=case_id)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            return None
+
+    def _update_aggregate(self, case_id: str, mutate) -> Dict[str, Any]:
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions as cosmos_exceptions
+        for attempt in range(self.attempts):
+            aggregate = self._read_aggregate(case_id)
+            if aggregate is None:
+                aggregate = {"id": self.AGGREGATE_ID, "caseId": case_id, "type": "financial_aggregate",
+                             "totals": {field: 0.0 for field in AMOUNT_FIELDS}, "recordCount": 0,
+                             "documents": {}, "rsns": {}}
+                mutate(aggregate)
+                try:
+                    return self.container.create_item(body=aggregate)
+                except cosmos_exceptions.CosmosResourceExistsError:
+                    continue
+            mutate(aggregate)
+            try:
+                return self.container.replace_item(item=self.AGGREGATE_ID, body=aggregate, etag=aggregate.get("_etag"),
+                                                   match_condition=MatchConditions.IfNotModified)
+            except cosmos_exceptions.CosmosAccessConditionFailedError:
+                print(f"[FinancialStore] Aggregate for {case_id} changed concurrently - retrying "
+                      f"({attempt + 1}/{self.attempts})")
+        self._bump("errors")
+        raise RuntimeError(f"could not update financial aggregate for case {case_id}")
+
+    @staticmethod
+    def _apply_deltas(aggregate: Dict[str, Any], deltas: Dict[str, Dict[str, Any]], sign: int) -> None:
+        rsns = aggregate["rsns"]
+        for rsn, entry in deltas.items():
+            target = rsns.setdefault(rsn, {"pdli_pdli": entry["pdli_pdli"], "pdli_name": entry["pdli_name"],
+                                           "record_count": 0, **{field: 0.0 for field in AMOUNT_FIELDS}})
+            for field in AMOUNT_FIELDS:
+                target[field] += sign * entry[field]
+                aggregate["totals"][field] += sign * entry[field]
+            target["record_count"] += sign * entry["record_count"]
+            aggregate["recordCount"] += sign * entry["record_count"]
+            if target["record_count"] <= 0:
+                del rsns[rsn]
+
+    def _write_batches(self, case_id: str, operations: List[Tuple]) -> None:
+        for start in range(0, len(operations), self.BATCH_SIZE):
+            self.container.execute_item_batch(batch_operations=operations[start:start + self.BATCH_SIZE],
+                                              partition_key=case_id)
+
+    def _delete_records(self, case_id: str, document_id: str) -> None:
+        ids = [item["id"] for item in self.container.query_items(
+            query="SELECT c.id FROM c WHERE c.type = 'financial_record' AND c.documentId = @documentId",
+            parameters=[{"name": "@documentId", "value": document_id}], partition_key=case_id)]
+        self._write_batches(case_id, [("delete", (item_id,)) for item_id in ids])
+
+    def add_document(self, case_id: str, document_id: str, records: List[Dict[str, Any]],
+                     file_name: Optional[str] = None, uploaded_at: Optional[str] = None) -> int:
+        deltas = rsn_deltas(records)
+        aggregate = self._read_aggregate(case_id)
+        if aggregate and document_id in aggregate.get("documents", {}):
+            self.remove_document(case_id, document_id)
+
+        items = []
+        for seq, record in enumerate(records):
+            rsn, pdli, name = record_keys(record)
+            items.append(("upsert", ({
+                "id": f"{document_id}:{seq:06d}", "caseId": case_id, "type": "financial_record",
+                "documentId": document_id, "fileName": file_name, "seq": seq,
+                "uploadedAt": uploaded_at, "uploadOrder": f"{uploaded_at or ''}|{document_id}|{seq:06d}",
+                "rsn": rsn, "pdli": pdli, "pdliName": name.lower(), "record": record,
+            },)))
+        self._write_batches(case_id, items)
+
+        def mutate(aggregate):
+            self._apply_deltas(aggregate, deltas, sign=1)
+            aggregate["documents"][document_id] = {"fileName": file_name, "uploadedAt": uploaded_at,
+                                                   "recordCount": len(records), "rsnTotals": deltas}
+            aggregate["updatedAt"] = datetime.now(timezone.utc).isoformat()
+
+        self._update_aggregate(case_id, mutate)
+        self._bump("documents_added")
+        self._bump("records_written", len(records))
+        return len(records)
+
+    def remove_document(self, case_id: str, document_id: str) -> int:
+        aggregate = self._read_aggregate(case_id)
+        document = (aggregate or {}).get("documents", {}).get(document_id)
+        if document is None:
+            return 0
+
+        def mutate(aggregate):
+            entry = aggregate["documents"].pop(document_id, None)
+            if entry is not None:
+                self._apply_deltas(aggregate, entry["rsnTotals"], sign=-1)
+            aggregate["updatedAt"] = datetime.now(timezone.utc).isoformat()
+
+        self._update_aggregate(case_id, mutate)
+        self._delete_records(case_id, document_id)
+        self._bump("documents_removed")
+        return document["recordCount"]
+
+    def ensure_case(self, case_id: str) -> None:
+        aggregate = self._read_aggregate(case_id)
+        if aggregate is None or not aggregate.get("migrated"):
+            self._update_aggregate(case_id, lambda aggregate: aggregate.update(migrated=True))
+
+    def get_summary(self, case_id: str) -> Optional[Dict[str, Any]]:
+        aggregate = self._read_aggregate(case_id)
+        if aggregate is None:
+            return None
+        self._bump("summary_reads")
+        documents = sorted(
+            ({"documentId": document_id, "fileName": entry.get("fileName"), "uploadedAt": entry.get("uploadedAt"),
+              "recordCount": entry.get("recordCount", 0)}
+             for document_id, entry in aggregate.get("documents", {}).items()),
+            key=lambda d: d["uploadedAt"] or "")
+        rsn_summary = sorted(
+            (_round_amounts({"rsn_identifier": rsn, "pdli_pdli": entry["pdli_pdli"], "pdli_name": entry["pdli_name"],
+                             **{field: entry[field] for field in AMOUNT_FIELDS},
+                             "record_count": entry["record_count"]})
+             for rsn, entry in aggregate.get("rsns", {}).items()),
+            key=lambda item: (-item["oa_rec_amt"], item["rsn_identifier"]))
+        return {"totals": _round_amounts(dict(aggregate["totals"])), "recordCount": aggregate.get("recordCount", 0),
+                "documentCount": len(documents), "documents": documents, "rsnSummary": rsn_summary,
+                "migrated": bool(aggregate.get("migrated"))}
+
+    def query_records(self, case_id: str, rsn: Optional[str] = None, pdli: Optional[str] = None,
+                      document_id: Optional[str] = None, search: Optional[str] = None,
+                      page_size: Optional[int] = None, continuation: Optional[str] = None) -> Dict[str, Any]:
+        clauses = ["c.type = 'financial_record'"]
+        parameters = []
+        for field, value in (("rsn", rsn), ("pdli", pdli), ("documentId", document_id)):
+            if value:
+                clauses.append(f"c.{field} = @{field}")
+                parameters.append({"name": f"@{field}", "value": value})
+        if search:
+            clauses.append("CONTAINS(c.pdliName, @search)")
+            parameters.append({"name": "@search", "value": search.lower()})
+        pages = self.container.query_items(
+            query=f"SELECT c.documentId, c.fileName, c.record FROM c WHERE {' AND '.join(clauses)} "
+                  "ORDER BY c.uploadOrder",
+            parameters=parameters, partition_key=case_id, max_item_count=_page_size(page_size),
+        ).by_page(continuation)
+        items = list(next(pages, []))
+        self._bump("page_reads")
+        return {
+            "records": [_output_record(item["record"], item["documentId"], item.get("fileName")) for item in items],
+            "continuationToken": pages.continuation_token,
+        }
+
+
+def financial_store_from_env(database_client=None) -> FinancialRecordsStore:
+    """
+    Cosmos container FINANCIAL_RECORDS_CONTAINER (partition key /caseId) when set and
+    Cosmos is configured, else the SQLite file FINANCIAL_STORE_PATH
+    """
+    container_name = os.getenv("FINANCIAL_RECORDS_CONTAINER")
+    if container_name and database_client is not None:
+        try:
+            from azure.cosmos import PartitionKey
+            container = database_client.create_container_if_not_exists(
+                id=container_name, partition_key=PartitionKey(path="/caseId"))
+            print(f"[FinancialStore] Using Cosmos container {container_name}")
+            return CosmosFinancialStore(container)
+        except Exception as e:
+            print(f"[FinancialStore] ⚠️ Cosmos container {container_name} unavailable, using SQLite: {e}")
+    path = os.getenv("FINANCIAL_STORE_PATH", os.path.join("cache_data", "financial_records.sqlite3"))
+    return SQLiteFinancialStore(path)
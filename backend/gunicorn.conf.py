@@ -0,0 +1,65 @@
+# gunicorn.conf.py
+# Production serving for the SAMM app (v5.9.26): prefork workers forked from one preloaded app.
+#
+#   gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_app()"
+#   WEB_WORKERS=4 WEB_THREADS=16 gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_app()"
+#
+# preload_app: the master imports the app and runs create_app() (KG, 2-hop index,
+# embedding model, vector DB client, compiled matchers, gc.freeze) before forking,
+# so workers share those pages copy-on-write instead of loading one copy each.
+# Each worker drops the connections it inherited before serving (post_worker_init).
+# gthread workers: a request - including an SSE answer stream - holds one thread
+# while it waits on Ollama, so WEB_THREADS bounds concurrent requests per worker.
+# benchmark_serving.py measures per-worker memory and requests/sec for a setting.
+#
+# v5.9.27: WEB_SERVER=asgi runs uvicorn workers on create_asgi_app(): /api/query/stream
+# is served from the event loop (an open stream holds no thread), the other routes
+# from WEB_THREADS bridge threads per worker. test_async_streaming.py holds 1,000 streams.
+#   WEB_SERVER=asgi gunicorn -c gunicorn.conf.py "app_5_9_11_GOLD_TRAINING:create_asgi_app()"
+#
+# v5.9.31: each worker writes its metrics to METRICS_DIR (a fresh temporary directory
+# unless set), so a GET /metrics answered by any worker sums all of them.
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+APP_MODULE = "app_5_9_11_GOLD_TRAINING"
+
+bind = os.getenv("WEB_BIND", f"0.0.0.0:{os.getenv('PORT', '3000')}")
+workers = int(os.getenv("WEB_WORKERS", "2"))
+threads = int(os.getenv("WEB_THREADS", "16"))
+worker_class = "uvicorn.workers.UvicornWorker" if os.getenv("WEB_SERVER", "wsgi").lower() == "asgi" else "gthread"
+preload_app = os.getenv("WEB_PRELOAD", "true").lower() == "true"
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))  # answer generation can take minutes on CPU
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))  # 0 = never recycle workers
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("WEB_ACCESS_LOG") or None
+
+# Set before the app is imported (preload) so every process agrees on the directory
+_own_metrics_dir = not os.getenv("METRICS_DIR")
+if _own_metrics_dir:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="samm-metrics-")
+
+
+def on_starting(server):
+    """Master start: a METRICS_DIR kept from an earlier run must not add its workers' counts"""
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+        os.remove(path)
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def post_worker_init(worker):
+    """In the worker, after the app is loaded and before it accepts requests"""
+    samm = sys.modules.get(APP_MODULE)
+    if samm is not None:
+        # Ollama is shared by every worker: warming it from the first one is enough
+        samm.reset_after_fork(warm_ollama=worker.age == 1)
@@ -0,0 +1,1072 @@
+# itar_compliance_engine.py - In-process ITAR / security compliance engine
+#
+# The compliance knowledge base and rules of itar_compliance_microservice.py
+# (data_loader/agent_itar_security_loader.py), usable without Flask, database
+# connections or an HTTP hop:
+#
+#   engine = ITARComplianceEngine(llm=call_ollama_enhanced)
+#   result = engine.verify(query, intent_info, entity_info, user_profile)
+#
+#   # on an event loop: rules inline, LLM call awaited and bounded
+#   result = await engine.verify_async(query, ..., llm=async_chat, llm_slots=semaphore)
+#
+# - All keyword/classification detectors are compiled into one regex, so a query
+#   is scanned once instead of once per term (substring semantics are unchanged)
+# - Decisions are cached (LRU + TTL) on (normalised query, entity set, auth level)
+# - The LLM analysis only adds advisory ai_insights; it is skipped whenever the
+#   rule evidence is decisive (access denied, or nothing compliance-relevant found)
+#
+# The HTTP microservice wraps this same engine and remains an optional deployment.
+
+import asyncio
+import contextlib
+import copy
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from tiered_cache import LRUTTLCache
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# COMPLIANCE ENUMS AND TYPES
+# =============================================================================
+
+class AuthorizationLevel(Enum):
+    """Authorization levels for SC/A operations"""
+    UNCLASSIFIED = "unclassified"
+    CONFIDENTIAL = "confidential"
+    SECRET = "secret"
+    TOP_SECRET = "top_secret"
+    SCI = "sci"  # Sensitive Compartmented Information
+
+class ComplianceStatus(Enum):
+    """Compliance check results"""
+    COMPLIANT = "compliant"
+    NON_COMPLIANT = "non_compliant"
+    WARNING = "warning"
+    REQUIRES_REVIEW = "requires_review"
+    INSUFFICIENT_DATA = "insufficient_data"
+
+class PolicyDomain(Enum):
+    """Policy domains for compliance checking"""
+    ITAR = "itar"  # International Traffic in Arms Regulations
+    AECA = "aeca"  # Arms Export Control Act
+    SAMM = "samm"  # Security Assistance Management Manual
+    EAR = "ear"    # Export Administration Regulations
+    OFAC = "ofac"  # Office of Foreign Assets Control
+    NDAA = "ndaa"  # National Defense Authorization Act
+
+class ITARCategory(Enum):
+    """ITAR United States Munitions List (USML) Categories"""
+    CAT_I = "I"        # Firearms, Close Assault Weapons and Combat Shotguns
+    CAT_II = "II"      # Guns and Armament
+    CAT_III = "III"    # Ammunition/Ordnance
+    CAT_IV = "IV"      # Launch Vehicles, Guided Missiles, Ballistic Missiles
+    CAT_V = "V"        # Explosives and Energetic Materials
+    CAT_VI = "VI"      # Surface Vessels of War and Special Naval Equipment
+    CAT_VII = "VII"    # Ground Vehicles
+    CAT_VIII = "VIII"  # Aircraft and Associated Equipment
+    CAT_IX = "IX"      # Military Training Equipment
+    CAT_X = "X"        # Personal Protective Equipment
+    CAT_XI = "XI"      # Military Electronics
+    CAT_XII = "XII"    # Fire Control, Laser, Imaging and Guidance Equipment
+    CAT_XIII = "XIII"  # Materials and Miscellaneous Articles
+    CAT_XIV = "XIV"    # Toxicological Agents
+    CAT_XV = "XV"      # Spacecraft and Related Articles
+    CAT_XVI = "XVI"    # Nuclear Weapons Related Articles
+    CAT_XVII = "XVII"  # Classified Articles
+    CAT_XVIII = "XVIII" # Directed Energy Weapons
+    CAT_XIX = "XIX"    # Gas Turbine Engines and Associated Equipment
+    CAT_XX = "XX"      # Submersible Vessels and Related Articles
+    CAT_XXI = "XXI"    # Articles, Services and Related Technical Data
+
+AUTH_HIERARCHY = {
+    AuthorizationLevel.UNCLASSIFIED: 0,
+    AuthorizationLevel.CONFIDENTIAL: 1,
+    AuthorizationLevel.SECRET: 2,
+    AuthorizationLevel.TOP_SECRET: 3,
+    AuthorizationLevel.SCI: 4
+}
+
+# LLM analysis modes: "auto" (only when rule evidence is not decisive), "always", "never"
+LLM_ANALYSIS_MODES = ("auto", "always", "never")
+
+# =============================================================================
+# DETECTOR TERM LISTS
+# =============================================================================
+
+DOMAIN_INDICATORS = {
+    PolicyDomain.ITAR: ["itar", "defense article", "technical data", "export license", "usml",
+                       "munitions list", "ddtc", "defense trade controls"],
+    PolicyDomain.AECA: ["aeca", "fms", "foreign military sales", "arms export", "congressional notification"],
+    PolicyDomain.SAMM: ["samm", "security assistance", "security cooperation", "dsca"],
+    PolicyDomain.EAR: ["ear", "dual use", "commerce control list", "ccl", "bis"],
+    PolicyDomain.OFAC: ["ofac", "sanctions", "embargo", "sdn list"],
+    PolicyDomain.NDAA: ["ndaa", "national defense authorization", "section 1226"]
+}
+
+ITAR_CATEGORY_ITEMS = {
+    ITARCategory.CAT_I.value: ["firearms", "machine guns", "rifles", "pistols"],
+    ITARCategory.CAT_VIII.value: ["aircraft", "helicopters", "fighter", "bomber", "uav", "drone"],
+    ITARCategory.CAT_XI.value: ["radar", "electronics", "communications", "jamming"],
+    ITARCategory.CAT_XIII.value: ["armor", "materials", "alloys", "composites"],
+    ITARCategory.CAT_XXI.value: ["services", "training", "maintenance", "technical assistance"]
+}
+
+CLASSIFICATION_TERMS = ["classified", "confidential", "secret", "top secret", "sci", "noforn", "proprietary"]
+ITAR_TERMS = ["defense article", "technical data", "defense service", "significant military equipment",
+              "munitions", "weapons", "military technology"]
+EXPORT_TERMS = ["export", "re-export", "transfer", "foreign national", "third country"]
+COUNTRY_GROUPS = ["country group d:1", "country group d:3", "country group d:4", "country group d:5"]
+EMBARGO_TERMS = ["embargoed", "sanctioned", "restricted country", "arms embargo"]
+TECHNICAL_DATA_TERMS = ["blueprints", "specifications", "software", "source code", "algorithms",
+                        "design data", "manufacturing data", "test data", "technology transfer"]
+EXPORT_CONTROL_TERMS = ["export license", "license exception", "deemed export", "technology transfer",
+                        "foreign person", "end user", "end use", "diversion"]
+HIGH_RISK_CATEGORIES = [ITARCategory.CAT_I.value, ITARCategory.CAT_VIII.value,
+                        ITARCategory.CAT_XI.value, ITARCategory.CAT_XVI.value]
+
+
+class CompiledTermMatcher:
+    """
+    Finds which of a fixed set of terms occur as substrings of a text in a single
+    regex pass. Equivalent to [t for t in terms if t in text], including
+    overlapping terms and terms that are prefixes of one another.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(dict.fromkeys(terms))
+        ordered = sorted(self.terms, key=len, reverse=True)
+        # Lookahead capture: one match attempt per position, longest term first
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(t) for t in ordered) + "))") if ordered else None
+        # A longer match at a position implies every shorter term that is its prefix
+        self._prefixes = {t: [p for p in self.terms if p != t and t.startswith(p)] for t in self.terms}
+
+    def find(self, text: str) -> set:
+        found = set()
+        if self._pattern is None:
+            return found
+        for match in self._pattern.finditer(text):
+            term = match.group(1)
+            if term not in found:
+                found.add(term)
+                found.update(self._prefixes[term])
+        return found
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+class ITARComplianceEngine:
+    """
+    Stateless-per-request ITAR and security compliance evaluation.
+
+    verify() returns the same result structure as the microservice's
+    /api/compliance/verify endpoint and is safe to call from many threads.
+    """
+
+    def __init__(self, llm: Optional[Callable[[str, str], str]] = None, llm_mode: str = "auto",
+                 cache_size: int = 5000, cache_ttl_seconds: float = 3600):
+        self.llm = llm
+        self.llm_mode = llm_mode if llm_mode in LLM_ANALYSIS_MODES else "auto"
+
+        # ITAR-specific knowledge base
+        self.itar_usml_categories = self._initialize_itar_categories()
+        self.policy_frameworks = self._initialize_policy_frameworks()
+        self.authorization_matrix = self._initialize_authorization_matrix()
+        self.compliance_rules = self._initialize_compliance_rules()
+        self.country_classifications = self._initialize_country_classifications()
+
+        self._compile_detectors()
+
+        self.decision_cache = LRUTTLCache(max_size=cache_size, ttl_seconds=cache_ttl_seconds)
+        self._stats_lock = threading.Lock()
+        self.stats = {"evaluations": 0, "llm_calls": 0, "llm_skipped": 0}
+        self._async_flights: Dict[Tuple, "asyncio.Future"] = {}
+
+        logger.info(f"ITAR compliance engine ready: {len(self.compliance_rules)} rules, "
+                    f"{len(self._matcher.terms)} compiled terms, LLM mode={self.llm_mode}")
+
+    @classmethod
+    def from_env(cls, llm: Optional[Callable[[str, str], str]] = None,
+                 default_llm_mode: str = "auto") -> "ITARComplianceEngine":
+        """Engine configured from ITAR_LLM_ANALYSIS (default_llm_mode when unset) /
+        ITAR_DECISION_CACHE_SIZE / ITAR_DECISION_CACHE_TTL"""
+        return cls(
+            llm=llm,
+            llm_mode=os.getenv("ITAR_LLM_ANALYSIS", default_llm_mode).lower(),
+            cache_size=int(os.getenv("ITAR_DECISION_CACHE_SIZE", "5000")),
+            cache_ttl_seconds=float(os.getenv("ITAR_DECISION_CACHE_TTL", "3600")),
+        )
+
+    def _compile_detectors(self):
+        """Compile every detector term (and rule trigger) into one matcher"""
+        self._category_mentions = {f"category {category.value.lower()}": category.value for category in ITARCategory}
+        all_terms: List[str] = []
+        for indicators in DOMAIN_INDICATORS.values():
+            all_terms.extend(indicators)
+        all_terms.extend(self._category_mentions)
+        for items in ITAR_CATEGORY_ITEMS.values():
+            all_terms.extend(items)
+        for terms in (CLASSIFICATION_TERMS, ITAR_TERMS, EXPORT_TERMS, COUNTRY_GROUPS, EMBARGO_TERMS,
+                      TECHNICAL_DATA_TERMS, EXPORT_CONTROL_TERMS):
+            all_terms.extend(terms)
+        for rule in self.compliance_rules:
+            all_terms.extend(rule["trigger_terms"])
+        self._matcher = CompiledTermMatcher(all_terms)
+
+    # -------------------------------------------------------------------------
+    # Knowledge base (same definitions as the microservice agent)
+    # -------------------------------------------------------------------------
+
+    def _initialize_itar_categories(self) -> Dict[str, Dict]:
+        """Initialize ITAR USML categories with detailed information"""
+        return {
+            ITARCategory.CAT_I.value: {
+                "name": "Firearms, Close Assault Weapons and Combat Shotguns",
+                "description": "Military firearms and related equipment",
+                "risk_level": "high",
+                "common_items": ["military rifles", "machine guns", "combat shotguns"],
+                "license_required": True
+            },
+            ITARCategory.CAT_VIII.value: {
+                "name": "Aircraft and Associated Equipment",
+                "description": "Military aircraft, helicopters, and related systems",
+                "risk_level": "very_high",
+                "common_items": ["fighter aircraft", "military helicopters", "UAVs"],
+                "license_required": True
+            },
+            ITARCategory.CAT_XI.value: {
+                "name": "Military Electronics",
+                "description": "Electronic systems and equipment for military use",
+                "risk_level": "high",
+                "common_items": ["radar systems", "military communications", "electronic warfare"],
+                "license_required": True
+            },
+            ITARCategory.CAT_XIII.value: {
+                "name": "Materials and Miscellaneous Articles",
+                "description": "Special materials and miscellaneous defense articles",
+                "risk_level": "medium",
+                "common_items": ["armor materials", "special alloys", "protective equipment"],
+                "license_required": True
+            },
+            ITARCategory.CAT_XXI.value: {
+                "name": "Articles, Services and Related Technical Data",
+                "description": "Defense services and technical data not elsewhere specified",
+                "risk_level": "variable",
+                "common_items": ["technical assistance", "training", "maintenance"],
+                "license_required": True
+            }
+        }
+    
+    def _initialize_policy_frameworks(self) -> Dict[str, Dict]:
+        """Initialize policy framework definitions"""
+        return {
+            PolicyDomain.ITAR.value: {
+                "name": "International Traffic in Arms Regulations",
+                "authority": "Department of State, Directorate of Defense Trade Controls (DDTC)",
+                "classification_levels": [AuthorizationLevel.UNCLASSIFIED, AuthorizationLevel.CONFIDENTIAL, 
+                                        AuthorizationLevel.SECRET, AuthorizationLevel.TOP_SECRET],
+                "key_sections": ["120.1", "120.3", "121.1", "126.1", "127.1"],
+                "controlled_items": ["defense_articles", "defense_services", "technical_data"],
+                "prohibited_countries": ["Country Group D:1", "Country Group D:3", "Country Group D:4", "Country Group D:5"],
+                "license_types": ["DSP-5", "DSP-73", "DSP-83", "TAA", "MLA"],
+                "congressional_notification": True,
+                "end_use_monitoring": True
+            },
+            PolicyDomain.AECA.value: {
+                "name": "Arms Export Control Act",
+                "authority": "Department of State",
+                "classification_levels": [AuthorizationLevel.UNCLASSIFIED, AuthorizationLevel.CONFIDENTIAL],
+                "key_sections": ["Section 3", "Section 38", "Section 40A", "Section 36"],
+                "programs": ["FMS", "FMF", "IMET", "DCS"],
+                "congressional_notification": True,
+                "threshold_amounts": {"major_defense_equipment": 14000000, "defense_articles_services": 50000000}
+            },
+            PolicyDomain.SAMM.value: {
+                "name": "Security Assistance Management Manual",
+                "authority": "DSCA",
+                "classification_levels": [AuthorizationLevel.UNCLASSIFIED],
+                "chapters": ["C1", "C2", "C3", "C4", "C5", "C6", "C7", "C8", "C9", "C10"],
+                "case_types": ["FMS", "FMF", "IMET", "Building_Partner_Capacity"],
+                "processes": ["case_development", "congressional_notification", "implementation"]
+            },
+            PolicyDomain.EAR.value: {
+                "name": "Export Administration Regulations",
+                "authority": "Department of Commerce, Bureau of Industry and Security (BIS)",
+                "classification_levels": [AuthorizationLevel.UNCLASSIFIED],
+                "controlled_items": ["dual_use_items", "commercial_items"],
+                "license_types": ["individual", "validated_end_user", "special_comprehensive"]
+            }
+        }
+    
+    def _initialize_authorization_matrix(self) -> Dict[str, Dict]:
+        """Initialize authorization level requirements matrix"""
+        return {
+            "query_analysis": {
+                AuthorizationLevel.UNCLASSIFIED.value: {
+                    "allowed_domains": [PolicyDomain.SAMM.value, PolicyDomain.AECA.value],
+                    "itar_categories": [],  # No ITAR access at unclassified
+                    "restricted_terms": ["classified", "proprietary", "sensitive"],
+                    "max_detail_level": "general"
+                },
+                AuthorizationLevel.CONFIDENTIAL.value: {
+                    "allowed_domains": [PolicyDomain.SAMM.value, PolicyDomain.AECA.value, PolicyDomain.ITAR.value],
+                    "itar_categories": [ITARCategory.CAT_XIII.value, ITARCategory.CAT_XXI.value],
+                    "restricted_terms": ["secret", "top_secret", "sci"],
+                    "max_detail_level": "detailed"
+                },
+                AuthorizationLevel.SECRET.value: {
+                    "allowed_domains": list(PolicyDomain),
+                    "itar_categories": [cat.value for cat in ITARCategory],
+                    "restricted_terms": ["top_secret", "sci"],
+                    "max_detail_level": "comprehensive"
+                },
+                AuthorizationLevel.TOP_SECRET.value: {
+                    "allowed_domains": list(PolicyDomain),
+                    "itar_categories": [cat.value for cat in ITARCategory],
+                    "restricted_terms": ["sci"],
+                    "max_detail_level": "full"
+                }
+            },
+            "case_access": {
+                AuthorizationLevel.UNCLASSIFIED.value: {
+                    "case_types": ["FMS_unclassified", "IMET_unclassified"],
+                    "country_restrictions": ["Country Group D:1", "Country Group D:3", "Country Group D:4", "Country Group D:5"],
+                    "value_limits": {"case_value": 10000000, "individual_item": 1000000}
+                },
+                AuthorizationLevel.CONFIDENTIAL.value: {
+                    "case_types": ["FMS_all", "FMF_standard", "IMET_all", "DCS_commercial"],
+                    "country_restrictions": ["Country Group D:1", "Country Group D:3"],
+                    "value_limits": {"case_value": 100000000, "individual_item": 10000000}
+                },
+                AuthorizationLevel.SECRET.value: {
+                    "case_types": ["all"],
+                    "country_restrictions": [],
+                    "value_limits": {"case_value": -1, "individual_item": -1}  # No limits
+                }
+            }
+        }
+    
+    def _initialize_compliance_rules(self) -> List[Dict]:
+        """Initialize compliance checking rules"""
+        return [
+            {
+                "rule_id": "ITAR_001",
+                "domain": PolicyDomain.ITAR.value,
+                "description": "ITAR-controlled items require appropriate export authorization",
+                "trigger_terms": ["defense_article", "technical_data", "defense_service", "usml"],
+                "required_authorization": AuthorizationLevel.CONFIDENTIAL.value,
+                "compliance_check": "verify_itar_authorization",
+                "severity": "high"
+            },
+            {
+                "rule_id": "ITAR_002",
+                "domain": PolicyDomain.ITAR.value,
+                "description": "USML Category I-XX items require specific licensing",
+                "trigger_terms": ["category i", "category ii", "category iii", "category iv", "category v",
+                                "category vi", "category vii", "category viii", "category ix", "category x",
+                                "category xi", "category xii", "category xiii", "category xiv", "category xv",
+                                "category xvi", "category xvii", "category xviii", "category xix", "category xx"],
+                "required_authorization": AuthorizationLevel.SECRET.value,
+                "compliance_check": "verify_usml_category_authorization",
+                "severity": "very_high"
+            },
+            {
+                "rule_id": "AECA_001", 
+                "domain": PolicyDomain.AECA.value,
+                "description": "AECA programs require congressional notification thresholds",
+                "trigger_terms": ["FMS", "major_defense_equipment", "congressional notification"],
+                "required_authorization": AuthorizationLevel.UNCLASSIFIED.value,
+                "compliance_check": "verify_congressional_notification",
+                "severity": "medium"
+            },
+            {
+                "rule_id": "COUNTRY_001",
+                "domain": "country_policy",
+                "description": "Prohibited countries require special authorization",
+                "trigger_terms": ["Country Group D:1", "embargoed_country", "arms_embargo"],
+                "required_authorization": AuthorizationLevel.SECRET.value,
+                "compliance_check": "verify_country_authorization",
+                "severity": "very_high"
+            },
+            {
+                "rule_id": "CLASSIFICATION_001",
+                "domain": "classification",
+                "description": "Classified information requires appropriate clearance",
+                "trigger_terms": ["classified", "secret", "confidential", "top_secret", "sci"],
+                "required_authorization": AuthorizationLevel.CONFIDENTIAL.value,
+                "compliance_check": "verify_classification_authorization",
+                "severity": "high"
+            },
+            {
+                "rule_id": "TECHNICAL_DATA_001",
+                "domain": PolicyDomain.ITAR.value,
+                "description": "Technical data transfers require ITAR compliance review",
+                "trigger_terms": ["technical_data", "blueprints", "specifications", "software", "technology_transfer"],
+                "required_authorization": AuthorizationLevel.CONFIDENTIAL.value,
+                "compliance_check": "verify_technical_data_transfer",
+                "severity": "high"
+            }
+        ]
+    
+    def _initialize_country_classifications(self) -> Dict[str, Dict]:
+        """Initialize country classifications for export control"""
+        return {
+            "Country Group D:1": {
+                "description": "Countries subject to arms embargo",
+                "countries": ["Specified in CFR Title 22"],
+                "restrictions": "Complete arms embargo",
+                "license_policy": "Denial",
+                "risk_level": "maximum"
+            },
+            "Country Group D:3": {
+                "description": "Countries of concern for missile technology",
+                "restrictions": "Missile technology restrictions",
+                "license_policy": "Case-by-case review",
+                "risk_level": "high"
+            },
+            "Country Group D:4": {
+                "description": "Countries subject to certain restrictions",
+                "restrictions": "Specific item restrictions",
+                "license_policy": "Enhanced review",
+                "risk_level": "medium"
+            },
+            "NATO_Allies": {
+                "description": "NATO member countries",
+                "restrictions": "Reduced restrictions",
+                "license_policy": "Generally favorable",
+                "risk_level": "low"
+            },
+            "Major_Non_NATO_Allies": {
+                "description": "Major Non-NATO Allies (MNNA)",
+                "restrictions": "Reduced restrictions for certain items",
+                "license_policy": "Generally favorable",
+                "risk_level": "low"
+            }
+        }
+
+    # -------------------------------------------------------------------------
+    # Verification
+    # -------------------------------------------------------------------------
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def decision_key(self, query: str, intent_info: Dict, entity_info: Dict,
+                     user_auth_level: AuthorizationLevel) -> Tuple:
+        """Cache key: (normalised query, intent, entity set, authorization level)"""
+        entities = entity_info.get("entities", []) or []
+        entity_set = tuple(sorted({str(e).strip().lower() for e in entities}))
+        return (query.strip().lower(), str(intent_info.get("intent", "unknown")), entity_set, user_auth_level.value)
+
+    def verify(self, query: str, intent_info: Optional[Dict] = None, entity_info: Optional[Dict] = None,
+               user_profile: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Compliance verification for a query.
+
+        Returns the same structure as the microservice agent's verify_compliance(),
+        with compliance_analysis.required_auth_level as its string value so the
+        result is JSON serialisable. Cached decisions carry "decision_cached": True.
+        """
+        try:
+            cached, pending = self._begin(query, intent_info or {}, entity_info or {}, user_profile)
+            if cached is not None:
+                return cached
+            insights = self._ai_insights(query, pending["analysis"], pending["auth_result"])
+            return self._complete(pending, insights)
+        except Exception as e:
+            return self._error_result(e)
+
+    async def verify_async(self, query: str, intent_info: Optional[Dict] = None,
+                           entity_info: Optional[Dict] = None, user_profile: Optional[Dict] = None,
+                           llm: Optional[Callable[[str, str], Awaitable[str]]] = None,
+                           llm_slots: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """
+        Event-loop form of verify(). Rules run inline (sub-millisecond); only the
+        LLM analysis is awaited, bounded by llm_slots. Concurrent identical
+        requests on the loop share one evaluation.
+        """
+        try:
+            cached, pending = self._begin(query, intent_info or {}, entity_info or {}, user_profile)
+            if cached is not None:
+                return cached
+
+            key = pending["key"]
+            in_flight = self._async_flights.get(key)
+            if in_flight is not None:
+                result = copy.deepcopy(await asyncio.shield(in_flight))
+                result["compliance_analysis"]["query"] = query
+                result["decision_cached"] = True
+                return result
+
+            future = asyncio.get_running_loop().create_future()
+            self._async_flights[key] = future
+            try:
+                analysis, auth_result = pending["analysis"], pending["auth_result"]
+                if not self.needs_llm_analysis(analysis, auth_result, llm_available=llm is not None):
+                    self._count("llm_skipped")
+                    insights = self._rule_insights()
+                else:
+                    self._count("llm_calls")
+                    prompt, system_msg = self._llm_prompt(query, analysis)
+                    try:
+                        async with (llm_slots or contextlib.nullcontext()):
+                            response = await llm(prompt, system_msg)
+                    except Exception as e:
+                        logger.error(f"AI compliance analysis error: {e}")
+                        response = ""
+                    insights = self._parse_llm_insights(response)
+                result = self._complete(pending, insights)
+                future.set_result(result)
+                return result
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # retrieved here so an unawaited flight does not warn
+                raise
+            finally:
+                self._async_flights.pop(key, None)
+        except Exception as e:
+            return self._error_result(e)
+
+    def _begin(self, query: str, intent_info: Dict, entity_info: Dict,
+               user_profile: Optional[Dict]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Cached result, or the rule analysis still waiting for its ai_insights"""
+        logger.info(f"Verifying ITAR/Security compliance for query: {query[:100]}...")
+        self._count("evaluations")
+
+        user_auth_level = self._extract_user_auth_level(user_profile or {})
+
+        key = self.decision_key(query, intent_info, entity_info, user_auth_level)
+        cached = self.decision_cache.get(key)
+        if cached is not None:
+            result = copy.deepcopy(cached)
+            result["compliance_analysis"]["query"] = query
+            result["timestamp"] = datetime.now(timezone.utc).isoformat()
+            result["decision_cached"] = True
+            return result, None
+
+        compliance_analysis = self._analyze_compliance_requirements(query, intent_info, entity_info)
+        auth_result = self._check_authorization_compliance(user_auth_level, compliance_analysis)
+        return None, {
+            "key": key,
+            "query": query,
+            "user_auth_level": user_auth_level,
+            "analysis": compliance_analysis,
+            "auth_result": auth_result,
+        }
+
+    def _complete(self, pending: Dict[str, Any], ai_insights: Dict[str, Any]) -> Dict[str, Any]:
+        """Policy/ITAR checks and the final result; successful results are cached"""
+        compliance_analysis = pending["analysis"]
+        auth_result = pending["auth_result"]
+        user_auth_level = pending["user_auth_level"]
+        compliance_analysis["ai_insights"] = ai_insights
+
+        policy_compliance = self._check_policy_compliance(pending["query"], compliance_analysis)
+        compliance_analysis.pop("_found", None)
+        itar_compliance = self._check_itar_compliance(compliance_analysis)
+        recommendations = self._generate_compliance_recommendations(
+            auth_result, policy_compliance, itar_compliance, user_auth_level
+        )
+        content_guidance = self._generate_content_guidance(compliance_analysis, auth_result)
+
+        result = {
+            "compliance_status": self._determine_overall_compliance_status(
+                policy_compliance, itar_compliance
+            ),
+            "authorized": auth_result["authorized"],
+            "user_authorization_level": user_auth_level.value,
+            "required_authorization_level": auth_result["required_level"],
+            "policy_compliance": policy_compliance,
+            "itar_compliance": itar_compliance,
+            "compliance_analysis": {
+                **compliance_analysis,
+                "required_auth_level": compliance_analysis["required_auth_level"].value
+            },
+            "recommendations": recommendations,
+            "content_guidance": content_guidance,
+            "restrictions": self._get_content_restrictions(auth_result, compliance_analysis),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "agent_version": "ITARSecurityComplianceAgent_v1.0"
+        }
+        if "error" not in compliance_analysis:
+            self.decision_cache.set(pending["key"], copy.deepcopy(result))
+        return result
+
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        logger.error(f"Compliance verification error: {error}")
+        return {
+            "compliance_status": ComplianceStatus.INSUFFICIENT_DATA.value,
+            "authorized": False,
+            "error": str(error),
+            "recommendations": ["Contact system administrator for compliance verification"],
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+    def _extract_user_auth_level(self, user_profile: Dict) -> AuthorizationLevel:
+        """Extract user's authorization level from profile"""
+        auth_level_str = str(user_profile.get("authorization_level", "unclassified")).lower()
+
+        try:
+            return AuthorizationLevel(auth_level_str)
+        except ValueError:
+            logger.warning(f"Unknown authorization level: {auth_level_str}, defaulting to UNCLASSIFIED")
+            return AuthorizationLevel.UNCLASSIFIED
+
+    def _analyze_compliance_requirements(self, query: str, intent_info: Dict, entity_info: Dict) -> Dict[str, Any]:
+        """Rule-based analysis of the query; one compiled scan feeds every detector"""
+        analysis = {
+            "query": query,
+            "intent": intent_info.get("intent", "unknown"),
+            "entities": entity_info.get("entities", []),
+            "detected_domains": [],
+            "itar_categories": [],
+            "sensitive_terms": [],
+            "country_mentions": [],
+            "required_auth_level": AuthorizationLevel.UNCLASSIFIED,
+            "risk_indicators": [],
+            "technical_data_indicators": [],
+            "export_control_indicators": []
+        }
+
+        try:
+            found = self._matcher.find(query.lower())
+            analysis["_found"] = found
+
+            analysis["detected_domains"] = [
+                domain.value for domain, indicators in DOMAIN_INDICATORS.items()
+                if any(indicator in found for indicator in indicators)
+            ]
+            analysis["itar_categories"] = self._detect_itar_categories(found)
+            analysis["sensitive_terms"] = [t for t in CLASSIFICATION_TERMS + ITAR_TERMS + EXPORT_TERMS if t in found]
+            analysis["country_mentions"] = [t for t in COUNTRY_GROUPS + EMBARGO_TERMS if t in found]
+            analysis["technical_data_indicators"] = [t for t in TECHNICAL_DATA_TERMS if t in found]
+            analysis["export_control_indicators"] = [t for t in EXPORT_CONTROL_TERMS if t in found]
+
+            analysis["required_auth_level"] = self._determine_required_auth_level(analysis)
+            analysis["risk_indicators"] = self._identify_compliance_risk_indicators(analysis)
+
+            logger.info(f"Compliance analysis complete: {len(analysis['detected_domains'])} domains, "
+                        f"{len(analysis['itar_categories'])} ITAR categories, "
+                        f"{len(analysis['risk_indicators'])} risk indicators")
+
+        except Exception as e:
+            logger.error(f"Compliance analysis error: {e}")
+            analysis["error"] = str(e)
+
+        return analysis
+
+    def _detect_itar_categories(self, found: set) -> List[str]:
+        """ITAR USML categories from explicit mentions, then category-specific items"""
+        categories = [category for mention, category in self._category_mentions.items() if mention in found]
+        for category, items in ITAR_CATEGORY_ITEMS.items():
+            if category not in categories and any(item in found for item in items):
+                categories.append(category)
+        return categories
+
+    def _determine_required_auth_level(self, analysis: Dict) -> AuthorizationLevel:
+        """Determine required authorization level based on analysis"""
+        required_level = AuthorizationLevel.UNCLASSIFIED
+        rank = lambda level: list(AuthorizationLevel).index(level)
+
+        # Check for classification indicators
+        if any(term in ["classified", "confidential"] for term in analysis["sensitive_terms"]):
+            required_level = AuthorizationLevel.CONFIDENTIAL
+        elif any(term in ["secret", "top secret"] for term in analysis["sensitive_terms"]):
+            required_level = AuthorizationLevel.SECRET
+        elif "sci" in analysis["sensitive_terms"]:
+            required_level = AuthorizationLevel.SCI
+
+        # High-risk ITAR categories require higher authorization
+        if PolicyDomain.ITAR.value in analysis["detected_domains"] and analysis["itar_categories"]:
+            if any(cat in HIGH_RISK_CATEGORIES for cat in analysis["itar_categories"]):
+                required_level = max(required_level, AuthorizationLevel.SECRET, key=rank)
+            else:
+                required_level = max(required_level, AuthorizationLevel.CONFIDENTIAL, key=rank)
+
+        # Check for country restrictions
+        if any("d:1" in country or "embargoed" in country for country in analysis["country_mentions"]):
+            required_level = max(required_level, AuthorizationLevel.SECRET, key=rank)
+
+        return required_level
+
+    def _identify_compliance_risk_indicators(self, analysis: Dict) -> List[str]:
+        """Identify potential compliance risk indicators"""
+        risk_indicators = []
+
+        if analysis["required_auth_level"] != AuthorizationLevel.UNCLASSIFIED:
+            risk_indicators.append(f"Requires {analysis['required_auth_level'].value} authorization")
+
+        if len(analysis["detected_domains"]) > 2:
+            risk_indicators.append("Multiple policy domains involved")
+
+        if PolicyDomain.ITAR.value in analysis["detected_domains"]:
+            risk_indicators.append("ITAR-controlled content detected")
+            if analysis["itar_categories"]:
+                risk_indicators.append(f"USML categories detected: {', '.join(analysis['itar_categories'])}")
+
+        if analysis["technical_data_indicators"]:
+            risk_indicators.append("Technical data transfer indicators detected")
+
+        if analysis["export_control_indicators"]:
+            risk_indicators.append("Export control indicators detected")
+
+        if analysis["country_mentions"]:
+            risk_indicators.append("Country restrictions may apply")
+
+        if len(analysis["sensitive_terms"]) > 3:
+            risk_indicators.append("Multiple sensitive terms detected")
+
+        return risk_indicators
+
+    # -------------------------------------------------------------------------
+    # LLM analysis (advisory only)
+    # -------------------------------------------------------------------------
+
+    def needs_llm_analysis(self, analysis: Dict, auth_result: Dict, llm_available: Optional[bool] = None) -> bool:
+        """
+        The LLM only contributes ai_insights, never the decision. In "auto" mode it
+        runs when the rules allowed access but still found something to review;
+        a denial, or a query with no compliance signal at all, is already decisive.
+        """
+        if llm_available is None:
+            llm_available = self.llm is not None
+        if not llm_available or self.llm_mode == "never":
+            return False
+        if self.llm_mode == "always":
+            return True
+        if not auth_result["authorized"]:
+            return False
+        return bool(analysis["risk_indicators"] or analysis["detected_domains"] or analysis["sensitive_terms"])
+
+    def _ai_insights(self, query: str, analysis: Dict, auth_result: Dict) -> Dict[str, Any]:
+        if not self.needs_llm_analysis(analysis, auth_result):
+            self._count("llm_skipped")
+            return self._rule_insights()
+        self._count("llm_calls")
+        return self._ai_enhanced_compliance_analysis(query, analysis)
+
+    @staticmethod
+    def _fallback_insights() -> Dict[str, Any]:
+        return {
+            "compliance_concerns": ["Standard compliance review recommended"],
+            "recommended_review_level": "standard",
+            "potential_violations": [],
+            "mitigation_suggestions": ["Consult compliance officer for guidance"]
+        }
+
+    @classmethod
+    def _rule_insights(cls) -> Dict[str, Any]:
+        return {**cls._fallback_insights(), "source": "rules"}
+
+    @staticmethod
+    def _llm_prompt(query: str, analysis: Dict) -> Tuple[str, str]:
+        system_msg = """You are an ITAR and export control compliance expert. Analyze the query for potential compliance issues.
+
+FOCUS AREAS:
+- ITAR (International Traffic in Arms Regulations) compliance
+- Export control restrictions
+- Technical data transfer concerns
+- Country-specific restrictions
+- Classification requirements
+
+RESPONSE FORMAT (JSON):
+{
+    "compliance_concerns": ["concern1", "concern2"],
+    "recommended_review_level": "standard|enhanced|legal_review",
+    "potential_violations": ["violation1", "violation2"],
+    "mitigation_suggestions": ["suggestion1", "suggestion2"]
+}"""
+
+        prompt = f"""Query: "{query}"
+
+Detected domains: {analysis.get('detected_domains', [])}
+ITAR categories: {analysis.get('itar_categories', [])}
+Sensitive terms: {analysis.get('sensitive_terms', [])}
+Country mentions: {analysis.get('country_mentions', [])}
+
+Provide compliance analysis:"""
+        return prompt, system_msg
+
+    def _parse_llm_insights(self, response: str) -> Dict[str, Any]:
+        """JSON object from the LLM response, or the standard fallback"""
+        try:
+            if "{" in response and "}" in response:
+                json_start = response.find("{")
+                json_end = response.rfind("}") + 1
+                return json.loads(response[json_start:json_end])
+        except Exception as e:
+            logger.error(f"AI compliance analysis error: {e}")
+        return self._fallback_insights()
+
+    def _ai_enhanced_compliance_analysis(self, query: str, analysis: Dict) -> Dict[str, Any]:
+        """Use AI to enhance compliance analysis"""
+        prompt, system_msg = self._llm_prompt(query, analysis)
+        try:
+            response = self.llm(prompt, system_msg)
+        except Exception as e:
+            logger.error(f"AI compliance analysis error: {e}")
+            return self._fallback_insights()
+        return self._parse_llm_insights(response)
+
+    # -------------------------------------------------------------------------
+    # Authorization, policy and ITAR checks
+    # -------------------------------------------------------------------------
+
+    def _check_authorization_compliance(self, user_auth_level: AuthorizationLevel,
+                                        compliance_analysis: Dict) -> Dict[str, Any]:
+        """Check if user authorization meets compliance requirements"""
+        required_level = compliance_analysis["required_auth_level"]
+        user_level_value = AUTH_HIERARCHY.get(user_auth_level, 0)
+        required_level_value = AUTH_HIERARCHY.get(required_level, 0)
+        authorized = user_level_value >= required_level_value
+
+        return {
+            "authorized": authorized,
+            "user_level": user_auth_level.value,
+            "required_level": required_level.value,
+            "level_sufficient": authorized,
+            "authorization_gap": max(0, required_level_value - user_level_value),
+            "access_restrictions": self._get_access_restrictions(user_auth_level, compliance_analysis)
+        }
+
+    def _get_access_restrictions(self, user_auth_level: AuthorizationLevel,
+                                 compliance_analysis: Dict) -> List[str]:
+        """Get access restrictions based on authorization level"""
+        restrictions = []
+
+        if user_auth_level in self.authorization_matrix["query_analysis"]:
+            matrix = self.authorization_matrix["query_analysis"][user_auth_level.value]
+
+            all_domains = [domain.value for domain in PolicyDomain]
+            restricted_domains = [domain for domain in all_domains if domain not in matrix["allowed_domains"]]
+            if restricted_domains and any(domain in compliance_analysis["detected_domains"]
+                                          for domain in restricted_domains):
+                restrictions.append(f"Restricted domains: {', '.join(restricted_domains)}")
+
+            if "itar_categories" in matrix:
+                restricted_categories = [cat for cat in compliance_analysis["itar_categories"]
+                                         if cat not in matrix["itar_categories"]]
+                if restricted_categories:
+                    restrictions.append(f"Restricted ITAR categories: {', '.join(restricted_categories)}")
+
+        return restrictions
+
+    def _check_policy_compliance(self, query: str, compliance_analysis: Dict) -> Dict[str, Any]:
+        """Check policy compliance against defined rules"""
+        compliance_result = {
+            "status": ComplianceStatus.COMPLIANT.value,
+            "violations": [],
+            "warnings": [],
+            "applicable_rules": []
+        }
+
+        try:
+            found = compliance_analysis.get("_found")
+            if found is None:
+                found = self._matcher.find(query.lower())
+
+            for rule in self.compliance_rules:
+                if not any(term in found for term in rule["trigger_terms"]):
+                    continue
+                compliance_result["applicable_rules"].append(rule["rule_id"])
+
+                required_auth = AuthorizationLevel(rule["required_authorization"])
+                user_auth = compliance_analysis.get("required_auth_level", AuthorizationLevel.UNCLASSIFIED)
+
+                if AUTH_HIERARCHY.get(user_auth, 0) < AUTH_HIERARCHY.get(required_auth, 0):
+                    compliance_result["violations"].append({
+                        "rule_id": rule["rule_id"],
+                        "description": rule["description"],
+                        "required_authorization": required_auth.value,
+                        "violation_type": "insufficient_authorization",
+                        "severity": rule.get("severity", "medium")
+                    })
+
+                    if rule.get("severity") in ["high", "very_high"]:
+                        compliance_result["status"] = ComplianceStatus.NON_COMPLIANT.value
+                    elif compliance_result["status"] == ComplianceStatus.COMPLIANT.value:
+                        compliance_result["status"] = ComplianceStatus.WARNING.value
+
+            logger.info(f"Policy compliance check: {compliance_result['status']}, "
+                        f"{len(compliance_result['violations'])} violations")
+
+        except Exception as e:
+            logger.error(f"Policy compliance check error: {e}")
+            compliance_result["status"] = ComplianceStatus.INSUFFICIENT_DATA.value
+            compliance_result["error"] = str(e)
+
+        return compliance_result
+
+    def _check_itar_compliance(self, compliance_analysis: Dict) -> Dict[str, Any]:
+        """Check ITAR-specific compliance"""
+        itar_result = {
+            "status": ComplianceStatus.COMPLIANT.value,
+            "usml_categories_detected": compliance_analysis.get("itar_categories", []),
+            "license_requirements": [],
+            "restrictions": [],
+            "end_use_monitoring": False,
+            "congressional_notification": False
+        }
+
+        try:
+            for category in compliance_analysis.get("itar_categories", []):
+                cat_info = self.itar_usml_categories.get(category)
+                if cat_info is None:
+                    continue
+
+                if cat_info["license_required"]:
+                    itar_result["license_requirements"].append({
+                        "category": category,
+                        "name": cat_info["name"],
+                        "risk_level": cat_info["risk_level"]
+                    })
+
+                if cat_info["risk_level"] in ["high", "very_high"]:
+                    itar_result["end_use_monitoring"] = True
+                    if cat_info["risk_level"] == "very_high":
+                        itar_result["congressional_notification"] = True
+
+            if compliance_analysis.get("technical_data_indicators"):
+                itar_result["restrictions"].append("Technical data transfer restrictions apply")
+                itar_result["status"] = ComplianceStatus.REQUIRES_REVIEW.value
+
+            for country in compliance_analysis.get("country_mentions", []):
+                if "d:1" in country or "embargoed" in country:
+                    itar_result["restrictions"].append(f"Country restriction: {country}")
+                    itar_result["status"] = ComplianceStatus.NON_COMPLIANT.value
+
+            logger.info(f"ITAR compliance check: {itar_result['status']}, "
+                        f"{len(itar_result['license_requirements'])} license requirements")
+
+        except Exception as e:
+            logger.error(f"ITAR compliance check error: {e}")
+            itar_result["status"] = ComplianceStatus.INSUFFICIENT_DATA.value
+            itar_result["error"] = str(e)
+
+        return itar_result
+
+    def _determine_overall_compliance_status(self, policy_compliance: Dict, itar_compliance: Dict) -> str:
+        """Determine overall compliance status"""
+        statuses = [policy_compliance.get("status"), itar_compliance.get("status")]
+
+        for status in (ComplianceStatus.NON_COMPLIANT, ComplianceStatus.REQUIRES_REVIEW,
+                       ComplianceStatus.WARNING, ComplianceStatus.INSUFFICIENT_DATA):
+            if status.value in statuses:
+                return status.value
+        return ComplianceStatus.COMPLIANT.value
+
+    def _generate_compliance_recommendations(self, auth_result: Dict, policy_compliance: Dict,
+                                             itar_compliance: Dict, user_auth_level: AuthorizationLevel) -> List[str]:
+        """Generate compliance recommendations"""
+        recommendations = []
+
+        if not auth_result["authorized"]:
+            recommendations.append(
+                f"Insufficient authorization: {auth_result['required_level']} clearance required"
+            )
+            recommendations.append("Contact security officer for authorization upgrade")
+
+        for violation in policy_compliance.get("violations", []):
+            if violation["violation_type"] == "insufficient_authorization":
+                recommendations.append(
+                    f"Policy compliance issue: {violation['description']} "
+                    f"(requires {violation['required_authorization']} authorization)"
+                )
+
+        if itar_compliance.get("license_requirements"):
+            recommendations.append("ITAR export license may be required")
+            recommendations.append("Consult with DDTC or export control office")
+
+        if itar_compliance.get("end_use_monitoring"):
+            recommendations.append("End-use monitoring requirements may apply")
+
+        if itar_compliance.get("congressional_notification"):
+            recommendations.append("Congressional notification may be required")
+
+        if not recommendations:
+            recommendations.append("No compliance issues detected at current authorization level")
+
+        return recommendations
+
+    def _generate_content_guidance(self, compliance_analysis: Dict, auth_result: Dict) -> Dict[str, Any]:
+        """Generate guidance for content generation"""
+        guidance = {
+            "allowed_detail_level": "general",
+            "content_restrictions": [],
+            "required_disclaimers": [],
+            "sanitization_required": False
+        }
+
+        try:
+            user_auth_level = AuthorizationLevel(auth_result["user_level"])
+
+            if user_auth_level in self.authorization_matrix["query_analysis"]:
+                matrix = self.authorization_matrix["query_analysis"][user_auth_level.value]
+                guidance["allowed_detail_level"] = matrix["max_detail_level"]
+
+            if compliance_analysis.get("itar_categories"):
+                guidance["content_restrictions"].append("ITAR-controlled information must be sanitized")
+                guidance["sanitization_required"] = True
+
+            if compliance_analysis.get("sensitive_terms"):
+                guidance["content_restrictions"].append("Classified information must be removed")
+                guidance["sanitization_required"] = True
+
+            if compliance_analysis.get("technical_data_indicators"):
+                guidance["content_restrictions"].append("Technical data transfer restrictions apply")
+
+            if PolicyDomain.ITAR.value in compliance_analysis.get("detected_domains", []):
+                guidance["required_disclaimers"].append(
+                    "This information may be subject to ITAR export control restrictions"
+                )
+
+            if compliance_analysis.get("country_mentions"):
+                guidance["required_disclaimers"].append(
+                    "Country-specific export restrictions may apply"
+                )
+
+        except Exception as e:
+            logger.error(f"Content guidance generation error: {e}")
+
+        return guidance
+
+    def _get_content_restrictions(self, auth_result: Dict, compliance_analysis: Dict) -> List[str]:
+        """Get content restrictions for response generation"""
+        restrictions = []
+
+        if not auth_result["authorized"]:
+            restrictions.append("Content must be limited to unclassified, general information")
+
+        if compliance_analysis.get("itar_categories"):
+            restrictions.append("ITAR-controlled technical details must be omitted")
+
+        if compliance_analysis.get("technical_data_indicators"):
+            restrictions.append("Specific technical data must not be provided")
+
+        if compliance_analysis.get("country_mentions"):
+            restrictions.append("Country-specific sensitive information must be omitted")
+
+        return restrictions
+
+    # -------------------------------------------------------------------------
+    # Stats
+    # -------------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["llm_mode"] = self.llm_mode
+        stats["decision_cache"] = self.decision_cache.get_stats()
+        return stats
@@ -0,0 +1,191 @@
+# knowledge_snapshot.py
+# Versioned on-disk snapshot of knowledge structures derived from source files (v5.9.29).
+#
+#   snapshot = KnowledgeSnapshot.from_env(sources=["samm_knowledge_graph.json", __file__], version=1)
+#   states = snapshot.load_or_build(build_states)   # {"json_kg": {...}, "two_hop": {...}, ...}
+#   snapshot.get_stats()                            # source, load_seconds vs build_seconds, ...
+#
+# - build_states() returns plain data (dicts / lists / strings), one entry per
+#   component; the caller turns it back into objects. No class is pickled, so a
+#   snapshot written under one module name (gunicorn) loads under another (__main__).
+#   Objects shared within a component stay shared; across components they are copied
+# - The key is the SHA-256 of every source file plus the caller's version, the
+#   file format and the Python version; a snapshot with any other key is stale
+#   and is rebuilt and rewritten
+# - One file: fixed header, JSON header (key, component offsets, build time),
+#   then each component pickled on its own. Loading memory-maps the file and
+#   unpickles the components straight from the mapping (no read into a buffer),
+#   with the garbage collector paused (it only rescans the new containers)
+# - Written to a temporary file and renamed, so concurrent workers never see a
+#   partial snapshot. The file is a local cache written by this process: do not
+#   point KNOWLEDGE_SNAPSHOT_PATH at a location others can write (pickle)
+
+import gc
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+MAGIC = b"SAMMSNAP"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")  # magic, format version, JSON header length
+_ALIGN = 64
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return "missing"
+    return digest.hexdigest()
+
+
+class _GCPaused:
+    def __enter__(self):
+        self.was_enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *exc):
+        if self.was_enabled:
+            gc.enable()
+
+
+class KnowledgeSnapshot:
+    """Load derived structures from a snapshot keyed by their sources, or build and write it"""
+
+    def __init__(self, path: Optional[str], sources: Iterable[str], version: Any = 1):
+        self.path = path or None  # None: always build, never write
+        self.sources = [os.fspath(source) for source in sources]
+        self.version = str(version)
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "builds": 0, "writes": 0, "stale": 0, "errors": 0,
+                      "source": None, "load_seconds": None, "build_seconds": None,
+                      "write_seconds": None, "bytes": 0}
+
+    @classmethod
+    def from_env(cls, sources: Iterable[str], version: Any = 1) -> "KnowledgeSnapshot":
+        """Snapshot at KNOWLEDGE_SNAPSHOT_PATH (empty = disabled)"""
+        return cls(os.getenv("KNOWLEDGE_SNAPSHOT_PATH", os.path.join("cache_data", "knowledge_snapshot.bin")),
+                   sources, version)
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def _record(self, **values) -> None:
+        with self._lock:
+            self.stats.update(values)
+
+    def key(self) -> Dict[str, str]:
+        """What the snapshot must have been built from to be current"""
+        key = {"version": self.version, "format": str(FORMAT_VERSION),
+               "python": f"{sys.version_info[0]}.{sys.version_info[1]}",
+               "pickle_protocol": str(pickle.HIGHEST_PROTOCOL)}
+        for source in self.sources:
+            key[f"sha256:{os.path.basename(source)}"] = _file_sha256(source)
+        return key
+
+    def load(self, key: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """The snapshot's components, or None when it is missing, stale or unreadable"""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        key = key or self.key()
+        try:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, file_format, header_length = _PREAMBLE.unpack_from(mapped, 0)
+                if magic != MAGIC or file_format != FORMAT_VERSION:
+                    self._bump("stale")
+                    return None
+                header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_length])
+                if header.get("key") != key:
+                    self._bump("stale")
+                    return None
+                components = {}
+                with memoryview(mapped) as view, _GCPaused():
+                    for name, (offset, length) in header["components"].items():
+                        components[name] = pickle.loads(view[offset:offset + length])
+            self._record(build_seconds=header.get("build_seconds"))
+            return components
+        except Exception as e:
+            print(f"[Snapshot] ⚠️ Could not read {self.path}: {e}")
+            self._bump("errors")
+            return None
+
+    def write(self, components: Dict[str, Any], build_seconds: float, key: Optional[Dict[str, str]] = None) -> int:
+        """Write the components atomically; returns the file size"""
+        blobs = {name: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) for name, value in components.items()}
+        header = {"key": key or self.key(), "build_seconds": round(build_seconds, 4),
+                  "created": time.time(), "components": {}}
+        # Offsets depend on the header length, which depends on the offsets: size the header with
+        # placeholders as wide as any real offset, then pad it to that size
+        header["components"] = {name: [2 ** 40, len(blob)] for name, blob in blobs.items()}
+        header_length = len(json.dumps(header).encode())
+        offset = -(-(_PREAMBLE.size + header_length) // _ALIGN) * _ALIGN
+        for name, blob in blobs.items():
+            header["components"][name] = [offset, len(blob)]
+            offset = -(-(offset + len(blob)) // _ALIGN) * _ALIGN
+        header_bytes = json.dumps(header).encode().ljust(header_length)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_length))
+                f.write(header_bytes)
+                for name, blob in blobs.items():
+                    f.seek(header["components"][name][0])
+                    f.write(blob)
+                size = f.tell()
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return size
+
+    def load_or_build(self, build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Components from the snapshot when current; otherwise build(), then write the snapshot"""
+        key = self.key() if self.path else None
+        start = time.perf_counter()
+        components = self.load(key) if self.path else None
+        if components is not None:
+            load_seconds = time.perf_counter() - start
+            self._bump("loads")
+            self._record(source="snapshot", load_seconds=round(load_seconds, 4))
+            build_seconds = self.stats["build_seconds"]
+            print(f"[Snapshot] Loaded {', '.join(components)} in {load_seconds * 1000:.0f} ms "
+                  f"(building them took {build_seconds * 1000:.0f} ms)")
+            return components
+
+        start = time.perf_counter()
+        components = build()
+        build_seconds = time.perf_counter() - start
+        self._bump("builds")
+        self._record(source="built", build_seconds=round(build_seconds, 4))
+        if not self.path:
+            return components
+        try:
+            start = time.perf_counter()
+            size = self.write(components, build_seconds, key)
+            self._bump("writes")
+            self._record(write_seconds=round(time.perf_counter() - start, 4), bytes=size)
+            print(f"[Snapshot] Built {', '.join(components)} in {build_seconds * 1000:.0f} ms, "
+                  f"wrote {self.path} ({size / 1e6:.1f} MB)")
+        except Exception as e:
+            print(f"[Snapshot] ⚠️ Could not write {self.path}: {e}")
+            self._bump("errors")
+        return components
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.path is not None, "path": self.path, **self.stats}
@@ -0,0 +1,233 @@
+# lazy_init.py
+# Subsystems built on first use, plus the startup profiler (v5.9.28).
+#
+#   SUBSYSTEMS = Subsystems()
+#   SUBSYSTEMS.register("knowledge_graph", lambda: SimpleKnowledgeGraph(TTL))
+#   knowledge_graph = SUBSYSTEMS.lazy("knowledge_graph")   # built on first attribute access
+#   SUBSYSTEMS.register("cosmos", connect_cosmos)           # factory returns {"client": ..., "reviews": ...}
+#   reviews_container = SUBSYSTEMS.lazy("cosmos", "reviews")
+#   SUBSYSTEMS.warmup(exclude=("gremlin",))                 # build the rest now (serving preload)
+#   SUBSYSTEMS.report()                                     # seconds and RSS growth per subsystem
+#
+#   profiler = ImportProfiler().install()    # before the imports to measure
+#   ...
+#   profiler.uninstall(); profiler.report()  # seconds and RSS growth per imported package
+#
+# A subsystem is built once, under a lock, with its `requires` built first. A
+# factory that fails leaves the subsystem ready with the value None (the app's
+# clients already treat None as "not configured"). A lookup made by a factory
+# into its own subsystem (re-entrant, same thread) gets None instead of recursing.
+
+import importlib.abc
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+
+def rss_kb() -> int:
+    """Resident set size of this process (0 where /proc is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class LazyObject:
+    """Stands in for a subsystem's value (or one item of it) and builds it on first use"""
+
+    __slots__ = ("_subsystems", "_name", "_item")
+
+    def __init__(self, subsystems: "Subsystems", name: str, item: Optional[str] = None):
+        object.__setattr__(self, "_subsystems", subsystems)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_item", item)
+
+    def _target(self) -> Any:
+        value = self._subsystems.get(self._name)
+        if self._item is not None:
+            value = value.get(self._item) if value else None
+        return value
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._target(), attr, value)
+
+    def __bool__(self):
+        return bool(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __contains__(self, key):
+        return key in self._target()
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __call__(self, *args, **kwargs):
+        return self._target()(*args, **kwargs)
+
+    def __repr__(self):
+        if not self._subsystems.is_ready(self._name):
+            return f"<lazy {self._name}{'.' + self._item if self._item else ''} (not built)>"
+        return repr(self._target())
+
+
+class Subsystems:
+    """Named factories run once on first use (or by warmup()), with timing and RSS per subsystem"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._factories: Dict[str, Tuple[Callable[[], Any], Tuple[str, ...]]] = {}
+        self._values: Dict[str, Any] = {}
+        self._building: List[str] = []
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"built": 0, "failed": 0}
+
+    def register(self, name: str, factory: Callable[[], Any], requires: Iterable[str] = ()) -> None:
+        self._factories[name] = (factory, tuple(requires))
+
+    def lazy(self, name: str, item: Optional[str] = None) -> LazyObject:
+        return LazyObject(self, name, item)
+
+    def is_ready(self, name: str) -> bool:
+        return name in self._values
+
+    def get(self, name: str) -> Any:
+        """The subsystem's value, built now if needed (other threads wait for the build)"""
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            if name in self._building:
+                return None  # its own factory asked for it
+            factory, requires = self._factories[name]
+            for dependency in requires:
+                self.get(dependency)
+            self._building.append(name)
+            start, rss_before = time.perf_counter(), rss_kb()
+            error = None
+            try:
+                value = factory()
+            except Exception as e:
+                print(f"[Startup] ⚠️ {name} failed to initialise: {e}")
+                value, error = None, str(e)
+            finally:
+                self._building.remove(name)
+            self._timings[name] = {"seconds": round(time.perf_counter() - start, 4),
+                                   "rss_mb": round((rss_kb() - rss_before) / 1024, 1),
+                                   "error": error}
+            self.stats["failed" if error else "built"] += 1
+            self._values[name] = value
+            return value
+
+    def reset(self, name: str) -> None:
+        """Forget a value so the next use builds it again (e.g. a connection after fork)"""
+        with self._lock:
+            self._values.pop(name, None)
+
+    def warmup(self, names: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> Dict[str, Dict[str, Any]]:
+        """Build the named subsystems (default: all registered) now; returns their timings"""
+        for name in (list(names) if names is not None else list(self._factories)):
+            if name not in exclude:
+                self.get(name)
+        return self.report()
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Timings of the built subsystems, in build order"""
+        with self._lock:
+            return {name: dict(timing) for name, timing in self._timings.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "registered": len(self._factories),
+                    "pending": sorted(set(self._factories) - set(self._values))}
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, profiler: "ImportProfiler", name: str):
+        self.loader, self.profiler, self.name = loader, profiler, name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self.profiler.measure(self.name):
+            self.loader.exec_module(module)
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """Seconds and RSS growth of each import made by the profiled code (nested imports count toward their importer)"""
+
+    def __init__(self):
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self._depth = threading.local()
+
+    def install(self) -> "ImportProfiler":
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if getattr(self._depth, "value", 0):
+            return None  # only outermost imports are timed (namespace packages such as azure time their subpackages)
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self, fullname)
+                return spec
+        return None
+
+    def measure(self, name: str):
+        profiler = self
+
+        class _Measure:
+            def __enter__(self):
+                profiler._depth.value = getattr(profiler._depth, "value", 0) + 1
+                self.start, self.rss = time.perf_counter(), rss_kb()
+
+            def __exit__(self, *exc):
+                profiler._depth.value -= 1
+                profiler.timings[name] = {"seconds": round(time.perf_counter() - self.start, 4),
+                                          "rss_mb": round((rss_kb() - self.rss) / 1024, 1)}
+
+        return _Measure()
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return dict(self.timings)
+
+
+def format_startup_report(imports: Dict[str, Dict[str, float]], subsystems: Dict[str, Dict[str, Any]],
+                          import_seconds: float, top: int = 20) -> str:
+    """Text table for --profile-startup: slowest imports, then each subsystem's build"""
+    lines = [f"Module import: {import_seconds:.2f}s, RSS {rss_kb() / 1024:.0f} MB", "",
+             f"  {'import':<32}{'seconds':>10}{'RSS MB':>10}"]
+    for name, timing in sorted(imports.items(), key=lambda kv: -kv[1]["seconds"])[:top]:
+        lines.append(f"  {name:<32}{timing['seconds']:>10.3f}{timing['rss_mb']:>10.1f}")
+    lines += ["", f"  {'subsystem':<32}{'seconds':>10}{'RSS MB':>10}"]
+    for name, timing in subsystems.items():
+        note = f"  ({timing['error']})" if timing.get("error") else ""
+        lines.append(f"  {name:<32}{timing['seconds']:>10.3f}{timing['rss_mb']:>10.1f}{note}")
+    return "\n".join(lines)
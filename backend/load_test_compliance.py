@@ -0,0 +1,228 @@
+"""
+Load test for the ITAR compliance microservice
+
+Fires N /api/compliance/verify requests (or verify_batch calls) at a fixed
+concurrency and reports throughput and latency percentiles. A fake Ollama with
+a configurable delay can be started so LLM-assisted checks cost something
+realistic without a GPU:
+
+    # spawn the service (uvicorn/ASGI) against a fake Ollama: 300ms per answer, 4 in parallel
+    python load_test_compliance.py --spawn asgi --fake-ollama 0.3
+
+    # same load against the Flask server
+    python load_test_compliance.py --spawn flask --fake-ollama 0.3
+
+    # already-running service, 20 checks per verify_batch call
+    python load_test_compliance.py --url http://localhost:3002 --batch 20
+
+Queries are unique by default (every check misses the decision cache); use
+--repeat to reuse a small query set.
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SERVICE_FILE = "itar_compliance_microservice.py"
+
+# Mix of decisive (no LLM) and LLM-assisted checks
+QUERY_TEMPLATES = [
+    "What is the FMS process for category viii aircraft under ITAR? ({n})",
+    "Explain SAMM chapter 5 LOR processing steps ({n})",
+    "Can technical data blueprints be shared with a foreign person? ({n})",
+    "Who approves security cooperation training services? ({n})",
+    "Export license requirements for radar electronics to country group d:3 ({n})",
+    "What is a letter of offer and acceptance? ({n})",
+]
+
+AUTH_LEVELS = ["unclassified", "confidential", "secret", "top_secret"]
+
+
+# =============================================================================
+# FAKE OLLAMA
+# =============================================================================
+
+def start_fake_ollama(port: int, delay: float, parallel: int) -> ThreadingHTTPServer:
+    """
+    Answers /api/chat with a fixed compliance JSON after `delay` seconds,
+    generating at most `parallel` answers at once (like OLLAMA_NUM_PARALLEL)
+    """
+    slots = threading.Semaphore(parallel)
+    answer = json.dumps({
+        "compliance_concerns": ["Review export authorization"],
+        "recommended_review_level": "enhanced",
+        "potential_violations": [],
+        "mitigation_suggestions": ["Confirm license status with DDTC"]
+    })
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with slots:
+                time.sleep(delay)
+            body = json.dumps({"message": {"role": "assistant", "content": answer}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# =============================================================================
+# SERVICE PROCESS
+# =============================================================================
+
+def spawn_service(server: str, port: int, ollama_url: str, service_file: str) -> subprocess.Popen:
+    env = dict(os.environ, COMPLIANCE_SERVER=server, COMPLIANCE_PORT=str(port), OLLAMA_URL=ollama_url)
+    process = subprocess.Popen(
+        [sys.executable, service_file], env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(service_file))
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    stop_service(process)
+    raise RuntimeError(f"Service did not start on port {port}")
+
+
+def stop_service(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except Exception:
+        pass
+
+
+# =============================================================================
+# LOAD
+# =============================================================================
+
+def make_check(n: int, repeat: bool) -> dict:
+    template = QUERY_TEMPLATES[n % len(QUERY_TEMPLATES)]
+    return {
+        "query": template.format(n=(n % len(QUERY_TEMPLATES)) if repeat else n),
+        "intent_info": {"intent": "process"},
+        "entity_info": {"entities": ["FMS", "LOA"]},
+        "user_profile": {"authorization_level": AUTH_LEVELS[n % len(AUTH_LEVELS)]}
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_load(url: str, total: int, concurrency: int, batch: int, repeat: bool) -> dict:
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def one(call_no):
+        start = time.perf_counter()
+        try:
+            if batch > 1:
+                checks = [make_check(call_no * batch + i, repeat) for i in range(batch)]
+                response = session().post(f"{url}/api/compliance/verify_batch", json={"checks": checks}, timeout=300)
+                ok = response.status_code == 200 and all("error" not in r for r in response.json()["results"])
+            else:
+                response = session().post(f"{url}/api/compliance/verify", json=make_check(call_no, repeat), timeout=300)
+                ok = response.status_code == 200 and "compliance_status" in response.json()
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    calls = max(1, total // max(batch, 1))
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [latency for latency, _ in outcomes]
+    checks = calls * max(batch, 1)
+    return {
+        "calls": calls,
+        "checks": checks,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "wall_seconds": round(wall, 3),
+        "checks_per_second": round(checks / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:3002")
+    parser.add_argument("--spawn", choices=["asgi", "flask"], help="start the service with this server")
+    parser.add_argument("--service-file", default=SERVICE_FILE)
+    parser.add_argument("--port", type=int, default=3102, help="port for --spawn")
+    parser.add_argument("--fake-ollama", type=float, metavar="DELAY", help="start a fake Ollama with this delay (s)")
+    parser.add_argument("--fake-ollama-port", type=int, default=11534)
+    parser.add_argument("--fake-ollama-parallel", type=int, default=4, help="concurrent fake generations")
+    parser.add_argument("--requests", type=int, default=400, help="total checks")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=1, help="checks per verify_batch call (1 = /verify)")
+    parser.add_argument("--repeat", action="store_true", help="reuse a small query set (decision cache hits)")
+    args = parser.parse_args()
+
+    ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    fake = None
+    if args.fake_ollama is not None:
+        fake = start_fake_ollama(args.fake_ollama_port, args.fake_ollama, args.fake_ollama_parallel)
+        ollama_url = f"http://127.0.0.1:{args.fake_ollama_port}"
+
+    process = None
+    url = args.url
+    if args.spawn:
+        process = spawn_service(args.spawn, args.port, ollama_url, args.service_file)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        print("=" * 60)
+        print(f"COMPLIANCE LOAD TEST - {args.requests} checks, concurrency {args.concurrency}, "
+              f"batch {args.batch}, server {args.spawn or url}")
+        print("=" * 60)
+        report = run_load(url, args.requests, args.concurrency, args.batch, args.repeat)
+        for key, value in report.items():
+            print(f"{key:>18}: {value}")
+        print(json.dumps(report))
+    finally:
+        if process is not None:
+            stop_service(process)
+        if fake is not None:
+            fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
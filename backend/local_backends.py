@@ -0,0 +1,510 @@
+# local_backends.py
+# Local stand-ins for the app's backends, so the whole query path runs offline (v5.9.33).
+#
+#   ollama = FakeOllama(ttft_ms=150, tokens_per_second=40).start()
+#   os.environ["OLLAMA_URL"] = ollama.url                  # before the app is imported
+#   backends = LocalBackends(blob_root, gremlin_latency_ms=5).install(samm)   # before its first request
+#
+# - InMemoryContainer: the azure.cosmos ContainerClient calls the app makes (create / upsert /
+#   replace with etag / read / delete / patch) and the SQL it sends: SELECT * | VALUE COUNT(1) |
+#   c.field [AS alias] lists, WHERE with = != < > <= >= AND OR NOT and parentheses over
+#   @parameters and literals, ORDER BY one field, and the review-stats aggregate query.
+#   Anything else raises ValueError, so a new query shows up instead of returning nothing
+# - Blob: blob_text_cache.LocalBlobContainer (files under blob_root) for case and chat documents
+# - InMemoryGremlin: the traversals DatabaseManager.query_cosmos_graph() submits
+#   (g.V(), has('name'|'id', containing('x')), bothE(), limit(n), count()) answered from
+#   samm_knowledge_graph.json after a fixed round-trip delay, in GraphSON-style dicts
+# - FakeOllama: /api/chat, non-streaming as the app calls it. A reply is fixed per call type
+#   (intent JSON, entity list, entity context, answer), so two runs send the same text, and
+#   arrives after ttft_ms plus one token (word) per 1/tokens_per_second
+# - The vector search stays real: point VECTOR_DB_PATH at a Chroma index (needs chromadb and
+#   sentence_transformers; without them the app runs with the vector search off)
+
+import copy
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from azure.cosmos import exceptions as cosmos_exceptions
+
+from blob_text_cache import LocalBlobContainer
+from review_stats import AGGREGATE_QUERY, review_contribution
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ANSWER = ("The Defense Security Cooperation Agency (DSCA) directs, administers and provides guidance to "
+          "DoD Components for Security Cooperation programs (C1.3.2.2). After the Letter of Request (LOR) "
+          "is received, the Implementing Agency prepares the Letter of Offer and Acceptance (LOA) and "
+          "DSCA reviews and approves it before it is offered to the purchaser (C5.1.2, C5.4). ") * 3
+
+# (marker in the prompt, reply) - the first match wins; ANSWER otherwise
+REPLIES: List[Tuple[str, str]] = [
+    ("determine intent:", json.dumps({"intent": "definition", "confidence": 0.85,
+                                      "entities_mentioned": ["DSCA", "LOA"]})),
+    ("\nEntities:", json.dumps(["DSCA", "LOA"])),
+    ("Provide SAMM context for this entity", json.dumps({
+        "definition": "Directs, administers, and provides guidance to DoD Components for SC programs",
+        "section": "C1.3.2.2", "role": "Administers Security Cooperation programs"})),
+]
+
+
+# =============================================================================
+# COSMOS
+# =============================================================================
+
+_TOKEN = re.compile(r"\s*(<=|>=|!=|<>|=|<|>|\(|\)|,|@\w+|'(?:[^']|'')*'|-?\d+(?:\.\d+)?|[A-Za-z_][\w.]*)")
+
+
+def _tokens(text: str) -> List[str]:
+    tokens, position = [], 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"InMemoryContainer: cannot parse query at: {text[position:position + 30]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def _field(item: Dict[str, Any], path: str) -> Any:
+    value: Any = item
+    for part in path.split(".")[1:]:  # "c.aiResponse.intent"
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+class _Where:
+    """WHERE clause as a predicate: recursive descent over OR / AND / NOT / comparisons"""
+
+    OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+        "=": lambda a, b: a == b, "!=": lambda a, b: a != b, "<>": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and b is not None and a < b,
+        ">": lambda a, b: a is not None and b is not None and a > b,
+        "<=": lambda a, b: a is not None and b is not None and a <= b,
+        ">=": lambda a, b: a is not None and b is not None and a >= b,
+    }
+
+    def __init__(self, tokens: List[str], parameters: Dict[str, Any]):
+        self.tokens = tokens
+        self.parameters = parameters
+        self.position = 0
+        self.predicate = self._or()
+        if self.position != len(tokens):
+            raise ValueError(f"InMemoryContainer: unexpected {' '.join(tokens[self.position:])!r} in WHERE")
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _take(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise ValueError("InMemoryContainer: WHERE clause ends early")
+        self.position += 1
+        return token
+
+    def _or(self) -> Callable[[Dict[str, Any]], bool]:
+        terms = [self._and()]
+        while (self._peek() or "").upper() == "OR":
+            self._take()
+            terms.append(self._and())
+        return terms[0] if len(terms) == 1 else lambda item: any(term(item) for term in terms)
+
+    def _and(self) -> Callable[[Dict[str, Any]], bool]:
+        terms = [self._not()]
+        while (self._peek() or "").upper() == "AND":
+            self._take()
+            terms.append(self._not())
+        return terms[0] if len(terms) == 1 else lambda item: all(term(item) for term in terms)
+
+    def _not(self) -> Callable[[Dict[str, Any]], bool]:
+        if (self._peek() or "").upper() == "NOT":
+            self._take()
+            term = self._not()
+            return lambda item: not term(item)
+        if self._peek() == "(":
+            self._take()
+            term = self._or()
+            if self._take() != ")":
+                raise ValueError("InMemoryContainer: unbalanced parentheses in WHERE")
+            return term
+        left, operator, right = self._operand(), self._take(), self._operand()
+        if operator not in self.OPERATORS:
+            raise ValueError(f"InMemoryContainer: unsupported operator {operator!r}")
+        compare = self.OPERATORS[operator]
+        return lambda item: compare(left(item), right(item))
+
+    def _operand(self) -> Callable[[Dict[str, Any]], Any]:
+        token = self._take()
+        if token.startswith("c."):
+            return lambda item: _field(item, token)
+        if token.startswith("@"):
+            if token not in self.parameters:
+                raise ValueError(f"InMemoryContainer: no value for parameter {token}")
+            value = self.parameters[token]
+        elif token.startswith("'"):
+            value = token[1:-1].replace("''", "'")
+        elif token.lower() in ("true", "false", "null"):
+            value = {"true": True, "false": False, "null": None}[token.lower()]
+        elif re.fullmatch(r"-?\d+(?:\.\d+)?", token):
+            value = float(token) if "." in token else int(token)
+        else:
+            raise ValueError(f"InMemoryContainer: unsupported operand {token!r}")
+        return lambda item: value
+
+
+_QUERY = re.compile(r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+c\b(?:\s+WHERE\s+(?P<where>.+?))?"
+                    r"(?:\s+ORDER\s+BY\s+(?P<order>c\.[\w.]+)(?:\s+(?P<direction>ASC|DESC))?)?\s*$",
+                    re.IGNORECASE | re.DOTALL)
+
+
+class InMemoryContainer:
+    """
+    azure.cosmos ContainerClient stand-in: items keyed by (partition key value, id),
+    copied in and out (callers cannot change stored items), one lock.
+    """
+
+    def __init__(self, container_name: str, partition_key_path: str = "/id"):
+        self.id = container_name
+        self.partition_key_path = partition_key_path
+        self._items: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"reads": 0, "writes": 0, "patches": 0, "queries": 0}
+
+    def _partition_key(self, body: Dict[str, Any]) -> Any:
+        return _field(body, "c" + self.partition_key_path.replace("/", "."))
+
+    def _store(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        item = copy.deepcopy(body)
+        item["_etag"] = f'"{uuid.uuid4().hex}"'
+        item["_ts"] = int(time.time())
+        self._items[(self._partition_key(item), item["id"])] = item
+        self.stats["writes"] += 1
+        return copy.deepcopy(item)
+
+    def _existing(self, item_id: str, partition_key: Any) -> Dict[str, Any]:
+        item = self._items.get((partition_key, item_id))
+        if item is None:
+            raise cosmos_exceptions.CosmosResourceNotFoundError(status_code=404, message=f"{self.id}/{item_id} not found")
+        return item
+
+    def create_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            if (self._partition_key(body), body["id"]) in self._items:
+                raise cosmos_exceptions.CosmosResourceExistsError(status_code=409, message=f"{self.id}/{body['id']} exists")
+            return self._store(body)
+
+    def upsert_item(self, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            return self._store(body)
+
+    def replace_item(self, item: Any, body: Dict[str, Any], etag: Optional[str] = None,
+                     match_condition: Any = None, **kwargs) -> Dict[str, Any]:
+        item_id = item["id"] if isinstance(item, dict) else item
+        with self._lock:
+            existing = self._existing(item_id, self._partition_key(body))
+            if etag is not None and match_condition is not None and existing["_etag"] != etag:
+                raise cosmos_exceptions.CosmosAccessConditionFailedError(status_code=412, message="etag mismatch")
+            return self._store(body)
+
+    def read_item(self, item: Any, partition_key: Any, **kwargs) -> Dict[str, Any]:
+        item_id = item["id"] if isinstance(item, dict) else item
+        with self._lock:
+            self.stats["reads"] += 1
+            return copy.deepcopy(self._existing(item_id, partition_key))
+
+    def delete_item(self, item: Any, partition_key: Any, **kwargs) -> None:
+        item_id = item["id"] if isinstance(item, dict) else item
+        with self._lock:
+            self._existing(item_id, partition_key)
+            del self._items[(partition_key, item_id)]
+
+    def patch_item(self, item: str, partition_key: Any, patch_operations: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        if len(patch_operations) > 10:
+            raise cosmos_exceptions.CosmosHttpResponseError(status_code=400, message="more than 10 patch operations")
+        with self._lock:
+            doc = copy.deepcopy(self._existing(item, partition_key))
+            for operation in patch_operations:
+                *parents, name = operation["path"].strip("/").split("/")
+                target = doc
+                for part in parents:
+                    target = target.setdefault(part, {})
+                if operation["op"] == "incr":
+                    target[name] = target.get(name, 0) + operation["value"]
+                elif operation["op"] in ("set", "add", "replace"):
+                    target[name] = operation["value"]
+                elif operation["op"] == "remove":
+                    target.pop(name, None)
+                else:
+                    raise ValueError(f"InMemoryContainer: unsupported patch op {operation['op']!r}")
+            self.stats["patches"] += 1
+            return self._store(doc)
+
+    def query_items(self, query: str, parameters: Optional[List[Dict[str, Any]]] = None,
+                    partition_key: Any = None, **kwargs) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.stats["queries"] += 1
+            items = [item for (key, _), item in self._items.items() if partition_key is None or key == partition_key]
+            if query == AGGREGATE_QUERY:
+                if partition_key is None:  # as azure-cosmos raises for a cross-partition query
+                    raise ValueError("Cross partition query only supports 'VALUE <AggregateFunc>' for aggregates")
+                totals: Dict[str, float] = {}
+                for item in items:
+                    for key, value in review_contribution(item).items():
+                        totals[key] = totals.get(key, 0) + value
+                return [totals]
+
+            match = _QUERY.match(query)
+            if not match:
+                raise ValueError(f"InMemoryContainer: unsupported query: {query}")
+            if match.group("where"):
+                values = {p["name"]: p["value"] for p in parameters or []}
+                predicate = _Where(_tokens(match.group("where")), values).predicate
+                items = [item for item in items if predicate(item)]
+            if match.group("order"):
+                present = [item for item in items if _field(item, match.group("order")) is not None]
+                items = sorted(present, key=lambda item: _field(item, match.group("order")),
+                               reverse=(match.group("direction") or "").upper() == "DESC")
+            return self._project(match.group("select").strip(), items)
+
+    @staticmethod
+    def _project(select: str, items: List[Dict[str, Any]]) -> List[Any]:
+        if select == "*":
+            return [copy.deepcopy(item) for item in items]
+        if re.fullmatch(r"VALUE\s+COUNT\(1\)", select, re.IGNORECASE):
+            return [len(items)]
+        fields = []
+        for column in select.split(","):
+            parts = re.fullmatch(r"\s*(c\.[\w.]+)(?:\s+AS\s+(\w+))?\s*", column, re.IGNORECASE)
+            if not parts:
+                raise ValueError(f"InMemoryContainer: unsupported SELECT column {column.strip()!r}")
+            fields.append((parts.group(1), parts.group(2) or parts.group(1).rsplit(".", 1)[-1]))
+        rows = []
+        for item in items:
+            row = {alias: copy.deepcopy(_field(item, path)) for path, alias in fields}
+            rows.append({key: value for key, value in row.items() if value is not None})
+        return rows
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+# =============================================================================
+# GREMLIN
+# =============================================================================
+
+_TRAVERSAL = re.compile(r"^g\.V\(\)(?:\.has\('(?P<key>\w+)',\s*containing\('(?P<text>[^']*)'\)\))?"
+                        r"(?P<edges>\.bothE\(\))?(?:\.limit\((?P<limit>\d+)\))?(?P<count>\.count\(\))?$")
+
+
+class _ResultSet:
+    """What gremlin_python's client.submit() returns: .all().result()"""
+
+    def __init__(self, results: List[Any]):
+        self._results = results
+
+    def all(self) -> Future:
+        future: Future = Future()
+        future.set_result(self._results)
+        return future
+
+
+class InMemoryGremlin:
+    """
+    gremlin_python Client stand-in over the JSON knowledge graph. Vertices: one per entity
+    (id = lowercase key, as query_cosmos_graph's ID-style lookups expect; name = full label);
+    edges: one per relationship.
+    """
+
+    def __init__(self, kg_path: Optional[str] = None, latency_ms: float = 0.0):
+        with open(kg_path or os.path.join(BACKEND_DIR, "samm_knowledge_graph.json"), encoding="utf-8") as f:
+            graph = json.load(f)
+        self.latency_ms = latency_ms
+        self.vertices: List[Dict[str, Any]] = []
+        ids: Dict[str, str] = {}
+        for entities in graph.get("entities", {}).values():
+            for key, entity in entities.items():
+                vertex_id = entity.get("cosmos_original_id") or key.lower().replace(" ", "_")
+                ids[key] = vertex_id
+                properties = {"name": entity.get("label") or key, "acronym": key,
+                              **{name: value for name, value in entity.items()
+                                 if name not in ("id", "label", "type") and isinstance(value, (str, int, float))}}
+                self.vertices.append({"id": vertex_id, "label": entity.get("type", "entity"), "type": "vertex",
+                                      "properties": {name: [{"id": f"{vertex_id}|{name}", "value": value}]
+                                                     for name, value in properties.items()}})
+        self.edges_by_vertex: Dict[str, List[Dict[str, Any]]] = {}
+        for relationship in graph.get("relationships", []):
+            source = ids.get(relationship["source"], relationship["source"].lower())
+            target = ids.get(relationship["target"], relationship["target"].lower())
+            edge = {"id": relationship.get("id") or f"{source}-{target}", "label": relationship.get("type", "relates_to"),
+                    "type": "edge", "outV": source, "inV": target,
+                    "properties": {name: relationship[name] for name in ("description", "section", "weight")
+                                   if name in relationship}}
+            self.edges_by_vertex.setdefault(source, []).append(edge)
+            if target != source:
+                self.edges_by_vertex.setdefault(target, []).append(edge)
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "unsupported": 0}
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def submit(self, query: str) -> _ResultSet:
+        self._bump("submitted")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        match = _TRAVERSAL.match(query.strip())
+        if not match:
+            self._bump("unsupported")
+            raise ValueError(f"InMemoryGremlin: unsupported traversal: {query}")
+        vertices = self.vertices
+        if match.group("key"):
+            key, text = match.group("key"), match.group("text")
+            vertices = [v for v in vertices
+                        if text in (v["id"] if key == "id" else str(v["properties"].get(key, [{}])[0].get("value", "")))]
+        results: List[Any] = vertices
+        if match.group("edges"):
+            seen, results = set(), []
+            for vertex in vertices:
+                for edge in self.edges_by_vertex.get(vertex["id"], []):
+                    if edge["id"] not in seen:
+                        seen.add(edge["id"])
+                        results.append(edge)
+        if match.group("limit"):
+            results = results[:int(match.group("limit"))]
+        if match.group("count"):
+            return _ResultSet([len(results)])
+        return _ResultSet(copy.deepcopy(results))
+
+    def close(self) -> None:
+        pass
+
+
+# =============================================================================
+# OLLAMA
+# =============================================================================
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # a load test opens many connections at once
+
+
+class FakeOllama:
+    """
+    Ollama /api/chat on 127.0.0.1 (a thread per request). Replies come from REPLIES by the
+    user prompt's call type, cut to options.num_predict words; each is sent after
+    ttft_ms + words / tokens_per_second (tokens_per_second 0: no generation time).
+    """
+
+    def __init__(self, ttft_ms: float = 100.0, tokens_per_second: float = 50.0, answer: str = ANSWER):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.answer = answer
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens": 0}
+
+    def reply_for(self, prompt: str, num_predict: Optional[int] = None) -> Tuple[str, int]:
+        """(reply text, tokens) for a user prompt"""
+        text = next((reply for marker, reply in REPLIES if marker in prompt), self.answer)
+        words = text.split(" ")
+        if num_predict and len(words) > num_predict:
+            words = words[:num_predict]
+            text = " ".join(words)
+        return text, len(words)
+
+    def generation_seconds(self, tokens: int) -> float:
+        seconds = self.ttft_ms / 1000
+        if self.tokens_per_second > 0:
+            seconds += tokens / self.tokens_per_second
+        return seconds
+
+    def start(self) -> "FakeOllama":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = next((m.get("content", "") for m in reversed(request.get("messages", []))
+                               if m.get("role") == "user"), request.get("prompt", ""))
+                text, tokens = fake.reply_for(prompt, (request.get("options") or {}).get("num_predict"))
+                seconds = fake.generation_seconds(tokens)
+                time.sleep(seconds)
+                with fake._lock:
+                    fake.stats["requests"] += 1
+                    fake.stats["tokens"] += tokens
+                body = json.dumps({"model": request.get("model", "fake"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                   "message": {"role": "assistant", "content": text}, "done": True,
+                                   "total_duration": int(seconds * 1e9), "prompt_eval_count": len(prompt) // 4,
+                                   "eval_count": tokens}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def shutdown(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "ttft_ms": self.ttft_ms, "tokens_per_second": self.tokens_per_second}
+
+
+# =============================================================================
+# INSTALL
+# =============================================================================
+
+class LocalBackends:
+    """The stand-ins for one app process; install() swaps them in as the app's subsystems"""
+
+    def __init__(self, blob_root: str, gremlin_latency_ms: float = 0.0, kg_path: Optional[str] = None):
+        self.reviews = InMemoryContainer("reviews", "/type")
+        self.cases = InMemoryContainer("cases", "/userId")
+        # Named as the app's settings name them: the stream route picks the container by name
+        self.case_docs = LocalBlobContainer(blob_root, os.getenv("AZURE_CASE_DOCS_CONTAINER_NAME") or "case-docs")
+        self.chat_docs = LocalBlobContainer(blob_root, os.getenv("AZURE_CHAT_DOCS_CONTAINER_NAME") or "chat-docs")
+        self.gremlin = InMemoryGremlin(kg_path, latency_ms=gremlin_latency_ms)
+
+    def install(self, samm) -> "LocalBackends":
+        """
+        Register the stand-ins as the app module's "cosmos", "blob" and "gremlin" subsystems
+        (before anything uses them; one already built is dropped). The financial store
+        falls back to SQLite (FINANCIAL_STORE_PATH): there is no Cosmos database client.
+        """
+        def gremlin():
+            samm.db_manager.cosmos_gremlin_client = self.gremlin
+            return self.gremlin
+
+        samm.SUBSYSTEMS.register("cosmos", lambda: {"reviews": self.reviews, "cases": self.cases})
+        samm.SUBSYSTEMS.register("blob", lambda: {"case_docs": self.case_docs, "chat_docs": self.chat_docs})
+        samm.SUBSYSTEMS.register("gremlin", gremlin)
+        for name in ("cosmos", "blob", "gremlin", "review_stats", "review_queue", "financial_store"):
+            samm.SUBSYSTEMS.reset(name)
+        return self
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"reviews": {**self.reviews.stats, "items": self.reviews.count()},
+                "cases": {**self.cases.stats, "items": self.cases.count()},
+                "gremlin": dict(self.gremlin.stats)}
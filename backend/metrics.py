@@ -0,0 +1,375 @@
+# metrics.py
+# Counters, gauges and latency histograms in Prometheus text format (v5.9.31).
+#
+#   REGISTRY = MetricsRegistry.from_env()
+#   STAGE_SECONDS = REGISTRY.histogram("samm_stage_seconds", "Pipeline stage latency", ("stage",))
+#   rerank_seconds = STAGE_SECONDS.labels("rerank")      # bind once, at import
+#   with rerank_seconds.time():                          # or rerank_seconds.observe(seconds)
+#       ...
+#   @STAGE_SECONDS.labels("two_hop").time()              # every call of the function
+#   REGISTRY.render()                                    # text for GET /metrics
+#
+# - An observation is a bisect over the bucket bounds and two additions under the
+#   child's lock (about a microsecond); label lookups are a dict hit, so hot paths
+#   bind their children once. Nothing is formatted until a scrape
+# - Several worker processes (gunicorn): with METRICS_DIR set, each process writes
+#   its values to METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS and when scraped,
+#   and a scrape of any worker sums every file. Counters and histograms of exited
+#   workers are kept (they only grow); their gauges are not
+# - No prometheus_client dependency; the exposition format is text 0.0.4
+
+import bisect
+import functools
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Value:
+    """Counter / gauge child"""
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def get(self) -> float:
+        return self._value
+
+    def reset(self) -> None:
+        self.set(0.0)
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+
+    def __call__(self, fn):
+        """As a decorator: observe every call of fn"""
+        child = self._child
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(child):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last: above every bound (+Inf)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> _Timer:
+        """Context manager (or decorator) observing the seconds spent inside"""
+        return _Timer(self)
+
+    def get(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self._sum = 0.0
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child for these label values (created on first use); bind it once on hot paths"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def reset(self) -> None:
+        """Zero every child in place (bound children stay valid)"""
+        for child in list(self._children.values()):
+            child.reset()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "help": self.documentation, "labels": list(self.labelnames),
+                "samples": [[list(key), child.get()] for key, child in list(self._children.items())]}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._unlabelled.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._unlabelled.set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled.observe(value)
+
+    def time(self) -> _Timer:
+        return self._unlabelled.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """The process's metrics; render() merges other workers' when a directory is set"""
+
+    def __init__(self, directory: Optional[str] = None, flush_seconds: float = 5.0):
+        self.directory = directory or None
+        self.flush_seconds = flush_seconds
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+        self.stats = {"scrapes": 0, "flushes": 0, "flush_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "MetricsRegistry":
+        """METRICS_DIR (per-process files, set by gunicorn.conf.py) / METRICS_FLUSH_SECONDS"""
+        return cls(os.getenv("METRICS_DIR"), float(os.getenv("METRICS_FLUSH_SECONDS", "5")))
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    # ------------------------------------------------------------ processes
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+    def flush(self) -> None:
+        """Write this process's values to METRICS_DIR/<pid>.json (atomically)"""
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.json")
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+            os.replace(temp_path, path)
+            self._bump("flushes")
+        except OSError as e:
+            print(f"[Metrics] ⚠️ Could not write {self.directory}: {e}")
+            self._bump("flush_errors")
+
+    @property
+    def flushing(self) -> bool:
+        """True in a process that started its flusher (a serving worker)"""
+        return self._flusher_pid == os.getpid()
+
+    def start_flusher(self) -> None:
+        """Flush every flush_seconds from a daemon thread (call in each worker, after fork)"""
+        if not self.directory or self.flushing:
+            return
+        self._flusher_pid = os.getpid()
+
+        def _run():
+            while True:
+                time.sleep(self.flush_seconds)
+                self.flush()
+
+        threading.Thread(target=_run, name="metrics-flush", daemon=True).start()
+
+    def reset_after_fork(self) -> None:
+        """In a forked worker: forget the parent's values (they are not this process's), start flushing"""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+        self.start_flusher()
+
+    def _collect(self) -> Dict[str, Dict[str, Any]]:
+        """Every process's snapshot summed (this process's values are current)"""
+        own = self.snapshot()
+        if not self.directory:
+            return own
+        self.flush()
+        merged: Dict[str, Dict[str, Any]] = {}
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            names = []
+        for file_name in names:
+            if not file_name.endswith(".json"):
+                continue
+            pid = int(file_name[:-5]) if file_name[:-5].isdigit() else None
+            if pid == os.getpid():
+                snapshot = own
+            else:
+                try:
+                    with open(os.path.join(self.directory, file_name)) as f:
+                        snapshot = json.load(f)["metrics"]
+                except (OSError, ValueError, KeyError):
+                    continue
+            alive = pid is None or pid == os.getpid() or _pid_alive(pid)
+            for name, metric in snapshot.items():
+                if metric["kind"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                for labels, value in metric["samples"]:
+                    key = tuple(labels)
+                    if metric["kind"] == "histogram":
+                        counts, total = value
+                        previous = target["samples"].get(key)
+                        if previous is not None:
+                            counts = [a + b for a, b in zip(previous[0], counts)]
+                            total += previous[1]
+                        target["samples"][key] = (counts, total)
+                    else:
+                        target["samples"][key] = target["samples"].get(key, 0.0) + value
+        for name, metric in own.items():  # metrics nobody has written yet still get their HELP / TYPE
+            merged.setdefault(name, {**metric, "samples": {}})
+        for metric in merged.values():
+            metric["samples"] = [[list(key), value] for key, value in metric["samples"].items()]
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric (summed over workers)"""
+        self._bump("scrapes")
+        lines = []
+        for name, metric in sorted(self._collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            labelnames = metric["labels"]
+            for labels, value in sorted(metric["samples"], key=lambda sample: sample[0]):
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + [math.inf], counts):
+                    cumulative += count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{name}_bucket{_labels(labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"metrics": len(self._metrics), "directory": self.directory, **self.stats}
@@ -0,0 +1,295 @@
+# pdf_text_extractor.py
+# Page-parallel PDF text extraction for case and chat attachments.
+#
+#   extractor = PDFTextExtractor.from_env()
+#   for page_text in extractor.iter_pages(pdf_bytes_or_path, max_chars=5000): ...
+#   text = extractor.extract_text(pdf_bytes_or_path, max_chars=5000)
+#
+# - PyMuPDF (fitz) extracts page ranges in a process pool; pages are yielded in
+#   order as soon as they are ready and the pool is only kept a few ranges ahead
+# - The generator stops once the caller's character budget is reached, so a
+#   5,000-char preview of a 300-page LOA reads a handful of pages
+# - Extracted pages are cached by SHA-256 of the file content; a later call with
+#   a larger budget continues from the last cached page
+# - Small documents (and platforms without fork) are extracted in-process;
+#   PyPDF2 is used when PyMuPDF is not installed
+# - The pool is forked only by start(), which the server calls in each worker
+#   before request threads exist (forking a threaded process can copy a lock
+#   another thread holds). Until start() - or after the pool breaks - every
+#   document is extracted in-process; a request thread never forks
+
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional
+
+from tiered_cache import LRUTTLCache
+
+# PyMuPDF is imported by the first extraction, not at module import
+HAS_PYMUPDF = importlib.util.find_spec("fitz") is not None
+
+
+def _fitz():
+    import fitz  # PyMuPDF
+    return fitz
+
+CAN_FORK = "fork" in multiprocessing.get_all_start_methods()
+
+
+def _read_source(source) -> bytes:
+    """PDF bytes from bytes, a file-like object or a path"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        content = source.read()
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return content
+    with open(source, 'rb') as file:
+        return file.read()
+
+
+# =============================================================================
+# WORKER SIDE
+# =============================================================================
+
+_worker_doc = None
+_worker_doc_key = None
+
+
+def _extract_page_range(path: str, content_key: str, start: int, stop: int) -> List[str]:
+    """Runs in a pool process; keeps the last opened document between ranges"""
+    global _worker_doc, _worker_doc_key
+    if _worker_doc_key != content_key:
+        if _worker_doc is not None:
+            _worker_doc.close()
+        _worker_doc = _fitz().open(path)
+        _worker_doc_key = content_key
+    return [_worker_doc[page_no].get_text() for page_no in range(start, stop)]
+
+
+def _warm_worker(_=None) -> int:
+    return os.getpid()
+
+
+# =============================================================================
+# EXTRACTOR
+# =============================================================================
+
+class PDFTextExtractor:
+    """
+    Thread-safe PDF text extraction with early stop and a content-hash cache.
+    workers=0 extracts every document in the calling thread.
+    """
+
+    def __init__(self, workers: int = 4, pages_per_task: int = 4, parallel_min_pages: int = 8,
+                 cache_size: int = 256, cache_ttl_seconds: float = 3600):
+        self.workers = max(0, int(workers)) if (HAS_PYMUPDF and CAN_FORK) else 0
+        self.pages_per_task = max(1, int(pages_per_task))
+        self.parallel_min_pages = max(1, int(parallel_min_pages))
+        self.cache = LRUTTLCache(max_size=cache_size, ttl_seconds=cache_ttl_seconds)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"documents": 0, "pages_extracted": 0, "served_from_cache": 0,
+                      "early_stops": 0, "parallel_documents": 0, "pool_failures": 0}
+
+    @classmethod
+    def from_env(cls) -> "PDFTextExtractor":
+        """Extractor configured from PDF_EXTRACT_WORKERS / PDF_PAGES_PER_TASK / PDF_PARALLEL_MIN_PAGES /
+        PDF_TEXT_CACHE_SIZE / PDF_TEXT_CACHE_TTL"""
+        return cls(
+            # default: the spare cores (none on a single-core host), at most 4
+            workers=int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, (os.cpu_count() or 1) - 1)))),
+            pages_per_task=int(os.getenv("PDF_PAGES_PER_TASK", "4")),
+            parallel_min_pages=int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8")),
+            cache_size=int(os.getenv("PDF_TEXT_CACHE_SIZE", "256")),
+            cache_ttl_seconds=float(os.getenv("PDF_TEXT_CACHE_TTL", "3600")),
+        )
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    # -------------------------------------------------------------------------
+    # Process pool
+    # -------------------------------------------------------------------------
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """The pool start() forked in this process, or None (extract in-process)"""
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                return self._pool
+            return None
+
+    def _reset_pool(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            owned = self._pool_pid == os.getpid()
+        if pool is not None and owned:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """
+        Fork the pool workers now. Call before request threads exist (gunicorn
+        post_worker_init, or before app.run()); a pool inherited through fork
+        from another process is dropped and replaced.
+        """
+        if not self.workers:
+            return
+        self._reset_pool()
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"))
+        # fork-context pools launch every worker on the first submit
+        list(pool.map(_warm_worker, range(self.workers)))
+        with self._pool_lock:
+            self._pool, self._pool_pid = pool, os.getpid()
+
+    def shutdown(self) -> None:
+        self._reset_pool()
+
+    # -------------------------------------------------------------------------
+    # Page sources
+    # -------------------------------------------------------------------------
+
+    def _pages_in_process(self, doc, start: int) -> Iterator[str]:
+        for page_no in range(start, doc.page_count):
+            yield doc[page_no].get_text()
+
+    def _pages_in_pool(self, pool: ProcessPoolExecutor, path: str, content_key: str, start: int,
+                       page_count: int, doc, ramp_up: bool = False) -> Iterator[str]:
+        """
+        Page ranges submitted a window ahead of the consumer; pending ranges are
+        cancelled on exit. ramp_up starts with one range in flight and doubles
+        the window per range consumed, so a budget met early wastes little work.
+        """
+        ranges = [(first, min(first + self.pages_per_task, page_count))
+                  for first in range(start, page_count, self.pages_per_task)]
+        pending = []
+        next_range = 0
+        next_page = start
+        window = 1 if ramp_up else self.workers
+        try:
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < window:
+                    first, stop = ranges[next_range]
+                    pending.append(pool.submit(_extract_page_range, path, content_key, first, stop))
+                    next_range += 1
+                for text in pending.pop(0).result():
+                    next_page += 1
+                    yield text
+                window = min(self.workers, window * 2)
+        except BrokenProcessPool as e:
+            print(f"[PDF Extract] Worker pool failed ({e}) - in-process until the next start()")
+            self._bump("pool_failures")
+            self._reset_pool()
+            yield from self._pages_in_process(doc, next_page)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _pypdf2_pages(self, data: bytes, start: int) -> Iterator[str]:
+        import PyPDF2
+        reader = PyPDF2.PdfReader(BytesIO(data))
+        for page in reader.pages[start:]:
+            yield page.extract_text() or ''
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def iter_pages(self, source, max_chars: Optional[int] = None) -> Iterator[str]:
+        """
+        Page texts in order. Stops after the page that brings the running total
+        to max_chars (None = every page). Closing the generator early is fine.
+        """
+        data = _read_source(source)
+        key = hashlib.sha256(data).hexdigest()
+        self._bump("documents")
+
+        entry = self.cache.get(key)
+        pages: List[str] = list(entry["pages"]) if entry else []
+        page_count: Optional[int] = entry["page_count"] if entry else None
+
+        total = 0
+        for text in pages:
+            yield text
+            total += len(text)
+            if max_chars is not None and total >= max_chars:
+                self._bump("served_from_cache")
+                return
+        if page_count is not None and len(pages) >= page_count:
+            self._bump("served_from_cache")
+            return
+
+        cached_pages = len(pages)
+        doc = None
+        temp_path = None
+        try:
+            if HAS_PYMUPDF:
+                doc = _fitz().open(stream=data, filetype="pdf")
+                page_count = doc.page_count
+                remaining = page_count - cached_pages
+                pool = self._get_pool() if remaining >= self.parallel_min_pages else None
+                if pool is not None:
+                    path = source if isinstance(source, (str, os.PathLike)) else None
+                    if path is None:
+                        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                            tmp.write(data)
+                            temp_path = path = tmp.name
+                    self._bump("parallel_documents")
+                    page_iter = self._pages_in_pool(pool, os.fspath(path), key, cached_pages, page_count, doc,
+                                                    ramp_up=max_chars is not None)
+                else:
+                    page_iter = self._pages_in_process(doc, cached_pages)
+            else:
+                import PyPDF2
+                page_count = len(PyPDF2.PdfReader(BytesIO(data)).pages)
+                page_iter = self._pypdf2_pages(data, cached_pages)
+
+            try:
+                for text in page_iter:
+                    pages.append(text)
+                    yield text
+                    total += len(text)
+                    if max_chars is not None and total >= max_chars:
+                        if len(pages) < page_count:
+                            self._bump("early_stops")
+                        break
+            finally:
+                page_iter.close()
+        finally:
+            if len(pages) > cached_pages:
+                self._bump("pages_extracted", len(pages) - cached_pages)
+                self.cache.set(key, {"pages": pages, "page_count": page_count})
+            if doc is not None:
+                doc.close()
+            if temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
+    def extract_text(self, source, max_chars: Optional[int] = None, separator: str = '\n') -> str:
+        """Joined page text, truncated to max_chars"""
+        text = separator.join(self.iter_pages(source, max_chars=max_chars))
+        return text[:max_chars] if max_chars is not None else text
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "backend": "pymupdf" if HAS_PYMUPDF else "pypdf2",
+            "workers": self.workers,
+            "pool_started": self._get_pool() is not None,
+            "pages_per_task": self.pages_per_task,
+            "parallel_min_pages": self.parallel_min_pages,
+            "cache": self.cache.get_stats(),
+        }
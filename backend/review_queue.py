@@ -0,0 +1,112 @@
+# review_queue.py
+# Paged, projected reads of the HITL review queue.
+#
+#   queue = ReviewQueue.from_env(reviews_container)
+#   page = queue.list_page({"intent": "definition", "band": "low"}, page_size=25)
+#   page = queue.list_page(filters, page_size=25, continuation=page["continuationToken"])
+#   review = queue.get_review(review_id)          # full item for the detail view
+#
+# A page is one Cosmos query page (max_item_count=page_size) resumed from the
+# continuation token of the previous page, so its cost does not depend on how
+# many reviews are queued. The list view projects only the fields the queue
+# shows; answers, entity payloads and context are read by get_review().
+# Filters (status, intent, confidence band / range, date range) run in the query.
+# Queries are scoped to the review_item partition (the container is partitioned
+# on /type): the SDK's cross-partition ORDER BY does not resume from a token.
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from review_stats import REVIEW_TYPE
+
+LIST_FIELDS = ("id", "reviewId", "question", "status", "priority", "timestamp", "assignedTo",
+               "confidenceOverall", "confidenceIntent", "confidenceEntity", "confidenceAnswer")
+# Same thresholds as the dashboard's confidence badges
+CONFIDENCE_BANDS = {"low": (None, 0.6), "medium": (0.6, 0.8), "high": (0.8, None)}
+
+
+def build_queue_query(filters: Optional[Dict[str, Any]] = None, view: str = "list") -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    SQL + parameters for a page of the queue, newest first.
+    filters: status (default "pending", "all" for any), intent, band (low / medium / high),
+             minConfidence / maxConfidence (confidenceOverall), since / until (ISO timestamps)
+    """
+    filters = filters or {}
+    clauses = [f"c.type = '{REVIEW_TYPE}'"]
+    parameters: List[Dict[str, Any]] = []
+
+    def add(clause: str, name: str, value: Any) -> None:
+        clauses.append(clause)
+        parameters.append({"name": name, "value": value})
+
+    status = filters.get("status") or "pending"
+    if status != "all":
+        add("c.status = @status", "@status", status)
+    if filters.get("intent"):
+        add("c.aiResponse.intent = @intent", "@intent", filters["intent"])
+    low, high = CONFIDENCE_BANDS.get(filters.get("band") or "", (None, None))
+    if filters.get("minConfidence") is not None:
+        low = float(filters["minConfidence"])
+    if filters.get("maxConfidence") is not None:
+        high = float(filters["maxConfidence"])
+    if low is not None:
+        add("c.confidenceOverall >= @minConfidence", "@minConfidence", low)
+    if high is not None:
+        add("c.confidenceOverall < @maxConfidence", "@maxConfidence", high)
+    if filters.get("since"):
+        add("c.timestamp >= @since", "@since", filters["since"])
+    if filters.get("until"):
+        add("c.timestamp <= @until", "@until", filters["until"])
+
+    if view == "full":
+        projection = "*"
+    else:
+        projection = ", ".join([f"c.{field}" for field in LIST_FIELDS] + ["c.aiResponse.intent AS intent"])
+    query = f"SELECT {projection} FROM c WHERE {' AND '.join(clauses)} ORDER BY c.timestamp DESC"
+    return query, parameters
+
+
+class ReviewQueue:
+    """Review queue pages over Cosmos continuation tokens"""
+
+    def __init__(self, container_client=None, default_page_size: int = 25, max_page_size: int = 200):
+        self.container = container_client
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
+
+    @classmethod
+    def from_env(cls, container_client=None) -> "ReviewQueue":
+        return cls(container_client,
+                   default_page_size=int(os.getenv("REVIEW_PAGE_SIZE", "25")),
+                   max_page_size=int(os.getenv("REVIEW_MAX_PAGE_SIZE", "200")))
+
+    def page_size(self, requested: Optional[int]) -> int:
+        return max(1, min(int(requested or self.default_page_size), self.max_page_size))
+
+    def list_page(self, filters: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None,
+                  continuation: Optional[str] = None, view: str = "list") -> Dict[str, Any]:
+        """One page of reviews: {"reviews", "continuationToken", "pageSize"} (token None on the last page)"""
+        page_size = self.page_size(page_size)
+        query, parameters = build_queue_query(filters, view)
+        pages = self.container.query_items(
+            query=query,
+            parameters=parameters,
+            partition_key=REVIEW_TYPE,
+            max_item_count=page_size
+        ).by_page(continuation)
+        reviews = list(next(pages, []))
+        return {"reviews": reviews, "continuationToken": pages.continuation_token, "pageSize": page_size}
+
+    def get_review(self, review_id: str) -> Optional[Dict[str, Any]]:
+        """Full review by item id (point read) or by reviewId"""
+        from azure.cosmos import exceptions as cosmos_exceptions
+        try:
+            return self.container.read_item(item=review_id, partition_key=REVIEW_TYPE)
+        except cosmos_exceptions.CosmosHttpResponseError:
+            pass  # not an item id
+        items = list(self.container.query_items(
+            query="SELECT * FROM c WHERE c.reviewId = @reviewId",
+            parameters=[{"name": "@reviewId", "value": review_id}],
+            partition_key=REVIEW_TYPE
+        ))
+        return items[0] if items else None
@@ -0,0 +1,278 @@
+# review_stats.py
+# HITL review statistics without reading every review document.
+#
+#   stats = ReviewStatsService.from_env(reviews_container)
+#   stats.record_change(None, review)            # after create_item
+#   stats.record_change(before, review)          # after a status change (accept / reject / ...)
+#   counters = stats.get_counters()              # TTL cache -> counters item -> aggregate query
+#   review_stats_summary(counters) / detailed_review_stats(counters)
+#
+# Each review contributes a fixed set of numbers (one for its status, the
+# confidence values it has, intent correctness, entity metrics). The counters
+# item holds the sum of every contribution and is kept current with Cosmos
+# patch "incr" operations of (after - before) on each transition.
+# When the counters item is missing (or on refresh) it is rebuilt with ONE
+# server-side aggregate query (COUNT / SUM per field, computed by Cosmos).
+# The query is scoped to the review_item partition: the SDK only runs
+# cross-partition aggregates of the form SELECT VALUE <aggregate>.
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+REVIEW_TYPE = "review_item"
+REVIEW_STATUSES = ("pending", "approved", "needs_revision", "rejected", "regenerating")
+CONFIDENCE_FIELDS = ("confidenceIntent", "confidenceEntity", "confidenceAnswer", "confidenceOverall")
+ENTITY_METRICS = ("precision", "recall", "f1")
+COUNTERS_ID = "review_stats_counters"
+COUNTERS_TYPE = "review_stats"
+PATCH_OPERATION_LIMIT = 10  # Cosmos allows 10 operations per patch request
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def review_contribution(review: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """The counter values one review adds to the totals ({} for non-review items)"""
+    if not review or review.get("type") != REVIEW_TYPE:
+        return {}
+    status = review.get("status")
+    contribution: Dict[str, float] = {"total": 1}
+    if status in REVIEW_STATUSES:
+        contribution[f"status_{status}"] = 1
+    for field in CONFIDENCE_FIELDS:
+        if _is_number(review.get(field)):
+            contribution[f"sum_{field}"] = review[field]
+            contribution[f"n_{field}"] = 1
+    if status == "approved" and review.get("intentCorrect") is True:
+        contribution["intent_correct_approved"] = 1
+    metrics = review.get("entityMetrics")
+    if isinstance(metrics, dict):
+        for metric in ENTITY_METRICS:
+            if _is_number(metrics.get(metric)):
+                contribution[f"sum_entity_{metric}"] = metrics[metric]
+                contribution[f"n_entity_{metric}"] = 1
+    return contribution
+
+
+def contribution_delta(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """after - before, without the counters that did not change"""
+    old, new = review_contribution(before), review_contribution(after)
+    delta = {key: new.get(key, 0) - old.get(key, 0) for key in set(old) | set(new)}
+    return {key: value for key, value in delta.items() if value}
+
+
+def empty_counters() -> Dict[str, float]:
+    counters: Dict[str, float] = {"total": 0, "intent_correct_approved": 0}
+    counters.update({f"status_{status}": 0 for status in REVIEW_STATUSES})
+    for field in CONFIDENCE_FIELDS:
+        counters.update({f"sum_{field}": 0, f"n_{field}": 0})
+    for metric in ENTITY_METRICS:
+        counters.update({f"sum_entity_{metric}": 0, f"n_entity_{metric}": 0})
+    return counters
+
+
+def _aggregate_query() -> str:
+    """One server-side aggregate over every review_item: COUNT plus a SUM per counter"""
+    columns = ["COUNT(1) AS total"]
+    columns += [f"SUM(c.status = '{status}' ? 1 : 0) AS status_{status}" for status in REVIEW_STATUSES]
+    for field in CONFIDENCE_FIELDS:
+        columns.append(f"SUM(IS_NUMBER(c.{field}) ? c.{field} : 0) AS sum_{field}")
+        columns.append(f"SUM(IS_NUMBER(c.{field}) ? 1 : 0) AS n_{field}")
+    columns.append("SUM((c.status = 'approved' AND c.intentCorrect = true) ? 1 : 0) AS intent_correct_approved")
+    for metric in ENTITY_METRICS:
+        columns.append(f"SUM(IS_NUMBER(c.entityMetrics.{metric}) ? c.entityMetrics.{metric} : 0) AS sum_entity_{metric}")
+        columns.append(f"SUM(IS_NUMBER(c.entityMetrics.{metric}) ? 1 : 0) AS n_entity_{metric}")
+    return f"SELECT {', '.join(columns)} FROM c WHERE c.type = '{REVIEW_TYPE}'"
+
+
+AGGREGATE_QUERY = _aggregate_query()
+
+
+def _average(counters: Dict[str, float], name: str) -> float:
+    n = counters.get(f"n_{name}", 0)
+    return round(counters.get(f"sum_{name}", 0) / n, 2) if n else 0
+
+
+def _rate(part: float, total: float) -> float:
+    return round(part / total * 100, 2) if total > 0 else 0
+
+
+def review_stats_summary(counters: Dict[str, float]) -> Dict[str, Any]:
+    """/api/reviews/stats body"""
+    return {
+        "success": True,
+        "total_reviews": counters.get("total", 0),
+        "pending": counters.get("status_pending", 0),
+        "approved": counters.get("status_approved", 0),
+        "needs_revision": counters.get("status_needs_revision", 0),
+        "average_confidence": _average(counters, "confidenceOverall"),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
+def detailed_review_stats(counters: Dict[str, float]) -> Dict[str, Any]:
+    """/api/reviews/detailed-stats body"""
+    total = counters.get("total", 0)
+    avg_intent = _average(counters, "confidenceIntent")
+    avg_entity = _average(counters, "confidenceEntity")
+    avg_answer = _average(counters, "confidenceAnswer")
+    intent_accuracy = _rate(counters.get("intent_correct_approved", 0), total)
+    avg_precision = _average(counters, "entity_precision")
+    avg_recall = _average(counters, "entity_recall")
+    avg_f1 = _average(counters, "entity_f1")
+    return {
+        "success": True,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "counts": {
+            "total_reviews": total,
+            "pending": counters.get("status_pending", 0),
+            "approved": counters.get("status_approved", 0),
+            "needs_revision": counters.get("status_needs_revision", 0),
+            "rejected": counters.get("status_rejected", 0)
+        },
+        "rates": {
+            "approval_rate": _rate(counters.get("status_approved", 0), total),
+            "revision_rate": _rate(counters.get("status_needs_revision", 0), total),
+            "rejection_rate": _rate(counters.get("status_rejected", 0), total)
+        },
+        "confidence": {
+            "intent": avg_intent,
+            "entity": avg_entity,
+            "answer": avg_answer,
+            "overall": _average(counters, "confidenceOverall")
+        },
+        "accuracy": {
+            "intent_accuracy": intent_accuracy,
+            "entity_precision": avg_precision,
+            "entity_recall": avg_recall,
+            "entity_f1": avg_f1
+        },
+        "agent_performance": {
+            "intent_agent": {
+                "accuracy": intent_accuracy,
+                "avg_confidence": avg_intent,
+                "total_processed": counters.get("n_confidenceIntent", 0)
+            },
+            "entity_agent": {
+                "precision": avg_precision,
+                "recall": avg_recall,
+                "f1_score": avg_f1,
+                "avg_confidence": avg_entity,
+                "total_processed": counters.get("n_confidenceEntity", 0)
+            },
+            "answer_agent": {
+                "avg_confidence": avg_answer,
+                "total_processed": counters.get("n_confidenceAnswer", 0)
+            }
+        },
+        "trend": [],
+        "performance": {
+            "avg_response_time": 0,
+            "total_questions_evaluated": total
+        }
+    }
+
+
+class ReviewStatsService:
+    """
+    Counters item in the reviews container (type "review_stats", so it gets its own
+    partition in the /type-partitioned container the app creates), a short
+    per-process TTL cache in front of it, and the aggregate query to build it.
+    """
+
+    def __init__(self, container_client=None, cache_ttl_seconds: float = 15.0):
+        self.container = container_client
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._lock = threading.Lock()
+        self._cached: Optional[Dict[str, float]] = None
+        self._cached_at = 0.0
+        self.stats = {"cache_hits": 0, "counter_reads": 0, "aggregate_queries": 0, "increments": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, container_client=None) -> "ReviewStatsService":
+        return cls(container_client, cache_ttl_seconds=float(os.getenv("REVIEW_STATS_CACHE_TTL", "15")))
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cached = None
+
+    def aggregate_counters(self) -> Dict[str, float]:
+        """Counters computed by Cosmos over every review (one aggregate query, no documents returned)"""
+        self._bump("aggregate_queries")
+        rows = list(self.container.query_items(query=AGGREGATE_QUERY, partition_key=REVIEW_TYPE))
+        counters = empty_counters()
+        for key, value in (rows[0] if rows else {}).items():
+            if key in counters and _is_number(value):
+                counters[key] = value
+        return counters
+
+    def rebuild(self) -> Dict[str, float]:
+        """Recompute the counters with the aggregate query and store them"""
+        counters = self.aggregate_counters()
+        self.container.upsert_item({"id": COUNTERS_ID, "type": COUNTERS_TYPE, "counters": counters,
+                                    "rebuiltAt": datetime.now(timezone.utc).isoformat()})
+        print(f"[ReviewStats] Counters rebuilt from aggregate query: {counters['total']} reviews")
+        self._store(counters)
+        return counters
+
+    def _store(self, counters: Dict[str, float]) -> None:
+        with self._lock:
+            self._cached = dict(counters)
+            self._cached_at = time.time()
+
+    def get_counters(self, refresh: bool = False) -> Dict[str, float]:
+        """Current counters: TTL cache, else the counters item, else rebuilt by aggregate query"""
+        if refresh:
+            return self.rebuild()
+        with self._lock:
+            if self._cached is not None and time.time() - self._cached_at < self.cache_ttl_seconds:
+                self.stats["cache_hits"] += 1
+                return dict(self._cached)
+
+        from azure.cosmos import exceptions as cosmos_exceptions
+        try:
+            item = self.container.read_item(item=COUNTERS_ID, partition_key=COUNTERS_TYPE)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            return self.rebuild()
+        self._bump("counter_reads")
+        counters = {**empty_counters(), **item.get("counters", {})}
+        self._store(counters)
+        return counters
+
+    def record_change(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """
+        Apply a review create / transition to the counters item (call after the review is written).
+        Fail-open: a failed increment is logged and fixed by the next rebuild.
+        """
+        delta = contribution_delta(before, after)
+        if not delta or self.container is None:
+            return
+        from azure.cosmos import exceptions as cosmos_exceptions
+        operations = [{"op": "incr", "path": f"/counters/{key}", "value": value} for key, value in delta.items()]
+        try:
+            for start in range(0, len(operations), PATCH_OPERATION_LIMIT):
+                self.container.patch_item(item=COUNTERS_ID, partition_key=COUNTERS_TYPE,
+                                          patch_operations=operations[start:start + PATCH_OPERATION_LIMIT])
+            self._bump("increments")
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            pass  # not built yet - the first read rebuilds it from the reviews (this one included)
+        except Exception as e:
+            self._bump("errors")
+            print(f"[ReviewStats] ⚠️ Counter update failed ({e}); rebuilding on next read")
+            try:
+                self.container.delete_item(item=COUNTERS_ID, partition_key=COUNTERS_TYPE)
+            except Exception:
+                pass
+        self.invalidate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "cache_ttl_seconds": self.cache_ttl_seconds}
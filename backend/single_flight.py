@@ -0,0 +1,277 @@
+# single_flight.py
+# Coalesce identical in-flight requests so one computation serves all callers.
+#
+#   SingleFlight.do(key, fn)         - blocking calls (/api/query): the first caller
+#                                      runs fn, concurrent callers with the same key
+#                                      wait for and share its result (or exception)
+#   SingleFlight.stream(key, make)   - SSE generators (/api/query/stream): one
+#                                      background producer, every subscriber gets
+#                                      the full frame sequence from the beginning
+#   SingleFlight.stream_async(...)   - the same for async frame iterators served
+#                                      from an event loop (producer is a task)
+#
+# Flights are removed as soon as they finish, so only truly concurrent requests
+# are coalesced; later requests go through the answer cache as usual.
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def single_flight_key(*parts: Any) -> str:
+    """Stable key from arbitrary JSON-serialisable parts"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class _Broadcast:
+    def __init__(self):
+        self.frames: List[str] = []
+        self.finished = False
+        self.cond = threading.Condition()
+        self.subscribers = 0
+        self.meta: Dict[str, Any] = {}
+
+    def publish(self, frame: str) -> None:
+        with self.cond:
+            self.frames.append(frame)
+            self.cond.notify_all()
+
+    def finish(self) -> None:
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def iterate(self) -> Iterator[str]:
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.frames) and not self.finished:
+                    self.cond.wait()
+                if index >= len(self.frames):
+                    return
+                pending = self.frames[index:]
+                index = len(self.frames)
+            for frame in pending:
+                yield frame
+
+
+class _AsyncBroadcast:
+    """_Broadcast for one event loop: subscribers await the next frame instead of blocking a thread"""
+
+    def __init__(self):
+        self.frames: List[str] = []
+        self.finished = False
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.meta: Dict[str, Any] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def _wake(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, frame: str) -> None:
+        self.frames.append(frame)
+        self._wake()
+
+    def finish(self) -> None:
+        self.finished = True
+        self._wake()
+
+    async def iterate(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            if index < len(self.frames):
+                index += 1
+                yield self.frames[index - 1]
+            elif self.finished:
+                return
+            else:
+                await self.changed.wait()
+
+
+class SingleFlight:
+    """
+    Per-process request coalescing with counters.
+
+    llm_used(value) / llm_used_meta(meta) tell the group whether the shared
+    computation actually called the LLM, so llm_calls_saved only counts
+    followers that really avoided a generation.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._async_streams: Dict[str, _AsyncBroadcast] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "llm_calls_saved": 0, "errors": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def do(self, key: str, fn: Callable[[], Any],
+           llm_used: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, bool]:
+        """Run fn once per key among concurrent callers. Returns (value, coalesced)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self.stats["leaders"] += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            try:
+                if llm_used(call.value):
+                    self._count("llm_calls_saved")
+            except Exception:
+                pass
+            return call.value, True
+
+        try:
+            call.value = fn()
+            return call.value, False
+        except BaseException as e:
+            call.error = e
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stream(self, key: str, make_frames: Callable[[], Iterable[str]],
+               llm_used_meta: Callable[[Dict[str, Any]], bool] = lambda meta: True,
+               inspect_frame: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Iterator[str]:
+        """
+        Subscribe to the frame stream for key, starting a producer thread if
+        none is running. make_frames must not depend on the request context.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = _Broadcast()
+                self._streams[key] = broadcast
+                leader = True
+                self.stats["leaders"] += 1
+            else:
+                leader = False
+                self.stats["coalesced"] += 1
+            broadcast.subscribers += 1
+
+        if leader:
+            def _produce():
+                try:
+                    for frame in make_frames():
+                        if inspect_frame is not None:
+                            try:
+                                inspect_frame(frame, broadcast.meta)
+                            except Exception:
+                                pass
+                        broadcast.publish(frame)
+                except Exception as e:
+                    print(f"[SingleFlight:{self.name}] producer error: {e}")
+                    self._count("errors")
+                    broadcast.publish(f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n")
+                finally:
+                    with self._lock:
+                        self._streams.pop(key, None)
+                    broadcast.finish()
+
+            # The producer logs under the leader's request context (request id, log sampling)
+            threading.Thread(target=contextvars.copy_context().run, args=(_produce,),
+                             name=f"single-flight-{self.name}", daemon=True).start()
+
+        return self._follow(broadcast, leader, llm_used_meta)
+
+    def _follow(self, broadcast: _Broadcast, leader: bool,
+                llm_used_meta: Callable[[Dict[str, Any]], bool]) -> Iterator[str]:
+        yield from broadcast.iterate()
+        if not leader:
+            try:
+                if llm_used_meta(broadcast.meta):
+                    self._count("llm_calls_saved")
+            except Exception:
+                pass
+
+    def stream_async(self, key: str, make_frames: Callable[[], AsyncIterator[str]],
+                     llm_used_meta: Callable[[Dict[str, Any]], bool] = lambda meta: True,
+                     inspect_frame: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> AsyncIterator[str]:
+        """
+        stream() for async frame iterators: call from the serving event loop. The
+        producer runs as a task, so it finishes (and fills caches) even if every
+        subscriber disconnects.
+        """
+        with self._lock:
+            broadcast = self._async_streams.get(key)
+            if broadcast is None:
+                broadcast = _AsyncBroadcast()
+                self._async_streams[key] = broadcast
+                leader = True
+                self.stats["leaders"] += 1
+            else:
+                leader = False
+                self.stats["coalesced"] += 1
+            broadcast.subscribers += 1
+
+        if leader:
+            async def _produce():
+                try:
+                    async for frame in make_frames():
+                        if inspect_frame is not None:
+                            try:
+                                inspect_frame(frame, broadcast.meta)
+                            except Exception:
+                                pass
+                        broadcast.publish(frame)
+                except Exception as e:
+                    print(f"[SingleFlight:{self.name}] producer error: {e}")
+                    self._count("errors")
+                    broadcast.publish(f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n")
+                finally:
+                    with self._lock:
+                        self._async_streams.pop(key, None)
+                    broadcast.finish()
+
+            broadcast.task = asyncio.get_running_loop().create_task(_produce())
+
+        return self._follow_async(broadcast, leader, llm_used_meta)
+
+    async def _follow_async(self, broadcast: _AsyncBroadcast, leader: bool,
+                            llm_used_meta: Callable[[Dict[str, Any]], bool]) -> AsyncIterator[str]:
+        async for frame in broadcast.iterate():
+            yield frame
+        if not leader:
+            try:
+                if llm_used_meta(broadcast.meta):
+                    self._count("llm_calls_saved")
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "in_flight": len(self._calls) + len(self._streams) + len(self._async_streams),
+            }
@@ -0,0 +1,249 @@
+# sse_asgi.py
+# Serve long-lived SSE routes from an event loop, everything else from the WSGI app (v5.9.27).
+#
+#   asgi_app = SSEASGIApp(flask_app, routes={("POST", "/api/query/stream"): query_stream},
+#                         wsgi_threads=16, on_startup=start_clients, on_shutdown=close_clients)
+#   uvicorn module:asgi_app            (or gunicorn -k uvicorn.workers.UvicornWorker)
+#
+# A route handler is `async def handler(request: ASGIRequest)` returning either
+# (status, json_payload) or an SSEResponse wrapping an async iterator of frames.
+# An open stream costs a task and a socket, not an OS thread: the handler awaits
+# the LLM and storage calls, and only the CPU-bound pipeline steps run on a
+# bounded thread pool (drive_effects_async).
+#
+# Pipelines are plain generators shared with the WSGI route. Besides frames they
+# yield effect objects (e.g. "generate an answer", "write this review item"); the
+# driver performs the effect and sends the result back into the generator:
+#   drive_effects(pipeline, handlers)                  - sync, for Flask routes
+#   drive_effects_async(pipeline, executor, handlers)  - async, for SSEASGIApp routes
+
+import asyncio
+import contextvars
+import json
+import threading
+from concurrent.futures import Executor
+from http.cookies import SimpleCookie
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs
+
+
+class ASGIRequest:
+    """The parts of an HTTP request the async routes need"""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        self.args = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(self.headers.get("cookie", ""))
+        except Exception:
+            return {}
+        return {name: morsel.value for name, morsel in cookie.items()}
+
+    @property
+    def is_json(self) -> bool:
+        mimetype = self.headers.get("content-type", "").split(";")[0].strip().lower()
+        return mimetype == "application/json" or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+
+    def json(self) -> Any:
+        """Parsed body, None when it is not valid JSON"""
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            return None
+
+
+class SSEResponse:
+    """text/event-stream response; frames are complete 'data: ...\\n\\n' strings"""
+
+    def __init__(self, frames: AsyncIterator[str], headers: Optional[Dict[str, str]] = None):
+        self.frames = frames
+        self.headers = headers or {}
+
+
+def drive_effects(pipeline: Iterator[Any], handlers: Dict[type, Callable[[Any], Any]]) -> Iterator[str]:
+    """Frames of pipeline; each effect it yields is run by handlers[type(effect)] and the result sent back"""
+    send, throw = None, None
+    while True:
+        try:
+            item = pipeline.throw(throw) if throw is not None else pipeline.send(send)
+        except StopIteration:
+            return
+        send, throw = None, None
+        handler = handlers.get(type(item))
+        if handler is None:
+            yield item
+            continue
+        try:
+            send = handler(item)
+        except Exception as e:
+            throw = e
+
+
+async def drive_effects_async(pipeline: Iterator[Any], executor: Executor,
+                              handlers: Dict[type, Callable[[Any], Awaitable[Any]]]) -> AsyncIterator[str]:
+    """
+    drive_effects() for an event loop: each step of the generator (the CPU work between
+    two yields) runs on executor, effects are awaited on the loop. Steps of one pipeline
+    never overlap, so the generator needs no locking. Steps run in a copy of the caller's
+    context (request id, log sampling), which persists from one step to the next.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+
+    def step(send, throw):
+        try:
+            return False, pipeline.throw(throw) if throw is not None else pipeline.send(send)
+        except StopIteration:
+            return True, None  # StopIteration cannot cross a Future
+
+    send, throw = None, None
+    try:
+        while True:
+            done, item = await loop.run_in_executor(executor, context.run, step, send, throw)
+            if done:
+                return
+            send, throw = None, None
+            handler = handlers.get(type(item))
+            if handler is None:
+                yield item
+                continue
+            try:
+                send = await handler(item)
+            except Exception as e:
+                throw = e
+    finally:
+        await loop.run_in_executor(executor, context.run, pipeline.close)
+
+
+def _wsgi_adapter(wsgi_app, threads: int):
+    """a2wsgi when installed, otherwise uvicorn's bundled adapter (same thread-pool model)"""
+    try:
+        from a2wsgi import WSGIMiddleware
+    except ImportError:
+        from uvicorn.middleware.wsgi import WSGIMiddleware
+    return WSGIMiddleware(wsgi_app, workers=threads)
+
+
+class SSEASGIApp:
+    """ASGI app: async routes for the streaming endpoints, the WSGI app behind a thread pool for the rest"""
+
+    def __init__(self, wsgi_app, routes: Dict[Tuple[str, str], Callable[[ASGIRequest], Awaitable[Any]]],
+                 wsgi_threads: int = 16, cors_origin: str = "*",
+                 on_startup: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_shutdown: Optional[Callable[[], Awaitable[None]]] = None):
+        self.wsgi = _wsgi_adapter(wsgi_app, wsgi_threads)
+        self.routes = routes
+        self.cors_origin = cors_origin
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self._lock = threading.Lock()
+        self.stats = {"streams_started": 0, "streams_completed": 0, "client_disconnects": 0,
+                      "open_streams": 0, "peak_open_streams": 0, "wsgi_requests": 0}
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+            if key == "open_streams":
+                self.stats["peak_open_streams"] = max(self.stats["peak_open_streams"], self.stats["open_streams"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            self._bump("wsgi_requests")
+            await self.wsgi(scope, receive, send)
+            return
+        request = ASGIRequest(scope, await self._read_body(receive))
+        result = await handler(request)
+        if isinstance(result, SSEResponse):
+            await self._send_sse(result, receive, send)
+        else:
+            status, payload = result
+            await self._send_json(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    if self.on_startup is not None:
+                        await self.on_startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.on_shutdown is not None:
+                    await self.on_shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return body
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    def _cors_headers(self):
+        return [(b"access-control-allow-origin", self.cors_origin.encode())]
+
+    async def _send_json(self, send, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())] + self._cors_headers()})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_sse(self, response: SSEResponse, receive, send) -> None:
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8")] + self._cors_headers()
+        headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+        self._bump("streams_started")
+        self._bump("open_streams")
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.get_running_loop().create_task(watch_disconnect())
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            async for frame in response.frames:
+                if disconnected.is_set():
+                    break
+                await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+            if disconnected.is_set():
+                self._bump("client_disconnects")
+            else:
+                await send({"type": "http.response.body", "body": b""})
+                self._bump("streams_completed")
+        except OSError:
+            self._bump("client_disconnects")  # socket closed under us
+        finally:
+            watcher.cancel()
+            self._bump("open_streams", -1)
+            aclose = getattr(response.frames, "aclose", None)
+            if aclose is not None:
+                await aclose()
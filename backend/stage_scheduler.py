@@ -0,0 +1,196 @@
+# stage_scheduler.py
+# Dependency-driven execution of query pipeline stages with per-stage timing.
+#
+#   scheduler = StageScheduler(executor)
+#   scheduler.add("compliance", fn, requires=("intent", "entities"))  # starts on a worker
+#                                                                      # as soon as both exist
+#   intent = scheduler.run("intent", fn)        # runs in the calling thread, timed
+#   scheduler.provide("entities", entities)     # milestone produced inside another stage
+#   result = scheduler.result("compliance")     # waits only for what the caller needs
+#   scheduler.timings()                         # {stage: {start, end, duration}} offsets (s)
+#   StageScheduler(executor, observe=fn)        # fn(stage, seconds) as each stage finishes
+#
+# Stage functions receive the results of their `requires` as positional arguments.
+# A failed dependency fails its dependents with the same exception. Background
+# stages see the context variables of the thread that launched them.
+
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class _Stage:
+    def __init__(self, name: str, fn: Optional[Callable] = None, requires: Tuple[str, ...] = ()):
+        self.name = name
+        self.fn = fn
+        self.requires = requires
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.submitted = False
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+
+
+class StageScheduler:
+    """Per-request stage graph; offsets are measured from construction (or `origin`)"""
+
+    def __init__(self, executor: Executor, origin: Optional[float] = None,
+                 observe: Optional[Callable[[str, float], None]] = None):
+        self._executor = executor
+        self._origin = origin if origin is not None else time.perf_counter()
+        self._observe = observe  # called with (stage, seconds) for each stage that ran (not provided)
+        self._lock = threading.Lock()
+        self._stages: Dict[str, _Stage] = {}
+
+    # ------------------------------------------------------------------ graph
+
+    def _get(self, name: str) -> _Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = _Stage(name)
+            self._stages[name] = stage
+        return stage
+
+    def add(self, name: str, fn: Callable[..., Any], requires: Iterable[str] = ()) -> None:
+        """Declare a background stage; it is submitted once all requirements resolve"""
+        with self._lock:
+            stage = self._get(name)
+            if stage.fn is not None or stage.done.is_set():
+                raise ValueError(f"Stage '{name}' already defined")
+            stage.fn = fn
+            stage.requires = tuple(requires)
+            for dep in stage.requires:
+                self._get(dep)
+            ready = self._collect_ready()
+        self._launch(ready)
+
+    def provide(self, name: str, value: Any) -> None:
+        """Resolve a milestone produced elsewhere (first value wins)"""
+        now = time.perf_counter()
+        with self._lock:
+            stage = self._get(name)
+            if stage.done.is_set():
+                return
+            stage.start = stage.start if stage.start is not None else now
+            stage.end = now
+            stage.value = value
+            stage.done.set()
+            ready = self._collect_ready()
+        self._launch(ready)
+
+    def run(self, name: str, fn: Callable[..., Any], requires: Iterable[str] = ()) -> Any:
+        """Run a stage in the calling thread after its requirements, and time it"""
+        args = [self.result(dep) for dep in requires]
+        with self._lock:
+            stage = self._get(name)
+            stage.submitted = True
+        self._execute(stage, fn, args)
+        return self.result(name)
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Time a block of caller code (e.g. a streaming loop) as a stage"""
+        with self._lock:
+            stage = self._get(name)
+            stage.submitted = True
+            stage.start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self._finish(stage, None, e)
+            raise
+        self._finish(stage, None, None)
+
+    def declared(self, name: str) -> bool:
+        """True if the stage was added, is running/ran, or was provided"""
+        with self._lock:
+            stage = self._stages.get(name)
+            return stage is not None and (stage.fn is not None or stage.submitted or stage.done.is_set())
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        if not self.declared(name):
+            raise KeyError(f"Stage '{name}' was never declared")
+        with self._lock:
+            stage = self._stages[name]
+        if not stage.done.wait(timeout):
+            raise TimeoutError(f"Stage '{name}' did not finish within {timeout}s")
+        if stage.error is not None:
+            raise stage.error
+        return stage.value
+
+    def is_done(self, name: str) -> bool:
+        with self._lock:
+            stage = self._stages.get(name)
+        return stage is not None and stage.done.is_set()
+
+    # -------------------------------------------------------------- execution
+
+    def _collect_ready(self) -> List[Tuple[_Stage, List[Any], Optional[BaseException]]]:
+        """Caller holds the lock. Returns stages whose requirements are all resolved."""
+        ready = []
+        for stage in self._stages.values():
+            if stage.fn is None or stage.submitted or stage.done.is_set():
+                continue
+            deps = [self._stages[dep] for dep in stage.requires]
+            if not all(dep.done.is_set() for dep in deps):
+                continue
+            stage.submitted = True
+            failed = next((dep.error for dep in deps if dep.error is not None), None)
+            ready.append((stage, [dep.value for dep in deps], failed))
+        return ready
+
+    def _launch(self, ready: List[Tuple[_Stage, List[Any], Optional[BaseException]]]) -> None:
+        for stage, args, failed in ready:
+            if failed is not None:
+                self._finish(stage, None, failed)
+            else:
+                # Workers run the stage in a copy of this context (request id, log sampling)
+                self._executor.submit(contextvars.copy_context().run, self._execute, stage, stage.fn, args)
+
+    def _execute(self, stage: _Stage, fn: Callable[..., Any], args: List[Any]) -> None:
+        stage.start = time.perf_counter()
+        try:
+            value = fn(*args)
+        except BaseException as e:
+            self._finish(stage, None, e)
+            return
+        self._finish(stage, value, None)
+
+    def _finish(self, stage: _Stage, value: Any, error: Optional[BaseException]) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            ran = stage.start is not None
+            if stage.start is None:
+                stage.start = now
+            stage.end = now
+            stage.value = value
+            stage.error = error
+            stage.done.set()
+            ready = self._collect_ready()
+        if ran and self._observe is not None:
+            try:
+                self._observe(stage.name, now - stage.start)
+            except Exception:
+                pass
+        self._launch(ready)
+
+    # ---------------------------------------------------------------- reports
+
+    def timings(self) -> Dict[str, Dict[str, float]]:
+        """Start/end offsets and duration (seconds) of every stage that ran"""
+        report = {}
+        with self._lock:
+            stages = list(self._stages.values())
+        for stage in sorted(stages, key=lambda s: s.start if s.start is not None else float("inf")):
+            if stage.start is None or stage.end is None:
+                continue
+            report[stage.name] = {
+                "start": round(stage.start - self._origin, 4),
+                "end": round(stage.end - self._origin, 4),
+                "duration": round(stage.end - stage.start, 4),
+            }
+        return report
@@ -0,0 +1,288 @@
+# structured_logging.py
+# Levelled per-subsystem loggers, per-request debug sampling and a queued handler (v5.9.30).
+#
+#   configure_logging()                              # from LOG_* env vars, once at startup
+#   log = get_logger("samm.entity")
+#   log.debug("[EntityAgent] %d results for %s", len(results), query)   # formatted only if emitted
+#   with request_context(request_id):                # Flask before/teardown hooks do this
+#       ...                                          # DEBUG records kept for sampled requests only
+#
+# - Every logger under "samm." has its own level (LOG_LEVELS="samm.entity=DEBUG,samm.llm=WARNING",
+#   default LOG_LEVEL). A record below the level is dropped before any formatting
+# - LOG_DEBUG_SAMPLE_RATE: fraction of requests whose DEBUG records are all kept, whatever the
+#   levels say (a full trace of some requests, not a random subset of lines). The decision is
+#   per request and is carried by a context variable, so stages on worker threads follow it
+#   when they run in the request's context (contextvars.copy_context)
+# - With LOG_QUEUE=true (default) a request thread only puts the record on a bounded queue;
+#   a listener thread formats and writes it, whole lines, in order. A full queue drops the
+#   record and counts it rather than block the request. After fork call restart_after_fork()
+#   (the listener thread does not survive it)
+# - LOG_FORMAT=text (time, level, logger, request id, message) or json (one object per line,
+#   plus any `extra=` fields)
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("samm_request_id", default="-")
+_debug_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("samm_debug_sampled", default=False)
+
+# LogRecord attributes that are not `extra=` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class SampledLogger(logging.Logger):
+    """Logger whose DEBUG records are also enabled for requests sampled for a debug trace"""
+
+    def isEnabledFor(self, level: int) -> bool:
+        if super().isEnabledFor(level):
+            return True
+        return level >= logging.DEBUG and _debug_sampled.get() and not self.manager.disable >= level
+
+
+_logger_class_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A SampledLogger (created on first use) for a subsystem, e.g. "samm.entity" """
+    with _logger_class_lock:
+        existing = logging.Logger.manager.loggerDict.get(name)
+        if isinstance(existing, logging.Logger):
+            return existing
+        previous = logging.getLoggerClass()
+        logging.setLoggerClass(SampledLogger)
+        try:
+            return logging.getLogger(name)
+        finally:
+            logging.setLoggerClass(previous)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+def debug_sampled() -> bool:
+    return _debug_sampled.get()
+
+
+class _RequestFields(logging.Filter):
+    """Stamps the request id on records in the calling thread (before they are queued)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 6), "level": record.levelname, "logger": record.name,
+                 "request_id": getattr(record, "request_id", "-"), "msg": record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts what it queues and drops (never blocks) when the queue is full"""
+
+    def __init__(self, record_queue: queue.Queue, bump: Callable[[str], None]):
+        super().__init__(record_queue)
+        self.bump = bump
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self.bump("records")
+        except queue.Full:
+            self.bump("dropped")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message formatted here only because the record is being emitted; args are dropped so the
+        # listener does not format again and nothing mutable crosses threads
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = logging.Formatter().formatException(record.exc_info) if record.exc_info else record.exc_text
+        record.exc_info = None
+        return record
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel, timeout=5)  # waits for room: the queue may be full at exit
+
+
+class _CurrentStdout:
+    """Writes to whatever sys.stdout is at the time, as print() does (tests redirect it)"""
+
+    def write(self, text: str) -> int:
+        return sys.stdout.write(text)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+
+class LoggingConfig:
+    """What configure_logging() installed; see get_stats()"""
+
+    def __init__(self, level: str = "INFO", levels: Optional[Dict[str, str]] = None, fmt: str = "text",
+                 sample_rate: float = 0.0, queued: bool = True, queue_size: int = 10000, stream=None,
+                 root: str = "samm"):
+        self.level = level.upper()
+        self.levels = {name: value.upper() for name, value in (levels or {}).items()}
+        self.fmt = fmt
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.queued = queued
+        self.queue_size = queue_size
+        self.stream = stream
+        self.root = root
+        self._lock = threading.Lock()
+        self.stats = {"records": 0, "dropped": 0, "requests": 0, "sampled_requests": 0}
+        self._listener: Optional[_Listener] = None
+        self._handler: Optional[logging.Handler] = None
+        self._output: Optional[logging.Handler] = None
+
+    @classmethod
+    def from_env(cls, stream=None) -> "LoggingConfig":
+        """LOG_LEVEL / LOG_LEVELS / LOG_FORMAT / LOG_DEBUG_SAMPLE_RATE / LOG_QUEUE / LOG_QUEUE_SIZE"""
+        levels = {}
+        for item in os.getenv("LOG_LEVELS", "").split(","):
+            if "=" in item:
+                name, value = item.split("=", 1)
+                levels[name.strip()] = value.strip()
+        return cls(level=os.getenv("LOG_LEVEL", "INFO"), levels=levels,
+                   fmt=os.getenv("LOG_FORMAT", "text").lower(),
+                   sample_rate=float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0")),
+                   queued=os.getenv("LOG_QUEUE", "true").lower() == "true",
+                   queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")), stream=stream)
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _formatter(self) -> logging.Formatter:
+        if self.fmt == "json":
+            return JSONFormatter()
+        if self.fmt == "message":  # bare messages, as the old print() output
+            return logging.Formatter("%(message)s")
+        return logging.Formatter("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def install(self) -> "LoggingConfig":
+        root = logging.getLogger(self.root)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.setLevel(self.level)
+        root.propagate = False
+        for name, level in self.levels.items():
+            get_logger(name).setLevel(level)
+
+        self._output = logging.StreamHandler(self.stream or _CurrentStdout())
+        self._output.setFormatter(self._formatter())
+        if self.queued:
+            self._handler = _BoundedQueueHandler(queue.Queue(self.queue_size), self._bump)
+            self._start_listener()
+        else:
+            self._handler = self._output
+            self._output.addFilter(self._count)
+        self._handler.addFilter(_RequestFields())
+        root.addHandler(self._handler)
+        return self
+
+    def _count(self, record: logging.LogRecord) -> bool:
+        self._bump("records")
+        return True
+
+    def _start_listener(self) -> None:
+        self._listener = _Listener(self._handler.queue, self._output)
+        self._listener.start()
+
+    def restart_after_fork(self) -> None:
+        """New queue and listener thread in a forked child (records queued before the fork are the parent's)"""
+        if self.queued and self._handler is not None:
+            self._handler.queue = queue.Queue(self.queue_size)
+            self._start_listener()
+
+    def stop(self) -> None:
+        """Flush what is queued (at exit)"""
+        if self._listener is not None and self._listener._thread is not None:
+            self._listener.stop()
+
+    def sample(self) -> bool:
+        """Draw the debug-sampling decision for a new request"""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        self._bump("requests")
+        if sampled:
+            self._bump("sampled_requests")
+        return sampled
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        return {"level": self.level, "levels": dict(self.levels), "format": self.fmt, "queued": self.queued,
+                "queue_depth": self._handler.queue.qsize() if self.queued and self._handler is not None else 0,
+                "debug_sample_rate": self.sample_rate, **stats}
+
+
+_config: Optional[LoggingConfig] = None
+
+
+def configure_logging(config: Optional[LoggingConfig] = None) -> LoggingConfig:
+    """Install config (default: from the environment) on the "samm" logger tree; replaces an earlier one"""
+    global _config
+    if _config is not None:
+        _config.stop()
+    _config = (config or LoggingConfig.from_env()).install()
+    return _config
+
+
+def logging_config() -> Optional[LoggingConfig]:
+    return _config
+
+
+def restart_after_fork() -> None:
+    if _config is not None:
+        _config.restart_after_fork()
+
+
+@contextmanager
+def request_context(request_id: Optional[str] = None, sampled: Optional[bool] = None) -> Iterator[str]:
+    """Request id and debug-sampling decision for everything logged inside (this thread's context)"""
+    request_id = request_id or new_request_id()
+    if sampled is None:
+        sampled = _config.sample() if _config is not None else False
+    id_token, sampled_token = _request_id.set(request_id), _debug_sampled.set(sampled)
+    try:
+        yield request_id
+    finally:
+        _request_id.reset(id_token)
+        _debug_sampled.reset(sampled_token)
+
+
+def begin_request(request_id: Optional[str] = None, sampled: Optional[bool] = None) -> str:
+    """request_context() for frameworks with before / teardown hooks (end_request() in teardown)"""
+    request_id = request_id or new_request_id()
+    if sampled is None:
+        sampled = _config.sample() if _config is not None else False
+    _request_id.set(request_id)
+    _debug_sampled.set(sampled)
+    return request_id
+
+
+def end_request() -> None:
+    _request_id.set("-")
+    _debug_sampled.set(False)
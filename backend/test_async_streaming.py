@@ -0,0 +1,203 @@
+"""
+Concurrency test for async /api/query/stream serving (v5.9.27)
+
+Serves create_asgi_app() with uvicorn in this process and opens N
+streaming clients (distinct questions, a signed session cookie) against a fake
+Ollama that holds every answer generation until released. With all N streams
+parked on their generation it checks:
+  - every stream reached answer_start and its request is pending at Ollama
+  - the process runs a bounded number of threads (not one per open stream)
+and reports RSS per open stream. After the release every stream must finish
+with the same SSE event sequence as the Flask route, hitl_triggered included
+(the review write goes to an in-memory container).
+
+    python test_async_streaming.py            # 1,000 streams
+    python test_async_streaming.py 200
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+FAKE_ANSWER = ("The Defense Security Cooperation Agency (DSCA) directs the FMS process (C1.3.2.2). "
+               "The Implementing Agency prepares the LOA after the LOR is received (C5.1.2). ") * 2
+
+
+class FakeOllama:
+    """ASGI /api/chat: generation requests (num_predict 1500) wait for release(), others answer at once"""
+
+    def __init__(self):
+        self.hold = False
+        self.pending = 0
+        self.served = 0
+        self.released = asyncio.Event()  # set on the server's loop (call_soon_threadsafe)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if self.hold and json.loads(body)["options"].get("num_predict") == 1500:
+            self.pending += 1
+            await self.released.wait()
+            self.pending -= 1
+        self.served += 1
+        payload = json.dumps({"model": "fake", "message": {"role": "assistant", "content": FAKE_ANSWER},
+                              "done": True}).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+def start_server(asgi_app, port, lifespan="on"):
+    """uvicorn on its own thread and event loop; returns (server, loop)"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, lifespan=lifespan,
+                                           log_level="warning", backlog=4096, timeout_keep_alive=300))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, loop
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_app():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def event_types(body):
+    return [json.loads(line[6:])["type"] for line in body.split("\n") if line.startswith("data: ")]
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def stream_events(client, base, cookie, i, answer_started):
+    """Event types of one stream; notes its index in answer_started once generation is awaited"""
+    # 5 digits: the flight key drops words shorter than 3 characters, so "case 1" and "case 2" would coalesce
+    frames = []
+    async with client.stream("POST", f"{base}/api/query/stream", cookies={"session": cookie},
+                             json={"question": f"What does DSCA do in FMS case {i:05d}?"}) as response:
+        assert response.status_code == 200, response.status_code
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                frames.append(json.loads(line[6:])["type"])
+                if frames[-1] == "answer_start":
+                    answer_started.append(i)
+    return frames
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 4 * n + 512  # client, server, server->Ollama and Ollama sockets per stream
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    assert resource.getrlimit(resource.RLIMIT_NOFILE)[0] >= needed, f"need {needed} file descriptors"
+
+    print("=" * 60)
+    print(f"ASYNC STREAMING TEST - {n} concurrent /api/query/stream clients")
+    print("=" * 60)
+
+    ollama = FakeOllama()
+    ollama_port = free_port()
+    _, ollama_loop = start_server(ollama, ollama_port, lifespan="off")
+    os.environ.update({"OLLAMA_URL": f"http://127.0.0.1:{ollama_port}", "CACHE_ENABLED": "false"})
+
+    report = sys.stdout
+    with open(os.devnull, "w") as quiet, redirect_stdout(quiet):  # the pipeline logs every step
+        samm = load_app()
+        from benchmark_review_queue import InMemoryReviewContainer
+        reviews = InMemoryReviewContainer()
+        samm.reviews_test_container_client = reviews
+
+        client = samm.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = {"userinfo": {"sub": "stream-test", "name": "Stream Test"}}
+        cookie = client.get_cookie(samm.app.config["SESSION_COOKIE_NAME"]).value
+        expected = event_types(client.post("/api/query/stream", json={"question": "What does DSCA do in FMS?"})
+                               .get_data(as_text=True))
+        assert expected[0] == "start" and "answer_token" in expected and "hitl_triggered" in expected, expected
+        print(f"  ✅ Flask route: {len(expected)} frames ({', '.join(dict.fromkeys(expected))})", file=report)
+
+        asgi_app = samm.create_asgi_app()
+        port = free_port()
+        server, _ = start_server(asgi_app, port)
+        base = f"http://127.0.0.1:{port}"
+        threads_before, rss_before = threading.active_count(), rss_mb()
+        reviews_before = len(reviews.by_id)
+        ollama.hold = True
+        results = asyncio.run(drive(n, base, cookie, ollama, ollama_loop, asgi_app,
+                                    threads_before, rss_before, report))
+        server.should_exit = True
+
+    for frames in results:
+        assert frames == expected, (frames, expected)
+    print("  ✅ every stream sent the Flask route's event sequence")
+    assert len(reviews.by_id) - reviews_before == n
+    print(f"  ✅ {n} review items written from the event loop")
+    stats = asgi_app.get_stats()
+    assert stats["streams_completed"] == n and stats["client_disconnects"] == 0, stats
+    print("✅ PASSED")
+
+
+async def drive(n, base, cookie, ollama, ollama_loop, asgi_app, threads_before, rss_before, report):
+    import httpx
+    answer_started = []
+    limits = httpx.Limits(max_connections=n + 10, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(900.0)) as client:
+        started = time.time()
+        tasks = [asyncio.ensure_future(stream_events(client, base, cookie, i, answer_started)) for i in range(n)]
+        while len(answer_started) < n or ollama.pending < n:
+            await asyncio.sleep(0.2)
+            failed = [t for t in tasks if t.done()]
+            assert not failed, failed[0].result()
+            assert time.time() - started < 900, (len(answer_started), ollama.pending)
+        stats = asgi_app.get_stats()
+        threads, rss = threading.active_count(), rss_mb()
+        print(f"  ✅ {n} streams open and waiting on generation after {time.time() - started:.1f}s "
+              f"({ollama.pending} pending at Ollama, {stats['open_streams']} open)", file=report)
+        assert stats["open_streams"] == n
+        print(f"  ✅ threads: {threads} with {n} open streams ({threads_before} before)", file=report)
+        assert threads - threads_before < 64, (threads_before, threads)
+        print(f"  ✅ RSS: +{rss - rss_before:.1f} MB for {n} streams "
+              f"({(rss - rss_before) * 1024 / n:.0f} KB per stream, client side included)", file=report)
+
+        ollama_loop.call_soon_threadsafe(ollama.released.set)
+        released = time.time()
+        results = await asyncio.gather(*tasks)
+        print(f"  ✅ all {n} streams completed {time.time() - released:.1f}s after the release", file=report)
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(main())
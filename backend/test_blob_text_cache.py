@@ -0,0 +1,187 @@
+"""
+Tests for the attachment text cache (v5.9.21)
+
+Runs BlobTextCache against a blob container and checks what is downloaded:
+properties-only hits, ranged prefix reads, etag invalidation, binary types
+skipped without a download, PDF extraction, the disk tier and concurrent fetch.
+
+By default the container is LocalBlobContainer (files in a temp directory).
+Against Azurite (docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite):
+
+    python test_blob_text_cache.py
+    python test_blob_text_cache.py --azurite                     # default Azurite account
+    python test_blob_text_cache.py --azurite "<connection string>"
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from blob_text_cache import BlobTextCache, LocalBlobContainer
+from pdf_text_extractor import PDFTextExtractor
+
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRz6IqsVFY7S3eJg5kRS2vmDCMnr1Y1RpHnrDnbE4w==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+BUDGET = 5000
+
+
+class SlowContainer:
+    """Adds a fixed delay to every download, like a remote store"""
+
+    def __init__(self, inner, delay: float):
+        self.inner = inner
+        self.delay = delay
+        self.container_name = inner.container_name
+
+    def get_blob_client(self, blob):
+        inner_client = self.inner.get_blob_client(blob)
+        delay = self.delay
+
+        class SlowBlobClient:
+            def get_blob_properties(self):
+                return inner_client.get_blob_properties()
+
+            def download_blob(self, *args, **kwargs):
+                time.sleep(delay)
+                return inner_client.download_blob(*args, **kwargs)
+
+        return SlowBlobClient()
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for page_no in range(pages):
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800),
+                                      f"LOA page {page_no + 1}. " + "Line item note. " * 120, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def upload(container, name: str, data: bytes):
+    container.get_blob_client(name).upload_blob(data, overwrite=True)
+
+
+def downloads(cache: BlobTextCache) -> int:
+    stats = cache.get_stats()
+    return stats["full_downloads"] + stats["ranged_downloads"]
+
+
+def run_checks(container, disk_path: str):
+    pdf_extractor = PDFTextExtractor(workers=0)
+    cache = BlobTextCache(pdf_extractor=pdf_extractor, disk_path=disk_path)
+    prefix = f"test-{uuid.uuid4().hex[:8]}/"
+
+    # 1. Large text blob: only a prefix is read, then served from cache
+    body = ("SAMM C5.4 case development notes. " * 20000).encode()
+    upload(container, prefix + "notes.txt", body)
+    text = cache.get_text(container, prefix + "notes.txt", max_chars=BUDGET)
+    stats = cache.get_stats()
+    assert len(text) >= BUDGET and body.decode().startswith(text), "prefix text mismatch"
+    assert stats["ranged_downloads"] == 1 and stats["bytes_downloaded"] <= BUDGET * 4, stats
+    before = downloads(cache)
+    assert cache.get_text(container, prefix + "notes.txt", max_chars=BUDGET) == text
+    assert downloads(cache) == before, "cache hit downloaded the blob"
+    print(f"  ✅ ranged read: {stats['bytes_downloaded']:,} of {len(body):,} bytes; repeat served from cache")
+
+    # 2. A bigger budget than the cached prefix reads again; full text is complete
+    full = cache.get_text(container, prefix + "notes.txt")
+    assert full == body.decode() and downloads(cache) == before + 1
+    # a prefix covers the budget it was read for, even if its text came out shorter
+    short = {"kind": "pdf", "text": "image-only pages", "complete": False, "budget": BUDGET}
+    assert BlobTextCache._covers(short, BUDGET) and not BlobTextCache._covers(short, BUDGET + 1)
+    print("  ✅ larger budget re-reads, full text cached")
+
+    # 3. Overwrite -> new etag -> new text
+    time.sleep(0.01)
+    upload(container, prefix + "notes.txt", b"Revised notes")
+    assert cache.get_text(container, prefix + "notes.txt", max_chars=BUDGET) == "Revised notes"
+    print("  ✅ overwritten blob (new etag) is re-read")
+
+    # 4. Multi-byte character cut by the range end is not an error
+    upload(container, prefix + "unicode.txt", ("é" * (BUDGET * 3)).encode())
+    text = cache.get_text(container, prefix + "unicode.txt", max_chars=BUDGET)
+    assert len(text) >= BUDGET and set(text) == {"é"}, "multi-byte prefix not decoded"
+    print("  ✅ multi-byte prefix decoded")
+
+    # 5. Binary types answered from properties alone
+    before = downloads(cache)
+    upload(container, prefix + "SR-P-NAV_financials.xlsx", b"PK\x03\x04" + os.urandom(4096))
+    assert cache.get_text(container, prefix + "SR-P-NAV_financials.xlsx", max_chars=BUDGET).startswith("[Binary file:")
+    assert downloads(cache) == before, "binary blob was downloaded"
+    upload(container, prefix + "unknown.bin", b"\xff\xfe\x00" + os.urandom(2048))
+    assert cache.get_text(container, prefix + "unknown.bin", max_chars=BUDGET).startswith("[Binary file:")
+    print("  ✅ binary files: no download for known types, placeholder for undecodable ones")
+
+    # 6. PDF text extracted up to the budget
+    upload(container, prefix + "LOA.pdf", make_pdf(40))
+    text = cache.get_text(container, prefix + "LOA.pdf", max_chars=BUDGET)
+    assert text.startswith("LOA page 1") and len(text) == BUDGET, text[:80]
+    assert pdf_extractor.get_stats()["early_stops"] == 1
+    print(f"  ✅ PDF: {pdf_extractor.get_stats()['pages_extracted']} of 40 pages extracted for {BUDGET} chars")
+
+    # 7. Missing blob
+    assert cache.get_text(container, prefix + "missing.txt", max_chars=BUDGET) is None
+    print("  ✅ missing blob -> None")
+
+    # 8. Disk tier: a new process (new cache object) reads nothing
+    if disk_path:
+        fresh = BlobTextCache(pdf_extractor=pdf_extractor, disk_path=disk_path)
+        assert fresh.get_text(container, prefix + "LOA.pdf", max_chars=BUDGET) is not None
+        assert downloads(fresh) == 0, fresh.get_stats()
+        print("  ✅ disk tier: restart served without downloading")
+
+    # 9. Concurrent fetch of several attachments
+    names = [f"{prefix}attachment_{n}.txt" for n in range(6)]
+    for name in names:
+        upload(container, name, f"Attachment {name}".encode())
+    slow = SlowContainer(container, delay=0.2)
+    start = time.perf_counter()
+    texts = BlobTextCache(disk_path=None).fetch_many([(slow, name) for name in names], max_chars=BUDGET)
+    elapsed = time.perf_counter() - start
+    assert texts == [f"Attachment {name}" for name in names]
+    assert elapsed < 0.2 * len(names) / 2, f"fetch_many took {elapsed:.2f}s"
+    print(f"  ✅ fetch_many: {len(names)} blobs at 200ms each in {elapsed:.2f}s")
+
+    return cache.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--azurite", nargs="?", const=AZURITE_CONNECTION_STRING, metavar="CONNECTION_STRING",
+                        help="run against Azurite / Azure instead of the filesystem stand-in")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.azurite:
+            from azure.storage.blob import BlobServiceClient
+            service = BlobServiceClient.from_connection_string(args.azurite)
+            container = service.get_container_client(f"blobtextcache{uuid.uuid4().hex[:8]}")
+            container.create_container()
+            backend = "Azurite"
+        else:
+            container = LocalBlobContainer(tmp, "chat-docs")
+            backend = "filesystem stand-in"
+
+        print("=" * 60)
+        print(f"BLOB TEXT CACHE TEST - {backend}")
+        print("=" * 60)
+        try:
+            stats = run_checks(container, os.path.join(tmp, "blob_text.sqlite3"))
+        finally:
+            if args.azurite:
+                container.delete_container()
+
+    print(f"\nCache stats: { {k: v for k, v in stats.items() if k != 'tiers'} }")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
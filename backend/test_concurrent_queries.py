@@ -0,0 +1,161 @@
+"""
+Concurrency test for the per-request PipelineContext (v5.9.16)
+
+Fires N different questions in parallel at POST /api/query (the Flask handler, through
+the orchestrator's process_query(), one test client per thread) and checks that every
+answer belongs to its own question: the prompt the LLM saw holds only that question's
+retrieved sections, the answer cites only its sections, and the response metadata
+carries that question's own retrieval count.
+
+Vector DB / Cosmos / 2-hop / Ollama are replaced by deterministic in-process fakes with
+a small random delay so requests interleave; each question's retrieval returns its own
+number of chunks. The answer cache is off, so every request runs the pipeline. No server
+is needed:
+
+    python test_concurrent_queries.py            # 16 parallel queries
+    python test_concurrent_queries.py 64 5       # 64 parallel queries, 5 rounds
+"""
+
+import contextlib
+import importlib.util
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+TAG = re.compile(r"R\d+Q\d+")
+
+
+def load_app():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    os.environ.update(CACHE_ENABLED="false", SMART_SEARCH_ENABLED="false", LOG_LEVEL="WARNING",
+                      OLLAMA_URL="http://127.0.0.1:9")
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        spec.loader.exec_module(app_module)
+    return app_module
+
+
+def chunk_count(tag):
+    """Each question retrieves its own number of chunks (1-4)"""
+    return int(tag.split("Q")[1]) % 4 + 1
+
+
+def install_fakes(app_module):
+    agent = app_module.orchestrator.entity_agent
+    seen_two_hop_queries = {}
+    lock = threading.Lock()
+
+    def fake_vector(query, data_versions=None):
+        tag = TAG.search(query).group()
+        time.sleep(random.uniform(0.0, 0.02))
+        return [
+            {
+                "content": f"Section text for {tag} chunk {i}",
+                "metadata": {"section_number": f"C{tag}.{i}"},
+                "similarity": 0.9 - i * 0.1,
+            }
+            for i in range(chunk_count(tag))
+        ]
+
+    def fake_cosmos(query, entities):
+        time.sleep(random.uniform(0.0, 0.02))
+        return []
+
+    def fake_llm(prompt, system_message="", temperature=0.1):
+        """Names every question tag in the prompt and counts the retrieved sections it was given"""
+        time.sleep(random.uniform(0.0, 0.02))
+        seen = system_message + "\n" + prompt
+        tags = sorted(set(TAG.findall(seen)))
+        sections = len(set(re.findall(r"Section text for R\d+Q\d+ chunk \d+", seen)))
+        return f"Answer about {' '.join(tags)} from {sections} retrieved sections of the SAMM."
+
+    class FakePathFinder:
+        def get_context_for_query(self, entities, query, intent=None):
+            time.sleep(random.uniform(0.0, 0.02))
+            with lock:
+                seen_two_hop_queries[query] = seen_two_hop_queries.get(query, 0) + 1
+            return {"paths": [], "authority_chains": {}, "relationship_count": 0, "query": query}
+
+    agent._safe_query_vector = fake_vector
+    agent._safe_query_cosmos = fake_cosmos
+    app_module.call_ollama_enhanced = fake_llm
+    app_module.TWO_HOP_PATH_FINDER = FakePathFinder()
+    app_module.path_finder_cache.clear()
+    return seen_two_hop_queries
+
+
+def run_one(app_module, tag):
+    """One user's POST /api/query"""
+    question = f"What is the process for case {tag}"
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = {"userinfo": {"sub": f"user-{tag}", "name": f"User {tag}"}}
+    response = client.post("/api/query", json={"question": question})
+    return tag, question, response.status_code, response.get_json()
+
+
+def check(tag, status, body):
+    if status != 200:
+        return [f"HTTP {status}: {body}"]
+    errors = []
+    answer = body["response"]["answer"]
+    expected = f"Answer about {tag} from {chunk_count(tag)} retrieved sections"
+    if not answer.startswith(expected):
+        errors.append(f"answer {answer[:80]!r}")
+    foreign = set(re.findall(r"C(R\d+Q\d+)\.\d+", answer)) - {tag}
+    if foreign:
+        errors.append(f"cites sections of {sorted(foreign)}")
+    if body["metadata"].get("total_database_results") != chunk_count(tag):
+        errors.append(f"metadata total_database_results {body['metadata'].get('total_database_results')}")
+    if body.get("cached") or body.get("coalesced"):
+        errors.append("answer was not computed for this request")
+    return errors
+
+
+def test_concurrent_queries(workers=16, rounds=3):
+    app_module = load_app()
+    seen_two_hop_queries = install_fakes(app_module)
+
+    print("=" * 60)
+    print(f"CONCURRENCY TEST - {workers} parallel /api/query requests x {rounds} rounds")
+    print("=" * 60)
+
+    failures = 0
+    questions = set()
+    start = time.time()
+    for round_no in range(1, rounds + 1):
+        tags = [f"R{round_no}Q{i}" for i in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            outcomes = list(pool.map(lambda t: run_one(app_module, t), tags))
+        for tag, question, status, body in outcomes:
+            questions.add(question)
+            errors = check(tag, status, body)
+            if errors:
+                failures += 1
+                print(f"  ❌ {tag}: {errors[:3]}")
+        print(f"Round {round_no}: {len(outcomes)} answers checked")
+
+    elapsed = time.time() - start
+    print(f"\nTime taken: {elapsed:.2f} seconds")
+    print(f"2-hop lookups: {sum(seen_two_hop_queries.values())} for {len(seen_two_hop_queries)} distinct queries")
+    assert set(seen_two_hop_queries) <= questions, "2-hop lookup for a question nobody asked"
+    if failures:
+        print(f"❌ FAILED: {failures} answers carried another request's state")
+    else:
+        print("✅ PASSED: every answer was built from its own question's retrieval")
+    assert failures == 0
+
+
+if __name__ == "__main__":
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    n_rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    test_concurrent_queries(n_workers, n_rounds)
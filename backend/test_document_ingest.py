@@ -0,0 +1,162 @@
+"""
+Tests for upload-time document ingestion (v5.9.22)
+
+Runs DocumentIngestService with simple in-process extractors (keyword entity
+matcher, bag-of-words embedder) and checks the job lifecycle, the stored
+artefacts, that a second service on the same store (another worker) sees them,
+and that select_passages() returns the chunks relevant to a question.
+No server, Ollama or embedding model is needed:
+
+    python test_document_ingest.py
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from document_ingest import DocumentExtractors, DocumentIngestService, chunk_text, entities_in, select_passages
+from pdf_text_extractor import PDFTextExtractor
+
+KEYWORDS = ["letter of request", "lor", "dsca", "implementing agency", "congressional notification", "loa"]
+
+SECTIONS = [
+    "C5.1 Letter of Request. The purchaser submits a Letter of Request (LOR) through the Security "
+    "Cooperation Organization. The LOR is screened by the Implementing Agency for completeness.",
+    "C5.2 Pricing. Estimated costs are developed by the Implementing Agency for each line item of the "
+    "LOA using current pricing data and surcharges.",
+    "C5.5 Congressional Notification. DSCA prepares the congressional notification for sales above the "
+    "statutory thresholds before the LOA may be offered.",
+]
+
+
+def bag_of_words(texts):
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 128
+        for word in text.lower().replace(".", " ").replace(",", " ").split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 128] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def keyword_entities(text, file_name):
+    lower = text.lower()
+    return [k for k in KEYWORDS if k in lower]
+
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for page_no in range(pages):
+        body = f"Page {page_no + 1}. " + " ".join(SECTIONS[page_no % len(SECTIONS)] for _ in range(6))
+        doc.new_page().insert_textbox(fitz.Rect(50, 50, 550, 800), body, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_service(store_path):
+    extractors = DocumentExtractors(
+        pdf_text=lambda data, max_chars: PDFTextExtractor(workers=0).extract_text(data, max_chars=max_chars),
+        entities=keyword_entities,
+        relationships=lambda text, file_name: [],
+        financial=lambda data, file_name: {"financial_records": [{"rsn": "001", "pdli": "P1", "dir_rsrv_amt": 10.0}],
+                                           "summary": {"total_pdlis": 1, "unique_rsns": 1, "total_directed": 10.0}},
+        embed=bag_of_words,
+    )
+    return DocumentIngestService(extractors=extractors, workers=2, chunk_chars=400, overlap_chars=50,
+                                 store_path=store_path)
+
+
+def wait_for(service, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = service.get_job(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_document_ingest():
+    print("=" * 60)
+    print("DOCUMENT INGEST TEST")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = os.path.join(tmp, "document_artefacts.sqlite3")
+        service = make_service(store_path)
+
+        # 1. Job lifecycle + on_complete
+        completed = threading.Event()
+        results = {}
+
+        def on_complete(job, artefacts):
+            results["job"], results["artefacts"] = job, artefacts
+            completed.set()
+
+        job = service.submit("case-docs", "SR-P-NAV/1_LOA.pdf", make_pdf(30), "LOA.pdf", user_id="u1",
+                             document_id="doc-1", on_complete=on_complete)
+        assert job["status"] in ("queued", "running", "done"), job
+        job = wait_for(service, job["jobId"])
+        assert job["status"] == "done" and completed.wait(5), job
+        assert results["job"]["status"] == "done" and results["artefacts"]["kind"] == "pdf"
+        summary = job["summary"]
+        assert summary["textChars"] > 10000 and summary["indexedChunks"] > 10, summary
+        assert summary["entities"] == len(KEYWORDS), summary
+        print(f"  ✅ PDF job done: {summary}")
+
+        # 2. Workbook -> financial tables + summary text
+        job = wait_for(service, service.submit("case-docs", "SR-P-NAV/2_fin.xlsx", b"PK\x03\x04", "SR-P-NAV_fin.xlsx")["jobId"])
+        artefacts = service.get_artefacts("case-docs", "SR-P-NAV/2_fin.xlsx")
+        assert artefacts["financial"]["records"][0]["rsn"] == "001" and "1 PDLI records" in artefacts["text"]
+        print(f"  ✅ workbook job done: {job['summary']}")
+
+        # 3. A failing extractor marks the job failed (and stores nothing)
+        def broken(data, max_chars):
+            raise ValueError("corrupt PDF")
+        service.extractors.pdf_text, pdf_text = broken, service.extractors.pdf_text
+        job = wait_for(service, service.submit("chat-docs", "u1/bad.pdf", b"%PDF-1.4 broken", "bad.pdf")["jobId"])
+        service.extractors.pdf_text = pdf_text
+        assert job["status"] == "failed" and "corrupt PDF" in job["error"], job
+        assert service.get_artefacts("chat-docs", "u1/bad.pdf") is None
+        print("  ✅ failed job reported with its error")
+
+        # 4. Another worker (same store file) sees jobs and artefacts
+        other_worker = make_service(store_path)
+        assert other_worker.get_job(job["jobId"])["status"] == "failed"
+        artefacts = other_worker.get_artefacts("case-docs", "SR-P-NAV/1_LOA.pdf")
+        assert artefacts is not None and artefacts["documentId"] == "doc-1"
+        print("  ✅ artefacts and job status visible to another worker")
+
+        # 5. Query-time passages follow the question; entities follow the passages
+        question = "When does DSCA prepare the congressional notification?"
+        content = select_passages(artefacts, bag_of_words([question])[0], max_chars=1200)
+        assert "congressional notification" in content.lower(), content[:200]
+        assert content.count("C5.5") >= content.count("C5.2"), content[:400]
+        found = entities_in(artefacts, content)
+        assert set(found) == set(keyword_entities(content, "LOA.pdf")), (found, keyword_entities(content, "LOA.pdf"))
+        prefix = select_passages(artefacts, None, max_chars=1200)
+        assert prefix == artefacts["text"][:1200]
+        print(f"  ✅ passages for the question ({len(content)} chars), entities {found}")
+
+        # 6. Forget on delete
+        assert service.forget("case-docs", "SR-P-NAV/1_LOA.pdf")
+        assert service.get_artefacts("case-docs", "SR-P-NAV/1_LOA.pdf") is None
+
+    # chunking covers the whole text with overlap
+    text = " ".join(SECTIONS * 10)
+    chunks = chunk_text(text, 300, 50)
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+    assert all(b["start"] < a["end"] for a, b in zip(chunks, chunks[1:]))
+    print("  ✅ chunks cover the text with overlap")
+
+    print(f"\nIngest stats: { {k: v for k, v in service.get_stats().items() if k != 'store'} }")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_document_ingest()
+    sys.exit(0)
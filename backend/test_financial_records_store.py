@@ -0,0 +1,191 @@
+"""
+Tests for the financial records store (v5.9.23)
+
+Seeds a case with generated RSN/PDLI workbook records through SQLiteFinancialStore
+and checks that the materialised aggregates equal the totals the old endpoints
+computed by looping over every record, that adding / replacing / deleting a
+document keeps them exact, and that paged, filtered row reads return every
+matching row once. No Cosmos account is needed:
+
+    python test_financial_records_store.py
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from financial_records_store import AMOUNT_FIELDS, SQLiteFinancialStore
+
+CASE_ID = "case-uuid-1"
+
+
+def make_records(count: int, seed: int, rsns: int = 40):
+    rng = random.Random(seed)
+    records = []
+    for n in range(count):
+        rsn = f"{rng.randrange(rsns):03d}"
+        record = {
+            "rsn_identifier": rsn,
+            "pdli_pdli": f"P{rsn}",
+            "pdli_name": rng.choice(["F-16 Parts", "Training", "Radar Spares", "Munitions"]),
+            "line_nbr": str(n),
+        }
+        for field in AMOUNT_FIELDS:
+            amount = round(rng.uniform(0, 250000), 2)
+            record[field] = f"${amount:,.2f}" if n % 3 == 0 else amount
+        records.append(record)
+    return records
+
+
+def legacy_summary(documents):
+    """The totals /financial-data and /financial-summary computed before v5.9.23"""
+    rsn_aggregation = {}
+    for records in documents.values():
+        for record in records:
+            rsn = record.get("rsn_identifier", "Unknown")
+            if rsn not in rsn_aggregation:
+                rsn_aggregation[rsn] = {"rsn_identifier": rsn, "pdli_pdli": record.get("pdli_pdli", "N/A"),
+                                        "pdli_name": record.get("pdli_name", ""), "record_count": 0,
+                                        **{field: 0 for field in AMOUNT_FIELDS}}
+            for field in AMOUNT_FIELDS:
+                value = record.get(field, 0)
+                if value:
+                    rsn_aggregation[rsn][field] += float(str(value).replace('$', '').replace(',', ''))
+            rsn_aggregation[rsn]["record_count"] += 1
+    totals = {field: sum(item[field] for item in rsn_aggregation.values()) for field in AMOUNT_FIELDS}
+    return totals, rsn_aggregation
+
+
+def assert_matches_legacy(store, documents):
+    summary = store.get_summary(CASE_ID)
+    totals, rsn_aggregation = legacy_summary(documents)
+    for field in AMOUNT_FIELDS:
+        assert abs(summary["totals"][field] - totals[field]) < 0.01, (field, summary["totals"][field], totals[field])
+    assert summary["recordCount"] == sum(len(records) for records in documents.values())
+    assert summary["documentCount"] == len(documents)
+    assert {item["rsn_identifier"] for item in summary["rsnSummary"]} == set(rsn_aggregation)
+    for item in summary["rsnSummary"]:
+        expected = rsn_aggregation[item["rsn_identifier"]]
+        assert item["record_count"] == expected["record_count"], item
+        for field in AMOUNT_FIELDS:
+            assert abs(item[field] - expected[field]) < 0.01, (item, expected)
+    amounts = [item["oa_rec_amt"] for item in summary["rsnSummary"]]
+    assert amounts == sorted(amounts, reverse=True)
+    return summary
+
+
+def read_all(store, page_size, **filters):
+    rows, token, pages = [], None, 0
+    while True:
+        page = store.query_records(CASE_ID, page_size=page_size, continuation=token, **filters)
+        rows.extend(page["records"])
+        pages += 1
+        token = page["continuationToken"]
+        if not token:
+            return rows, pages
+
+
+def test_financial_records_store():
+    print("=" * 60)
+    print("FINANCIAL RECORDS STORE TEST")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "financial_records.sqlite3")
+        store = SQLiteFinancialStore(path)
+        assert store.get_summary(CASE_ID) is None
+
+        # 1. Incremental totals equal the old full recomputation
+        documents = {f"doc-{n}": make_records(1500 + 250 * n, seed=n) for n in range(3)}
+        for n, (doc_id, records) in enumerate(documents.items()):
+            store.add_document(CASE_ID, doc_id, records, file_name=f"SR-P-NAV_{n}.xlsx",
+                               uploaded_at=f"2024-01-1{n}T10:00:00Z")
+            assert_matches_legacy(store, dict(list(documents.items())[:n + 1]))
+        summary = assert_matches_legacy(store, documents)
+        print(f"  ✅ {summary['recordCount']} records in {summary['documentCount']} documents: "
+              f"totals and {len(summary['rsnSummary'])} RSN aggregates match the full recomputation")
+
+        # 2. Re-adding a document replaces it; deleting subtracts it
+        store.add_document(CASE_ID, "doc-1", documents["doc-1"], file_name="SR-P-NAV_1.xlsx",
+                           uploaded_at="2024-01-11T10:00:00Z")
+        documents["doc-1"] = documents.pop("doc-1")  # its rows are now the newest
+        assert_matches_legacy(store, documents)
+        assert store.remove_document(CASE_ID, "doc-0") == len(documents.pop("doc-0"))
+        assert store.remove_document(CASE_ID, "doc-0") == 0
+        assert_matches_legacy(store, documents)
+        print("  ✅ re-upload does not double count, delete subtracts exactly")
+
+        # 3. Pages cover every row once, in upload order
+        all_rows = [record for records in documents.values() for record in records]
+        rows, pages = read_all(store, page_size=700)
+        assert [r["line_nbr"] for r in rows] == [r["line_nbr"] for r in all_rows] and len(rows) == len(all_rows)
+        assert rows[0]["documentId"] == "doc-2" and rows[-1]["sourceDocument"] == "SR-P-NAV_1.xlsx"
+        print(f"  ✅ {len(rows)} rows in {pages} pages of 700")
+
+        # 4. Filters
+        for filters, predicate in (
+            ({"rsn": "007"}, lambda r: r["rsn_identifier"] == "007"),
+            ({"pdli": "P012", "document_id": "doc-2"}, lambda r: r["pdli_pdli"] == "P012"),
+            ({"search": "radar"}, lambda r: "radar" in r["pdli_name"].lower()),
+        ):
+            expected = [r for doc_id, records in documents.items() for r in records
+                        if predicate(r) and filters.get("document_id") in (None, doc_id)]
+            rows, _ = read_all(store, page_size=50, **filters)
+            assert [r["line_nbr"] for r in rows] == [r["line_nbr"] for r in expected], filters
+        print("  ✅ rsn / pdli / document_id / search filters")
+
+        # 5. Parser-shaped records (rsn / pdli / pdli_desc) are grouped the same way
+        store.add_document("case-uuid-2", "doc-x", [
+            {"rsn": "001", "pdli": "P1", "pdli_desc": "Spares", "dir_rsrv_amt": 10.0, "net_commit_amt": 4.0},
+            {"rsn": "001", "pdli": "P1", "pdli_desc": "Spares", "dir_rsrv_amt": 5.5, "net_commit_amt": 1.0},
+        ])
+        rsn = store.get_summary("case-uuid-2")["rsnSummary"][0]
+        assert (rsn["rsn_identifier"], rsn["pdli_name"], rsn["dir_rsrv_amt"], rsn["record_count"]) == \
+            ("001", "Spares", 15.5, 2), rsn
+        assert store.get_summary(CASE_ID)["recordCount"] == len(all_rows), "cases are not isolated"
+        print("  ✅ streaming-parser records aggregated by rsn / pdli")
+
+        # 6. Another worker on the same file; bad continuation tokens rejected
+        other_worker = SQLiteFinancialStore(path)
+        assert other_worker.get_summary(CASE_ID) == store.get_summary(CASE_ID)
+        try:
+            store.query_records(CASE_ID, continuation="not-a-token")
+            raise AssertionError("invalid continuation token accepted")
+        except ValueError:
+            pass
+        store.ensure_case("case-empty")
+        assert store.get_summary("case-empty")["recordCount"] == 0
+        print("  ✅ aggregates visible to another worker; invalid token -> ValueError")
+
+        # 7. Migration flag: a case first seen through a new upload is not yet migrated
+        store.add_document("case-legacy", "new-upload", make_records(10, seed=50))
+        assert store.get_summary("case-legacy")["migrated"] is False
+        store.add_document("case-legacy", "embedded", make_records(20, seed=51))
+        store.ensure_case("case-legacy")
+        summary = store.get_summary("case-legacy")
+        assert summary["migrated"] and summary["recordCount"] == 30 and summary["documentCount"] == 2, summary
+        assert store.get_summary("case-empty")["migrated"]
+        print("  ✅ migrated flag set only by ensure_case(), after the copy; totals keep both documents")
+
+        # 8. Summary cost does not grow with the record count
+        big = {f"big-{n}": make_records(10000, seed=100 + n) for n in range(5)}
+        for doc_id, records in big.items():
+            store.add_document("case-big", doc_id, records)
+        start = time.perf_counter()
+        for _ in range(20):
+            summary = store.get_summary("case-big")
+        summary_ms = (time.perf_counter() - start) * 1000 / 20
+        start = time.perf_counter()
+        legacy_summary(big)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        assert summary["recordCount"] == 50000
+        print(f"  ✅ 50,000 records: summary {summary_ms:.2f}ms vs {legacy_ms:.1f}ms recomputed per request")
+
+        print(f"\nStore stats: {store.get_stats()}")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_financial_records_store()
+    sys.exit(0)
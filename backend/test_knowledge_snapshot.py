@@ -0,0 +1,146 @@
+"""
+Tests for the knowledge structure snapshot (v5.9.29)
+
+KnowledgeSnapshot on its own (temporary sources): a first start builds and writes
+the snapshot, the next one loads it without building; changing a source or the
+version rebuilds; a truncated or foreign file is rebuilt, never trusted; shared
+objects inside a component stay shared. Then the app's structures: states loaded
+from the snapshot give the same 2-hop answers as freshly built ones, with the
+load vs build time reported:
+
+    python test_knowledge_snapshot.py
+"""
+
+import contextlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+from knowledge_snapshot import KnowledgeSnapshot
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+
+
+def counting_builder(source_path):
+    calls = []
+
+    def build():
+        calls.append(1)
+        with open(source_path) as f:
+            words = f.read().split()
+        index = {word: {"word": word, "length": len(word)} for word in words}
+        by_length = {n: [v for v in index.values() if v["length"] == n] for n in (3, 5)}
+        return {"graph": {"index": index, "by_length": by_length}, "words": sorted(index)}
+
+    return build, calls
+
+
+def test_snapshot_lifecycle():
+    print("=" * 60)
+    print("KNOWLEDGE SNAPSHOT TEST")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "graph.txt")
+        with open(source, "w") as f:
+            f.write("dsca dfas loa lor fms case")
+        path = os.path.join(tmp, "snap", "knowledge.bin")
+        build, calls = counting_builder(source)
+
+        # 1. First start builds and writes; the next start loads without building
+        first = KnowledgeSnapshot(path, [source]).load_or_build(build)
+        second_snapshot = KnowledgeSnapshot(path, [source])
+        second = second_snapshot.load_or_build(build)
+        assert len(calls) == 1 and os.path.exists(path)
+        assert second == first
+        stats = second_snapshot.get_stats()
+        assert stats["source"] == "snapshot" and stats["loads"] == 1 and stats["builds"] == 0, stats
+        assert stats["build_seconds"] is not None and stats["load_seconds"] is not None
+        print("  ✅ built and written once, then loaded (build time kept in the header)")
+
+        # 2. Objects shared inside a component stay shared after the round trip
+        graph = second["graph"]
+        assert graph["by_length"][3][0] is graph["index"][graph["by_length"][3][0]["word"]]
+        print("  ✅ shared references survive")
+
+        # 3. A changed source or version is a different key: rebuilt and rewritten
+        with open(source, "a") as f:
+            f.write(" itar")
+        changed = KnowledgeSnapshot(path, [source])
+        assert "itar" in changed.load_or_build(build)["words"] and len(calls) == 2
+        assert changed.get_stats()["source"] == "built" and changed.get_stats()["stale"] == 1
+        KnowledgeSnapshot(path, [source], version=2).load_or_build(build)
+        assert len(calls) == 3
+        KnowledgeSnapshot(path, [source], version=2).load_or_build(build)
+        assert len(calls) == 3
+        print("  ✅ source edit and version bump rebuild; unchanged sources do not")
+
+        # 4. Damaged or foreign files are rebuilt
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+        damaged = KnowledgeSnapshot(path, [source], version=2)
+        damaged.load_or_build(build)
+        assert len(calls) == 4 and damaged.get_stats()["errors"] == 1
+        with open(path, "wb") as f:
+            f.write(b"not a snapshot at all")
+        KnowledgeSnapshot(path, [source], version=2).load_or_build(build)
+        assert len(calls) == 5
+        KnowledgeSnapshot(path, [source], version=2).load_or_build(build)
+        assert len(calls) == 5
+        print("  ✅ truncated and foreign files rebuilt and replaced")
+
+        # 5. A missing source hashes as "missing"; an empty path disables the snapshot
+        missing = KnowledgeSnapshot(path, [os.path.join(tmp, "absent.json")])
+        assert missing.key()["sha256:absent.json"] == "missing"
+        disabled = KnowledgeSnapshot("", [source])
+        disabled.load_or_build(build)
+        disabled.load_or_build(build)
+        assert len(calls) == 7 and not disabled.get_stats()["enabled"]
+        print("  ✅ missing source keyed as missing; KNOWLEDGE_SNAPSHOT_PATH='' always builds")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def test_app_structures():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["KNOWLEDGE_SNAPSHOT_PATH"] = os.path.join(tmp, "knowledge.bin")
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            samm = load_app()
+            start = time.perf_counter()
+            built = samm.build_knowledge_states()
+            build_seconds = time.perf_counter() - start
+            samm.KNOWLEDGE_SNAPSHOT.write(built, build_seconds)
+            start = time.perf_counter()
+            loaded = samm.KNOWLEDGE_SNAPSHOT.load()
+            load_seconds = time.perf_counter() - start
+        assert loaded is not None and set(loaded) == {"json_kg", "two_hop", "ttl_kg"}
+
+        fresh = samm.restore_state(samm.TwoHopPathFinder, {**built["two_hop"], "json_kg": None, "knowledge_graph": None})
+        restored = samm.restore_state(samm.TwoHopPathFinder, {**loaded["two_hop"], "json_kg": None, "knowledge_graph": None})
+        for entities, query in ((["DSCA"], "Who supervises DSCA?"), (["DFAS", "LOA"], "What does DFAS do with the LOA?"),
+                                (["Secretary of State"], "What is the Secretary of State responsible for?")):
+            assert restored.get_context_for_query(entities, query) == fresh.get_context_for_query(entities, query)
+        json_kg = samm.restore_state(samm.SAMMKnowledgeGraphJSON, loaded["json_kg"])
+        assert json_kg.find_entity("DSCA") == samm.restore_state(samm.SAMMKnowledgeGraphJSON, built["json_kg"]).find_entity("DSCA")
+        ttl_kg = samm.restore_state(samm.SimpleKnowledgeGraph, loaded["ttl_kg"])
+        assert ttl_kg.entities == built["ttl_kg"]["entities"]
+        print(f"  ✅ app structures: {len(json_kg.entities)} entities, {len(restored.relationship_graph)} graph nodes; "
+              f"same 2-hop context as built")
+        print(f"  ✅ load {load_seconds * 1000:.0f} ms vs build {build_seconds * 1000:.0f} ms "
+              f"({os.path.getsize(os.environ['KNOWLEDGE_SNAPSHOT_PATH']) / 1e6:.1f} MB)")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_snapshot_lifecycle()
+    test_app_structures()
+    sys.exit(0)
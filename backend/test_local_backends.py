@@ -0,0 +1,180 @@
+"""
+Tests for the local backend stand-ins used by benchmark_load.py (v5.9.33)
+
+InMemoryContainer: the app's Cosmos calls and query shapes (parameters, OR and
+parentheses, projections, ORDER BY, COUNT, the review-stats aggregate), etag checks
+and patch increments, errors as azure.cosmos raises them. InMemoryGremlin: the
+traversals query_cosmos_graph() sends. FakeOllama: replies by call type after
+ttft + tokens / rate. Then the app with the stand-ins installed: a stream's review
+write lands in the in-memory reviews container and a query reads an attached
+document from the Blob stand-in:
+
+    python test_local_backends.py
+"""
+
+import contextlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+import requests
+from azure.core import MatchConditions
+from azure.cosmos import exceptions as cosmos_exceptions
+
+from local_backends import ANSWER, FakeOllama, InMemoryContainer, InMemoryGremlin, LocalBackends
+from review_stats import AGGREGATE_QUERY, COUNTERS_ID, COUNTERS_TYPE
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+
+
+def test_container():
+    print("=" * 60)
+    print("LOCAL BACKENDS TEST")
+    print("=" * 60)
+    cases = InMemoryContainer("cases", "/userId")
+    cases.create_item({"id": "1", "userId": "u1", "type": "case", "caseNumber": "SR-P-NAV", "opened": 3})
+    cases.create_item({"id": "2", "userId": "u1", "type": "case", "caseNumber": "MX-B-SAL", "opened": 1})
+    cases.create_item({"id": "3", "userId": "u2", "type": "case", "caseNumber": "SR-P-NAV", "opened": 2})
+    try:
+        cases.create_item({"id": "1", "userId": "u1"})
+        raise AssertionError("duplicate id accepted")
+    except cosmos_exceptions.CosmosResourceExistsError:
+        pass
+
+    rows = cases.query_items("""
+        SELECT c.id, c.caseNumber FROM c
+        WHERE c.userId = @userId
+        AND (c.id = @caseId OR (c.type = 'case' AND c.caseNumber = @caseId))
+        """, parameters=[{"name": "@userId", "value": "u1"}, {"name": "@caseId", "value": "MX-B-SAL"}])
+    assert rows == [{"id": "2", "caseNumber": "MX-B-SAL"}], rows
+    ordered = cases.query_items("SELECT * FROM c WHERE c.type = 'case' AND NOT c.opened < 2 ORDER BY c.opened DESC",
+                                enable_cross_partition_query=True)
+    assert [item["id"] for item in ordered] == ["1", "3"], ordered
+    assert cases.query_items("SELECT VALUE COUNT(1) FROM c", partition_key="u1") == [2]
+    try:
+        cases.query_items("SELECT * FROM c JOIN t IN c.tags")
+        raise AssertionError("unsupported query answered")
+    except ValueError:
+        pass
+    print("  ✅ parameters, AND / OR / NOT, parentheses, projections, ORDER BY, COUNT; unknown SQL raises")
+
+    case = cases.read_item("1", partition_key="u1")
+    cases.replace_item("1", {**case, "opened": 4}, etag=case["_etag"], match_condition=MatchConditions.IfNotModified)
+    try:
+        cases.replace_item("1", {**case, "opened": 5}, etag=case["_etag"], match_condition=MatchConditions.IfNotModified)
+        raise AssertionError("stale etag accepted")
+    except cosmos_exceptions.CosmosAccessConditionFailedError:
+        pass
+    case["opened"] = 99  # a caller's copy, not the stored item
+    assert cases.read_item("1", partition_key="u1")["opened"] == 4
+
+    reviews = InMemoryContainer("reviews", "/type")
+    reviews.create_item({"id": "r1", "type": "review_item", "status": "pending", "confidenceOverall": 0.4})
+    try:
+        reviews.patch_item(COUNTERS_ID, COUNTERS_TYPE, [{"op": "incr", "path": "/counters/total", "value": 1}])
+        raise AssertionError("patch of a missing item accepted")
+    except cosmos_exceptions.CosmosResourceNotFoundError:
+        pass
+    reviews.upsert_item({"id": COUNTERS_ID, "type": COUNTERS_TYPE, "counters": {"total": 1}})
+    reviews.patch_item(COUNTERS_ID, COUNTERS_TYPE, [{"op": "incr", "path": "/counters/total", "value": 2}])
+    assert reviews.read_item(COUNTERS_ID, COUNTERS_TYPE)["counters"]["total"] == 3
+    totals = reviews.query_items(AGGREGATE_QUERY, partition_key="review_item")[0]
+    assert totals["total"] == 1 and totals["status_pending"] == 1, totals
+    print("  ✅ etag checks, copies in and out, patch increments, the review-stats aggregate")
+
+
+def test_gremlin():
+    graph = InMemoryGremlin(latency_ms=2)
+    start = time.perf_counter()
+    assert graph.submit("g.V().limit(1).count()").all().result() == [1]
+    assert time.perf_counter() - start >= 0.002
+    by_id = graph.submit("g.V().has('id', containing('dsca')).limit(5)").all().result()
+    assert by_id and all("dsca" in vertex["id"] for vertex in by_id)
+    by_name = graph.submit("g.V().has('name', containing('Security Cooperation')).limit(10)").all().result()
+    assert len(by_name) == 10 and by_name[0]["properties"]["name"][0]["value"]
+    edges = graph.submit("g.V().has('id', containing('dsca')).bothE().limit(15)").all().result()
+    assert len(edges) == 15 and all(edge["type"] == "edge" and {"outV", "inV", "label"} <= set(edge) for edge in edges)
+    try:
+        graph.submit("g.V().out('supervises')")
+        raise AssertionError("unsupported traversal answered")
+    except ValueError:
+        pass
+    print(f"  ✅ Gremlin: {len(graph.vertices)} vertices; has/containing, bothE, limit, count; round-trip delay")
+
+
+def test_fake_ollama():
+    ollama = FakeOllama(ttft_ms=30, tokens_per_second=1000).start()
+    try:
+        def chat(prompt, num_predict):
+            start = time.perf_counter()
+            reply = requests.post(f"{ollama.url}/api/chat", json={
+                "model": "fake", "stream": False, "options": {"num_predict": num_predict},
+                "messages": [{"role": "system", "content": "SAMM"}, {"role": "user", "content": prompt}]}).json()
+            return reply, time.perf_counter() - start
+
+        intent, seconds = chat("Analyze this SAMM query and determine intent: What is DSCA?", 200)
+        assert intent["message"]["content"].startswith("{") and 0.03 <= seconds < 0.5, (intent, seconds)
+        answer, seconds = chat("Answer the question.", 1500)
+        words = len(ANSWER.split(" "))
+        assert answer["message"]["content"] == ANSWER and answer["eval_count"] == words
+        assert seconds >= 0.03 + words / 1000, seconds
+        short, _ = chat("Answer the question.", 10)
+        assert short["eval_count"] == 10
+        assert ollama.get_stats()["requests"] == 3
+    finally:
+        ollama.shutdown()
+    print(f"  ✅ fake Ollama: reply by call type, num_predict respected, {words} tokens took {seconds * 1000:.0f}ms")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def test_app_with_stand_ins():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    ollama = FakeOllama(ttft_ms=5, tokens_per_second=0).start()
+    blob_root = tempfile.mkdtemp(prefix="samm-blobs-")
+    os.environ.update(CACHE_ENABLED="false", LOG_LEVEL="WARNING", OLLAMA_URL=ollama.url,
+                      AZURE_CHAT_DOCS_CONTAINER_NAME="chat-docs", AZURE_CASE_DOCS_CONTAINER_NAME="case-docs")
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        samm = load_app()
+        backends = LocalBackends(blob_root).install(samm)
+        backends.chat_docs.get_blob_client("notes/loa.txt").upload_blob(
+            b"The purchaser asked for the LOA to include spare parts and training.", overwrite=True)
+        client = samm.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = {"userinfo": {"sub": "stand-in-test", "name": "Stand-in Test"}}
+        attachment = {"blobName": "notes/loa.txt", "blobContainer": "chat-docs", "fileName": "loa.txt",
+                      "contentType": "text/plain"}
+        response = client.post("/api/query", json={"question": "What does DSCA do?",
+                                                   "staged_chat_documents": [attachment]})
+        stream = client.post("/api/query/stream", json={"question": "Who approves an LOA?",
+                                                        "staged_chat_documents": [attachment]})
+        body = stream.get_data(as_text=True)
+        stream.close()
+    ollama.shutdown()
+    assert response.status_code == 200 and stream.status_code == 200
+    assert "answer_token" in body and "No content retrieved" not in body
+    stats = backends.get_stats()
+    assert stats["gremlin"]["submitted"] > 0 and stats["gremlin"]["unsupported"] == 0, stats
+    assert backends.chat_docs.stats["downloads"] >= 1, backends.chat_docs.stats
+    if '"hitl_triggered"' in body:
+        assert stats["reviews"]["items"] >= 1, stats
+    print(f"  ✅ app on the stand-ins: {stats['gremlin']['submitted']} Gremlin queries, "
+          f"{backends.chat_docs.stats['downloads']} attachment download(s), {stats['reviews']['items']} review item(s)")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_container()
+    test_gremlin()
+    test_fake_ollama()
+    test_app_with_stand_ins()
+    sys.exit(0)
@@ -0,0 +1,206 @@
+"""
+Tests for the Prometheus /metrics endpoint (v5.9.31)
+
+metrics on its own: text exposition (HELP / TYPE, cumulative buckets, _sum and
+_count, label escaping); an observation costs a few microseconds; with METRICS_DIR
+set a scrape sums every worker's file and drops the gauges of exited workers;
+StageScheduler reports the stages that ran. Then the app: a query against a fake
+Ollama shows up in the stage, step, LLM and request series of GET /metrics:
+
+    python test_metrics.py
+"""
+
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import CONTENT_TYPE, MetricsRegistry
+from stage_scheduler import StageScheduler
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+
+
+def test_exposition():
+    print("=" * 60)
+    print("METRICS TEST")
+    print("=" * 60)
+    registry = MetricsRegistry()
+    stage = registry.histogram("test_stage_seconds", "Stage latency", ("stage",), buckets=(0.01, 0.1, 1))
+    hits = registry.counter("test_hits_total", "Hits", ("cache", "result"))
+    in_flight = registry.gauge("test_in_flight", "In flight")
+
+    rerank = stage.labels("rerank")
+    for seconds in (0.005, 0.01, 0.05, 2.0):
+        rerank.observe(seconds)
+    hits.labels("answer", "hit").inc()
+    hits.labels("answer", "hit").inc(2)
+    hits.labels('quo"te', "miss").inc()
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    text = registry.render()
+    lines = text.splitlines()
+    assert "# HELP test_stage_seconds Stage latency" in lines and "# TYPE test_stage_seconds histogram" in lines
+    assert 'test_stage_seconds_bucket{stage="rerank",le="0.01"} 2' in lines, text  # le is inclusive
+    assert 'test_stage_seconds_bucket{stage="rerank",le="0.1"} 3' in lines
+    assert 'test_stage_seconds_bucket{stage="rerank",le="1"} 3' in lines
+    assert 'test_stage_seconds_bucket{stage="rerank",le="+Inf"} 4' in lines
+    assert 'test_stage_seconds_count{stage="rerank"} 4' in lines
+    assert 'test_stage_seconds_sum{stage="rerank"} 2.065' in lines
+    assert 'test_hits_total{cache="answer",result="hit"} 3' in lines
+    assert 'test_hits_total{cache="quo\\"te",result="miss"} 1' in lines
+    assert "test_in_flight 1" in lines and text.endswith("\n")
+    print("  ✅ HELP / TYPE, cumulative buckets, _sum / _count, escaped label values")
+
+    try:
+        hits.labels("answer")
+        raise AssertionError("wrong label count accepted")
+    except ValueError:
+        pass
+
+    @stage.labels("decorated").time()
+    def work():
+        time.sleep(0.02)
+        return "done"
+
+    assert work() == "done" and work.__name__ == "work"
+    counts, total = stage.labels("decorated").get()
+    assert sum(counts) == 1 and 0.02 <= total < 0.5 and counts[0] == 0, (counts, total)
+    print("  ✅ time() as context manager and decorator; wrong label count rejected")
+
+
+def test_overhead():
+    registry = MetricsRegistry()
+    child = registry.histogram("test_overhead_seconds", "Overhead", ("step",)).labels("x")
+    counter = registry.counter("test_overhead_total", "Overhead").labels()
+    n = 200000
+    start = time.perf_counter()
+    for _ in range(n):
+        child.observe(0.042)
+    observe_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(n):
+        with child.time():
+            pass
+    timer_us = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(n):
+        counter.inc()
+    inc_us = (time.perf_counter() - start) / n * 1e6
+    assert observe_us < 5 and timer_us < 10 and inc_us < 5, (observe_us, timer_us, inc_us)
+    print(f"  ✅ overhead: observe {observe_us:.2f}us, timed block {timer_us:.2f}us, counter {inc_us:.2f}us")
+
+
+def test_worker_files():
+    with tempfile.TemporaryDirectory() as directory:
+        def worker():
+            registry = MetricsRegistry(directory)
+            return (registry, registry.counter("test_requests_total", "Requests", ("endpoint",)),
+                    registry.gauge("test_in_flight", "In flight"),
+                    registry.histogram("test_seconds", "Latency", buckets=(0.1, 1)))
+
+        registry, requests_total, in_flight, seconds = worker()
+        requests_total.labels("query").inc(3)
+        in_flight.set(2)
+        seconds.observe(0.5)
+
+        # Another worker's file, and one from a worker that has exited
+        _, other_requests, other_in_flight, other_seconds = worker()
+        other_requests.labels("query").inc(4)
+        other_in_flight.set(5)
+        other_seconds.observe(0.05)
+        exited = {"pid": 0, "metrics": {
+            "test_requests_total": {**other_requests.snapshot(), "samples": [[["query"], 10.0]]},
+            "test_in_flight": {**other_in_flight.snapshot(), "samples": [[[], 7.0]]}}}
+        alive_pid = os.getppid()
+        with open(os.path.join(directory, f"{alive_pid}.json"), "w") as f:
+            json.dump({"pid": alive_pid, "metrics": {"test_requests_total": other_requests.snapshot(),
+                                                      "test_in_flight": other_in_flight.snapshot(),
+                                                      "test_seconds": other_seconds.snapshot()}}, f)
+        dead_pid = 2 ** 22 + 17  # above pid_max on Linux
+        with open(os.path.join(directory, f"{dead_pid}.json"), "w") as f:
+            json.dump(exited, f)
+
+        lines = registry.render().splitlines()
+        assert 'test_requests_total{endpoint="query"} 17' in lines, lines
+        assert "test_in_flight 7" in lines, lines
+        assert 'test_seconds_bucket{le="0.1"} 1' in lines and 'test_seconds_count 2' in lines
+        assert os.path.exists(os.path.join(directory, f"{os.getpid()}.json"))
+        print("  ✅ scrape sums every worker's file; an exited worker keeps its counters, not its gauges")
+
+        registry.reset_after_fork()
+        assert registry.flushing and requests_total.labels("query").get() == 0
+        assert 'test_requests_total{endpoint="query"} 14' in registry.render().splitlines()
+        print("  ✅ reset_after_fork: a worker starts from zero and flushes")
+
+
+def test_scheduler_observes_stages():
+    observed = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        scheduler = StageScheduler(pool, observe=lambda stage, seconds: observed.append((stage, seconds)))
+        scheduler.add("intent", lambda start: time.sleep(0.01) or "intent", requires=("start",))
+        scheduler.add("compliance", lambda intent: intent.upper(), requires=("intent",))
+        scheduler.provide("start", None)
+        assert scheduler.result("compliance") == "INTENT"
+    stages = dict(observed)
+    assert set(stages) == {"intent", "compliance"} and stages["intent"] >= 0.01, observed
+    print("  ✅ StageScheduler reports each stage's run time (provided values are not stages)")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def test_app_metrics():
+    from benchmark_serving import start_fake_ollama
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    ollama = start_fake_ollama(5)
+    os.environ.update(CACHE_ENABLED="false", LOG_LEVEL="WARNING",
+                      OLLAMA_URL=f"http://127.0.0.1:{ollama.server_address[1]}")
+    os.environ.pop("METRICS_DIR", None)
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        samm = load_app()
+        client = samm.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = {"userinfo": {"sub": "metrics-test", "name": "Metrics Test"}}
+        response = client.post("/api/query", json={"question": "What does DSCA do?"})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    scrape = client.get("/metrics")
+    ollama.shutdown()
+    assert scrape.status_code == 200 and scrape.headers["Content-Type"] == CONTENT_TYPE
+    text = scrape.get_data(as_text=True)
+    stages = {line.split('stage="')[1].split('"')[0] for line in text.splitlines()
+              if line.startswith("samm_pipeline_stage_seconds_count")}
+    assert stages, text
+    samples = dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+    llm_calls = float(samples['samm_llm_calls_total{call="enhanced",outcome="ok"}'])
+    assert llm_calls >= 1 and float(samples['samm_llm_seconds_count{call="enhanced"}']) == llm_calls
+    assert 'samm_http_requests_total{endpoint="query_ai_assistant",status="200"} 1' in text
+    assert 'samm_requests_in_flight{endpoint="query_ai_assistant"} 0' in text
+    assert 'samm_requests_in_flight{endpoint="prometheus_metrics"} 1' in text
+    assert float(samples['samm_step_seconds_count{step="compliance"}']) >= 1
+    print(f"  ✅ /metrics after a query: stages {sorted(stages)}, {llm_calls:.0f} LLM calls, "
+          f"request counts and in-flight gauge")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_exposition()
+    test_overhead()
+    test_worker_files()
+    test_scheduler_observes_stages()
+    test_app_metrics()
+    sys.exit(0)
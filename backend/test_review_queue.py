@@ -0,0 +1,116 @@
+"""
+Tests for the paged review queue (v5.9.25)
+
+Walks the queue page by page through ReviewQueue.list_page(), passing each page's
+continuation token back the way the dashboard does (JSON body in, query string out),
+and checks that the pages together are every matching review exactly once, newest
+first; a filtered walk too. The first page of a cross-partition query is answered,
+but its token is refused - as the SDK's multi-partition ORDER BY does.
+
+By default the container is the in-memory stand-in from benchmark_review_queue.py.
+Against the Cosmos emulator or an account (real continuation tokens):
+
+    python test_review_queue.py
+    python test_review_queue.py --cosmos https://localhost:8081 <key>
+"""
+
+import argparse
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from benchmark_review_queue import InMemoryReviewContainer, make_review
+from review_queue import ReviewQueue, build_queue_query
+
+REVIEWS = 120
+PAGE_SIZE = 25
+
+
+def walk(queue, filters, page_size):
+    """Every page from the first to the one without a token; returns (reviews, page count)"""
+    reviews, pages, token = [], 0, None
+    while True:
+        page = queue.list_page(filters, page_size=page_size, continuation=token)
+        pages += 1
+        assert len(page["reviews"]) <= page_size, len(page["reviews"])
+        reviews.extend(page["reviews"])
+        token = json.loads(json.dumps(page))["continuationToken"]  # through the HTTP response
+        if not token:
+            return reviews, pages
+        assert pages < 100, "continuation tokens never ended"
+
+
+def run_checks(container):
+    rng = random.Random(25)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    seeded = [make_review(rng, n, start) for n in range(REVIEWS)]
+    for review in seeded:
+        container.create_item(review)
+    queue = ReviewQueue(container)
+    newest_first = sorted(seeded, key=lambda review: review["timestamp"], reverse=True)
+
+    # 1. Pending queue: several pages, each review once, newest first
+    reviews, pages = walk(queue, {}, PAGE_SIZE)
+    expected = [review["reviewId"] for review in newest_first if review["status"] == "pending"]
+    assert pages >= 2, pages
+    assert [review["reviewId"] for review in reviews] == expected, "pages skipped, repeated or reordered reviews"
+    assert all("aiResponse" not in review for review in reviews)
+    print(f"  ✅ {len(reviews)} pending reviews over {pages} pages of {PAGE_SIZE}, each once, newest first")
+
+    # 2. Filtered walk resumes with the filters applied
+    filters = {"status": "all", "band": "low"}
+    reviews, pages = walk(queue, filters, 10)
+    expected = [review["reviewId"] for review in newest_first if review["confidenceOverall"] < 0.6]
+    assert pages >= 2 and [review["reviewId"] for review in reviews] == expected, pages
+    print(f"  ✅ filtered walk: {len(reviews)} low-confidence reviews over {pages} pages")
+
+    # 3. Detail reads stay inside the review_item partition
+    first = newest_first[0]
+    assert queue.get_review(first["id"])["reviewId"] == first["reviewId"]
+    assert queue.get_review(first["reviewId"])["id"] == first["id"]
+    print("  ✅ detail read by id and by reviewId")
+
+
+def check_cross_partition_refused(container):
+    """What list_page used to send: page 1 works, page 2 cannot be resumed"""
+    query, parameters = build_queue_query({})
+    pages = container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True,
+                                  max_item_count=PAGE_SIZE).by_page()
+    next(pages)
+    try:
+        container.query_items(query=query, parameters=parameters, enable_cross_partition_query=True,
+                              max_item_count=PAGE_SIZE).by_page(pages.continuation_token)
+        raise AssertionError("cross-partition continuation accepted")
+    except ValueError:
+        pass
+    print("  ✅ stand-in refuses a cross-partition ORDER BY continuation, as the SDK does")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cosmos", nargs=2, metavar=("ENDPOINT", "KEY"),
+                        help="run against a Cosmos account / emulator (temporary database)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"REVIEW QUEUE TEST - {'Cosmos' if args.cosmos else 'in-memory container'}")
+    print("=" * 60)
+    if args.cosmos:
+        from azure.cosmos import CosmosClient, PartitionKey
+        client = CosmosClient(args.cosmos[0], args.cosmos[1])
+        database = client.create_database(f"reviewqueue{uuid.uuid4().hex[:8]}")
+        try:
+            run_checks(database.create_container(id="reviews", partition_key=PartitionKey(path="/type")))
+        finally:
+            client.delete_database(database)
+    else:
+        container = InMemoryReviewContainer()
+        run_checks(container)
+        check_cross_partition_refused(container)
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
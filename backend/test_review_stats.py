@@ -0,0 +1,221 @@
+"""
+Tests for review statistics from counters (v5.9.24)
+
+Seeds a reviews container with generated review items, moves them through
+submit / accept / reject / needs-revision / regenerate transitions with
+ReviewStatsService.record_change(), and checks that /api/reviews/stats and
+/api/reviews/detailed-stats bodies built from the counters equal the full scan
+the endpoints used to do - both for incrementally maintained counters and for
+counters rebuilt by the aggregate query.
+
+By default the container is an in-memory stand-in (its aggregate query is
+answered in Python). Against the Cosmos emulator or an account:
+
+    python test_review_stats.py
+    python test_review_stats.py --cosmos https://localhost:8081 <key>
+"""
+
+import argparse
+import copy
+import random
+import sys
+import uuid
+
+from review_stats import (AGGREGATE_QUERY, COUNTERS_ID, REVIEW_STATUSES, ReviewStatsService, detailed_review_stats,
+                          review_contribution, review_stats_summary)
+
+
+class InMemoryReviewsContainer:
+    """create / upsert / read / delete / patch (incr) and the aggregate query, keyed like /type partitions"""
+
+    def __init__(self):
+        self.items = {}
+        self.reads = 0
+
+    def _key(self, item_id, partition_key):
+        return partition_key, item_id
+
+    def create_item(self, body):
+        self.items[self._key(body["id"], body["type"])] = copy.deepcopy(body)
+        return body
+
+    upsert_item = create_item
+
+    def read_item(self, item, partition_key):
+        from azure.cosmos import exceptions as cosmos_exceptions
+        self.reads += 1
+        if self._key(item, partition_key) not in self.items:
+            raise cosmos_exceptions.CosmosResourceNotFoundError(message="not found")
+        return copy.deepcopy(self.items[self._key(item, partition_key)])
+
+    def delete_item(self, item, partition_key):
+        self.items.pop(self._key(item, partition_key), None)
+
+    def patch_item(self, item, partition_key, patch_operations):
+        from azure.cosmos import exceptions as cosmos_exceptions
+        assert len(patch_operations) <= 10, "more than 10 patch operations"
+        doc = self.items.get(self._key(item, partition_key))
+        if doc is None:
+            raise cosmos_exceptions.CosmosResourceNotFoundError(message="not found")
+        for operation in patch_operations:
+            assert operation["op"] == "incr"
+            _, parent, name = operation["path"].split("/")
+            doc[parent][name] = doc[parent].get(name, 0) + operation["value"]
+        return doc
+
+    def query_items(self, query, partition_key=None, enable_cross_partition_query=False, **kwargs):
+        assert query == AGGREGATE_QUERY, query
+        # azure-cosmos rejects several aggregates (no VALUE) across partitions
+        assert partition_key is not None and not enable_cross_partition_query, "cross-partition aggregate"
+        totals = {}
+        for (key, _), doc in self.items.items():
+            if key != partition_key:
+                continue
+            for key, value in review_contribution(doc).items():
+                totals[key] = totals.get(key, 0) + value
+        return [totals]
+
+
+def make_review(rng):
+    review = {"id": str(uuid.uuid4()), "reviewId": str(uuid.uuid4()), "type": "review_item", "status": "pending",
+              "question": "What is a Letter of Request?"}
+    for field in ("confidenceIntent", "confidenceEntity", "confidenceAnswer", "confidenceOverall"):
+        if rng.random() < 0.9:
+            review[field] = round(rng.random(), 3)
+    return review
+
+
+def legacy_detailed_stats(all_reviews):
+    """What /api/reviews/detailed-stats computed from SELECT * before v5.9.24"""
+    total = len(all_reviews)
+    pending = sum(1 for r in all_reviews if r.get('status') == 'pending')
+    approved = sum(1 for r in all_reviews if r.get('status') == 'approved')
+    needs_revision = sum(1 for r in all_reviews if r.get('status') == 'needs_revision')
+    rejected = sum(1 for r in all_reviews if r.get('status') == 'rejected')
+
+    def avg(values):
+        return round(sum(values) / len(values), 2) if values else 0
+
+    confs = {f: [r[f] for r in all_reviews if f in r]
+             for f in ("confidenceIntent", "confidenceEntity", "confidenceAnswer", "confidenceOverall")}
+    correct = sum(1 for r in all_reviews if r.get('status') == 'approved' and r.get('intentCorrect', False))
+    metrics = {m: [r['entityMetrics'][m] for r in all_reviews if m in r.get('entityMetrics', {})]
+               for m in ("precision", "recall", "f1")}
+    rate = lambda n: round((n / total * 100), 2) if total > 0 else 0  # noqa: E731
+    return {
+        "counts": {"total_reviews": total, "pending": pending, "approved": approved,
+                   "needs_revision": needs_revision, "rejected": rejected},
+        "rates": {"approval_rate": rate(approved), "revision_rate": rate(needs_revision),
+                  "rejection_rate": rate(rejected)},
+        "confidence": {"intent": avg(confs["confidenceIntent"]), "entity": avg(confs["confidenceEntity"]),
+                       "answer": avg(confs["confidenceAnswer"]), "overall": avg(confs["confidenceOverall"])},
+        "accuracy": {"intent_accuracy": rate(correct), "entity_precision": avg(metrics["precision"]),
+                     "entity_recall": avg(metrics["recall"]), "entity_f1": avg(metrics["f1"])},
+        "processed": (len(confs["confidenceIntent"]), len(confs["confidenceEntity"]), len(confs["confidenceAnswer"])),
+    }
+
+
+def assert_equivalent(counters, reviews, label):
+    expected = legacy_detailed_stats(reviews)
+    got = detailed_review_stats(counters)
+    for section in ("counts", "rates", "confidence", "accuracy"):
+        assert got[section] == expected[section], (label, section, got[section], expected[section])
+    performance = got["agent_performance"]
+    assert (performance["intent_agent"]["total_processed"], performance["entity_agent"]["total_processed"],
+            performance["answer_agent"]["total_processed"]) == expected["processed"], label
+    summary = review_stats_summary(counters)
+    assert summary["total_reviews"] == expected["counts"]["total_reviews"]
+    assert summary["average_confidence"] == expected["confidence"]["overall"]
+
+
+def transition(rng, review):
+    """One of the endpoint transitions, applied the way the routes do it"""
+    action = rng.choice(["submit", "accept", "reject", "needs_revision", "regenerate"])
+    if action == "submit":
+        review["status"] = rng.choice(["approved", "needs_revision", "rejected"])
+        if rng.random() < 0.6:
+            review["entityMetrics"] = {"precision": round(rng.random(), 2), "recall": round(rng.random(), 2),
+                                       "f1": round(rng.random(), 2)}
+        if rng.random() < 0.7:
+            review["intentCorrect"] = rng.random() < 0.8
+    elif action == "accept":
+        review["status"] = "approved"
+    elif action in ("reject", "needs_revision"):
+        review["status"] = "needs_revision"
+    else:
+        review["status"] = "regenerating"
+
+
+def run_checks(container, reviews_count=600, transitions=1500):
+    rng = random.Random(7)
+    stats = ReviewStatsService(container, cache_ttl_seconds=60)
+    reviews = []
+
+    # 1. Empty container -> counters built by the aggregate query
+    first = stats.get_counters()
+    assert_equivalent(first, [], "empty")
+    print("  ✅ counters item created from the aggregate query")
+
+    # 2. Creates + transitions maintained incrementally
+    for _ in range(reviews_count):
+        review = make_review(rng)
+        container.create_item(review)
+        stats.record_change(None, review)
+        reviews.append(review)
+    for _ in range(transitions):
+        review = rng.choice(reviews)
+        before = copy.deepcopy(review)
+        transition(rng, review)
+        container.upsert_item(review)
+        stats.record_change(before, review)
+    incremental = stats.get_counters()
+    assert_equivalent(incremental, reviews, "incremental")
+    statuses = {s: incremental[f"status_{s}"] for s in REVIEW_STATUSES}
+    print(f"  ✅ {reviews_count} reviews, {transitions} transitions: counters equal the full scan {statuses}")
+
+    # 3. Rebuilt counters (aggregate query) agree with the incremental ones
+    rebuilt = stats.get_counters(refresh=True)
+    assert_equivalent(rebuilt, reviews, "rebuilt")
+    print("  ✅ aggregate-query rebuild equals the incremental counters")
+
+    # 4. TTL cache: repeated reads inside the TTL do not touch the container
+    before_hits = stats.get_stats()["cache_hits"]
+    for _ in range(50):
+        stats.get_counters()
+    assert stats.get_stats()["cache_hits"] == before_hits + 50
+    print("  ✅ repeated reads served from the TTL cache")
+
+    # 5. Lost counters item -> rebuilt on the next read
+    container.delete_item(item=COUNTERS_ID, partition_key="review_stats")
+    stats.invalidate()
+    assert_equivalent(stats.get_counters(), reviews, "after delete")
+    print("  ✅ missing counters item rebuilt on read")
+    return stats.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cosmos", nargs=2, metavar=("ENDPOINT", "KEY"),
+                        help="run against a Cosmos account / emulator (temporary database)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"REVIEW STATS TEST - {'Cosmos' if args.cosmos else 'in-memory container'}")
+    print("=" * 60)
+    if args.cosmos:
+        from azure.cosmos import CosmosClient, PartitionKey
+        client = CosmosClient(args.cosmos[0], args.cosmos[1])
+        database = client.create_database(f"reviewstats{uuid.uuid4().hex[:8]}")
+        try:
+            container = database.create_container(id="reviews", partition_key=PartitionKey(path="/type"))
+            stats = run_checks(container, reviews_count=150, transitions=300)
+        finally:
+            client.delete_database(database)
+    else:
+        stats = run_checks(InMemoryReviewsContainer())
+    print(f"\nStats: {stats}")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
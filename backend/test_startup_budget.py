@@ -0,0 +1,110 @@
+"""
+Cold start budget test (v5.9.28)
+
+Imports the app in fresh interpreters and checks, on the median of the runs:
+  - import time and RSS stay within the budget
+  - no heavy optional backend (torch, ChromaDB, Gremlin, PyMuPDF, openpyxl, PyPDF2)
+    is imported and no subsystem is built at import time
+Then, in this process, checks that a lazy global builds its subsystem on first
+use and that warmup() builds every registered subsystem.
+
+    python test_startup_budget.py                 # 3 runs, 1.5 s / 160 MB budget
+    python test_startup_budget.py 5 --seconds 2.5 --rss-mb 200
+    STARTUP_BUDGET_SECONDS=2.5 python test_startup_budget.py
+
+Before v5.9.28 the import took 1.29 s and 109 MB on the reference host (no Azure or
+Gremlin credentials); the per-package breakdown comes from
+python app_5_9_11_GOLD_TRAINING.py --profile-startup
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+from contextlib import redirect_stdout
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+HEAVY_MODULES = ("torch", "sentence_transformers", "chromadb", "gremlin_python", "fitz", "openpyxl", "PyPDF2")
+
+COLD_IMPORT = f"""
+import importlib.util, json, os, sys, time
+from contextlib import redirect_stdout
+sys.path.insert(0, os.getcwd())
+from lazy_init import rss_kb
+start = time.perf_counter()
+with open(os.devnull, "w") as quiet, redirect_stdout(quiet):
+    spec = importlib.util.spec_from_file_location("samm_app", {APP_FILE!r})
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "rss_mb": rss_kb() / 1024,
+                  "heavy": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+                  "subsystems": app_module.SUBSYSTEMS.get_stats()}}))
+"""
+
+
+def cold_import():
+    env = dict(os.environ, CACHE_ENABLED="false")
+    output = subprocess.run([sys.executable, "-c", COLD_IMPORT], capture_output=True, text=True,
+                            env=env, check=True).stdout
+    return json.loads([line for line in output.splitlines() if line.startswith("{")][-1])  # atexit may print after
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runs", nargs="?", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "1.5")))
+    parser.add_argument("--rss-mb", type=float, default=float(os.getenv("STARTUP_BUDGET_RSS_MB", "160")))
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+
+    print("=" * 60)
+    print(f"COLD START BUDGET TEST - {args.runs} cold imports")
+    print("=" * 60)
+
+    runs = [cold_import() for _ in range(args.runs)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    rss_mb = statistics.median(run["rss_mb"] for run in runs)
+    print(f"  import: {', '.join('%.2fs' % run['seconds'] for run in runs)} (median {seconds:.2f}s)")
+    print(f"  RSS after import: median {rss_mb:.0f} MB")
+    assert seconds <= args.seconds, f"cold import {seconds:.2f}s over the {args.seconds}s budget"
+    print(f"  ✅ within the {args.seconds}s budget")
+    assert rss_mb <= args.rss_mb, f"RSS {rss_mb:.0f} MB over the {args.rss_mb:.0f} MB budget"
+    print(f"  ✅ within the {args.rss_mb:.0f} MB budget")
+
+    for run in runs:
+        assert not run["heavy"], f"imported at startup: {run['heavy']}"
+        assert run["subsystems"]["built"] == 0 and run["subsystems"]["failed"] == 0, run["subsystems"]
+    print(f"  ✅ none of {', '.join(HEAVY_MODULES)} imported")
+    print(f"  ✅ no subsystem built at import ({runs[0]['subsystems']['registered']} registered)")
+
+    with open(os.devnull, "w") as quiet, redirect_stdout(quiet):
+        samm = load_app()
+        entity_count = len(samm.knowledge_graph.entities)
+    assert samm.SUBSYSTEMS.is_ready("knowledge_graph") and entity_count > 0
+    assert not samm.SUBSYSTEMS.is_ready("orchestrator")
+    print(f"  ✅ knowledge_graph built on first use ({entity_count} entities), orchestrator still pending")
+
+    with open(os.devnull, "w") as quiet, redirect_stdout(quiet):
+        timings = samm.warmup()
+    stats = samm.SUBSYSTEMS.get_stats()
+    assert not stats["pending"] and stats["failed"] == 0, stats
+    slowest = max(timings, key=lambda name: timings[name]["seconds"])
+    print(f"  ✅ warmup() built all {stats['registered']} subsystems "
+          f"(slowest: {slowest} {timings[slowest]['seconds']:.2f}s)")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Tests for levelled, sampled logging (v5.9.30)
+
+structured_logging on its own: a record below its logger's level is never
+formatted; per-subsystem levels; a request sampled for a debug trace gets its
+DEBUG records and no other request does; the queued handler writes on its
+listener thread, and a full queue drops (and counts) instead of blocking; the
+request id follows pipeline stages onto worker threads. Then the app: every
+response carries X-Request-ID and the query path logs through the samm.* loggers:
+
+    python test_structured_logging.py
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import SingleFlight
+from stage_scheduler import StageScheduler
+from structured_logging import LoggingConfig, configure_logging, current_request_id, get_logger, request_context
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+
+
+class CountingArg:
+    """Counts how often a log argument is turned into text"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "arg"
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.writer_threads = set()
+
+    def write(self, text):
+        self.writer_threads.add(threading.current_thread().name)
+        self.release.wait(10)
+        return super().write(text)
+
+
+def test_levels_and_lazy_formatting():
+    print("=" * 60)
+    print("STRUCTURED LOGGING TEST")
+    print("=" * 60)
+    stream = io.StringIO()
+    configure_logging(LoggingConfig(level="INFO", levels={"samm.test.entity": "DEBUG"}, queued=False, stream=stream))
+    quiet, verbose = get_logger("samm.test.llm"), get_logger("samm.test.entity")
+
+    arg = CountingArg()
+    quiet.debug("[Test] %s", arg)
+    assert arg.formatted == 0 and stream.getvalue() == ""
+    quiet.info("[Test] info %s", arg)
+    verbose.debug("[Test] debug %s", arg)
+    assert arg.formatted == 2
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2 and "INFO    samm.test.llm [-] [Test] info arg" in lines[0], lines
+    assert "DEBUG   samm.test.entity" in lines[1]
+    print("  ✅ records below the level never formatted; LOG_LEVELS overrides one subsystem")
+
+    os.environ["LOG_LEVELS"] = "samm.entity=DEBUG, samm.llm=warning"
+    config = LoggingConfig.from_env()
+    del os.environ["LOG_LEVELS"]
+    assert config.levels == {"samm.entity": "DEBUG", "samm.llm": "WARNING"}, config.levels
+    print("  ✅ LOG_LEVELS parsed")
+
+
+def test_debug_sampling():
+    stream = io.StringIO()
+    config = configure_logging(LoggingConfig(level="INFO", fmt="json", sample_rate=0.5, queued=False, stream=stream))
+    log = get_logger("samm.test.sampled")
+    with request_context("not-sampled", sampled=False):
+        log.debug("[Test] hidden")
+    with request_context("sampled", sampled=True):
+        assert log.isEnabledFor(logging.DEBUG)
+        log.debug("[Test] traced", extra={"stage": "entities"})
+    assert not log.isEnabledFor(logging.DEBUG) and current_request_id() == "-"
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry["msg"] for entry in entries] == ["[Test] traced"], entries
+    assert entries[0]["request_id"] == "sampled" and entries[0]["stage"] == "entities"
+    print("  ✅ DEBUG kept only inside a sampled request (JSON lines with request id and extra fields)")
+
+    for _ in range(2000):
+        with request_context():
+            pass
+    stats = config.get_stats()
+    assert stats["requests"] == 2000 and 850 < stats["sampled_requests"] < 1150, stats
+    print(f"  ✅ sample rate 0.5: {stats['sampled_requests']} of {stats['requests']} requests sampled")
+
+
+def test_queued_handler():
+    stream = BlockingStream()
+    config = configure_logging(LoggingConfig(level="INFO", queue_size=5, stream=stream))
+    log = get_logger("samm.test.queued")
+    for n in range(20):
+        log.info("[Test] record %d", n)  # returns at once although the stream is blocked
+    stats = config.get_stats()
+    assert stats["dropped"] > 0 and stats["records"] + stats["dropped"] == 20, stats
+    stream.release.set()
+    config.stop()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == stats["records"] and "[Test] record 0" in lines[0]
+    assert threading.current_thread().name not in stream.writer_threads
+    print(f"  ✅ queued: request thread never writes; full queue dropped {stats['dropped']} of 20 records")
+
+
+def test_context_follows_stages():
+    stream = io.StringIO()
+    configure_logging(LoggingConfig(level="INFO", queued=False, stream=stream))
+    log = get_logger("samm.test.stages")
+    with ThreadPoolExecutor(max_workers=2) as pool, request_context("req-42", sampled=True):
+        scheduler = StageScheduler(pool)
+        scheduler.add("compliance", lambda: (log.debug("[Test] in stage"), current_request_id())[1])
+        scheduler.provide("start", None)
+        assert scheduler.result("compliance") == "req-42"
+        frames = list(SingleFlight("test").stream("key", lambda: iter([current_request_id()])))
+    assert frames == ["req-42"] and "[req-42] [Test] in stage" in stream.getvalue()
+    print("  ✅ request id and sampling follow background stages and the single-flight producer")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def test_app_request_ids():
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    os.environ.update(CACHE_ENABLED="false", LOG_QUEUE="false", LOG_FORMAT="json")
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        samm = load_app()
+    client = samm.app.test_client()
+    given = client.get("/api/examples", headers={"X-Request-ID": "client-id-1"})
+    assert given.headers["X-Request-ID"] == "client-id-1"
+    generated = client.get("/api/examples").headers["X-Request-ID"]
+    assert len(generated) == 16 and generated != "client-id-1"
+    print("  ✅ X-Request-ID echoed, or generated when absent")
+
+    samm.LOGGING.sample_rate = 1.0
+    output = io.StringIO()
+    with client.session_transaction() as session:
+        session["user"] = {"userinfo": {"sub": "logging-test", "name": "Logging Test"}}
+    samm.call_ollama_enhanced = lambda *args, **kwargs: "DSCA directs the FMS process (C1.3.2.2)."
+    with contextlib.redirect_stdout(output):
+        response = client.post("/api/query", json={"question": "What does DSCA do?"},
+                               headers={"X-Request-ID": "query-id-7"})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    entries = [json.loads(line) for line in output.getvalue().splitlines() if line.startswith("{")]
+    loggers = {entry["logger"] for entry in entries if entry["request_id"] == "query-id-7"}
+    assert {"samm.query", "samm.orchestrator", "samm.entity"} <= loggers, loggers
+    print(f"  ✅ sampled query traced through {len(loggers)} subsystems under its request id")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_levels_and_lazy_formatting()
+    test_debug_sampling()
+    test_queued_handler()
+    test_context_follows_stages()
+    test_app_request_ids()
+    sys.exit(0)
@@ -0,0 +1,260 @@
+"""
+Tests for per-request span trees (v5.9.32)
+
+tracing on its own: spans nest across StageScheduler stages and the SingleFlight
+producer thread, generators and coroutines are one span each, errors are recorded;
+sampling, the span cap and the ring's eviction; OTLP/JSON export round-trips to the
+same tree; the cost of a span inside and outside a trace. Then the app: /api/query
+and /api/query/stream traces on /api/debug/traces/<request_id>, as a tree and as
+OTLP, and in TRACE_EXPORT_DIR:
+
+    python test_tracing.py
+"""
+
+import asyncio
+import contextlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import SingleFlight
+from stage_scheduler import StageScheduler
+from tracing import Tracer, span, traced, trace_methods, tree_from_otlp
+
+APP_FILE = "app_5_9_11_GOLD_TRAINING.py"
+
+
+def names(node):
+    """{name: [child names]} of a tree, flattened"""
+    found = {node["name"]: [child["name"] for child in node["children"]]}
+    for child in node["children"]:
+        found.update(names(child))
+    return found
+
+
+@trace_methods
+class Agent:
+    def answer(self, question):
+        return self._lookup(question).upper()
+
+    def _lookup(self, question):
+        time.sleep(0.002)
+        return question
+
+
+@traced("llm.stream")
+def tokens():
+    sent = yield "a"
+    yield sent
+
+
+@traced("review.write")
+async def write_review():
+    await asyncio.sleep(0.001)
+    return True
+
+
+@traced()
+def failing():
+    raise KeyError("missing")
+
+
+def test_span_tree():
+    print("=" * 60)
+    print("TRACING TEST")
+    print("=" * 60)
+    tracer = Tracer()
+    trace = tracer.begin("req-1", "POST /api/query")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        scheduler = StageScheduler(pool)
+        scheduler.add("answer", lambda start: Agent().answer("what is dsca"), requires=("start",))
+        scheduler.provide("start", None)
+        assert scheduler.result("answer") == "WHAT IS DSCA"
+    with span("stream"):
+        frames = list(SingleFlight("test").stream("key", lambda: iter(["frame"])))
+        generator = tokens()
+        assert next(generator) == "a" and generator.send("b") == "b" and list(generator) == []
+        assert asyncio.run(write_review())
+        try:
+            failing()
+        except KeyError:
+            pass
+    tracer.end(trace)
+    assert frames == ["frame"]
+
+    tree = trace.tree()
+    found = names(tree["root"])
+    assert found["POST /api/query"] == ["Agent.answer", "stream"], found
+    assert found["Agent.answer"] == ["Agent._lookup"]
+    assert found["stream"] == ["llm.stream", "review.write", "failing"], found
+    stage = tree["root"]["children"][0]
+    assert stage["thread"].startswith("ThreadPoolExecutor") and stage["children"][0]["duration_ms"] >= 2
+    assert tree["root"]["children"][1]["children"][2]["error"] == "KeyError: 'missing'"
+    assert tree["duration_ms"] > 0 and tree["spans"] == 7
+    print("  ✅ spans nest across stage threads; methods, generators and coroutines; errors recorded")
+
+
+def test_sampling_cap_and_ring():
+    tracer = Tracer(sample_rate=0.0)
+    assert tracer.begin("off", "GET /") is None
+    with span("ignored") as current:
+        assert current is None
+    tracer.end(None)
+
+    tracer = Tracer(sample_rate=0.5)
+    sampled = sum(tracer.begin(f"r{n}", "GET /") is not None for n in range(2000))
+    tracer.end(None)
+    assert 850 < sampled < 1150, sampled
+    print(f"  ✅ sample rate 0 traces nothing; 0.5 traced {sampled} of 2000 requests")
+
+    tracer = Tracer(buffer_size=3, max_spans=5)
+    for n in range(5):
+        trace = tracer.begin(f"req-{n}", "POST /api/query")
+        for _ in range(10):
+            with span("step"):
+                pass
+        tracer.end(trace)
+    assert trace.dropped == 6 and len(trace.spans) == 5
+    assert tracer.get("req-0") is None and tracer.get("req-1") is None and tracer.get("req-4") is trace
+    stats = tracer.get_stats()
+    assert stats["evicted"] == 2 and stats["buffered"] == 3 and stats["dropped_spans"] == 30, stats
+    assert [t["request_id"] for t in tracer.recent()] == ["req-4", "req-3", "req-2"]
+    print("  ✅ TRACE_MAX_SPANS caps a trace (dropped counted); the ring keeps the newest TRACE_BUFFER_SIZE")
+
+
+def test_otlp_export():
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = Tracer(export_dir=directory)
+        trace = tracer.begin("req-otlp", "POST /api/query", endpoint="query_ai_assistant")
+        with span("gremlin.submit", query="g.V().limit(10)"):
+            pass
+        Agent().answer("loa")
+        tracer.end(trace)
+
+        document = trace.to_otlp()
+        spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(spans[0]["traceId"]) == 32 and all(len(s["spanId"]) == 16 for s in spans)
+        assert "parentSpanId" not in spans[0] and spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert int(spans[0]["endTimeUnixNano"]) >= int(spans[1]["endTimeUnixNano"]) > int(spans[0]["startTimeUnixNano"])
+        assert {"key": "query", "value": {"stringValue": "g.V().limit(10)"}} in spans[1]["attributes"]
+
+        for _ in range(100):  # written by the export thread
+            exported = tracer.load_exported("req-otlp")
+            if exported is not None:
+                break
+            time.sleep(0.02)
+        assert exported == document, "exported file differs"
+        assert names(tree_from_otlp(exported)["root"]) == names(trace.tree()["root"])
+        assert tree_from_otlp(exported)["request_id"] == "req-otlp" and tracer.get_stats()["exported"] == 1
+        assert tracer.load_exported("../etc/passwd") is None
+        print("  ✅ OTLP/JSON: 16-byte trace id, parent links, attributes; exported file reads back as the same tree")
+
+
+def test_overhead():
+    @traced("hot")
+    def hot():
+        return 1
+
+    n = 100000
+    start = time.perf_counter()
+    for _ in range(n):
+        hot()
+    untraced_us = (time.perf_counter() - start) / n * 1e6
+
+    tracer = Tracer(max_spans=n + 1)
+    trace = tracer.begin("overhead", "GET /")
+    start = time.perf_counter()
+    for _ in range(n):
+        hot()
+    traced_us = (time.perf_counter() - start) / n * 1e6
+    tracer.end(trace)
+    assert untraced_us < 1 and traced_us < 15, (untraced_us, traced_us)
+    print(f"  ✅ overhead: {untraced_us:.2f}us per call outside a trace, {traced_us:.2f}us per span inside")
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("samm_app", APP_FILE)
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def test_app_traces():
+    from benchmark_serving import start_fake_ollama
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    export_dir = tempfile.mkdtemp(prefix="samm-traces-")
+    ollama = start_fake_ollama(5)
+    os.environ.update(CACHE_ENABLED="false", LOG_LEVEL="WARNING", TRACE_EXPORT_DIR=export_dir,
+                      DEBUG_TRACES_ENABLED="true",
+                      OLLAMA_URL=f"http://127.0.0.1:{ollama.server_address[1]}")
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        samm = load_app()
+        client = samm.app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = {"userinfo": {"sub": "tracing-test", "name": "Tracing Test"}}
+        response = client.post("/api/query", json={"question": "What does DSCA do?"},
+                               headers={"X-Request-ID": "trace-query-1"})
+        stream = client.post("/api/query/stream", json={"question": "Who approves an LOA?"},
+                             headers={"X-Request-ID": "trace-stream-1"})
+        stream.get_data()
+        stream.close()  # what the server does when the stream ends
+    ollama.shutdown()
+    assert response.status_code == 200 and stream.status_code == 200
+
+    tree = client.get("/api/debug/traces/trace-query-1").get_json()
+    found = names(tree["root"])
+    assert tree["root"]["attributes"] == {"endpoint": "query_ai_assistant", "http.status_code": 200}
+    assert "SimpleStateOrchestrator.process_query" in found["_answer_samm_query"], found
+    assert "IntentAgent.analyze_intent" in found["SimpleStateOrchestrator._analyze_intent_step"]
+    assert "call_ollama_enhanced" in found["EnhancedAnswerAgent._generate_with_validation"]
+    assert found["call_ollama_enhanced"] == ["ollama.chat"]
+    print(f"  ✅ /api/query: {tree['spans']} spans, orchestrator > steps > agent methods > LLM attempts")
+
+    stream_tree = client.get("/api/debug/traces/trace-stream-1").get_json()
+    found = names(stream_tree["root"])
+    assert stream_tree["duration_ms"] is not None and found["POST /api/query/stream"] == ["stream_query_pipeline"]
+    assert {"IntentAgent.analyze_intent", "call_ollama_streaming", "add_stream_review_item"} <= set(
+        found["stream_query_pipeline"]), found
+    print(f"  ✅ /api/query/stream: traced until the stream closed ({stream_tree['duration_ms']:.0f}ms), "
+          f"pipeline spans on the producer thread")
+
+    listed = client.get("/api/debug/traces").get_json()
+    assert [t["request_id"] for t in listed["traces"]][:2] == ["trace-stream-1", "trace-query-1"]
+    assert all(t["request_id"] is not None for t in listed["traces"])
+    otlp = client.get("/api/debug/traces/trace-query-1?format=otlp").get_json()
+    assert len(otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]) == tree["spans"]
+    assert client.get("/api/debug/traces/no-such-request").status_code == 404
+    anonymous = samm.app.test_client()
+    assert anonymous.get("/api/debug/traces").status_code == 401
+    assert anonymous.get("/api/debug/traces/trace-query-1").status_code == 401
+    samm.DEBUG_TRACES_ENABLED = False
+    assert client.get("/api/debug/traces/trace-query-1").status_code == 404
+    samm.DEBUG_TRACES_ENABLED = True
+    for _ in range(100):
+        if os.path.exists(os.path.join(export_dir, "trace-stream-1.json")):
+            break
+        time.sleep(0.02)
+    samm.TRACER._by_request.clear()  # as if another worker served it
+    from_file = client.get("/api/debug/traces/trace-query-1").get_json()
+    assert names(from_file["root"]) == names(tree["root"])
+    assert sorted(os.listdir(export_dir)) == ["trace-query-1.json", "trace-stream-1.json"]
+    shutil.rmtree(export_dir)
+    print("  ✅ listing, ?format=otlp, 404; login required, off without DEBUG_TRACES_ENABLED")
+    print("  ✅ TRACE_EXPORT_DIR files serve traces this worker no longer holds")
+    print("✅ PASSED")
+
+
+if __name__ == "__main__":
+    test_span_tree()
+    test_sampling_cap_and_ring()
+    test_otlp_export()
+    test_overhead()
+    test_app_traces()
+    sys.exit(0)
@@ -0,0 +1,588 @@
+# tiered_cache.py
+# Thread-safe two-tier cache for the SAMM backend.
+#
+#   Tier 1 (memory): per-process OrderedDict LRU with TTL, O(1) get/set/evict.
+#   Tier 2 (shared): SQLite file on local disk that every gunicorn worker on the
+#                    host reads and writes. Writes are single transactions, so a
+#                    reader never sees a half-written entry.
+#
+# Values must be JSON-serialisable (they are the same dicts we already jsonify).
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LRUTTLCache:
+    """
+    In-process LRU cache with per-entry TTL.
+    Every operation is O(1) and guarded by a single lock.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 3600):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "sets": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (time.time() + ttl, value)
+            self.stats["sets"] += 1
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            return count
+
+    def items(self, limit: int = 10) -> List[Tuple[str, Any]]:
+        """Most recently used entries first (expired entries skipped)"""
+        now = time.time()
+        with self._lock:
+            result = []
+            for key in reversed(self._data):
+                expires_at, value = self._data[key]
+                if expires_at > now:
+                    result.append((key, value))
+                if len(result) >= limit:
+                    break
+            return result
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate_percent": round(self.stats["hits"] / lookups * 100, 2) if lookups else 0,
+            }
+
+
+class SQLiteCacheTier:
+    """
+    Shared on-disk cache tier backed by SQLite (WAL mode).
+
+    - One connection per thread (sqlite3 connections are not thread-safe)
+    - Upsert + size bookkeeping + eviction happen in ONE transaction
+    - Row count is kept in a meta table so eviction never needs COUNT(*)
+    - Eviction drops the oldest-written rows (indexed on stored_at)
+    Counters are per process; size/max_size describe the shared file.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000, ttl_seconds: float = 3600,
+                 namespace: str = "default"):
+        self.path = path
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "sets": 0, "errors": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_stored_at "
+                "ON cache_entries (namespace, stored_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_meta ("
+                " namespace TEXT PRIMARY KEY,"
+                " entry_count INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (namespace, entry_count) "
+                "SELECT ?, COUNT(*) FROM cache_entries WHERE namespace = ?",
+                (namespace, namespace),
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # connections must not cross a fork
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+            value, expires_at = row
+            if expires_at <= time.time():
+                self._delete_rows(conn, key)
+                self._bump("expirations")
+                self._bump("misses")
+                return None
+            self._bump("hits")
+            return json.loads(value)
+        except Exception as e:
+            print(f"[SharedCache] get error: {e}")
+            self._bump("errors")
+            self._bump("misses")
+            return None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        try:
+            payload = json.dumps(value, default=str)
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existed = conn.execute(
+                    "SELECT 1 FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone() is not None
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, payload, now, now + ttl),
+                )
+                evicted = 0
+                if not existed:
+                    conn.execute(
+                        "UPDATE cache_meta SET entry_count = entry_count + 1 WHERE namespace = ?",
+                        (self.namespace,),
+                    )
+                    count = conn.execute(
+                        "SELECT entry_count FROM cache_meta WHERE namespace = ?",
+                        (self.namespace,),
+                    ).fetchone()[0]
+                    overflow = count - self.max_size
+                    if overflow > 0:
+                        evicted = conn.execute(
+                            "DELETE FROM cache_entries WHERE rowid IN ("
+                            " SELECT rowid FROM cache_entries WHERE namespace = ?"
+                            " ORDER BY stored_at LIMIT ?)",
+                            (self.namespace, overflow),
+                        ).rowcount
+                        conn.execute(
+                            "UPDATE cache_meta SET entry_count = entry_count - ? WHERE namespace = ?",
+                            (evicted, self.namespace),
+                        )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._bump("sets")
+            if evicted:
+                self._bump("evictions", evicted)
+            return True
+        except Exception as e:
+            print(f"[SharedCache] set error: {e}")
+            self._bump("errors")
+            return False
+
+    def _delete_rows(self, conn: sqlite3.Connection, key: str) -> int:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).rowcount
+            if deleted:
+                conn.execute(
+                    "UPDATE cache_meta SET entry_count = entry_count - ? WHERE namespace = ?",
+                    (deleted, self.namespace),
+                )
+            conn.execute("COMMIT")
+            return deleted
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: str) -> bool:
+        try:
+            return self._delete_rows(self._conn(), key) > 0
+        except Exception as e:
+            print(f"[SharedCache] delete error: {e}")
+            self._bump("errors")
+            return False
+
+    def clear(self) -> int:
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,)
+                ).rowcount
+                conn.execute(
+                    "UPDATE cache_meta SET entry_count = 0 WHERE namespace = ?", (self.namespace,)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return deleted
+        except Exception as e:
+            print(f"[SharedCache] clear error: {e}")
+            self._bump("errors")
+            return 0
+
+    def __len__(self) -> int:
+        try:
+            row = self._conn().execute(
+                "SELECT entry_count FROM cache_meta WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+            return row[0] if row else 0
+        except Exception:
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "size": len(self),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate_percent": round(stats["hits"] / lookups * 100, 2) if lookups else 0,
+            "path": self.path,
+            "namespace": self.namespace,
+        }
+
+
+class TieredCache:
+    """
+    Memory LRU in front of an optional shared SQLite tier.
+    get(): memory -> shared (promoting shared hits into memory)
+    set(): write-through to both tiers
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 3600,
+                 shared_path: Optional[str] = None, shared_max_size: Optional[int] = None,
+                 namespace: str = "default"):
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUTTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.shared: Optional[SQLiteCacheTier] = None
+        if shared_path:
+            try:
+                self.shared = SQLiteCacheTier(
+                    shared_path,
+                    max_size=shared_max_size or max_size * 10,
+                    ttl_seconds=ttl_seconds,
+                    namespace=namespace,
+                )
+            except Exception as e:
+                print(f"[TieredCache] Shared tier disabled ({shared_path}): {e}")
+                self.shared = None
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.shared is None:
+            return None
+        value = self.shared.get(key)
+        if value is not None:
+            # Keep the remaining shared TTL so promotion never extends an entry's life
+            remaining = None
+            if isinstance(value, dict) and "timestamp" in value:
+                remaining = max(0.0, self.ttl_seconds - (time.time() - value["timestamp"]))
+            self.memory.set(key, value, ttl_seconds=remaining)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl_seconds)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl_seconds)
+
+    def delete(self, key: str) -> bool:
+        removed = self.memory.delete(key)
+        if self.shared is not None:
+            removed = self.shared.delete(key) or removed
+        return removed
+
+    def clear(self) -> int:
+        count = self.memory.clear()
+        if self.shared is not None:
+            count = max(count, self.shared.clear())
+        return count
+
+    def items(self, limit: int = 10) -> List[Tuple[str, Any]]:
+        return self.memory.items(limit)
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.get_stats(),
+            "shared": self.shared.get_stats() if self.shared is not None else {"enabled": False},
+        }
+
+
+class DataVersionRegistry:
+    """
+    Version stamps for the data that cached artefacts depend on.
+
+    A component is a plain string, e.g. "training:kw:loa", "kg:file",
+    "vector:samm_all_chapters". Counters are bumped on data changes
+    (HITL corrections, trigger updates); fingerprints are set from source
+    files at startup. Unknown components are at version "0".
+
+    With a path, versions live in the shared SQLite file so a bump in one
+    worker invalidates entries in every worker. Each row carries a global
+    sequence number, so refreshing only reads rows changed since last look.
+    """
+
+    def __init__(self, path: Optional[str] = None, refresh_seconds: float = 1.0):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[str, str] = {}
+        self._last_seq = 0
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.stats = {"bumps": 0, "fingerprint_changes": 0, "refreshes": 0}
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = self._conn()
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS data_versions ("
+                        " component TEXT PRIMARY KEY,"
+                        " version TEXT NOT NULL,"
+                        " seq INTEGER NOT NULL,"
+                        " updated_at REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_data_versions_seq ON data_versions (seq)")
+                self._refresh(force=True)
+            except Exception as e:
+                print(f"[DataVersions] Shared store disabled ({path}): {e}")
+                self.path = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # connections must not cross a fork
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _refresh(self, force: bool = False) -> None:
+        if not self.path:
+            return
+        now = time.time()
+        if not force and now - self._last_refresh < self.refresh_seconds:
+            return
+        try:
+            rows = self._conn().execute(
+                "SELECT component, version, seq FROM data_versions WHERE seq > ?",
+                (self._last_seq,),
+            ).fetchall()
+            with self._lock:
+                for component, version, seq in rows:
+                    self._versions[component] = version
+                    self._last_seq = max(self._last_seq, seq)
+                self._last_refresh = now
+                self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"[DataVersions] refresh error: {e}")
+
+    def _write(self, component: str, version_sql: str, params: Tuple) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = (conn.execute("SELECT COALESCE(MAX(seq), 0) FROM data_versions").fetchone()[0]) + 1
+            conn.execute(
+                "INSERT INTO data_versions (component, version, seq, updated_at) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(component) DO UPDATE SET version = {version_sql}, "
+                "seq = excluded.seq, updated_at = excluded.updated_at",
+                (component, *params, seq, time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def bump(self, *components: str) -> None:
+        """Increment the counter of every given component"""
+        for component in dict.fromkeys(c for c in components if c):
+            if self.path:
+                try:
+                    self._write(component, "CAST(CAST(data_versions.version AS INTEGER) + 1 AS TEXT)", ("1",))
+                except Exception as e:
+                    print(f"[DataVersions] bump error ({component}): {e}")
+            with self._lock:
+                current = self._versions.get(component, "0")
+                self._versions[component] = str(int(current) + 1) if current.isdigit() else "1"
+                self.stats["bumps"] += 1
+        self._refresh(force=True)
+
+    def set_fingerprint(self, component: str, fingerprint: str) -> bool:
+        """Pin a component to a content fingerprint; returns True if it changed"""
+        self._refresh(force=True)
+        with self._lock:
+            if self._versions.get(component) == fingerprint:
+                return False
+            self._versions[component] = fingerprint
+            self.stats["fingerprint_changes"] += 1
+        if self.path:
+            try:
+                self._write(component, "excluded.version", (fingerprint,))
+            except Exception as e:
+                print(f"[DataVersions] fingerprint error ({component}): {e}")
+        return True
+
+    def capture(self) -> Dict[str, str]:
+        """Every current version; taken when a request starts reading data"""
+        self._refresh()
+        with self._lock:
+            return dict(self._versions)
+
+    def snapshot(self, components, at: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Versions for the given components (stored alongside a cache entry):
+        current ones, or those of an earlier capture() when `at` is given
+        """
+        if at is not None:
+            return {c: at.get(c, "0") for c in dict.fromkeys(components) if c}
+        self._refresh()
+        with self._lock:
+            return {c: self._versions.get(c, "0") for c in dict.fromkeys(components) if c}
+
+    def is_current(self, versions: Optional[Dict[str, str]]) -> bool:
+        if not versions:
+            return True
+        self._refresh()
+        with self._lock:
+            return all(self._versions.get(c, "0") == v for c, v in versions.items())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "tracked_components": len(self._versions),
+                "shared": self.path is not None,
+            }
+
+
+class VersionedCache:
+    """
+    Cache whose entries remember the data versions they were built from.
+    A lookup that finds an entry with an outdated version deletes it and
+    reports a miss, so invalidation is lazy and touches only dependents.
+    """
+
+    def __init__(self, cache: TieredCache, versions: DataVersionRegistry):
+        self.cache = cache
+        self.versions = versions
+        self._stats_lock = threading.Lock()
+        self.stale_invalidations = 0
+
+    @property
+    def shared(self) -> Optional[SQLiteCacheTier]:
+        return self.cache.shared
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if not self.versions.is_current(entry.get("versions")):
+            self.cache.delete(key)
+            with self._stats_lock:
+                self.stale_invalidations += 1
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any, depends_on=(), ttl_seconds: Optional[float] = None,
+            snapshot: Optional[Dict[str, str]] = None) -> None:
+        """
+        Store value stamped with the versions of depends_on. Pass the
+        versions.capture() taken before the value's inputs were read as
+        `snapshot`, so a bump while it was being built leaves it stale.
+        """
+        self.cache.set(key, {
+            "value": value,
+            "versions": self.versions.snapshot(depends_on, at=snapshot),
+            "timestamp": time.time(),
+        }, ttl_seconds)
+
+    def delete(self, key: str) -> bool:
+        return self.cache.delete(key)
+
+    def clear(self) -> int:
+        return self.cache.clear()
+
+    def items(self, limit: int = 10) -> List[Tuple[str, Any]]:
+        return [(key, entry["value"]) for key, entry in self.cache.items(limit)]
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.get_stats()
+        with self._stats_lock:
+            stats["stale_invalidations"] = self.stale_invalidations
+        return stats
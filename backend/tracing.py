@@ -0,0 +1,439 @@
+# tracing.py
+# Per-request span trees kept in a bounded in-memory ring, exportable as OTLP/JSON (v5.9.32).
+#
+#   TRACER = Tracer.from_env()
+#   trace = TRACER.begin(request_id, "POST /api/query")   # request hook; None if not sampled
+#   with span("gremlin.submit", query=query):             # no-op unless a trace is current
+#       ...
+#   @traced("llm.enhanced")                               # functions, generators, coroutines
+#   @trace_methods                                         # every method of an agent class
+#   TRACER.end(trace)                                     # teardown: into the ring (and TRACE_EXPORT_DIR)
+#   TRACER.get(request_id).tree()                         # nested timing tree for /api/debug/traces/<id>
+#
+# - The current span is a context variable, so spans opened on worker threads (StageScheduler
+#   stages, the SingleFlight producer, drive_effects_async steps) nest under the request's
+#   span when they run in a copy of its context
+# - Outside a sampled request a span costs one context-variable read. TRACE_SAMPLE_RATE is the
+#   fraction of requests traced; TRACE_MAX_SPANS caps one trace (later spans are counted, not kept)
+# - TRACE_BUFFER_SIZE finished traces are kept, oldest evicted first; traces still running are
+#   visible too. With TRACE_EXPORT_DIR set each finished trace is also written, from a background
+#   thread, to <dir>/<request_id>.json in OTLP/JSON (the endpoint of any gunicorn worker finds it)
+
+import collections
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+SERVICE_NAME = "samm-agent"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("samm_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "thread")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = trace.next_span_id()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+        self.end_ns: Optional[int] = None
+        self.start_ns = time.perf_counter_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time.perf_counter_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+
+class Trace:
+    """One request's spans; the first is the root"""
+
+    def __init__(self, request_id: str, name: str, max_spans: int, attributes: Optional[Dict[str, Any]] = None):
+        self.request_id = request_id
+        self.trace_id = uuid.uuid4().hex
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.wall_start_ns = time.time_ns()
+        self.perf_start_ns = time.perf_counter_ns()
+        self.root = self.open(name, None, dict(attributes or {}))
+
+    def next_span_id(self) -> str:
+        return f"{next(self._ids):016x}"
+
+    def open(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        """A new span, or None (counted in dropped) once the trace holds max_spans"""
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return None
+            span = Span(self, name, parent.span_id if parent is not None else None, attributes)
+            self.spans.append(span)
+        return span
+
+    @property
+    def finished(self) -> bool:
+        return self.root.end_ns is not None
+
+    def duration_ms(self) -> Optional[float]:
+        return (self.root.end_ns - self.root.start_ns) / 1e6 if self.finished else None
+
+    def _wall_ns(self, perf_ns: int) -> int:
+        return self.wall_start_ns + perf_ns - self.perf_start_ns
+
+    def summary(self) -> Dict[str, Any]:
+        return {"request_id": self.request_id, "trace_id": self.trace_id, "name": self.root.name,
+                "start": self.wall_start_ns / 1e9, "duration_ms": self.duration_ms(),
+                "spans": len(self.spans), "dropped_spans": self.dropped,
+                "error": self.root.error}
+
+    def tree(self) -> Dict[str, Any]:
+        """Nested {name, start_ms (offset from the root), duration_ms, attributes, children}"""
+        now_ns = time.perf_counter_ns()
+        with self._lock:
+            spans = list(self.spans)
+        nodes, roots = {}, []
+        for s in spans:
+            node = {"name": s.name, "start_ms": round((s.start_ns - self.root.start_ns) / 1e6, 3),
+                    "duration_ms": round(((s.end_ns or now_ns) - s.start_ns) / 1e6, 3), "thread": s.thread}
+            if s.end_ns is None:
+                node["in_progress"] = True
+            if s.attributes:
+                node["attributes"] = dict(s.attributes)
+            if s.error:
+                node["error"] = s.error
+            node["children"] = []
+            nodes[s.span_id] = node
+        for s in spans:
+            parent = nodes.get(s.parent_id) if s.parent_id else None
+            (parent["children"] if parent is not None else roots).append(nodes[s.span_id])
+        for node in nodes.values():
+            node["children"].sort(key=lambda child: child["start_ms"])
+        return {**self.summary(), "root": roots[0] if len(roots) == 1 else {"name": "(detached)", "children": roots}}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON (ExportTraceServiceRequest) for offline tools (Jaeger, Tempo, otel-cli)"""
+        now_ns = time.perf_counter_ns()
+        with self._lock:
+            spans = list(self.spans)
+        otlp_spans = []
+        for s in spans:
+            attributes = {**s.attributes, "thread.name": s.thread}
+            if s is self.root:
+                attributes["samm.request_id"] = self.request_id
+                if self.dropped:
+                    attributes["samm.dropped_spans"] = self.dropped
+            if s.end_ns is None:
+                attributes["samm.in_progress"] = True
+            record = {"traceId": self.trace_id, "spanId": s.span_id, "name": s.name,
+                      "kind": 2 if s is self.root else 1,  # SERVER / INTERNAL
+                      "startTimeUnixNano": str(self._wall_ns(s.start_ns)),
+                      "endTimeUnixNano": str(self._wall_ns(s.end_ns or now_ns)),
+                      "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()],
+                      "status": {"code": 2, "message": s.error} if s.error else {"code": 1}}
+            if s.parent_id:
+                record["parentSpanId"] = s.parent_id
+            otlp_spans.append(record)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME),
+                                        _otlp_attribute("process.pid", os.getpid())]},
+            "scopeSpans": [{"scope": {"name": "samm.tracing"}, "spans": otlp_spans}]}]}
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def tree_from_otlp(document: Dict[str, Any]) -> Dict[str, Any]:
+    """tree() of a trace read back from an exported OTLP/JSON file"""
+    spans = [s for resource in document.get("resourceSpans", []) for scope in resource.get("scopeSpans", [])
+             for s in scope.get("spans", [])]
+    if not spans:
+        raise ValueError("no spans in OTLP document")
+
+    def attributes(s):
+        return {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])}
+
+    root_span = next((s for s in spans if not s.get("parentSpanId")), spans[0])
+    origin = int(root_span["startTimeUnixNano"])
+    nodes = {}
+    for s in spans:
+        attrs = attributes(s)
+        start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+        node = {"name": s["name"], "start_ms": round((start - origin) / 1e6, 3),
+                "duration_ms": round((end - start) / 1e6, 3), "thread": attrs.pop("thread.name", "")}
+        if attrs.pop("samm.in_progress", False):
+            node["in_progress"] = True
+        attrs.pop("samm.request_id", None)
+        if attrs:
+            node["attributes"] = attrs
+        if s.get("status", {}).get("code") == 2:
+            node["error"] = s["status"].get("message", "")
+        node["children"] = []
+        nodes[s["spanId"]] = node
+    for s in spans:
+        parent = nodes.get(s.get("parentSpanId"))
+        if parent is not None:
+            parent["children"].append(nodes[s["spanId"]])
+    for node in nodes.values():
+        node["children"].sort(key=lambda child: child["start_ms"])
+    root_attrs = attributes(root_span)
+    return {"request_id": root_attrs.get("samm.request_id"), "trace_id": root_span["traceId"],
+            "name": root_span["name"], "start": origin / 1e9, "duration_ms": nodes[root_span["spanId"]]["duration_ms"],
+            "spans": len(spans), "dropped_spans": int(root_attrs.get("samm.dropped_spans", 0)),
+            "error": nodes[root_span["spanId"]].get("error"), "root": nodes[root_span["spanId"]]}
+
+
+# ---------------------------------------------------------------- spans
+
+
+class _SpanScope:
+    """Makes a new child of parent the current span for the duration of a with block"""
+    __slots__ = ("parent", "name", "attributes", "span", "token")
+
+    def __init__(self, parent: Span, name: str, attributes: Dict[str, Any]):
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        self.span = self.parent.trace.open(self.name, self.parent, self.attributes)
+        if self.span is not None:
+            self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        current = self.span
+        if current is None:
+            return False
+        current.finish(exc if exc is not None and exc_type is not GeneratorExit else None)
+        try:
+            _current_span.reset(self.token)
+        except ValueError:  # closed from another context (a generator collected elsewhere)
+            _current_span.set(self.parent)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes: Any):
+    """Context manager: a child of the current span, or nothing when this request is not traced"""
+    parent = _current_span.get()
+    if parent is None:
+        return _NO_SPAN
+    return _SpanScope(parent, name, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Annotate the current span (if any)"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: each call is a span (for generators: from first step to exhaustion)"""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return (yield from fn(*args, **kwargs))
+            return generator_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coroutine_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return coroutine_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            with _SpanScope(parent, span_name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls):
+    """Class decorator: @traced on every method defined in the class body (not dunders)"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("__") or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, traced(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+# ---------------------------------------------------------------- tracer
+
+
+class Tracer:
+    """Starts sampled traces and keeps the last buffer_size finished ones"""
+
+    def __init__(self, sample_rate: float = 1.0, buffer_size: int = 100, max_spans: int = 2000,
+                 export_dir: Optional[str] = None):
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.buffer_size = buffer_size
+        self.max_spans = max(1, max_spans)
+        self.export_dir = export_dir or None
+        self._lock = threading.Lock()
+        self._finished: Deque[Trace] = collections.deque()
+        self._by_request: Dict[str, Trace] = {}
+        self._export_queue: Optional[queue.Queue] = None
+        self._exporter_pid: Optional[int] = None
+        self.stats = {"traces": 0, "not_sampled": 0, "finished": 0, "evicted": 0, "spans": 0,
+                      "dropped_spans": 0, "exported": 0, "export_errors": 0, "export_dropped": 0}
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """TRACE_SAMPLE_RATE / TRACE_BUFFER_SIZE / TRACE_MAX_SPANS / TRACE_EXPORT_DIR"""
+        return cls(sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+                   buffer_size=int(os.getenv("TRACE_BUFFER_SIZE", "100")),
+                   max_spans=int(os.getenv("TRACE_MAX_SPANS", "2000")),
+                   export_dir=os.getenv("TRACE_EXPORT_DIR"))
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def begin(self, request_id: str, name: str, sampled: Optional[bool] = None, **attributes: Any) -> Optional[Trace]:
+        """Start request_id's trace and make its root the current span (None when not sampled)"""
+        if sampled is None:
+            sampled = self.sample_rate >= 1.0 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not sampled:
+            self._bump("not_sampled")
+            return None
+        trace = Trace(request_id, name, self.max_spans, attributes)
+        with self._lock:
+            self._by_request[request_id] = trace
+            self.stats["traces"] += 1
+        _current_span.set(trace.root)
+        return trace
+
+    def end(self, trace: Optional[Trace], error: Optional[BaseException] = None) -> None:
+        """Finish the root span, keep the trace in the ring and queue its export"""
+        _current_span.set(None)
+        if trace is None or trace.finished:
+            return
+        trace.root.finish(error)
+        with self._lock:
+            self._finished.append(trace)
+            self.stats["finished"] += 1
+            self.stats["spans"] += len(trace.spans)
+            self.stats["dropped_spans"] += trace.dropped
+            while len(self._finished) > self.buffer_size:
+                old = self._finished.popleft()
+                if self._by_request.get(old.request_id) is old:
+                    del self._by_request[old.request_id]
+                self.stats["evicted"] += 1
+        if self.export_dir:
+            self._queue_export(trace)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._by_request.get(request_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries, newest first: traces still running, then finished ones"""
+        with self._lock:
+            running = [t for t in self._by_request.values() if not t.finished]
+            finished = list(self._finished)[-limit:]
+        return [t.summary() for t in (running + finished[::-1])][:limit]
+
+    def load_exported(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """The OTLP/JSON document written for request_id (by this or another worker), if any"""
+        if not self.export_dir or not request_id.replace("-", "").replace("_", "").isalnum():
+            return None
+        try:
+            with open(os.path.join(self.export_dir, f"{request_id}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # ------------------------------------------------------------ export
+
+    def export(self, trace: Trace, directory: Optional[str] = None) -> str:
+        """Write trace as OTLP/JSON to <directory>/<request_id>.json (atomically); returns the path"""
+        directory = directory or self.export_dir
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{trace.request_id}.json")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(trace.to_otlp(), f)
+        os.replace(temp_path, path)
+        return path
+
+    def _queue_export(self, trace: Trace) -> None:
+        if self._exporter_pid != os.getpid():  # first export in this process (or after fork)
+            with self._lock:
+                if self._exporter_pid != os.getpid():
+                    self._export_queue = queue.Queue(self.buffer_size)
+                    threading.Thread(target=self._export_loop, args=(self._export_queue,),
+                                     name="trace-export", daemon=True).start()
+                    self._exporter_pid = os.getpid()
+        try:
+            self._export_queue.put_nowait(trace)
+        except queue.Full:
+            self._bump("export_dropped")
+
+    def _export_loop(self, traces: queue.Queue) -> None:
+        while True:
+            trace = traces.get()
+            try:
+                self.export(trace)
+                self._bump("exported")
+            except OSError as e:
+                print(f"[Tracing] ⚠️ Could not export trace {trace.request_id}: {e}")
+                self._bump("export_errors")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            buffered, running = len(self._finished), sum(not t.finished for t in self._by_request.values())
+        return {"sample_rate": self.sample_rate, "buffer_size": self.buffer_size, "buffered": buffered,
+                "running": running, "export_dir": self.export_dir, **stats}